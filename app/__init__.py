@@ -71,6 +71,13 @@ def create_app(config_class=Config):
     )
     app.config.from_object(config_class)
 
+    # Instrument the connection pool so checkout waits show on /metrics
+    from .utils.observability import InstrumentedQueuePool
+    engine_options = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    if "pool_size" in engine_options:
+        engine_options.setdefault("poolclass", InstrumentedQueuePool)
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options
+
     # Initialize extensions
     db.init_app(app)
     migrate.init_app(app, db)
@@ -102,6 +109,18 @@ def create_app(config_class=Config):
     from .utils.observability import register_observability
     register_observability(app)
 
+    # Opt-in per-request cProfile capture (needs g.request_id from observability)
+    from .utils.profiling import register_profiling
+    register_profiling(app)
+
+    # Resume jobs queued for the local runner while Redis was down
+    from .jobs.local import register_local_jobs
+    register_local_jobs(app)
+
+    # `flask jobs ...` commands (workers, scheduler, one-off job runs)
+    from .jobs import register_job_commands
+    register_job_commands(app)
+
     # REQ-029: Database schema is managed exclusively by Flask-Migrate.
     # Run 'flask db upgrade' before starting the application.
     # The old db.create_all() call has been removed to prevent
@@ -1,12 +1,29 @@
 """
 Teams Bot Routes (REQ-012)
+
+The webhook stores each activity and acknowledges it at once; Bot
+Framework retries deliveries that are slow to answer. The activity is
+then processed (conversation upsert, card actions, replies) by
+process_bot_activity_job. A retried delivery has the same activity key
+and is acknowledged without being processed again.
 """
 
-from datetime import datetime
+import hashlib
+import json
+from datetime import datetime, timedelta
 from flask import Blueprint, request, jsonify, current_app
+from sqlalchemy.exc import IntegrityError
 
 from ..extensions import csrf, db
-from ..models import TeamsConversation, User, Timesheet, TimesheetStatus, Note
+from ..models import (
+    BotActivity,
+    BotActivityStatus,
+    TeamsConversation,
+    User,
+    Timesheet,
+    TimesheetStatus,
+    Note,
+)
 from ..services.notification import NotificationService
 from ..utils.pay_periods import get_confirmed_pay_period
 from ..utils.teams import (
@@ -206,17 +223,15 @@ def health():
     return {"status": "ok"}
 
 
-@bot_bp.route("/messages", methods=["POST"])
-@csrf.exempt
-def messages():
-    activity = request.get_json(silent=True) or {}
+def _handle_activity(activity):
+    """Act on an activity: track the conversation, run card actions, reply."""
     activity_type = activity.get("type")
 
     conversation = _upsert_conversation(activity)
 
     if activity_type == "message":
         if _handle_card_action(activity, conversation):
-            return jsonify({"status": "ok"})
+            return
 
         text = (activity.get("text") or "").strip().lower()
         app_url = current_app.config.get("APP_URL", "http://localhost/app")
@@ -243,4 +258,166 @@ def messages():
             card = build_help_card(app_url)
             _send_reply(conversation, "Thanks for connecting!", card)
 
+
+def activity_key(activity) -> str:
+    """
+    Idempotency key for an activity.
+
+    Bot Framework activity IDs are unique within a conversation; activities
+    without an ID are keyed by their content.
+    """
+    activity_id = activity.get("id")
+    if activity_id:
+        conversation_id = (activity.get("conversation") or {}).get("id", "")
+        raw = f"{activity.get('channelId', '')}:{conversation_id}:{activity_id}"
+    else:
+        raw = json.dumps(activity, sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def record_activity(activity):
+    """
+    Store an inbound activity (commits).
+
+    Returns:
+        BotActivity: The stored activity, or None if it was received before
+    """
+    activity_id = activity.get("id")
+    activity_type = activity.get("type")
+    record = BotActivity(
+        activity_key=activity_key(activity),
+        activity_id=str(activity_id)[:255] if activity_id else None,
+        activity_type=str(activity_type)[:50] if activity_type else None,
+        activity=activity,
+        status=BotActivityStatus.RECEIVED,
+    )
+    try:
+        with db.session.begin_nested():
+            db.session.add(record)
+    except IntegrityError:
+        return None
+    db.session.commit()
+    return record
+
+
+def process_bot_activity(record_id: str) -> dict:
+    """
+    Process a stored activity at most once.
+
+    The activity is claimed (RECEIVED -> PROCESSING) before anything is
+    done, so a duplicate or rerun job finds it taken and does nothing.
+    """
+    claimed = (
+        BotActivity.query.filter_by(id=record_id, status=BotActivityStatus.RECEIVED)
+        .update(
+            {"status": BotActivityStatus.PROCESSING, "claimed_at": datetime.utcnow()},
+            synchronize_session=False,
+        )
+    )
+    db.session.commit()
+    if not claimed:
+        current_app.logger.info("Bot activity %s already processed", record_id)
+        return {"skipped": True}
+
+    record = db.session.get(BotActivity, record_id)
+    try:
+        _handle_activity(record.activity)
+        status, error = BotActivityStatus.DONE, None
+    except Exception as exc:
+        db.session.rollback()
+        current_app.logger.error("Bot activity %s failed: %s", record_id, exc)
+        status, error = BotActivityStatus.FAILED, str(exc)
+
+    record = db.session.get(BotActivity, record_id)
+    record.status = status
+    record.last_error = error
+    record.processed_at = datetime.utcnow()
+    db.session.commit()
+    return {"status": status}
+
+
+def find_stalled_bot_activities(limit: int = 100) -> list:
+    """
+    Find activities whose processing job was lost (commits).
+
+    RECEIVED activities older than BOT_ACTIVITY_REQUEUE_SECONDS never ran
+    (the job was lost, or enqueueing failed after the webhook replied), so
+    they can be enqueued again: a job that is merely late finds them
+    claimed and does nothing. PROCESSING activities claimed more than
+    BOT_ACTIVITY_STALE_SECONDS ago are marked FAILED rather than rerun,
+    since their action may have run (or still be running) and actions
+    run at most once.
+
+    Returns:
+        list: IDs of the RECEIVED activities to enqueue
+    """
+    now = datetime.utcnow()
+    received_cutoff = now - timedelta(
+        seconds=current_app.config.get("BOT_ACTIVITY_REQUEUE_SECONDS", 300)
+    )
+    stale_seconds = current_app.config.get("BOT_ACTIVITY_STALE_SECONDS", 900)
+
+    stale = BotActivity.query.filter(
+        BotActivity.status == BotActivityStatus.PROCESSING,
+        BotActivity.claimed_at < now - timedelta(seconds=stale_seconds),
+    ).update(
+        {
+            "status": BotActivityStatus.FAILED,
+            "last_error": f"Processing did not finish within {stale_seconds}s",
+            "processed_at": now,
+        },
+        synchronize_session=False,
+    )
+    db.session.commit()
+    if stale:
+        current_app.logger.warning("Marked %s stalled bot activities as failed", stale)
+
+    return [
+        record_id
+        for record_id, in BotActivity.query.filter(
+            BotActivity.status == BotActivityStatus.RECEIVED,
+            BotActivity.received_at < received_cutoff,
+        )
+        .order_by(BotActivity.received_at)
+        .with_entities(BotActivity.id)
+        .limit(limit)
+    ]
+
+
+def prune_bot_activities(retention_days: int = None) -> int:
+    """
+    Delete stored activities older than BOT_ACTIVITY_RETENTION_DAYS.
+
+    Bot Framework retries within minutes, so old keys are no longer needed
+    to spot duplicates.
+
+    Returns:
+        int: Number of activities deleted
+    """
+    if retention_days is None:
+        retention_days = current_app.config.get("BOT_ACTIVITY_RETENTION_DAYS", 7)
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    deleted = BotActivity.query.filter(BotActivity.received_at < cutoff).delete(
+        synchronize_session=False
+    )
+    db.session.commit()
+    return deleted
+
+
+@bot_bp.route("/messages", methods=["POST"])
+@csrf.exempt
+def messages():
+    """
+    Bot Framework webhook: store the activity and acknowledge it.
+    """
+    from ..jobs import enqueue_bot_activity
+
+    activity = request.get_json(silent=True) or {}
+
+    record = record_activity(activity)
+    if record is None:
+        current_app.logger.info("Ignoring duplicate bot activity %s", activity.get("id"))
+        return jsonify({"status": "ok"})
+
+    enqueue_bot_activity(record.id)
     return jsonify({"status": "ok"})
@@ -6,6 +6,7 @@ Loads settings from environment variables with sensible defaults.
 
 import os
 import secrets
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -29,6 +30,31 @@ def _load_secret_key():
     return secret_key
 
 
+def _build_engine_options(database_uri):
+    """
+    Build SQLAlchemy engine options for the configured database.
+
+    Production runs gunicorn with gevent workers, so many greenlets share
+    each worker's connection pool. SQLite uses its own pooling and does
+    not accept QueuePool arguments, so it gets no overrides.
+    """
+    if str(database_uri).startswith("sqlite"):
+        return {}
+
+    return {
+        # Connections kept open per worker process
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", "10")),
+        # Extra connections allowed under burst load (closed when returned)
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", "10")),
+        # Fail fast instead of parking greenlets for the 30s default
+        "pool_timeout": float(os.environ.get("DB_POOL_TIMEOUT", "10")),
+        # Recycle before server/load balancer idle timeouts drop connections
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", "1800")),
+        # Detect stale connections on checkout
+        "pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true",
+    }
+
+
 class Config:
     """Base configuration class."""
 
@@ -41,6 +67,8 @@ class Config:
         "DATABASE_URL", "sqlite:///timesheet.db"
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Connection pool tuning (sized for gevent workers, see _build_engine_options)
+    SQLALCHEMY_ENGINE_OPTIONS = _build_engine_options(SQLALCHEMY_DATABASE_URI)
 
     # Session security (REQ-031: CSRF requires sessions for token validation)
     SESSION_COOKIE_HTTPONLY = True  # Prevent XSS access to session cookie
@@ -62,6 +90,10 @@ class Config:
     # MSAL automatically adds openid, profile, offline_access - only specify additional scopes
     AZURE_SCOPES = ["User.Read"]
 
+    # MSAL clients are cached per process; rebuild them this often (seconds)
+    # to refresh authority metadata. 0 keeps them for the process lifetime.
+    MSAL_METADATA_REFRESH_SECONDS = int(os.environ.get("MSAL_METADATA_REFRESH_SECONDS", 86400))
+
     # SharePoint Sync (REQ-010)
     SHAREPOINT_SYNC_ENABLED = (
         os.environ.get("SHAREPOINT_SYNC_ENABLED", "false").lower() == "true"
@@ -69,6 +101,21 @@ class Config:
     SP_SITE_ID = os.environ.get("SP_SITE_ID", "")
     SP_DRIVE_ID = os.environ.get("SP_DRIVE_ID", "")
     SP_BASE_FOLDER = os.environ.get("SP_BASE_FOLDER", "Timesheets")
+    # Graph endpoint (override for national clouds, e.g. graph.microsoft.us)
+    GRAPH_BASE_URL = os.environ.get("GRAPH_BASE_URL", "https://graph.microsoft.com/v1.0")
+    # Keep-alive connections per worker for Graph calls
+    SP_HTTP_POOL_SIZE = int(os.environ.get("SP_HTTP_POOL_SIZE", 10))
+    # Seconds to remember that a drive folder exists (0 = always check);
+    # shared across workers through Redis when REDIS_URL is set
+    SP_FOLDER_CACHE_TTL = int(os.environ.get("SP_FOLDER_CACHE_TTL", 3600))
+    # Graph calls per second (and burst) per tenant, per worker process
+    SP_RATE_LIMIT_PER_SECOND = float(os.environ.get("SP_RATE_LIMIT_PER_SECOND", 10))
+    SP_RATE_LIMIT_BURST = int(os.environ.get("SP_RATE_LIMIT_BURST", 20))
+    # Retries of throttled (429 / Retry-After) Graph calls
+    SP_THROTTLE_MAX_RETRIES = int(os.environ.get("SP_THROTTLE_MAX_RETRIES", 3))
+    # The hourly sync scan uploads due attachments itself, this many at once
+    SP_BATCH_SYNC_ENABLED = os.environ.get("SP_BATCH_SYNC_ENABLED", "true").lower() == "true"
+    SP_SYNC_CONCURRENCY = int(os.environ.get("SP_SYNC_CONCURRENCY", 4))
 
     # Twilio
     TWILIO_ACCOUNT_SID = os.environ.get("TWILIO_ACCOUNT_SID")
@@ -92,11 +139,64 @@ class Config:
     TEAMS_APP_ID = os.environ.get("TEAMS_APP_ID", "")
     TEAMS_APP_PASSWORD = os.environ.get("TEAMS_APP_PASSWORD", "")
     TEAMS_TENANT_ID = os.environ.get("TEAMS_TENANT_ID", "botframework.com")
+    # Proactive messages: parallel sends per fan-out and per-send timeout (seconds)
+    TEAMS_FANOUT_CONCURRENCY = int(os.environ.get("TEAMS_FANOUT_CONCURRENCY", 8))
+    TEAMS_SEND_TIMEOUT = float(os.environ.get("TEAMS_SEND_TIMEOUT", 10))
+    # Inbound bot activities are kept this long to recognize redeliveries
+    BOT_ACTIVITY_RETENTION_DAYS = int(os.environ.get("BOT_ACTIVITY_RETENTION_DAYS", 7))
+    # Activities still unprocessed after this many seconds are enqueued again;
+    # those claimed by a worker that hasn't finished within the stale limit fail
+    BOT_ACTIVITY_REQUEUE_SECONDS = int(os.environ.get("BOT_ACTIVITY_REQUEUE_SECONDS", 300))
+    BOT_ACTIVITY_STALE_SECONDS = int(os.environ.get("BOT_ACTIVITY_STALE_SECONDS", 900))
+
+    # Admin submission digest: queue new-submission notices per admin and send
+    # one email/card listing them every N minutes (1-59), or sooner at N items
+    ADMIN_DIGEST_ENABLED = os.environ.get("ADMIN_DIGEST_ENABLED", "false").lower() == "true"
+    ADMIN_DIGEST_INTERVAL_MINUTES = int(os.environ.get("ADMIN_DIGEST_INTERVAL_MINUTES", 15))
+    ADMIN_DIGEST_MAX_ITEMS = int(os.environ.get("ADMIN_DIGEST_MAX_ITEMS", 25))
+
+    # Reminder delivery ledger: failed sends are retried with exponential
+    # backoff (base doubling per attempt, capped) until DELIVERY_MAX_ATTEMPTS.
+    # A sender holds a delivery for DELIVERY_LEASE_SECONDS before it may be retried.
+    DELIVERY_MAX_ATTEMPTS = int(os.environ.get("DELIVERY_MAX_ATTEMPTS", 5))
+    DELIVERY_RETRY_BASE_SECONDS = int(os.environ.get("DELIVERY_RETRY_BASE_SECONDS", 60))
+    DELIVERY_RETRY_MAX_SECONDS = int(os.environ.get("DELIVERY_RETRY_MAX_SECONDS", 3600))
+    DELIVERY_LEASE_SECONDS = int(os.environ.get("DELIVERY_LEASE_SECONDS", 300))
+    DELIVERY_RETRY_BATCH = int(os.environ.get("DELIVERY_RETRY_BATCH", 100))
+
+    # Reminder jobs split users into this many shards (by id hash), one RQ
+    # job each, with a per-shard timeout in seconds
+    REMINDER_SHARDS = int(os.environ.get("REMINDER_SHARDS", 8))
+    REMINDER_SHARD_TIMEOUT = int(os.environ.get("REMINDER_SHARD_TIMEOUT", 600))
+
+    # Without RQ/Redis, jobs go to the database-backed local runner
+    # ("local", LOCAL_JOB_WORKERS threads per process) or run in the
+    # request ("sync"). After a failed enqueue RQ is skipped for
+    # JOB_REDIS_RETRY_SECONDS. Local jobs are leased for their timeout, or
+    # LOCAL_JOB_LEASE_SECONDS, before another process may rerun them.
+    JOB_FALLBACK = os.environ.get("JOB_FALLBACK", "local")
+    LOCAL_JOB_WORKERS = int(os.environ.get("LOCAL_JOB_WORKERS", 2))
+    LOCAL_JOB_LEASE_SECONDS = int(os.environ.get("LOCAL_JOB_LEASE_SECONDS", 600))
+    JOB_REDIS_RETRY_SECONDS = int(os.environ.get("JOB_REDIS_RETRY_SECONDS", 30))
+
+    # Scheduler (flask jobs scheduler): the leader holds a Redis lease for
+    # SCHEDULER_LEASE_SECONDS, renewed every SCHEDULER_POLL_SECONDS, and
+    # re-checks the cron entries every SCHEDULER_RECONCILE_SECONDS
+    SCHEDULER_LEASE_SECONDS = int(os.environ.get("SCHEDULER_LEASE_SECONDS", 30))
+    SCHEDULER_POLL_SECONDS = int(os.environ.get("SCHEDULER_POLL_SECONDS", 5))
+    SCHEDULER_RECONCILE_SECONDS = int(os.environ.get("SCHEDULER_RECONCILE_SECONDS", 300))
 
     # Redis (optional - used for rate limiting and job queues)
     # If not set, rate limiting falls back to in-memory storage
     REDIS_URL = os.environ.get("REDIS_URL", "")
 
+    # Graph / Bot Framework access token cache: "auto" (Redis when REDIS_URL
+    # is set, else memory), "redis", "file" (TOKEN_CACHE_DIR) or "memory".
+    # Tokens are refreshed this many seconds before they expire.
+    TOKEN_CACHE_BACKEND = os.environ.get("TOKEN_CACHE_BACKEND", "auto")
+    TOKEN_CACHE_DIR = os.environ.get("TOKEN_CACHE_DIR", "")
+    TOKEN_REFRESH_MARGIN = int(os.environ.get("TOKEN_REFRESH_MARGIN", 300))
+
     # Rate limiting (REQ-042)
     # Use Redis if available, otherwise fall back to in-memory storage
     RATELIMIT_STORAGE_URI = os.environ.get("REDIS_URL") or "memory://"
@@ -107,6 +207,37 @@ class Config:
     # API limits (per IP): 60 requests per minute (higher for dashboards)
     RATELIMIT_API_LIMIT = os.environ.get("RATELIMIT_API_LIMIT", "60 per minute")
 
+    # Metrics (REQ-036)
+    # Workers publish their counters to Redis (when REDIS_URL is set) so
+    # /metrics reflects every gunicorn worker, not just the one serving it
+    METRICS_PUBLISH_INTERVAL = int(os.environ.get("METRICS_PUBLISH_INTERVAL", "10"))
+    METRICS_WORKER_TTL = int(os.environ.get("METRICS_WORKER_TTL", "300"))
+    # Hard cap on per-route entries kept by each worker (LRU eviction beyond it)
+    METRICS_MAX_ROUTES = int(os.environ.get("METRICS_MAX_ROUTES", "500"))
+    # Optional bearer token for scrapers hitting /metrics and /metrics/prometheus
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+    # Logging: write JSON logs from a background listener thread so log I/O
+    # never blocks a request; records are dropped if the queue fills up
+    LOG_QUEUE_ENABLED = os.environ.get("LOG_QUEUE_ENABLED", "true").lower() == "true"
+    LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+
+    # SQL instrumentation (per-request query count and DB time)
+    # Expose X-DB-Queries / X-DB-Time headers (always on when DEBUG)
+    DB_TIMING_HEADERS = os.environ.get("DB_TIMING_HEADERS", "false").lower() == "true"
+    # Log the statements of requests that run more than N queries (0 = off)
+    DB_QUERY_LOG_THRESHOLD = int(os.environ.get("DB_QUERY_LOG_THRESHOLD", "0"))
+
+    # Request profiling (see app/utils/profiling.py)
+    # Admins mint a signed token; requests carrying it run under cProfile
+    PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILE_DIR = os.environ.get(
+        "PROFILE_DIR", os.path.join(tempfile.gettempdir(), "timesheet-profiles")
+    )
+    PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "50"))
+    PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "1.0"))
+    PROFILE_TOKEN_MAX_AGE = int(os.environ.get("PROFILE_TOKEN_MAX_AGE", "3600"))
+
     # Application URL (for SMS notification links)
     APP_URL = os.environ.get("APP_URL", "http://localhost/app")
 
@@ -128,6 +259,46 @@ class Config:
     )  # 16MB
     ALLOWED_EXTENSIONS = {"pdf", "png", "jpg", "jpeg", "gif"}
 
+    # Attachment storage backend (REQ-033): "local", "s3", or "r2"
+    STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "local")
+    AWS_ACCESS_KEY_ID = os.environ.get("AWS_ACCESS_KEY_ID")
+    AWS_SECRET_ACCESS_KEY = os.environ.get("AWS_SECRET_ACCESS_KEY")
+    AWS_S3_BUCKET = os.environ.get("AWS_S3_BUCKET")
+    AWS_S3_REGION = os.environ.get("AWS_S3_REGION", "us-east-1")
+    AWS_S3_ENDPOINT_URL = os.environ.get("AWS_S3_ENDPOINT_URL")
+    R2_ACCOUNT_ID = os.environ.get("R2_ACCOUNT_ID")
+    R2_ACCESS_KEY_ID = os.environ.get("R2_ACCESS_KEY_ID")
+    R2_SECRET_ACCESS_KEY = os.environ.get("R2_SECRET_ACCESS_KEY")
+    R2_BUCKET = os.environ.get("R2_BUCKET")
+    # Uploads larger than one part use S3 multipart upload (min 5MB)
+    STORAGE_MULTIPART_CHUNK_SIZE = int(
+        os.environ.get("STORAGE_MULTIPART_CHUNK_SIZE", 8 * 1024 * 1024)
+    )
+    # Connections per shared S3/R2 client; raise with gevent worker_connections
+    STORAGE_MAX_POOL_CONNECTIONS = int(
+        os.environ.get("STORAGE_MAX_POOL_CONNECTIONS", 25)
+    )
+    # Lifetime of presigned S3/R2 download redirects, in seconds
+    STORAGE_PRESIGNED_URL_EXPIRY = int(
+        os.environ.get("STORAGE_PRESIGNED_URL_EXPIRY", 300)
+    )
+    # Internal nginx location serving UPLOAD_FOLDER (empty: stream from Flask)
+    STORAGE_ACCEL_REDIRECT_PREFIX = os.environ.get("STORAGE_ACCEL_REDIRECT_PREFIX", "")
+
+    # Attachment thumbnails / PDF first-page previews, generated in the background
+    ATTACHMENT_PREVIEWS_ENABLED = (
+        os.environ.get("ATTACHMENT_PREVIEWS_ENABLED", "true").lower() == "true"
+    )
+    ATTACHMENT_PREVIEW_SIZE = int(os.environ.get("ATTACHMENT_PREVIEW_SIZE", 320))
+    ATTACHMENT_PREVIEW_FORMAT = os.environ.get("ATTACHMENT_PREVIEW_FORMAT", "webp")
+
+    # Attachment ZIP exports: larger archives are built by a background job
+    ATTACHMENT_ARCHIVE_SYNC_MAX_BYTES = int(
+        os.environ.get("ATTACHMENT_ARCHIVE_SYNC_MAX_BYTES", 100 * 1024 * 1024)
+    )
+    # How long finished archives are kept for download (seconds)
+    ATTACHMENT_ARCHIVE_TTL = int(os.environ.get("ATTACHMENT_ARCHIVE_TTL", 86400))
+
 
 class DevelopmentConfig(Config):
     """Development configuration."""
@@ -139,6 +310,7 @@ class ProductionConfig(Config):
     """Production configuration."""
 
     DEBUG = False
+    DB_TIMING_HEADERS = False
 
     # Session security (production only - requires HTTPS)
     SESSION_COOKIE_SECURE = True  # Cookies only sent over HTTPS
@@ -154,10 +326,19 @@ class TestingConfig(Config):
 
     TESTING = True
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+    SQLALCHEMY_ENGINE_OPTIONS = {}
 
     # Disable CSRF in testing to simplify test requests
     WTF_CSRF_ENABLED = False
 
+    DB_TIMING_HEADERS = True
+    # Log synchronously so output lands in the current test's captured stream
+    LOG_QUEUE_ENABLED = False
+    # Preview jobs would need Redis; tests call the generator directly
+    ATTACHMENT_PREVIEWS_ENABLED = False
+    # Run jobs inline rather than on the local runner's threads
+    JOB_FALLBACK = "sync"
+
     # Rate limiting for tests (use memory storage, not Redis)
     RATELIMIT_STORAGE_URI = "memory://"
     # Stricter limits for testing (easy to trigger)
@@ -165,5 +346,5 @@ class TestingConfig(Config):
     RATELIMIT_API_LIMIT = "5 per minute"
 
     # Use temp directory for file uploads in tests
-    import tempfile
     UPLOAD_FOLDER = tempfile.mkdtemp()
+    PROFILE_DIR = tempfile.mkdtemp()
@@ -5,20 +5,26 @@ Provides scheduled and background job processing for:
 - SMS notifications (async, with retries)
 - Daily unsubmitted timesheet reminders
 - Weekly submission reminders
+- Admin submission digests
+- Notification delivery retries
+- Teams bot activity processing
 - Export generation
+- Attachment thumbnails and PDF previews
 
 Configuration:
     REDIS_URL: Redis connection URL (for RQ)
     JOB_QUEUE_NAME: Queue name (default: "timesheet")
+    JOB_FALLBACK: "local" (database-backed local runner, see
+        app/jobs/local.py) or "sync" when RQ/Redis is unavailable
     
 Usage:
     # Enqueue a notification job
     from app.jobs.tasks import send_notification_async
     send_notification_async.delay(user_id, "approved", timesheet_id)
     
-    # Schedule daily reminders (in scheduler)
-    from app.jobs.scheduler import schedule_daily_reminders
-    schedule_daily_reminders()
+    # Run recurring jobs (any number of replicas; one leads, see
+    # app/jobs/scheduler.py)
+    flask jobs scheduler
 """
 
 import logging
@@ -52,6 +58,58 @@ def get_queue():
         return None
 
 
+# After RQ fails to enqueue (e.g. Redis is down), skip it until this time
+# rather than wait on the connection in every request
+_RQ_STATE = {"down_until": 0.0}
+
+
+def _available_queue():
+    """get_queue(), or None while RQ is being skipped after a failure."""
+    import time
+
+    if time.monotonic() < _RQ_STATE["down_until"]:
+        return None
+    return get_queue()
+
+
+def _rq_failed(action: str, exc: Exception):
+    """Skip RQ for JOB_REDIS_RETRY_SECONDS after a Redis call fails."""
+    import time
+
+    retry_in = current_app.config.get("JOB_REDIS_RETRY_SECONDS", 30)
+    _RQ_STATE["down_until"] = time.monotonic() + retry_in
+    logger.error(f"Failed to {action} (skipping RQ for {retry_in}s): {exc}")
+
+
+def enqueue_job(func, *args, **kwargs):
+    """
+    Enqueue a job on RQ, or on the fallback when RQ/Redis is unavailable.
+
+    Takes the same arguments as rq.Queue.enqueue(); an int `retry` is the
+    number of retries. With JOB_FALLBACK=local the job goes to the local
+    job runner (app/jobs/local.py); with "sync" nothing is enqueued and the
+    caller runs the job itself.
+
+    Returns:
+        str: Job ID, or None if the caller should run the job synchronously
+    """
+    queue = _available_queue()
+    if queue:
+        options = dict(kwargs)
+        try:
+            if isinstance(options.get("retry"), int):
+                from rq import Retry
+                options["retry"] = Retry(max=options["retry"])
+            return queue.enqueue(func, *args, **options).id
+        except Exception as exc:
+            _rq_failed(f"enqueue {func.__name__}", exc)
+
+    if current_app.config.get("JOB_FALLBACK", "local") == "local":
+        from .local import get_local_queue
+        return get_local_queue().enqueue(func, *args, **kwargs).id
+    return None
+
+
 def with_app_context(f):
     """Decorator to ensure function runs with Flask app context."""
     @wraps(f)
@@ -106,31 +164,51 @@ def enqueue_notification(notification_type: str, timesheet_id: str, reason: str
     """
     Enqueue a notification job.
     
-    If RQ is not available, sends synchronously.
+    If no queue is available (JOB_FALLBACK=sync), sends synchronously.
     """
-    queue = get_queue()
-    
-    if queue:
-        job = queue.enqueue(
-            send_notification_job,
-            notification_type,
-            str(timesheet_id),
-            reason,
-            retry=3,
-            job_timeout=60,
-        )
-        logger.info(f"Enqueued notification job: {job.id}")
-        return job.id
-    else:
-        # Fallback to synchronous execution
-        logger.info("Running notification synchronously (RQ not available)")
-        return send_notification_job(notification_type, str(timesheet_id), reason)
+    job_id = enqueue_job(
+        send_notification_job,
+        notification_type,
+        str(timesheet_id),
+        reason,
+        retry=3,
+        job_timeout=60,
+    )
+    if job_id:
+        logger.info(f"Enqueued notification job: {job_id}")
+        return job_id
+
+    # Fallback to synchronous execution
+    logger.info("Running notification synchronously (RQ not available)")
+    return send_notification_job(notification_type, str(timesheet_id), reason)
 
 
 # ============================================================================
 # SharePoint Sync Jobs (REQ-010)
 # ============================================================================
 
+def _record_sharepoint_failure(attachment, exc):
+    from app.models import Attachment
+
+    attachment.sharepoint_sync_status = Attachment.SharePointSyncStatus.FAILED
+    attachment.sharepoint_last_error = str(exc)
+    attachment.sharepoint_retry_count = (attachment.sharepoint_retry_count or 0) + 1
+    attachment.sharepoint_last_attempt_at = datetime.utcnow()
+
+
+def _record_sharepoint_success(attachment, result: dict):
+    from app.models import Attachment
+
+    attachment.sharepoint_item_id = result.get("item_id")
+    attachment.sharepoint_site_id = result.get("site_id")
+    attachment.sharepoint_drive_id = result.get("drive_id")
+    attachment.sharepoint_web_url = result.get("web_url")
+    attachment.sharepoint_sync_status = Attachment.SharePointSyncStatus.SYNCED
+    attachment.sharepoint_synced_at = datetime.utcnow()
+    attachment.sharepoint_last_attempt_at = datetime.utcnow()
+    attachment.sharepoint_last_error = None
+
+
 @with_app_context
 def sync_attachment_sharepoint_job(attachment_id: str):
     """
@@ -150,10 +228,7 @@ def sync_attachment_sharepoint_job(attachment_id: str):
         return {"success": False, "error": "Attachment not found"}
 
     if not is_sharepoint_configured():
-        attachment.sharepoint_sync_status = Attachment.SharePointSyncStatus.FAILED
-        attachment.sharepoint_last_error = "SharePoint sync is not configured"
-        attachment.sharepoint_retry_count = (attachment.sharepoint_retry_count or 0) + 1
-        attachment.sharepoint_last_attempt_at = datetime.utcnow()
+        _record_sharepoint_failure(attachment, "SharePoint sync is not configured")
         db.session.commit()
         return {"success": False, "error": "SharePoint not configured"}
 
@@ -162,53 +237,48 @@ def sync_attachment_sharepoint_job(attachment_id: str):
     db.session.commit()
 
     try:
-        result = upload_attachment_to_sharepoint(attachment)
+        # Commit upload-session progress so a retry resumes mid-file
+        result = upload_attachment_to_sharepoint(attachment, checkpoint=db.session.commit)
     except SharePointSyncError as exc:
-        attachment.sharepoint_sync_status = Attachment.SharePointSyncStatus.FAILED
-        attachment.sharepoint_last_error = str(exc)
-        attachment.sharepoint_retry_count = (attachment.sharepoint_retry_count or 0) + 1
-        attachment.sharepoint_last_attempt_at = datetime.utcnow()
+        _record_sharepoint_failure(attachment, exc)
         db.session.commit()
         logger.error(f"SharePoint sync failed for attachment {attachment_id}: {exc}")
         raise
     except Exception as exc:
-        attachment.sharepoint_sync_status = Attachment.SharePointSyncStatus.FAILED
-        attachment.sharepoint_last_error = str(exc)
-        attachment.sharepoint_retry_count = (attachment.sharepoint_retry_count or 0) + 1
-        attachment.sharepoint_last_attempt_at = datetime.utcnow()
+        _record_sharepoint_failure(attachment, exc)
         db.session.commit()
         logger.error(f"SharePoint sync error for attachment {attachment_id}: {exc}")
         raise
 
-    attachment.sharepoint_item_id = result.get("item_id")
-    attachment.sharepoint_site_id = result.get("site_id")
-    attachment.sharepoint_drive_id = result.get("drive_id")
-    attachment.sharepoint_web_url = result.get("web_url")
-    attachment.sharepoint_sync_status = Attachment.SharePointSyncStatus.SYNCED
-    attachment.sharepoint_synced_at = datetime.utcnow()
-    attachment.sharepoint_last_attempt_at = datetime.utcnow()
-    attachment.sharepoint_last_error = None
+    _record_sharepoint_success(attachment, result)
     db.session.commit()
 
-    logger.info(f"SharePoint sync completed for attachment {attachment_id}")
-    return {"success": True, "item_id": result.get("item_id")}
+    if result.get("deduplicated"):
+        logger.info(f"SharePoint sync linked attachment {attachment_id} to identical item")
+    else:
+        logger.info(f"SharePoint sync completed for attachment {attachment_id}")
+    return {
+        "success": True,
+        "item_id": result.get("item_id"),
+        "deduplicated": bool(result.get("deduplicated")),
+    }
 
 
 def enqueue_sharepoint_sync(attachment_id: str):
     """
     Enqueue SharePoint sync job for an attachment.
-    """
-    queue = get_queue()
 
-    if queue:
-        job = queue.enqueue(
-            sync_attachment_sharepoint_job,
-            str(attachment_id),
-            retry=3,
-            job_timeout=300,
-        )
-        logger.info(f"Enqueued SharePoint sync job: {job.id}")
-        return job.id
+    If no queue is available (JOB_FALLBACK=sync), syncs synchronously.
+    """
+    job_id = enqueue_job(
+        sync_attachment_sharepoint_job,
+        str(attachment_id),
+        retry=3,
+        job_timeout=300,
+    )
+    if job_id:
+        logger.info(f"Enqueued SharePoint sync job: {job_id}")
+        return job_id
 
     logger.info("Running SharePoint sync synchronously (RQ not available)")
     try:
@@ -223,10 +293,67 @@ def _next_sharepoint_retry_delay(retry_count: int) -> int:
     return min(3600, 60 * (2 ** retry_count))
 
 
+def sync_sharepoint_batch(attachments, concurrency: int = None) -> dict:
+    """
+    Upload attachments to SharePoint concurrently and record the outcomes.
+
+    Each result is committed as it completes, so a crash mid-batch keeps
+    the work already done.
+
+    Args:
+        attachments: Attachments to sync
+        concurrency: Worker threads (default: SP_SYNC_CONCURRENCY)
+
+    Returns:
+        dict: Counts plus throughput (files_per_second, bytes_per_second)
+    """
+    import time
+    from app.extensions import db
+    from app.models import Attachment
+    from app.utils.sharepoint import sync_attachments_batch
+
+    for attachment in attachments:
+        attachment.sharepoint_sync_status = Attachment.SharePointSyncStatus.PENDING
+        attachment.sharepoint_last_attempt_at = datetime.utcnow()
+    db.session.commit()
+
+    started = time.monotonic()
+    synced = deduplicated = failed = bytes_uploaded = 0
+
+    for attachment, result, error in sync_attachments_batch(attachments, concurrency):
+        if error is not None:
+            _record_sharepoint_failure(attachment, error)
+            failed += 1
+            logger.error(f"SharePoint sync failed for attachment {attachment.id}: {error}")
+        else:
+            _record_sharepoint_success(attachment, result)
+            synced += 1
+            if result.get("deduplicated"):
+                deduplicated += 1
+            else:
+                bytes_uploaded += attachment.file_size or 0
+        db.session.commit()
+
+    elapsed = max(time.monotonic() - started, 1e-6)
+    uploaded = synced - deduplicated
+    return {
+        "synced": synced,
+        "deduplicated": deduplicated,
+        "failed": failed,
+        "bytes_uploaded": bytes_uploaded,
+        "elapsed_seconds": round(elapsed, 3),
+        "files_per_second": round(uploaded / elapsed, 2),
+        "bytes_per_second": round(bytes_uploaded / elapsed),
+    }
+
+
 @with_app_context
-def sync_pending_sharepoint_attachments_job(limit: int = 100):
+def sync_pending_sharepoint_attachments_job(limit: int = 100, batch: bool = None):
     """
-    Scan for pending/failed SharePoint syncs and enqueue retries.
+    Scan for pending/failed SharePoint syncs and retry the ones that are due.
+
+    With SP_BATCH_SYNC_ENABLED (or batch=True) the due attachments are
+    uploaded here, concurrently; otherwise each is enqueued as its own job.
     """
     from app.models import Attachment
     from flask import current_app
@@ -248,7 +375,7 @@ def sync_pending_sharepoint_attachments_job(limit: int = 100):
         .all()
     )
 
-    queued = 0
+    due = []
     skipped = 0
     for attachment in attachments:
         delay_seconds = _next_sharepoint_retry_delay(attachment.sharepoint_retry_count)
@@ -256,32 +383,443 @@ def sync_pending_sharepoint_attachments_job(limit: int = 100):
         if last_attempt and (now - last_attempt).total_seconds() < delay_seconds:
             skipped += 1
             continue
-        enqueue_sharepoint_sync(attachment.id)
-        queued += 1
+        due.append(attachment)
+
+    if batch is None:
+        batch = current_app.config.get("SP_BATCH_SYNC_ENABLED", True)
 
     result = {
         "checked": len(attachments),
-        "queued": queued,
         "skipped": skipped,
     }
+    if batch:
+        result.update(sync_sharepoint_batch(due) if due else {"synced": 0, "failed": 0})
+    else:
+        for attachment in due:
+            enqueue_sharepoint_sync(attachment.id)
+        result["queued"] = len(due)
     logger.info(f"SharePoint sync scan complete: {result}")
     return result
 
 
+# ============================================================================
+# Attachment Preview Jobs
+# ============================================================================
+
+@with_app_context
+def generate_attachment_preview_job(attachment_id: str):
+    """
+    Background job to render an attachment's thumbnail or PDF preview.
+    """
+    from app.models import Attachment
+    from app.extensions import db
+    from app.utils.previews import create_attachment_preview
+
+    attachment = Attachment.query.get(attachment_id)
+    if not attachment:
+        logger.error(f"Attachment {attachment_id} not found for preview")
+        return {"success": False, "error": "Attachment not found"}
+
+    result = create_attachment_preview(attachment)
+    db.session.commit()
+    return result
+
+
+def enqueue_attachment_preview(attachment_id: str):
+    """
+    Enqueue preview generation for an attachment.
+
+    Previews are an optimization: if no queue is available the upload
+    proceeds without one rather than rendering inside the request.
+    """
+    try:
+        job_id = enqueue_job(generate_attachment_preview_job, str(attachment_id), job_timeout=120)
+    except Exception as exc:
+        logger.error(f"Failed to enqueue attachment preview: {exc}")
+        return None
+
+    if not job_id:
+        logger.info("Skipping attachment preview (RQ not available)")
+        return None
+
+    logger.info(f"Enqueued attachment preview job: {job_id}")
+    return job_id
+
+
+# ============================================================================
+# Attachment Archive Jobs
+# ============================================================================
+
+ARCHIVE_KEY_PREFIX = "archives/"
+
+
+@with_app_context
+def build_attachment_archive_job(entries: list):
+    """
+    Background job to build a ZIP of attachments and store it for download.
+
+    Progress is published in job.meta["files_done"]. The stored archive is
+    removed after ATTACHMENT_ARCHIVE_TTL seconds.
+    """
+    import uuid
+    from app.utils.archive import write_attachment_archive
+
+    try:
+        from rq import get_current_job
+        job = get_current_job()
+    except ImportError:
+        job = None
+
+    job_id = job.id if job else uuid.uuid4().hex
+
+    def report_progress(files_done):
+        if job and (files_done % 25 == 0 or files_done == len(entries)):
+            job.meta["files_done"] = files_done
+            job.save_meta()
+
+    result = write_attachment_archive(
+        entries, f"{ARCHIVE_KEY_PREFIX}{job_id}.zip", progress=report_progress
+    )
+
+    ttl = current_app.config.get("ATTACHMENT_ARCHIVE_TTL", 86400)
+    queue = get_queue()
+    if queue:
+        try:
+            queue.enqueue_in(timedelta(seconds=ttl), delete_stored_file_job, result["key"])
+        except Exception as exc:
+            logger.error(f"Failed to schedule archive cleanup for {result['key']}: {exc}")
+
+    logger.info(f"Built attachment archive {result['key']}: {result['files']} files, {result['size']} bytes")
+    return result
+
+
+@with_app_context
+def delete_stored_file_job(key: str):
+    """Delete an object from the storage backend (e.g. an expired archive)."""
+    from app.utils.storage import get_storage_backend
+
+    return {"deleted": get_storage_backend().delete(key)}
+
+
+def enqueue_attachment_archive(entries: list, requested_by: str):
+    """
+    Enqueue an attachment archive build.
+
+    Progress is reported through RQ job meta, so there is no local
+    fallback: without RQ the caller streams the archive itself.
+
+    Returns:
+        str: Job ID, or None if no queue is available
+    """
+    queue = _available_queue()
+    if not queue:
+        return None
+
+    ttl = current_app.config.get("ATTACHMENT_ARCHIVE_TTL", 86400)
+    try:
+        job = queue.enqueue(
+            build_attachment_archive_job,
+            entries,
+            job_timeout=3600,
+            result_ttl=ttl,
+            meta={"requested_by": requested_by, "files_total": len(entries), "files_done": 0},
+        )
+    except Exception as exc:
+        _rq_failed("enqueue attachment archive", exc)
+        return None
+    logger.info(f"Enqueued attachment archive job: {job.id} ({len(entries)} files)")
+    return job.id
+
+
+def fetch_job(job_id: str):
+    """
+    Look up an RQ job by ID.
+
+    Returns:
+        rq.job.Job: The job, or None if it doesn't exist or RQ is unavailable
+    """
+    queue = _available_queue()
+    if not queue:
+        return None
+
+    from rq.exceptions import NoSuchJobError
+    from rq.job import Job
+
+    try:
+        return Job.fetch(job_id, connection=queue.connection)
+    except NoSuchJobError:
+        return None
+    except Exception as exc:
+        _rq_failed(f"fetch job {job_id}", exc)
+        return None
+
+
+# ============================================================================
+# Teams Bot Jobs (REQ-012)
+# ============================================================================
+
+@with_app_context
+def process_bot_activity_job(record_id: str):
+    """Background job to act on an activity stored by the bot webhook."""
+    from app.bot.routes import process_bot_activity
+
+    return process_bot_activity(record_id)
+
+
+def enqueue_bot_activity(record_id: str):
+    """
+    Enqueue processing of a stored bot activity.
+
+    Not retried: actions run at most once. If no queue is available
+    (JOB_FALLBACK=sync), processes synchronously.
+    """
+    try:
+        job_id = enqueue_job(process_bot_activity_job, str(record_id), job_timeout=120)
+    except Exception as exc:
+        logger.error(f"Failed to enqueue bot activity {record_id}: {exc}")
+        job_id = None
+
+    if job_id:
+        return job_id
+
+    from app.bot.routes import process_bot_activity
+    try:
+        return process_bot_activity(str(record_id))
+    except Exception as exc:
+        logger.error(f"Bot activity {record_id} failed: {exc}")
+        return None
+
+
+@with_app_context
+def requeue_bot_activities_job():
+    """
+    Re-enqueue bot activities that were never processed, and fail those
+    whose worker stopped mid-action.
+    """
+    from app.bot.routes import find_stalled_bot_activities
+
+    record_ids = find_stalled_bot_activities()
+    for record_id in record_ids:
+        enqueue_bot_activity(record_id)
+    if record_ids:
+        logger.warning(f"Re-enqueued {len(record_ids)} unprocessed bot activities")
+    return {"requeued": len(record_ids)}
+
+
+@with_app_context
+def prune_bot_activities_job():
+    """Daily job to delete old stored bot activities."""
+    from app.bot.routes import prune_bot_activities
+
+    deleted = prune_bot_activities()
+    logger.info(f"Pruned {deleted} bot activities")
+    return {"deleted": deleted}
+
+
 # ============================================================================
 # Scheduled Reminder Jobs
 # ============================================================================
 
+def reminder_shard(user_id: str, shards: int) -> int:
+    """Stable shard number for a user (by hash of the id)."""
+    import hashlib
+
+    digest = hashlib.sha1(str(user_id).encode()).digest()
+    return int.from_bytes(digest[:4], "big") % max(shards, 1)
+
+
+def _split_into_shards(user_ids, shards: int) -> list:
+    buckets = [[] for _ in range(max(shards, 1))]
+    for user_id in user_ids:
+        buckets[reminder_shard(user_id, shards)].append(user_id)
+    return [bucket for bucket in buckets if bucket]
+
+
+def _process_reminder_shard(kind: str, week_start: date, user_ids: list) -> dict:
+    """
+    Send one shard's reminders.
+
+    Deliveries are idempotent (see services/deliveries.py), so a shard that
+    is retried or rerun does not remind anyone twice.
+    """
+    from app.models import User, Timesheet, TimesheetStatus
+    from app.services.notification import NotificationService
+
+    users = User.query.filter(User.id.in_(user_ids)).all()
+
+    if kind == "daily":
+        # Skip users whose timesheet for the week is already in
+        done = {
+            user_id
+            for user_id, in Timesheet.query.filter(
+                Timesheet.user_id.in_(user_ids),
+                Timesheet.week_start == week_start,
+                Timesheet.status.in_([TimesheetStatus.SUBMITTED, TimesheetStatus.APPROVED]),
+            ).with_entities(Timesheet.user_id)
+        }
+        users = [user for user in users if user.id not in done]
+        send = NotificationService.notify_unsubmitted
+    else:
+        send = NotificationService.send_weekly_reminder
+
+    reminders_sent = 0
+    errors = 0
+    for user in users:
+        try:
+            send(user, week_start)
+            reminders_sent += 1
+        except Exception as e:
+            logger.error(f"Failed to send {kind} reminder to {user.email}: {e}")
+            errors += 1
+
+    return {"users_checked": len(user_ids), "reminders_sent": reminders_sent, "errors": errors}
+
+
+@with_app_context
+def send_reminder_shard_job(kind: str, week_start: str, user_ids: list):
+    """Background job to send reminders to one shard of users."""
+    return _process_reminder_shard(kind, date.fromisoformat(week_start), user_ids)
+
+
+def _merge_shard_results(results) -> dict:
+    totals = {"users_checked": 0, "reminders_sent": 0, "errors": 0, "failed_shards": 0}
+    for result in results:
+        if result is None:
+            totals["failed_shards"] += 1
+            continue
+        for key in ("users_checked", "reminders_sent", "errors"):
+            totals[key] += result.get(key, 0)
+    return totals
+
+
+@with_app_context
+def collect_reminder_shards_job(kind: str, summary: dict, shard_job_ids: list, schedule: str = None):
+    """
+    Parent-side job that runs after every shard and totals their results.
+
+    Shards that failed (or whose result expired) count as failed_shards.
+    When the reminders were started by the scheduler, `schedule` names
+    the ScheduledJob whose run this finishes.
+    """
+    from rq.job import Job
+    from app.models import ScheduledJobStatus
+    from .scheduler import finish_scheduled_run
+
+    try:
+        queue = get_queue()
+        jobs = Job.fetch_many(shard_job_ids, connection=queue.connection) if queue else []
+        results = []
+        for job in jobs:
+            if job is None or not job.is_finished:
+                results.append(None)
+            else:
+                # return_value() replaced .result in RQ 1.12
+                results.append(job.return_value() if hasattr(job, "return_value") else job.result)
+        result = {**summary, "shards": len(shard_job_ids), **_merge_shard_results(results)}
+    except Exception as e:
+        if schedule:
+            finish_scheduled_run(schedule, ScheduledJobStatus.FAILED, str(e))
+        raise
+
+    logger.info(f"{kind.capitalize()} reminders complete: {result}")
+    if schedule:
+        if result["failed_shards"]:
+            finish_scheduled_run(
+                schedule,
+                ScheduledJobStatus.FAILED,
+                f"{result['failed_shards']} of {len(shard_job_ids)} shards failed",
+            )
+        else:
+            finish_scheduled_run(schedule, ScheduledJobStatus.SUCCEEDED)
+    return result
+
+
+def _dispatch_reminder_shards(
+    kind: str, week_start: date, user_ids: list, summary: dict, schedule: str = None
+) -> dict:
+    """
+    Split users into REMINDER_SHARDS shards by id hash and run one job each.
+
+    With RQ the shards are enqueued, followed by a collector job that
+    depends on all of them; the returned dict has their job IDs, and the
+    collector finishes the `schedule` run (if any) once the shards are
+    done. Without RQ (or if enqueueing fails) the shards run here in
+    turn and the totals are returned.
+    """
+    shards = _split_into_shards(user_ids, current_app.config.get("REMINDER_SHARDS", 8))
+    queue = _available_queue()
+
+    if queue:
+        try:
+            return _enqueue_reminder_shards(queue, kind, week_start, shards, summary, schedule)
+        except Exception as exc:
+            # Shards already enqueued may run as well; deliveries are idempotent
+            _rq_failed(f"enqueue {kind} reminder shards", exc)
+
+    results = [_process_reminder_shard(kind, week_start, shard) for shard in shards]
+    result = {**summary, "shards": len(shards), **_merge_shard_results(results)}
+    logger.info(f"{kind.capitalize()} reminders complete: {result}")
+    return result
+
+
+def _enqueue_reminder_shards(queue, kind, week_start, shards, summary, schedule):
+    from rq import Retry
+
+    timeout = current_app.config.get("REMINDER_SHARD_TIMEOUT", 600)
+    shard_jobs = [
+        queue.enqueue(
+            send_reminder_shard_job,
+            kind,
+            week_start.isoformat(),
+            shard,
+            job_timeout=timeout,
+            retry=Retry(max=2, interval=[30, 120]),
+        )
+        for shard in shards
+    ]
+
+    try:
+        from rq import Dependency
+        depends_on = Dependency(jobs=shard_jobs, allow_failure=True)
+    except ImportError:
+        depends_on = shard_jobs
+
+    shard_job_ids = [job.id for job in shard_jobs]
+    users = sum(len(shard) for shard in shards)
+    collector = queue.enqueue(
+        collect_reminder_shards_job,
+        kind,
+        summary,
+        shard_job_ids,
+        schedule,
+        depends_on=depends_on,
+    )
+    logger.info(
+        f"Enqueued {len(shard_jobs)} {kind} reminder shards for {users} users "
+        f"(collector {collector.id})"
+    )
+    return {
+        **summary,
+        "users": users,
+        "shards": len(shard_jobs),
+        "shard_job_ids": shard_job_ids,
+        "collector_job_id": collector.id,
+    }
+
+
 @with_app_context
-def send_daily_reminders_job():
+def send_daily_reminders_job(schedule: str = None):
     """
     Daily job to remind users with unsubmitted timesheets.
     
     Runs Mon-Fri. Sends reminders for the previous week if not submitted.
+    Users are sharded across REMINDER_SHARDS jobs.
+
+    Args:
+        schedule: ScheduledJob name, when run by the scheduler
     """
-    from app.models import User, Timesheet, TimesheetStatus
-    from app.services.notification import NotificationService
-    
+    from app.models import User
+
     # Only run on weekdays
     today = date.today()
     if today.weekday() >= 5:  # Saturday or Sunday
@@ -294,131 +832,125 @@ def send_daily_reminders_job():
     previous_week_start = current_week_start - timedelta(days=7)
     
     logger.info(f"Checking for unsubmitted timesheets for week of {previous_week_start}")
-    
-    # Find users without submitted timesheets for last week
-    reminders_sent = 0
-    errors = 0
-    
-    users = User.query.filter(User.phone.isnot(None)).all()
-    
-    for user in users:
-        # Check if they have a submitted/approved timesheet for last week
-        timesheet = Timesheet.query.filter(
-            Timesheet.user_id == user.id,
-            Timesheet.week_start == previous_week_start,
-            Timesheet.status.in_([
-                TimesheetStatus.SUBMITTED,
-                TimesheetStatus.APPROVED,
-            ])
-        ).first()
-        
-        if not timesheet:
-            try:
-                NotificationService.notify_unsubmitted(user, previous_week_start)
-                reminders_sent += 1
-            except Exception as e:
-                logger.error(f"Failed to send reminder to {user.email}: {e}")
-                errors += 1
-    
-    result = {
-        "date": str(today),
-        "week_checked": str(previous_week_start),
-        "users_checked": len(users),
-        "reminders_sent": reminders_sent,
-        "errors": errors,
-    }
-    
-    logger.info(f"Daily reminders complete: {result}")
-    return result
+
+    user_ids = [user_id for user_id, in User.query.filter(User.phone.isnot(None)).with_entities(User.id)]
+    summary = {"date": str(today), "week_checked": str(previous_week_start)}
+    return _dispatch_reminder_shards("daily", previous_week_start, user_ids, summary, schedule)
 
 
 @with_app_context
-def send_weekly_reminders_job():
+def send_weekly_reminders_job(schedule: str = None):
     """
     Weekly job to remind all users to submit their timesheets.
     
-    Typically runs on Friday afternoon or Monday morning.
+    Typically runs on Friday afternoon or Monday morning. Users are sharded
+    across REMINDER_SHARDS jobs.
+
+    Args:
+        schedule: ScheduledJob name, when run by the scheduler
     """
     from app.models import User
-    from app.services.notification import NotificationService
-    
+
     today = date.today()
     days_since_monday = today.weekday()
     current_week_start = today - timedelta(days=days_since_monday)
     
     logger.info(f"Sending weekly reminders for week of {current_week_start}")
-    
-    reminders_sent = 0
-    errors = 0
-    
-    users = User.query.filter(User.phone.isnot(None)).all()
-    
-    for user in users:
-        try:
-            NotificationService.send_weekly_reminder(user, current_week_start)
-            reminders_sent += 1
-        except Exception as e:
-            logger.error(f"Failed to send weekly reminder to {user.email}: {e}")
-            errors += 1
-    
-    result = {
-        "date": str(today),
-        "week": str(current_week_start),
-        "reminders_sent": reminders_sent,
-        "errors": errors,
-    }
-    
-    logger.info(f"Weekly reminders complete: {result}")
+
+    user_ids = [user_id for user_id, in User.query.filter(User.phone.isnot(None)).with_entities(User.id)]
+    summary = {"date": str(today), "week": str(current_week_start)}
+    return _dispatch_reminder_shards("weekly", current_week_start, user_ids, summary, schedule)
+
+
+# ============================================================================
+# Notification Delivery Retries
+# ============================================================================
+
+@with_app_context
+def retry_notification_deliveries_job(limit: int = None):
+    """
+    Retry failed reminder deliveries whose backoff has elapsed.
+
+    Safe to run on several workers at once: each claims its own batch.
+    """
+    from app.services.deliveries import retry_due_deliveries
+
+    result = retry_due_deliveries(limit)
+    if result["claimed"]:
+        logger.info(f"Delivery retries complete: {result}")
     return result
 
 
+# ============================================================================
+# Admin Digest Jobs
+# ============================================================================
+
+@with_app_context
+def flush_admin_digests_job(admin_ids: list = None):
+    """
+    Send queued admin submission digests.
+
+    Runs every ADMIN_DIGEST_INTERVAL_MINUTES for all admins, and for a
+    single admin as soon as their queue reaches ADMIN_DIGEST_MAX_ITEMS.
+    """
+    from app.services.notification import NotificationService
+
+    return NotificationService.flush_admin_digests(admin_ids)
+
+
+def enqueue_admin_digest_flush(admin_ids: list):
+    """
+    Enqueue a digest flush for admins whose queue is full.
+
+    If no queue is available (JOB_FALLBACK=sync), flushes synchronously.
+    """
+    try:
+        job_id = enqueue_job(flush_admin_digests_job, list(admin_ids), job_timeout=300)
+    except Exception as exc:
+        logger.error(f"Failed to enqueue admin digest flush: {exc}")
+        job_id = None
+
+    if job_id:
+        logger.info(f"Enqueued admin digest flush job: {job_id}")
+        return job_id
+
+    from app.services.notification import NotificationService
+    logger.info("Flushing admin digests synchronously (RQ not available)")
+    return NotificationService.flush_admin_digests(admin_ids)
+
+
 # ============================================================================
 # Scheduler Integration
 # ============================================================================
 
 def setup_scheduler(app):
     """
-    Set up scheduled jobs using APScheduler or RQ-Scheduler.
-    
-    Call this during app initialization.
+    Reconcile the rq-scheduler entries with the declared schedule.
+
+    Does nothing while another process holds the scheduler lease (the
+    leader reconciles on its own). The schedule itself is declared in
+    app/jobs/scheduler.py; run `flask jobs scheduler` to enqueue due jobs.
+
+    Returns:
+        The rq_scheduler.Scheduler, or None if not reconciled
     """
     try:
-        from rq_scheduler import Scheduler
-        from redis import Redis
-        
-        redis_url = app.config.get("REDIS_URL", "redis://localhost:6379/0")
-        redis_conn = Redis.from_url(redis_url)
-        scheduler = Scheduler(connection=redis_conn)
-        
-        # Clear existing scheduled jobs
-        for job in scheduler.get_jobs():
-            if job.meta.get("origin") == "timesheet":
-                scheduler.cancel(job)
-        
-        # Schedule daily reminders at 9 AM
-        scheduler.cron(
-            "0 9 * * 1-5",  # 9 AM Mon-Fri
-            func=send_daily_reminders_job,
-            meta={"origin": "timesheet"},
-        )
-        
-        # Schedule weekly reminders on Friday at 2 PM
-        scheduler.cron(
-            "0 14 * * 5",  # 2 PM Friday
-            func=send_weekly_reminders_job,
-            meta={"origin": "timesheet"},
-        )
+        from .scheduler import SchedulerService
+
+        service = SchedulerService(app)
+        if not service.lease.acquire():
+            logger.info(
+                f"Scheduler lease held by {service.lease.current_holder()}; not reconciling"
+            )
+            return None
+        try:
+            service.reconcile()
+        finally:
+            service.lease.release()
 
-        # Schedule SharePoint sync scan hourly at :15
-        scheduler.cron(
-            "15 * * * *",
-            func=sync_pending_sharepoint_attachments_job,
-            meta={"origin": "timesheet"},
-        )
-        
         logger.info("Scheduled jobs configured successfully")
-        return scheduler
-        
+        return service.scheduler
+
     except ImportError:
         logger.warning("rq-scheduler not installed. Scheduled jobs not available.")
         return None
@@ -454,11 +986,25 @@ def register_job_commands(app):
 
     @jobs.command()
     @click.option("--limit", default=100, help="Max attachments to scan")
-    def sharepoint_sync(limit):
-        """Scan and enqueue SharePoint sync retries."""
-        result = sync_pending_sharepoint_attachments_job(limit=limit)
+    @click.option("--batch/--enqueue", default=None, help="Upload concurrently here, or enqueue one job per file")
+    def sharepoint_sync(limit, batch):
+        """Scan and retry pending SharePoint syncs."""
+        result = sync_pending_sharepoint_attachments_job(limit=limit, batch=batch)
         click.echo(f"Result: {result}")
     
+    @jobs.command()
+    @click.option("--limit", default=None, type=int, help="Max deliveries to retry")
+    def retry_deliveries(limit):
+        """Retry failed notification deliveries that are due."""
+        result = retry_notification_deliveries_job(limit)
+        click.echo(f"Result: {result}")
+
+    @jobs.command()
+    def admin_digest():
+        """Send queued admin submission digests now."""
+        result = flush_admin_digests_job()
+        click.echo(f"Result: {result}")
+
     @jobs.command()
     @click.argument("notification_type")
     @click.argument("timesheet_id")
@@ -468,6 +1014,44 @@ def register_job_commands(app):
         result = send_notification_job(notification_type, timesheet_id, reason)
         click.echo(f"Result: {result}")
     
+    @jobs.command()
+    @click.option("--burst", is_flag=True, help="Run the jobs that are due, then exit")
+    @click.option("--max-sleep", default=30, help="Longest wait between checks (seconds)")
+    def local_worker(burst, max_sleep):
+        """Run jobs queued for the local runner (while Redis was down)."""
+        import time
+        from .local import next_local_run_at, run_next_local_job
+
+        with app.app_context():
+            count = 0
+            while True:
+                while run_next_local_job():
+                    count += 1
+                if burst:
+                    break
+                # Sleep until the next retry or lease expiry (new jobs within max_sleep)
+                run_at = next_local_run_at()
+                wait = max_sleep
+                if run_at is not None:
+                    wait = min(max((run_at - datetime.utcnow()).total_seconds(), 0.1), max_sleep)
+                time.sleep(wait)
+        click.echo(f"Ran {count} local jobs")
+
+    @jobs.command()
+    def scheduler():
+        """Run the leader-elected job scheduler."""
+        try:
+            from .scheduler import SchedulerService
+
+            service = SchedulerService(app)
+        except ImportError:
+            click.echo("Error: rq-scheduler is required. Install with: pip install rq-scheduler")
+            raise SystemExit(1)
+
+        click.echo(f"Starting scheduler {service.lease.holder}")
+        with app.app_context():
+            service.run()
+
     @jobs.command()
     def worker():
         """Start a background job worker."""
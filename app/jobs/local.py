@@ -0,0 +1,315 @@
+"""
+Local Job Runner
+
+Fallback job queue for when Redis/RQ is unavailable (JOB_FALLBACK=local).
+Jobs are stored in the local_jobs table and run by a bounded thread pool
+in the process that enqueued them (LOCAL_JOB_WORKERS threads; green
+threads under the gevent gunicorn worker). The request only pays for one
+INSERT, and queued work survives a restart: each process drains leftover
+jobs after its first request.
+
+LocalQueue.enqueue() takes the same arguments as rq.Queue.enqueue() for
+the options used here (retry, job_timeout). A job is leased for its
+job_timeout (default LOCAL_JOB_LEASE_SECONDS); if its process dies, the
+job becomes runnable again when the lease runs out. The timeout is not
+otherwise enforced. Failed jobs are retried with backoff while retries
+remain; finished jobs are deleted. When the pool runs out of due jobs it
+sets a timer for the next retry or lease expiry, so those run without
+waiting for another enqueue.
+
+Due jobs are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so several
+processes can drain the same table.
+"""
+
+import importlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# Enqueue options understood by rq.Queue.enqueue() that are not job arguments
+RQ_OPTIONS = {
+    "retry",
+    "job_timeout",
+    "result_ttl",
+    "ttl",
+    "failure_ttl",
+    "description",
+    "meta",
+    "job_id",
+    "at_front",
+}
+
+# Seconds before retry n (1-based) of a failed job: 30, 60, 120, ... capped
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 900
+
+_STATE = {
+    "pid": None,
+    "executor": None,
+    "active": 0,
+    "pending": False,
+    "started": False,
+    "timer": None,
+    "timer_at": None,
+}
+_STATE_LOCK = threading.Lock()
+
+
+class LocalJobHandle:
+    """What LocalQueue.enqueue() returns; mirrors rq.job.Job.id."""
+
+    def __init__(self, job_id: str):
+        self.id = job_id
+
+
+def _func_path(func) -> str:
+    return f"{func.__module__}:{func.__qualname__}"
+
+
+def _resolve(path: str):
+    module_name, _, qualname = path.partition(":")
+    target = importlib.import_module(module_name)
+    for part in qualname.split("."):
+        target = getattr(target, part)
+    # Job functions build their own app under with_app_context; the runner
+    # already has one
+    return getattr(target, "__wrapped__", target)
+
+
+def _max_attempts(retry) -> int:
+    if retry is None:
+        return 1
+    if isinstance(retry, int):
+        return 1 + max(retry, 0)
+    return 1 + max(int(getattr(retry, "max", 0)), 0)
+
+
+def _retry_delay(attempts: int) -> int:
+    return min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0)))
+
+
+class LocalQueue:
+    """
+    Stand-in for rq.Queue backed by the local_jobs table.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def enqueue(self, func, *args, **kwargs):
+        """
+        Store a job and wake the local pool (commits the session).
+
+        Arguments must be JSON-serializable.
+
+        Returns:
+            LocalJobHandle: Handle with the job's id
+        """
+        from app.extensions import db
+        from app.models import LocalJob, LocalJobStatus
+
+        options = {key: kwargs.pop(key) for key in list(kwargs) if key in RQ_OPTIONS}
+        job = LocalJob(
+            func=_func_path(func),
+            args=list(args),
+            kwargs=kwargs,
+            status=LocalJobStatus.QUEUED,
+            attempts=0,
+            max_attempts=_max_attempts(options.get("retry")),
+            timeout=options.get("job_timeout"),
+            run_at=datetime.utcnow(),
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        wake(self.app)
+        return LocalJobHandle(job.id)
+
+
+def get_local_queue():
+    """Local queue for the current app."""
+    return LocalQueue(current_app._get_current_object())
+
+
+# ============================================================================
+# Runner
+# ============================================================================
+
+def _executor(app):
+    # Forked workers must not share the parent's pool (its threads don't survive)
+    pid = os.getpid()
+    if _STATE["pid"] != pid:
+        _STATE["pid"] = pid
+        _STATE["executor"] = ThreadPoolExecutor(
+            max_workers=max(app.config.get("LOCAL_JOB_WORKERS", 2), 1),
+            thread_name_prefix="local-jobs",
+        )
+        _STATE["active"] = 0
+        _STATE["pending"] = False
+        _STATE["started"] = False
+        _STATE["timer"] = None
+        _STATE["timer_at"] = None
+    return _STATE["executor"]
+
+
+def wake(app):
+    """Make sure a pool thread will look for runnable jobs."""
+    with _STATE_LOCK:
+        executor = _executor(app)
+        _STATE["pending"] = True
+        if _STATE["active"] >= max(app.config.get("LOCAL_JOB_WORKERS", 2), 1):
+            # A busy thread sees the pending flag before it exits
+            return False
+        _STATE["active"] += 1
+    executor.submit(_drain, app)
+    return True
+
+
+def _timer_fired(app):
+    with _STATE_LOCK:
+        _STATE["timer"] = None
+        _STATE["timer_at"] = None
+    wake(app)
+
+
+def _schedule_wake(app, run_at):
+    """Wake the pool at run_at, unless an earlier wake is set (hold _STATE_LOCK)."""
+    if run_at is None:
+        return
+    if _STATE["timer"] is not None:
+        if _STATE["timer_at"] <= run_at:
+            return
+        _STATE["timer"].cancel()
+
+    delay = max((run_at - datetime.utcnow()).total_seconds(), 0) + 1
+    timer = threading.Timer(delay, _timer_fired, args=(app,))
+    timer.daemon = True
+    _STATE["timer"] = timer
+    _STATE["timer_at"] = run_at
+    timer.start()
+
+
+def _drain(app):
+    try:
+        with app.app_context():
+            while True:
+                with _STATE_LOCK:
+                    _STATE["pending"] = False
+                while run_next_local_job():
+                    pass
+                run_at = next_local_run_at()
+                with _STATE_LOCK:
+                    if not _STATE["pending"]:
+                        _STATE["active"] -= 1
+                        _schedule_wake(app, run_at)
+                        return
+    except Exception as e:
+        logger.error(f"Local job runner stopped: {e}")
+        with _STATE_LOCK:
+            _STATE["active"] -= 1
+
+
+def next_local_run_at():
+    """When the next queued job (or leased job's lease) is due, or None."""
+    from app.extensions import db
+    from app.models import LocalJob, LocalJobStatus
+
+    run_at = (
+        db.session.query(db.func.min(LocalJob.run_at))
+        .filter(LocalJob.status.in_([LocalJobStatus.QUEUED, LocalJobStatus.RUNNING]))
+        .scalar()
+    )
+    db.session.rollback()
+    return run_at
+
+
+def claim_local_job():
+    """Lease the next runnable job, or return None (commits)."""
+    from app.extensions import db
+    from app.models import LocalJob, LocalJobStatus
+
+    now = datetime.utcnow()
+    job = (
+        LocalJob.query.filter(
+            LocalJob.status.in_([LocalJobStatus.QUEUED, LocalJobStatus.RUNNING]),
+            LocalJob.run_at <= now,
+        )
+        .order_by(LocalJob.run_at)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if job is None:
+        db.session.rollback()
+        return None
+
+    lease = job.timeout or current_app.config.get("LOCAL_JOB_LEASE_SECONDS", 600)
+    job.status = LocalJobStatus.RUNNING
+    job.attempts += 1
+    job.started_at = now
+    job.run_at = now + timedelta(seconds=lease)
+    db.session.commit()
+    return job
+
+
+def run_next_local_job() -> bool:
+    """
+    Run one runnable job, if any.
+
+    Returns:
+        bool: True if a job was run (successfully or not)
+    """
+    from app.extensions import db
+    from app.models import LocalJob, LocalJobStatus
+
+    job = claim_local_job()
+    if job is None:
+        return False
+
+    job_id, path = job.id, job.func
+    try:
+        _resolve(path)(*job.args, **job.kwargs)
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(LocalJob, job_id)
+        job.last_error = str(e)
+        if job.attempts >= job.max_attempts:
+            job.status = LocalJobStatus.FAILED
+            job.run_at = None
+            logger.error(f"Local job {path} ({job_id}) failed after {job.attempts} attempts: {e}")
+        else:
+            job.status = LocalJobStatus.QUEUED
+            job.run_at = datetime.utcnow() + timedelta(seconds=_retry_delay(job.attempts))
+            logger.warning(f"Local job {path} ({job_id}) failed, retrying at {job.run_at}: {e}")
+        db.session.commit()
+        return True
+
+    db.session.rollback()
+    LocalJob.query.filter_by(id=job_id).delete()
+    db.session.commit()
+    logger.info(f"Local job {path} ({job_id}) finished")
+    return True
+
+
+def register_local_jobs(app):
+    """
+    Drain jobs left over from a previous run after each process's first
+    request, when JOB_FALLBACK is "local".
+    """
+    if app.config.get("JOB_FALLBACK", "local") != "local":
+        return
+
+    @app.before_request
+    def start_local_jobs():
+        if _STATE["started"] and _STATE["pid"] == os.getpid():
+            return
+        with _STATE_LOCK:
+            _executor(app)
+            if _STATE["started"]:
+                return
+            _STATE["started"] = True
+        wake(app)
@@ -0,0 +1,463 @@
+"""
+Job Scheduler
+
+Runs the recurring jobs (reminders, SharePoint sync, delivery retries,
+admin digests) on rq-scheduler.
+
+- The schedule is declared in scheduled_jobs(). reconcile_schedule()
+  brings rq-scheduler's entries in line with it, touching only entries
+  that are missing, changed or no longer declared. Entries have fixed job
+  IDs, so a repeated or concurrent reconcile cannot duplicate them.
+- One process leads at a time, holding a Redis lease (SchedulerLease).
+  The leader reconciles when it takes over and every
+  SCHEDULER_RECONCILE_SECONDS, and moves due jobs onto the queue. Other
+  processes stand by and take over when the lease lapses.
+- Every scheduled run goes through run_scheduled_job(), which records its
+  start, finish, duration and outcome in ScheduledJob. Sharded reminder
+  runs only enqueue their shards; the collector job records their finish
+  once every shard is done (finish_scheduled_run()).
+  GET /api/admin/scheduler shows them with each job's next run.
+
+Run the scheduler with `flask jobs scheduler` (as many replicas as you
+like; one leads).
+"""
+
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime
+from flask import current_app
+from . import with_app_context
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_ORIGIN = "timesheet"
+SCHEDULE_JOB_PREFIX = "timesheet:schedule:"
+LEADER_KEY = "timesheet:scheduler:leader"
+
+# Take the lease if it is free, or extend it if we already hold it
+_ACQUIRE_LEASE_SCRIPT = """
+local holder = redis.call("get", KEYS[1])
+if holder == ARGV[1] then
+    redis.call("pexpire", KEYS[1], ARGV[2])
+    return 1
+end
+if not holder then
+    redis.call("set", KEYS[1], ARGV[1], "px", ARGV[2])
+    return 1
+end
+return 0
+"""
+
+_RELEASE_LEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def scheduled_jobs(config) -> list:
+    """
+    The declared schedule.
+
+    Each entry has a unique "name", a "cron" string (UTC), the name of the
+    job function in app.jobs ("func"), a "description", an optional
+    "timeout" in seconds, and "deferred" for jobs that take the schedule
+    name and may hand their work to a job that finishes the run later.
+    """
+    jobs = [
+        {
+            "name": "daily-reminders",
+            "cron": "0 9 * * 1-5",
+            "func": "send_daily_reminders_job",
+            "description": "Unsubmitted timesheet reminders, 9 AM Mon-Fri",
+            "deferred": True,  # Finished by collect_reminder_shards_job
+        },
+        {
+            "name": "weekly-reminders",
+            "cron": "0 14 * * 5",
+            "func": "send_weekly_reminders_job",
+            "description": "Weekly submission reminders, 2 PM Friday",
+            "deferred": True,  # Finished by collect_reminder_shards_job
+        },
+        {
+            "name": "sharepoint-sync",
+            "cron": "15 * * * *",
+            "func": "sync_pending_sharepoint_attachments_job",
+            "description": "Retry pending SharePoint uploads, hourly at :15",
+            "timeout": 1800,  # Batch mode uploads within the job
+        },
+        {
+            "name": "delivery-retries",
+            "cron": "*/5 * * * *",
+            "func": "retry_notification_deliveries_job",
+            "description": "Retry failed reminder deliveries every 5 minutes",
+        },
+        {
+            "name": "bot-activity-requeue",
+            "cron": "*/5 * * * *",
+            "func": "requeue_bot_activities_job",
+            "description": "Re-enqueue lost bot activities, fail stalled ones, every 5 minutes",
+        },
+        {
+            "name": "bot-activity-cleanup",
+            "cron": "30 3 * * *",
+            "func": "prune_bot_activities_job",
+            "description": "Delete stored Teams bot activities, daily at 3:30",
+        },
+    ]
+
+    if config.get("ADMIN_DIGEST_ENABLED", False):
+        interval = min(max(int(config.get("ADMIN_DIGEST_INTERVAL_MINUTES", 15)), 1), 59)
+        jobs.append({
+            "name": "admin-digest",
+            "cron": f"*/{interval} * * * *",
+            "func": "flush_admin_digests_job",
+            "description": f"Admin submission digests every {interval} minutes",
+        })
+
+    return jobs
+
+
+def _definition(name: str):
+    for job in scheduled_jobs(current_app.config):
+        if job["name"] == name:
+            return job
+    return None
+
+
+def _spec(definition: dict, queue_name: str) -> str:
+    """Everything about an entry that a change should trigger a re-create for."""
+    return json.dumps(
+        {
+            "cron": definition["cron"],
+            "func": definition["func"],
+            "timeout": definition.get("timeout"),
+            "queue": queue_name,
+        },
+        sort_keys=True,
+    )
+
+
+def reconcile_schedule(scheduler, definitions, queue_name: str) -> dict:
+    """
+    Make rq-scheduler's entries match the declared schedule.
+
+    Entries that already match are left alone. Changed entries are
+    re-created; undeclared ones (including duplicates and entries from
+    older releases) are cancelled.
+
+    Args:
+        scheduler: rq_scheduler.Scheduler
+        definitions: From scheduled_jobs()
+        queue_name: Queue the jobs run on
+
+    Returns:
+        dict: Schedule names (or job IDs, for removals) by action
+    """
+    result = {"created": [], "updated": [], "unchanged": [], "removed": []}
+
+    existing = {}
+    for job in scheduler.get_jobs():
+        if job.meta.get("origin") != SCHEDULE_ORIGIN:
+            continue
+        name = job.meta.get("schedule")
+        if name is None or name in existing or job.id != f"{SCHEDULE_JOB_PREFIX}{name}":
+            scheduler.cancel(job)
+            result["removed"].append(job.id)
+        else:
+            existing[name] = job
+
+    for definition in definitions:
+        name = definition["name"]
+        spec = _spec(definition, queue_name)
+        job = existing.pop(name, None)
+        if job is not None and job.meta.get("spec") == spec:
+            result["unchanged"].append(name)
+            continue
+
+        if job is not None:
+            scheduler.cancel(job)
+        scheduler.cron(
+            definition["cron"],
+            func=run_scheduled_job,
+            args=[name],
+            id=f"{SCHEDULE_JOB_PREFIX}{name}",
+            queue_name=queue_name,
+            timeout=definition.get("timeout"),
+            description=definition.get("description"),
+            meta={"origin": SCHEDULE_ORIGIN, "schedule": name, "spec": spec},
+        )
+        result["updated" if job is not None else "created"].append(name)
+
+    for job in existing.values():
+        scheduler.cancel(job)
+        result["removed"].append(job.id)
+
+    if result["created"] or result["updated"] or result["removed"]:
+        logger.info(f"Schedule reconciled: {result}")
+    return result
+
+
+class SchedulerLease:
+    """
+    Leader lease held in Redis.
+
+    acquire() takes the lease if it is free and renews it if this holder
+    already has it, so the leader calls it on every tick. If the leader
+    stops renewing, the lease expires after `ttl` seconds and another
+    process takes over.
+    """
+
+    def __init__(self, client, ttl: int, holder: str = None, key: str = LEADER_KEY):
+        self.client = client
+        self.ttl = ttl
+        self.key = key
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def acquire(self) -> bool:
+        return bool(
+            self.client.eval(_ACQUIRE_LEASE_SCRIPT, 1, self.key, self.holder, int(self.ttl * 1000))
+        )
+
+    def release(self):
+        self.client.eval(_RELEASE_LEASE_SCRIPT, 1, self.key, self.holder)
+
+    def current_holder(self):
+        holder = self.client.get(self.key)
+        return holder.decode() if isinstance(holder, bytes) else holder
+
+
+def _connect(config):
+    """Redis connection and rq-scheduler for `config`."""
+    from redis import Redis
+    from rq_scheduler import Scheduler
+
+    connection = Redis.from_url(config.get("REDIS_URL") or "redis://localhost:6379/0")
+    scheduler = Scheduler(
+        queue_name=config.get("JOB_QUEUE_NAME", "timesheet"), connection=connection
+    )
+    return connection, scheduler
+
+
+class SchedulerService:
+    """
+    Leader-elected scheduler loop.
+
+    Each tick renews (or tries to take) the lease. The leader reconciles
+    the schedule on taking over and every SCHEDULER_RECONCILE_SECONDS, then
+    enqueues the jobs that are due.
+    """
+
+    def __init__(self, app, connection=None, scheduler=None):
+        self.app = app
+        if connection is None or scheduler is None:
+            connection, scheduler = _connect(app.config)
+        self.scheduler = scheduler
+        self.lease = SchedulerLease(connection, app.config.get("SCHEDULER_LEASE_SECONDS", 30))
+        self.is_leader = False
+        self.last_reconcile = 0.0
+
+    def reconcile(self) -> dict:
+        result = reconcile_schedule(
+            self.scheduler,
+            scheduled_jobs(self.app.config),
+            self.app.config.get("JOB_QUEUE_NAME", "timesheet"),
+        )
+        self.last_reconcile = time.monotonic()
+        return result
+
+    def tick(self) -> bool:
+        """
+        Run one scheduling pass.
+
+        Returns:
+            bool: True if this process is the leader
+        """
+        try:
+            leader = self.lease.acquire()
+        except Exception as e:
+            logger.error(f"Scheduler lease unavailable: {e}")
+            leader = False
+
+        if leader != self.is_leader:
+            logger.info(
+                f"Scheduler {self.lease.holder} "
+                f"{'is now the leader' if leader else 'lost the lease; standing by'}"
+            )
+        took_over = leader and not self.is_leader
+        self.is_leader = leader
+        if not leader:
+            return False
+
+        interval = self.app.config.get("SCHEDULER_RECONCILE_SECONDS", 300)
+        if took_over or time.monotonic() - self.last_reconcile >= interval:
+            self.reconcile()
+        self.scheduler.enqueue_jobs()
+        return True
+
+    def run(self, max_ticks: int = None):
+        """Tick every SCHEDULER_POLL_SECONDS until interrupted."""
+        poll = self.app.config.get("SCHEDULER_POLL_SECONDS", 5)
+        ticks = 0
+        try:
+            while max_ticks is None or ticks < max_ticks:
+                self.tick()
+                ticks += 1
+                if max_ticks is None or ticks < max_ticks:
+                    time.sleep(poll)
+        finally:
+            if self.is_leader:
+                try:
+                    self.lease.release()
+                except Exception as e:
+                    logger.warning(f"Failed to release scheduler lease: {e}")
+                self.is_leader = False
+
+
+# ============================================================================
+# Run Tracking
+# ============================================================================
+
+def _record_run(name: str, **fields):
+    from app.extensions import db
+    from app.models import ScheduledJob
+
+    record = db.session.get(ScheduledJob, name)
+    if record is None:
+        record = ScheduledJob(name=name, run_count=0)
+        db.session.add(record)
+    for field, value in fields.items():
+        setattr(record, field, value)
+    db.session.commit()
+    return record
+
+
+def _run_scheduled_job(name: str):
+    import app.jobs as jobs
+    from app.extensions import db
+    from app.models import ScheduledJobStatus
+
+    definition = _definition(name)
+    if definition is None:
+        logger.warning(f"Scheduled job {name} is no longer defined; skipping")
+        return {"skipped": True, "reason": "not scheduled"}
+
+    func = getattr(jobs, definition["func"])
+    # Already inside an app context; don't build a second app
+    func = getattr(func, "__wrapped__", func)
+
+    started_at = datetime.utcnow()
+    record = _record_run(
+        name,
+        last_started_at=started_at,
+        last_finished_at=None,
+        last_duration_seconds=None,
+        last_status=ScheduledJobStatus.RUNNING,
+        last_error=None,
+    )
+    run_count = record.run_count
+    started = time.monotonic()
+    status, error, result = ScheduledJobStatus.SUCCEEDED, None, None
+    try:
+        result = func(schedule=name) if definition.get("deferred") else func()
+        return result
+    except Exception as e:
+        db.session.rollback()
+        status, error = ScheduledJobStatus.FAILED, str(e)
+        raise
+    finally:
+        if isinstance(result, dict) and result.get("collector_job_id"):
+            # Still RUNNING: the collector job finishes the run
+            _record_run(name, run_count=run_count + 1)
+        else:
+            _record_run(
+                name,
+                last_finished_at=datetime.utcnow(),
+                last_duration_seconds=round(time.monotonic() - started, 3),
+                last_status=status,
+                last_error=error,
+                run_count=run_count + 1,
+            )
+
+
+def finish_scheduled_run(name: str, status: str, error: str = None):
+    """
+    Record the end of a run whose work outlived its scheduled job.
+
+    The duration is measured from the run's start. Does nothing unless
+    the run is still RUNNING.
+    """
+    from app.extensions import db
+    from app.models import ScheduledJob, ScheduledJobStatus
+
+    record = db.session.get(ScheduledJob, name)
+    if record is None or record.last_status != ScheduledJobStatus.RUNNING:
+        return None
+
+    finished_at = datetime.utcnow()
+    return _record_run(
+        name,
+        last_finished_at=finished_at,
+        last_duration_seconds=round((finished_at - record.last_started_at).total_seconds(), 3),
+        last_status=status,
+        last_error=error,
+    )
+
+
+@with_app_context
+def run_scheduled_job(name: str):
+    """Background job that runs a scheduled job and records the run."""
+    return _run_scheduled_job(name)
+
+
+def _next_runs(scheduler) -> dict:
+    next_runs = {}
+    for job, scheduled_for in scheduler.get_jobs(with_times=True):
+        name = job.meta.get("schedule")
+        if job.meta.get("origin") == SCHEDULE_ORIGIN and name:
+            next_runs[name] = scheduled_for
+    return next_runs
+
+
+def describe_schedule(connection=None, scheduler=None) -> dict:
+    """
+    The declared schedule with each job's next and latest run.
+
+    next_run_at and the leader are None when Redis or rq-scheduler is
+    unavailable.
+
+    Returns:
+        dict: {"leader", "jobs": [...]}
+    """
+    from app.models import ScheduledJob
+
+    leader, next_runs = None, {}
+    try:
+        if connection is None or scheduler is None:
+            connection, scheduler = _connect(current_app.config)
+        leader = SchedulerLease(connection, 0).current_holder()
+        next_runs = _next_runs(scheduler)
+    except ImportError:
+        logger.debug("rq-scheduler not installed; next runs unavailable")
+    except Exception as e:
+        logger.warning(f"Could not read the schedule from Redis: {e}")
+
+    runs = {record.name: record for record in ScheduledJob.query.all()}
+    jobs = []
+    for definition in scheduled_jobs(current_app.config):
+        name = definition["name"]
+        next_run = next_runs.get(name)
+        record = runs.get(name)
+        jobs.append({
+            "name": name,
+            "description": definition["description"],
+            "cron": definition["cron"],
+            "next_run_at": next_run.isoformat() if next_run else None,
+            **(record.to_dict() if record else ScheduledJob(name=name, run_count=0).to_dict()),
+        })
+    return {"leader": leader, "jobs": jobs}
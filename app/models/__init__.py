@@ -12,12 +12,22 @@ from .timesheet import (
     HourType,
     ReimbursementType,
 )
-from .attachment import Attachment
+from .attachment import Attachment, AttachmentBlob
 from .note import Note
-from .notification import Notification, NotificationType
+from .notification import (
+    AdminDigestItem,
+    DeliveryChannel,
+    DeliveryStatus,
+    Notification,
+    NotificationDelivery,
+    NotificationType,
+)
 from .reimbursement import ReimbursementItem
 from .pay_period import PayPeriod
 from .teams_conversation import TeamsConversation
+from .bot_activity import BotActivity, BotActivityStatus
+from .scheduled_job import ScheduledJob, ScheduledJobStatus
+from .local_job import LocalJob, LocalJobStatus
 
 __all__ = [
     "User",
@@ -28,10 +38,21 @@ __all__ = [
     "HourType",
     "ReimbursementType",
     "Attachment",
+    "AttachmentBlob",
     "Note",
     "Notification",
     "NotificationType",
+    "NotificationDelivery",
+    "DeliveryChannel",
+    "DeliveryStatus",
+    "AdminDigestItem",
     "ReimbursementItem",
     "PayPeriod",
     "TeamsConversation",
+    "BotActivity",
+    "BotActivityStatus",
+    "ScheduledJob",
+    "ScheduledJobStatus",
+    "LocalJob",
+    "LocalJobStatus",
 ]
@@ -9,21 +9,55 @@ from datetime import datetime
 from ..extensions import db
 
 
+class AttachmentBlob(db.Model):
+    """
+    Content-addressed stored file shared by identical attachments.
+
+    Uploads with the same SHA-256 point at one stored object. ref_count
+    tracks how many attachments use it; the object is deleted from storage
+    when the last reference is released.
+
+    Attributes:
+        sha256: Content hash (primary key)
+        storage_key: Key of the object in the storage backend
+        file_size: Size in bytes
+        ref_count: Number of attachments referencing this blob
+        created_at: When the content was first stored
+    """
+
+    __tablename__ = "attachment_blobs"
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    storage_key = db.Column(db.String(255), nullable=False)
+    file_size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<AttachmentBlob {self.sha256[:12]} refs={self.ref_count}>"
+
+
 class Attachment(db.Model):
     """
     File attachment for a timesheet.
 
     Stores metadata for uploaded files (images/PDFs).
-    The actual files are stored in the filesystem.
+    The actual files are stored in the configured storage backend,
+    deduplicated by content through AttachmentBlob.
 
     Attributes:
         id: Primary key (UUID)
         timesheet_id: Foreign key to Timesheet
-        filename: Stored filename (UUID-based)
+        filename: Storage key (shared with identical uploads)
+        content_hash: SHA-256 of the content (AttachmentBlob key)
         original_filename: User's original filename
         mime_type: File MIME type
         file_size: Size in bytes
         reimbursement_type: Optional reimbursement type tag (REQ-021)
+        sharepoint_upload_url: In-progress Graph upload session (for resume)
+        sharepoint_upload_offset: Bytes acknowledged by that session
+        preview_key: Storage key of the thumbnail/first-page preview
+        preview_mime_type: MIME type of the preview
         uploaded_at: Upload timestamp
     """
 
@@ -42,7 +76,12 @@ class Attachment(db.Model):
     original_filename = db.Column(db.String(255), nullable=False)
     mime_type = db.Column(db.String(100), nullable=False)
     file_size = db.Column(db.Integer, nullable=False)
+    content_hash = db.Column(
+        db.String(64), db.ForeignKey("attachment_blobs.sha256"), nullable=True, index=True
+    )
     reimbursement_type = db.Column(db.String(20), nullable=True)
+    preview_key = db.Column(db.String(300), nullable=True)
+    preview_mime_type = db.Column(db.String(50), nullable=True)
     sharepoint_item_id = db.Column(db.String(120), nullable=True)
     sharepoint_site_id = db.Column(db.String(120), nullable=True)
     sharepoint_drive_id = db.Column(db.String(120), nullable=True)
@@ -52,6 +91,8 @@ class Attachment(db.Model):
     sharepoint_last_attempt_at = db.Column(db.DateTime, nullable=True)
     sharepoint_last_error = db.Column(db.Text, nullable=True)
     sharepoint_retry_count = db.Column(db.Integer, default=0, nullable=False)
+    sharepoint_upload_url = db.Column(db.Text, nullable=True)
+    sharepoint_upload_offset = db.Column(db.Integer, nullable=True)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
     # Relationships
@@ -68,6 +109,7 @@ class Attachment(db.Model):
             "mime_type": self.mime_type,
             "file_size": self.file_size,
             "reimbursement_type": self.reimbursement_type,
+            "has_preview": bool(self.preview_key),
             "uploaded_at": self.uploaded_at.isoformat(),
             "sharepoint_sync_status": self.sharepoint_sync_status,
             "sharepoint_web_url": self.sharepoint_web_url,
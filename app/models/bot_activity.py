@@ -0,0 +1,46 @@
+"""
+Bot Activity Model (REQ-012)
+
+Inbound Bot Framework activities, stored by the webhook and processed in
+the background (see app/bot/routes.py).
+"""
+
+import uuid
+from datetime import datetime
+from ..extensions import db
+
+
+class BotActivityStatus:
+    """Bot activity processing states."""
+
+    RECEIVED = "RECEIVED"  # Stored and acknowledged, waiting for a worker
+    PROCESSING = "PROCESSING"  # Claimed by a worker at claimed_at
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+    ALL = [RECEIVED, PROCESSING, DONE, FAILED]
+
+
+class BotActivity(db.Model):
+    """
+    One inbound activity. activity_key is unique, so a retried delivery of
+    the same activity is recognized and ignored.
+    """
+
+    __tablename__ = "bot_activities"
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    activity_key = db.Column(db.String(64), unique=True, nullable=False)
+    activity_id = db.Column(db.String(255), nullable=True)
+    activity_type = db.Column(db.String(50), nullable=True)
+    activity = db.Column(db.JSON, nullable=False)
+
+    status = db.Column(db.String(20), default=BotActivityStatus.RECEIVED, nullable=False)
+    last_error = db.Column(db.Text, nullable=True)
+
+    received_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<BotActivity {self.activity_type} {self.status}>"
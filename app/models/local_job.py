@@ -0,0 +1,49 @@
+"""
+Local Job Model
+
+Durable queue for the in-process job runner (app/jobs/local.py), used
+when Redis/RQ is unavailable.
+"""
+
+import uuid
+from datetime import datetime
+from ..extensions import db
+
+
+class LocalJobStatus:
+    """Local job states. Finished jobs are deleted."""
+
+    QUEUED = "QUEUED"  # Runnable from run_at
+    RUNNING = "RUNNING"  # Leased until run_at
+    FAILED = "FAILED"  # Gave up after max_attempts
+
+    ALL = [QUEUED, RUNNING, FAILED]
+
+
+class LocalJob(db.Model):
+    """
+    A job waiting for, or being run by, the local job runner.
+    """
+
+    __tablename__ = "local_jobs"
+    __table_args__ = (
+        db.Index("ix_local_jobs_due", "status", "run_at"),
+    )
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    func = db.Column(db.String(255), nullable=False)  # "module:qualname"
+    args = db.Column(db.JSON, nullable=False, default=list)
+    kwargs = db.Column(db.JSON, nullable=False, default=dict)
+
+    status = db.Column(db.String(20), default=LocalJobStatus.QUEUED, nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=1, nullable=False)
+    timeout = db.Column(db.Integer, nullable=True)
+    run_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<LocalJob {self.func} {self.status}>"
@@ -1,7 +1,9 @@
 """
 Notification Model
 
-SMS notification records for Twilio integration.
+SMS notification records for Twilio integration, the delivery ledger
+for reminders on every channel, and the queue of submissions waiting
+for an admin's digest.
 """
 
 import uuid
@@ -16,8 +18,31 @@ class NotificationType:
     APPROVED = "APPROVED"
     REMINDER = "REMINDER"
     UNSUBMITTED = "UNSUBMITTED"  # Daily reminder for unsubmitted timesheets
+    ADMIN_DIGEST = "ADMIN_DIGEST"  # Batched submissions for an admin
 
-    ALL = [NEEDS_ATTACHMENT, APPROVED, REMINDER, UNSUBMITTED]
+    ALL = [NEEDS_ATTACHMENT, APPROVED, REMINDER, UNSUBMITTED, ADMIN_DIGEST]
+
+
+class DeliveryChannel:
+    """Channels a notification can be delivered on."""
+
+    EMAIL = "email"
+    SMS = "sms"
+    TEAMS = "teams"
+
+    ALL = [EMAIL, SMS, TEAMS]
+
+
+class DeliveryStatus:
+    """Delivery ledger states."""
+
+    SENDING = "SENDING"  # Claimed by a sender until next_attempt_at
+    SENT = "SENT"
+    FAILED = "FAILED"  # Retried at next_attempt_at
+    DEAD = "DEAD"  # Gave up after DELIVERY_MAX_ATTEMPTS
+    SKIPPED = "SKIPPED"  # Channel unavailable for this user; not retried
+
+    ALL = [SENDING, SENT, FAILED, DEAD, SKIPPED]
 
 
 class Notification(db.Model):
@@ -72,3 +97,100 @@ class Notification(db.Model):
             "sent_at": self.sent_at.isoformat() if self.sent_at else None,
             "created_at": self.created_at.isoformat(),
         }
+
+
+class NotificationDelivery(db.Model):
+    """
+    One notification to one user on one channel.
+
+    The idempotency key (type, user, week and channel, plus the day for
+    daily reminders) is unique, so a rerun reminder job finds the row and
+    does not send again. Failed sends keep their payload and are retried
+    with exponential backoff.
+
+    Attributes:
+        id: Primary key (UUID)
+        idempotency_key: Unique key for this delivery
+        user_id: Foreign key to recipient User
+        timesheet_id: Foreign key to related Timesheet (optional)
+        type: Notification type (see NotificationType)
+        channel: email, sms or teams
+        week_start: Week the notification is about
+        status: DeliveryStatus value
+        attempts: Send attempts so far
+        next_attempt_at: When a retry is due (or a claim expires)
+        payload: What to send, so retries need nothing else
+        last_error: Error from the latest failed attempt
+        sent_at: When the delivery succeeded
+        notification_id: SMS Notification record kept in step with this
+            delivery's outcome (optional)
+        created_at: When the delivery was recorded
+    """
+
+    __tablename__ = "notification_deliveries"
+    __table_args__ = (
+        db.Index("ix_notification_deliveries_due", "status", "next_attempt_at"),
+    )
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    idempotency_key = db.Column(db.String(255), nullable=False, unique=True)
+    user_id = db.Column(
+        db.String(36), db.ForeignKey("users.id"), nullable=False, index=True
+    )
+    timesheet_id = db.Column(
+        db.String(36), db.ForeignKey("timesheets.id"), nullable=True
+    )
+    type = db.Column(db.String(20), nullable=False)
+    channel = db.Column(db.String(10), nullable=False)
+    week_start = db.Column(db.Date, nullable=True)
+    status = db.Column(db.String(10), nullable=False, default=DeliveryStatus.SENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)
+    payload = db.Column(db.JSON, nullable=False)
+    last_error = db.Column(db.Text, nullable=True)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    notification_id = db.Column(
+        db.String(36), db.ForeignKey("notifications.id"), nullable=True
+    )
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    user = db.relationship("User")
+    notification = db.relationship("Notification")
+
+    def __repr__(self):
+        return f"<NotificationDelivery {self.idempotency_key} {self.status}>"
+
+
+class AdminDigestItem(db.Model):
+    """
+    A submission waiting to be listed in an admin's next digest.
+
+    One row per admin and timesheet, so a resubmission before the digest
+    goes out is only listed once.
+
+    Attributes:
+        id: Primary key (UUID)
+        admin_id: Foreign key to the admin User
+        timesheet_id: Foreign key to the submitted Timesheet
+        created_at: When the submission was queued
+    """
+
+    __tablename__ = "admin_digest_items"
+    __table_args__ = (
+        db.UniqueConstraint("admin_id", "timesheet_id", name="uq_admin_digest_items_admin_timesheet"),
+    )
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    admin_id = db.Column(
+        db.String(36), db.ForeignKey("users.id"), nullable=False, index=True
+    )
+    timesheet_id = db.Column(
+        db.String(36), db.ForeignKey("timesheets.id", ondelete="CASCADE"), nullable=False
+    )
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    admin = db.relationship("User")
+    timesheet = db.relationship("Timesheet")
+
+    def __repr__(self):
+        return f"<AdminDigestItem {self.timesheet_id} for {self.admin_id}>"
@@ -0,0 +1,47 @@
+"""
+Scheduled Job Model
+
+Last-run bookkeeping for the recurring jobs defined in app/jobs/scheduler.py.
+"""
+
+from ..extensions import db
+
+
+class ScheduledJobStatus:
+    """Outcome of a scheduled job's latest run."""
+
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
+
+    ALL = [RUNNING, SUCCEEDED, FAILED]
+
+
+class ScheduledJob(db.Model):
+    """
+    Latest run of one scheduled job, keyed by its schedule name.
+    """
+
+    __tablename__ = "scheduled_jobs"
+
+    name = db.Column(db.String(100), primary_key=True)
+    last_started_at = db.Column(db.DateTime, nullable=True)
+    last_finished_at = db.Column(db.DateTime, nullable=True)
+    last_duration_seconds = db.Column(db.Float, nullable=True)
+    last_status = db.Column(db.String(20), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    run_count = db.Column(db.Integer, default=0, nullable=False)
+
+    def to_dict(self):
+        """Serialize the latest run."""
+        return {
+            "last_started_at": self.last_started_at.isoformat() if self.last_started_at else None,
+            "last_finished_at": self.last_finished_at.isoformat() if self.last_finished_at else None,
+            "last_duration_seconds": self.last_duration_seconds,
+            "last_status": self.last_status,
+            "last_error": self.last_error,
+            "run_count": self.run_count,
+        }
+
+    def __repr__(self):
+        return f"<ScheduledJob {self.name} {self.last_status}>"
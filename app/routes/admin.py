@@ -8,7 +8,7 @@ Support users have limited access to approve trainee timesheets only (REQ-041).
 from datetime import datetime
 from io import BytesIO, StringIO
 import csv
-from flask import Blueprint, request, session, send_file, current_app, Response
+from flask import Blueprint, request, session, send_file, current_app, Response, redirect
 from ..models import (
     Timesheet,
     TimesheetEntry,
@@ -1017,6 +1017,153 @@ def export_timesheet_detail(timesheet_id):
     return _send_pdf(["Field", "Value"], summary_rows, filename, title, extra_tables=extra_tables)
 
 
+@admin_bp.route("/exports/attachments", methods=["GET"])
+@login_required
+@can_approve
+def export_attachments():
+    """
+    Download every attachment matching the export filters as a ZIP.
+
+    Uses the same filters as /exports/timesheets (status, user_id,
+    week_start, pay_period_start/end, hour_type). The archive is organized
+    by employee and week.
+
+    Archives up to ATTACHMENT_ARCHIVE_SYNC_MAX_BYTES (or without a job
+    queue) are streamed directly. Larger ones, or any with ?background=1,
+    are built by a background job: the response is 202 with a status URL,
+    and the finished archive supports resumable (Range) downloads.
+    """
+    from sqlalchemy.orm import contains_eager
+    from flask import stream_with_context
+    from ..jobs import enqueue_attachment_archive
+    from ..utils.archive import collect_archive_entries, iter_attachment_archive
+    from ..utils.storage import get_storage_backend
+
+    try:
+        query = _build_export_query()
+    except ValueError:
+        return {"error": "Invalid date format"}, 400
+
+    timesheets = query.options(contains_eager(Timesheet.user)).all()
+    entries = collect_archive_entries(timesheets)
+    if not entries:
+        return {"error": "No attachments match the selected filters"}, 404
+
+    total_bytes = sum(entry["size"] or 0 for entry in entries)
+    sync_limit = current_app.config.get("ATTACHMENT_ARCHIVE_SYNC_MAX_BYTES", 100 * 1024 * 1024)
+    wants_background = request.args.get("background") in ("1", "true")
+
+    if wants_background or total_bytes > sync_limit:
+        try:
+            job_id = enqueue_attachment_archive(entries, session["user"]["id"])
+        except Exception as e:
+            current_app.logger.error(f"Failed to enqueue attachment archive: {e}")
+            job_id = None
+        if job_id:
+            return {
+                "job_id": job_id,
+                "files": len(entries),
+                "total_bytes": total_bytes,
+                "status_url": f"/api/admin/exports/attachments/jobs/{job_id}",
+            }, 202
+
+    today = datetime.utcnow().date().isoformat()
+    response = Response(
+        stream_with_context(iter_attachment_archive(entries, get_storage_backend())),
+        mimetype="application/zip",
+    )
+    response.headers.set(
+        "Content-Disposition", "attachment", filename=f"attachments_export_{today}.zip"
+    )
+    return response
+
+
+def _get_archive_job(job_id):
+    """
+    Load an archive job owned by the current user.
+
+    Returns:
+        tuple: (job or None, error_response or None)
+    """
+    from ..jobs import fetch_job
+
+    job = fetch_job(job_id)
+    if job is None or job.meta.get("requested_by") != session["user"]["id"]:
+        return None, ({"error": "Archive not found"}, 404)
+    return job, None
+
+
+@admin_bp.route("/exports/attachments/jobs/<job_id>", methods=["GET"])
+@login_required
+@can_approve
+def get_attachment_archive_status(job_id):
+    """
+    Report progress of a background attachment archive.
+
+    Returns:
+        dict: status, files_done/files_total, and download_url when finished
+    """
+    job, error = _get_archive_job(job_id)
+    if error:
+        return error
+
+    status = job.get_status()
+    result = {
+        "job_id": job_id,
+        "status": status,
+        "files_done": job.meta.get("files_done", 0),
+        "files_total": job.meta.get("files_total"),
+    }
+    if status == "finished" and job.result:
+        result["size"] = job.result.get("size")
+        result["download_url"] = f"/api/admin/exports/attachments/jobs/{job_id}/download"
+    return result
+
+
+@admin_bp.route("/exports/attachments/jobs/<job_id>/download", methods=["GET"])
+@login_required
+@can_approve
+def download_attachment_archive(job_id):
+    """
+    Download a finished attachment archive.
+
+    Local storage honours Range requests, so interrupted downloads resume;
+    S3/R2 redirect to a presigned URL, which does the same.
+    """
+    from ..utils.storage import get_storage_backend, LocalStorageBackend
+
+    job, error = _get_archive_job(job_id)
+    if error:
+        return error
+
+    if job.get_status() != "finished" or not job.result:
+        return {"error": "Archive is not ready"}, 409
+
+    key = job.result["key"]
+    download_name = f"attachments_{job_id[:8]}.zip"
+    backend = get_storage_backend()
+
+    if not isinstance(backend, LocalStorageBackend):
+        return redirect(backend.get_url(
+            key,
+            expires_in=current_app.config.get("STORAGE_PRESIGNED_URL_EXPIRY", 300),
+            download_name=download_name,
+        ))
+
+    try:
+        filepath = backend.get_path(key)
+    except FileNotFoundError:
+        return {"error": "Archive has expired"}, 410
+
+    return send_file(
+        filepath,
+        mimetype="application/zip",
+        as_attachment=True,
+        download_name=download_name,
+        conditional=True,
+    )
+
+
 @admin_bp.route("/exports/pay-period", methods=["GET"])
 @login_required
 @admin_required
@@ -1059,57 +1206,141 @@ def export_pay_period():
     return _send_pdf(_summary_headers(), rows, filename, title, totals_row)
 
 
-@admin_bp.route(
-    "/timesheets/<timesheet_id>/attachments/<attachment_id>", methods=["GET"]
-)
-@login_required
-@can_approve
-def download_attachment(timesheet_id, attachment_id):
+def _get_reviewable_attachment(timesheet_id, attachment_id):
     """
-    Download an attachment for review.
-    
-    REQ-041: Support users can only download attachments from trainee timesheets.
+    Load an attachment the current reviewer may view.
+
+    Draft timesheet attachments are hidden, and REQ-041 access rules apply.
 
     Returns:
-        file: The attachment file
+        tuple: (attachment or None, error_response or None)
     """
-    import os
     from ..models import Attachment
 
     timesheet = Timesheet.query.filter_by(id=timesheet_id).first()
 
     if not timesheet:
-        return {"error": "Timesheet not found"}, 404
+        return None, ({"error": "Timesheet not found"}, 404)
 
     # Cannot view draft attachments
     if timesheet.status == TimesheetStatus.NEW:
-        return {"error": "Timesheet not found"}, 404
-    
+        return None, ({"error": "Timesheet not found"}, 404)
+
     # REQ-041: Check if Support user can access this timesheet
     can_access, error = _can_access_timesheet(timesheet)
     if not can_access:
-        return error
+        return None, error
 
     attachment = Attachment.query.filter_by(
         id=attachment_id, timesheet_id=timesheet_id
     ).first()
 
     if not attachment:
-        return {"error": "Attachment not found"}, 404
+        return None, ({"error": "Attachment not found"}, 404)
+
+    return attachment, None
 
-    filepath = os.path.join(current_app.config["UPLOAD_FOLDER"], attachment.filename)
 
-    if not os.path.exists(filepath):
+@admin_bp.route(
+    "/timesheets/<timesheet_id>/attachments/<attachment_id>", methods=["GET"]
+)
+@login_required
+@can_approve
+def download_attachment(timesheet_id, attachment_id):
+    """
+    Download an attachment for review.
+    
+    REQ-041: Support users can only download attachments from trainee timesheets.
+
+    The file body never passes through the worker when it can be avoided:
+    - S3/R2: 302 redirect to a short-lived presigned URL
+    - Local with STORAGE_ACCEL_REDIRECT_PREFIX: X-Accel-Redirect to nginx
+    - Local otherwise: send_file (supports Range requests / 206)
+
+    Returns:
+        file: The attachment file
+    """
+    from ..utils.storage import get_storage_backend, LocalStorageBackend
+
+    attachment, error = _get_reviewable_attachment(timesheet_id, attachment_id)
+    if error:
+        return error
+
+    backend = get_storage_backend()
+
+    if not isinstance(backend, LocalStorageBackend):
+        url = backend.get_url(
+            attachment.filename,
+            expires_in=current_app.config.get("STORAGE_PRESIGNED_URL_EXPIRY", 300),
+            download_name=attachment.original_filename,
+        )
+        return redirect(url)
+
+    try:
+        filepath = backend.get_path(attachment.filename)
+    except FileNotFoundError:
         return {"error": "File not found"}, 404
 
+    accel_prefix = current_app.config.get("STORAGE_ACCEL_REDIRECT_PREFIX")
+    if accel_prefix:
+        # nginx serves the file (including Range requests) from an internal location
+        response = Response(mimetype=attachment.mime_type)
+        response.headers["X-Accel-Redirect"] = accel_prefix.rstrip("/") + "/" + attachment.filename
+        response.headers.set(
+            "Content-Disposition", "attachment", filename=attachment.original_filename
+        )
+        return response
+
     return send_file(
         filepath,
         mimetype=attachment.mime_type,
         as_attachment=True,
         download_name=attachment.original_filename,
+        conditional=True,
     )
 
 
+@admin_bp.route(
+    "/timesheets/<timesheet_id>/attachments/<attachment_id>/preview", methods=["GET"]
+)
+@login_required
+@can_approve
+def get_attachment_preview(timesheet_id, attachment_id):
+    """
+    Serve an attachment's thumbnail / first-page preview.
+
+    Preview keys are immutable, so responses carry a year-long private
+    Cache-Control and an ETag; revisits cost a 304 at most.
+
+    Returns:
+        file: WebP/JPEG preview, or 404 if none has been generated
+    """
+    from ..utils.previews import PREVIEW_CACHE_MAX_AGE
+    from ..utils.storage import get_storage_backend
+
+    attachment, error = _get_reviewable_attachment(timesheet_id, attachment_id)
+    if error:
+        return error
+
+    if not attachment.preview_key:
+        return {"error": "Preview not available"}, 404
+
+    cache_control = f"private, max-age={PREVIEW_CACHE_MAX_AGE}, immutable"
+
+    if attachment.preview_key in request.if_none_match:
+        response = Response(status=304)
+    else:
+        try:
+            chunks = get_storage_backend().get_stream(attachment.preview_key)
+        except FileNotFoundError:
+            return {"error": "Preview not available"}, 404
+        response = Response(chunks, mimetype=attachment.preview_mime_type)
+
+    response.set_etag(attachment.preview_key)
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
 @admin_bp.route("/attachments/<attachment_id>/sharepoint/retry", methods=["POST"])
 @login_required
 @admin_required
@@ -1197,3 +1428,106 @@ def list_users():
     return {
         "users": [u.to_dict() for u in users],
     }
+
+
+# ============================================================================
+# Scheduled Jobs
+# ============================================================================
+
+
+@admin_bp.route("/scheduler", methods=["GET"])
+@login_required
+@admin_required
+def get_scheduler_status():
+    """
+    Show the scheduled jobs with their next and latest runs.
+
+    Returns:
+        dict: Current scheduler leader, and per job: cron, next_run_at,
+            last_started_at, last_finished_at, last_duration_seconds,
+            last_status and last_error
+    """
+    from ..jobs.scheduler import describe_schedule
+
+    return describe_schedule()
+
+
+# ============================================================================
+# Request Profiling
+# ============================================================================
+
+
+@admin_bp.route("/profiles/token", methods=["POST"])
+@login_required
+@admin_required
+def create_profile_token():
+    """
+    Issue a signed token that enables cProfile for requests carrying it.
+
+    Send it as the X-Profile-Token header (or ?_profile=<token>); the
+    response's X-Profile-ID names the stored profile.
+
+    Returns:
+        dict: Token, header name and lifetime in seconds
+    """
+    from ..utils.profiling import PROFILE_HEADER, create_profile_token as make_token
+
+    if not current_app.config.get("PROFILING_ENABLED", False):
+        return {"error": "Profiling is disabled"}, 400
+
+    return {
+        "token": make_token(session["user"]["id"]),
+        "header": PROFILE_HEADER,
+        "expires_in": current_app.config.get("PROFILE_TOKEN_MAX_AGE", 3600),
+    }
+
+
+@admin_bp.route("/profiles", methods=["GET"])
+@login_required
+@admin_required
+def list_profiles():
+    """
+    List stored request profiles, newest first.
+
+    Returns:
+        dict: Profile metadata (id, method, path, status, duration)
+    """
+    from ..utils.profiling import list_profiles as stored_profiles
+
+    return {"profiles": stored_profiles()}
+
+
+@admin_bp.route("/profiles/<profile_id>", methods=["GET"])
+@login_required
+@admin_required
+def get_profile(profile_id):
+    """
+    Download a stored profile.
+
+    Query params:
+        format: "pstats" (default, for snakeviz/pstats) or "text"
+        sort: pstats sort key for text output (default: cumulative)
+        limit: Functions included in text output (default: 50)
+
+    Returns:
+        file: .pstats file, or a text report
+    """
+    from ..utils.profiling import get_profile_path, format_profile
+
+    path = get_profile_path(profile_id)
+    if not path:
+        return {"error": "Profile not found"}, 404
+
+    if request.args.get("format") == "text":
+        sort = request.args.get("sort", "cumulative")
+        if sort not in ("cumulative", "tottime", "calls", "ncalls", "time"):
+            return {"error": "Invalid sort key"}, 400
+        limit = min(request.args.get("limit", 50, type=int), 500)
+        return Response(format_profile(profile_id, sort, limit), mimetype="text/plain")
+
+    return send_file(
+        path,
+        mimetype="application/octet-stream",
+        as_attachment=True,
+        download_name=f"{profile_id}.pstats",
+    )
@@ -6,8 +6,8 @@ Rate limited to prevent brute-force attacks (REQ-042).
 """
 
 from flask import Blueprint, redirect, url_for, session, request, current_app
-import msal
 from ..extensions import limiter
+from ..utils.token_cache import get_confidential_client
 
 auth_bp = Blueprint("auth", __name__)
 
@@ -28,14 +28,44 @@ def _is_dev_mode():
 
 
 def _get_msal_app():
-    """Create MSAL ConfidentialClientApplication instance."""
-    return msal.ConfidentialClientApplication(
+    """
+    Get the MSAL ConfidentialClientApplication for sign-in.
+
+    The app is cached per process, so authority discovery runs once rather
+    than on every login and callback. Its token cache is not persisted:
+    sign-in only reads the ID token claims (see _forget_login_tokens).
+    """
+    return get_confidential_client(
         current_app.config["AZURE_CLIENT_ID"],
-        authority=current_app.config["AZURE_AUTHORITY"],
-        client_credential=current_app.config["AZURE_CLIENT_SECRET"],
+        current_app.config["AZURE_AUTHORITY"],
+        current_app.config["AZURE_CLIENT_SECRET"],
     )
 
 
+def _forget_login_tokens(msal_app, result):
+    """
+    Remove the signed-in user's tokens from the shared client's cache.
+
+    Nothing reads them back, so keeping them would only grow the cache
+    with every user who signs in.
+    """
+    claims = result.get("id_token_claims") or {}
+    home_account_id = None
+    if claims.get("oid") and claims.get("tid"):
+        home_account_id = f"{claims['oid']}.{claims['tid']}"
+    username = (claims.get("preferred_username") or "").lower()
+
+    try:
+        for account in msal_app.get_accounts():
+            if (
+                account.get("home_account_id") == home_account_id
+                or (username and (account.get("username") or "").lower() == username)
+            ):
+                msal_app.remove_account(account)
+    except Exception as e:
+        current_app.logger.warning(f"Failed to clear sign-in tokens: {e}")
+
+
 def _get_auth_url(login_hint=None):
     """Build Microsoft 365 authorization URL."""
     msal_app = _get_msal_app()
@@ -124,6 +154,7 @@ def callback():
         scopes=current_app.config["AZURE_SCOPES"],
         redirect_uri=current_app.config["AZURE_REDIRECT_URI"],
     )
+    _forget_login_tokens(msal_app, result)
 
     if "error" in result:
         current_app.logger.error(f"Token error: {result}")
@@ -4,7 +4,17 @@ Main Routes
 Landing page and static content routes.
 """
 
-from flask import Blueprint, render_template, session, redirect, url_for, current_app
+import hmac
+from flask import (
+    Blueprint,
+    Response,
+    render_template,
+    request,
+    session,
+    redirect,
+    url_for,
+    current_app,
+)
 
 main_bp = Blueprint("main", __name__)
 
@@ -112,24 +122,68 @@ def health():
     return status, 200
 
 
+def _metrics_auth_error():
+    """
+    Check access to metrics endpoints.
+
+    Admin sessions are always allowed. Scrapers (e.g. Prometheus) may
+    instead send "Authorization: Bearer <METRICS_TOKEN>" when configured.
+
+    Returns:
+        tuple: (error dict, status) if access is denied, otherwise None
+    """
+    token = current_app.config.get("METRICS_TOKEN")
+    auth_header = request.headers.get("Authorization", "")
+    if token and auth_header.startswith("Bearer "):
+        if hmac.compare_digest(auth_header[len("Bearer "):], token):
+            return None
+        return {"error": "Invalid metrics token"}, 401
+
+    if "user" not in session:
+        return {"error": "Authentication required"}, 401
+
+    if not session["user"].get("is_admin"):
+        return {"error": "Admin access required"}, 403
+
+    return None
+
+
 @main_bp.route("/metrics")
 def metrics():
     """
     Metrics endpoint for monitoring (REQ-036).
     
-    Returns application metrics including:
+    Returns application metrics aggregated across workers, including:
     - Total requests
     - Error rate
-    - Average response time
+    - Average and p50/p95/p99 response time
     - Top routes by request count
+    - Database pool checkout stats
     
-    Requires admin authentication.
+    Requires admin authentication or the metrics bearer token.
     """
-    if "user" not in session:
-        return {"error": "Authentication required"}, 401
-    
-    if not session["user"].get("is_admin"):
-        return {"error": "Admin access required"}, 403
+    auth_error = _metrics_auth_error()
+    if auth_error:
+        return auth_error
     
     from ..utils.observability import get_metrics
     return get_metrics(), 200
+
+
+@main_bp.route("/metrics/prometheus")
+def metrics_prometheus():
+    """
+    Metrics in Prometheus text exposition format.
+
+    Same data as /metrics, with per-route latency histograms.
+    Requires admin authentication or the metrics bearer token.
+    """
+    auth_error = _metrics_auth_error()
+    if auth_error:
+        return auth_error
+
+    from ..utils.observability import get_prometheus_metrics
+    return Response(
+        get_prometheus_metrics(),
+        mimetype="text/plain; version=0.0.4",
+    )
@@ -17,13 +17,33 @@ from ..models import (
     ReimbursementType,
 )
 from ..extensions import db
-from ..jobs import enqueue_sharepoint_sync
+from ..jobs import enqueue_sharepoint_sync, enqueue_attachment_preview
+from ..services.attachments import (
+    store_attachment_content,
+    release_attachment_content,
+    delete_stored_files,
+)
 from ..services.notification import NotificationService
 from ..utils.decorators import login_required
 from ..utils.pay_periods import get_confirmed_pay_period
+from ..utils.storage import StorageValidationError
 
 timesheets_bp = Blueprint("timesheets", __name__)
 
+# Leading bytes expected for each allowed attachment extension
+ATTACHMENT_MAGIC_NUMBERS = {
+    "pdf": [b"%PDF"],
+    "png": [b"\x89PNG\r\n\x1a\n"],
+    "jpg": [b"\xff\xd8\xff"],
+    "jpeg": [b"\xff\xd8\xff"],
+    "gif": [b"GIF87a", b"GIF89a"],
+}
+
+
+def _matches_magic_number(ext, header):
+    """Check that a file's leading bytes match its extension."""
+    return any(header.startswith(magic) for magic in ATTACHMENT_MAGIC_NUMBERS.get(ext, []))
+
 
 def _get_week_start(date):
     """
@@ -329,9 +349,16 @@ def delete_timesheet(timesheet_id):
     if timesheet.status != TimesheetStatus.NEW:
         return {"error": "Only draft timesheets can be deleted"}, 400
 
+    attachments = timesheet.attachments.all()
     db.session.delete(timesheet)
+    db.session.flush()
+    released_keys = [
+        key for attachment in attachments for key in release_attachment_content(attachment)
+    ]
     db.session.commit()
 
+    delete_stored_files(released_keys)
+
     return {"message": "Timesheet deleted"}
 
 
@@ -437,8 +464,6 @@ def upload_attachment(timesheet_id):
     Returns:
         dict: Attachment info
     """
-    import os
-    import uuid as uuid_lib
     from werkzeug.utils import secure_filename
 
     user_id = session["user"]["id"]
@@ -472,43 +497,24 @@ def upload_attachment(timesheet_id):
     else:
         reimbursement_type = None
 
-    # Generate unique filename
     original_filename = secure_filename(file.filename)
-    stored_filename = f"{uuid_lib.uuid4()}.{ext}"
-
-    # Save file
-    upload_folder = current_app.config["UPLOAD_FOLDER"]
-    os.makedirs(upload_folder, exist_ok=True)
-    filepath = os.path.join(upload_folder, stored_filename)
-    file.save(filepath)
-
-    # Validate file content (magic numbers)
-    MAGIC_NUMBERS = {
-        "pdf": [b"%PDF"],
-        "png": [b"\x89PNG\r\n\x1a\n"],
-        "jpg": [b"\xff\xd8\xff"],
-        "jpeg": [b"\xff\xd8\xff"],
-        "gif": [b"GIF87a", b"GIF89a"],
-    }
+
+    # Stream to storage in one pass; content is checked against the
+    # extension's magic numbers before anything is written, and identical
+    # files share one stored blob
     try:
-        with open(filepath, "rb") as f:
-            header = f.read(8)
-        valid_magic = False
-        if ext in MAGIC_NUMBERS:
-            for magic in MAGIC_NUMBERS[ext]:
-                if header.startswith(magic):
-                    valid_magic = True
-                    break
-        if not valid_magic:
-            os.remove(filepath)
-            return {"error": "File content does not match extension"}, 400
-    except Exception:
-        if os.path.exists(filepath):
-            os.remove(filepath)
-        return {"error": "Failed to validate file"}, 500
-
-    # Get file size
-    file_size = os.path.getsize(filepath)
+        blob = store_attachment_content(
+            file.stream,
+            original_filename or f"upload.{ext}",
+            file.content_type,
+            validate_header=lambda header: _matches_magic_number(ext, header),
+        )
+    except StorageValidationError:
+        return {"error": "File content does not match extension"}, 400
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Failed to store attachment: {e}")
+        return {"error": "Failed to store file"}, 500
 
     sharepoint_enabled = current_app.config.get("SHAREPOINT_SYNC_ENABLED", False)
     sharepoint_status = (
@@ -518,10 +524,11 @@ def upload_attachment(timesheet_id):
     # Create attachment record
     attachment = Attachment(
         timesheet_id=timesheet_id,
-        filename=stored_filename,
+        filename=blob.storage_key,
         original_filename=original_filename,
         mime_type=file.content_type,
-        file_size=file_size,
+        file_size=blob.file_size,
+        content_hash=blob.sha256,
         reimbursement_type=reimbursement_type,
         sharepoint_sync_status=sharepoint_status,
     )
@@ -537,6 +544,9 @@ def upload_attachment(timesheet_id):
     if sharepoint_enabled:
         enqueue_sharepoint_sync(attachment.id)
 
+    if current_app.config.get("ATTACHMENT_PREVIEWS_ENABLED", False):
+        enqueue_attachment_preview(attachment.id)
+
     return attachment.to_dict(), 201
 
 
@@ -549,8 +559,6 @@ def delete_attachment(timesheet_id, attachment_id):
     Returns:
         dict: Success message
     """
-    import os
-
     user_id = session["user"]["id"]
 
     timesheet = Timesheet.query.filter_by(id=timesheet_id, user_id=user_id).first()
@@ -572,14 +580,14 @@ def delete_attachment(timesheet_id, attachment_id):
     if not attachment:
         return {"error": "Attachment not found"}, 404
 
-    # Delete file from filesystem
-    filepath = os.path.join(current_app.config["UPLOAD_FOLDER"], attachment.filename)
-    if os.path.exists(filepath):
-        os.remove(filepath)
-
     db.session.delete(attachment)
+    db.session.flush()
+    released_keys = release_attachment_content(attachment)
     db.session.commit()
 
+    # Stored content is removed only once no other attachment uses it
+    delete_stored_files(released_keys)
+
     return {"message": "Attachment deleted"}
 
 
@@ -0,0 +1,129 @@
+"""
+Attachment Storage Service
+
+Content-addressed storage for timesheet attachments. Uploads are hashed
+while they stream into the storage backend; identical content shares a
+single stored object tracked by AttachmentBlob.ref_count.
+
+Reference counts are changed with single UPDATE/DELETE statements so
+concurrent uploads and deletes of the same content cannot lose a blob
+that is still referenced.
+"""
+
+import logging
+from sqlalchemy.exc import IntegrityError
+from ..extensions import db
+from ..models import AttachmentBlob
+from ..utils.storage import get_storage_backend
+
+logger = logging.getLogger(__name__)
+
+
+def _acquire_blob(sha256):
+    """
+    Take a reference on an existing blob.
+
+    Returns:
+        AttachmentBlob: The blob, or None if no blob has this content
+    """
+    updated = AttachmentBlob.query.filter_by(sha256=sha256).update(
+        {AttachmentBlob.ref_count: AttachmentBlob.ref_count + 1},
+        synchronize_session=False,
+    )
+    if not updated:
+        return None
+    return db.session.get(AttachmentBlob, sha256, populate_existing=True)
+
+
+def store_attachment_content(stream, filename, content_type, validate_header=None):
+    """
+    Store uploaded content, reusing an existing blob for identical files.
+
+    The hash is only known once the upload has streamed through, so a
+    duplicate is written once and then removed in favour of the shared copy.
+    The caller commits the session.
+
+    Args:
+        stream: Readable binary file-like object
+        filename: Original filename (for extension)
+        content_type: MIME type
+        validate_header: Optional callable(first_chunk) -> bool
+
+    Returns:
+        AttachmentBlob: Blob holding the content, with a reference taken
+
+    Raises:
+        StorageValidationError: If validate_header rejects the content
+    """
+    backend = get_storage_backend()
+    stored = backend.save_stream(stream, filename, content_type, validate_header)
+
+    blob = _acquire_blob(stored["sha256"])
+    if blob is None:
+        blob = AttachmentBlob(
+            sha256=stored["sha256"],
+            storage_key=stored["key"],
+            file_size=stored["size"],
+            ref_count=1,
+        )
+        try:
+            with db.session.begin_nested():
+                db.session.add(blob)
+            return blob
+        except IntegrityError:
+            # A concurrent upload stored the same content first
+            blob = _acquire_blob(stored["sha256"])
+            if blob is None:
+                backend.delete(stored["key"])
+                raise
+
+    backend.delete(stored["key"])
+    logger.info(f"Deduplicated upload {filename} onto blob {blob.sha256[:12]}")
+    return blob
+
+
+def release_attachment_content(attachment):
+    """
+    Drop an attachment's reference to its stored content.
+
+    Call after the attachment's deletion has been flushed, then pass the
+    result to delete_stored_files() once the transaction commits.
+
+    Args:
+        attachment: Deleted Attachment
+
+    Returns:
+        list: Storage keys to delete (the file and its preview), empty if
+            other attachments still use them
+    """
+    owned_keys = [key for key in (attachment.filename, attachment.preview_key) if key]
+
+    if not attachment.content_hash:
+        # Attachments stored before deduplication own their file
+        return owned_keys
+
+    AttachmentBlob.query.filter_by(sha256=attachment.content_hash).update(
+        {AttachmentBlob.ref_count: AttachmentBlob.ref_count - 1},
+        synchronize_session=False,
+    )
+    deleted = AttachmentBlob.query.filter(
+        AttachmentBlob.sha256 == attachment.content_hash,
+        AttachmentBlob.ref_count <= 0,
+    ).delete(synchronize_session=False)
+
+    return owned_keys if deleted else []
+
+
+def delete_stored_files(keys):
+    """
+    Delete released objects from storage.
+
+    Args:
+        keys: Storage keys from release_attachment_content
+    """
+    backend = get_storage_backend()
+    for key in keys:
+        try:
+            backend.delete(key)
+        except Exception as e:
+            logger.error(f"Failed to delete stored attachment {key}: {e}")
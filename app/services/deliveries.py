@@ -0,0 +1,244 @@
+"""
+Notification Delivery Ledger
+
+Records every reminder sent to a user on each channel (email, SMS,
+Teams) in NotificationDelivery, under an idempotency key of notification
+type, user, week and channel. The unique key is claimed before sending,
+so rerunning a reminder job, or running it on several workers at once,
+sends each reminder once.
+
+Failed sends keep their payload and are retried by
+retry_due_deliveries() with exponential backoff, up to
+DELIVERY_MAX_ATTEMPTS. A send that cannot happen at all (Teams is not
+configured, or the user has no Teams conversation) is recorded as
+SKIPPED and never retried. A sender holds a delivery for
+DELIVERY_LEASE_SECONDS; if it dies mid-send, the delivery becomes due
+again once the lease runs out.
+
+Due deliveries are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so
+concurrent retry workers take disjoint batches.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from ..extensions import db
+from ..models import DeliveryChannel, DeliveryStatus, NotificationDelivery, User
+from ..utils.email import send_template_email
+from ..utils.sms import send_sms
+from ..utils.teams import get_conversation_for_user, is_teams_configured, send_teams_message
+
+logger = logging.getLogger(__name__)
+
+
+def delivery_key(notification_type, user_id, week_start, channel, occurrence=None) -> str:
+    """
+    Build the idempotency key for a delivery.
+
+    Args:
+        occurrence: Distinguishes repeats within a week (e.g. the date of
+            a daily reminder); None for once-a-week notifications
+    """
+    week = week_start.isoformat() if week_start else "-"
+    key = f"{notification_type}:{user_id}:{week}:{channel}"
+    return f"{key}:{occurrence}" if occurrence else key
+
+
+def next_retry_delay(attempts: int) -> int:
+    """Seconds before retrying a delivery that has failed `attempts` times."""
+    base = current_app.config.get("DELIVERY_RETRY_BASE_SECONDS", 60)
+    cap = current_app.config.get("DELIVERY_RETRY_MAX_SECONDS", 3600)
+    return min(cap, base * (2 ** max(attempts - 1, 0)))
+
+
+def _lease_until(now):
+    return now + timedelta(seconds=current_app.config.get("DELIVERY_LEASE_SECONDS", 300))
+
+
+def _send(delivery):
+    """
+    Send a delivery's payload on its channel, returning (success, error).
+
+    success is None when the channel is unavailable for this user, so
+    the delivery is skipped rather than retried.
+    """
+    payload = delivery.payload
+
+    if delivery.channel == DeliveryChannel.EMAIL:
+        result = send_template_email(
+            payload["recipients"],
+            payload["subject"],
+            payload["template"],
+            **payload["context"],
+        )
+        return bool(result.get("success")), result.get("error")
+
+    if delivery.channel == DeliveryChannel.SMS:
+        result = send_sms(payload["phone"], payload["message"])
+        return bool(result.get("success")), result.get("error")
+
+    if delivery.channel == DeliveryChannel.TEAMS:
+        user = db.session.get(User, delivery.user_id)
+        if user is None:
+            return False, "User not found"
+        if not is_teams_configured():
+            return None, "Teams not configured"
+        conversation = get_conversation_for_user(user)
+        if conversation is None:
+            return None, "No Teams conversation for user"
+        if send_teams_message(conversation, payload["fallback_text"], payload["card"]):
+            return True, None
+        return False, "Teams send failed"
+
+    return False, f"Unknown channel: {delivery.channel}"
+
+
+def _attempt(delivery):
+    """Make one send attempt and record the outcome (commits)."""
+    try:
+        success, error = _send(delivery)
+    except Exception as exc:
+        success, error = False, str(exc)
+
+    now = datetime.utcnow()
+    delivery.attempts += 1
+    if success:
+        delivery.status = DeliveryStatus.SENT
+        delivery.sent_at = now
+        delivery.next_attempt_at = None
+        delivery.last_error = None
+    elif success is None:
+        delivery.status = DeliveryStatus.SKIPPED
+        delivery.next_attempt_at = None
+        delivery.last_error = error
+        logger.info(f"Skipped delivery {delivery.idempotency_key}: {error}")
+    else:
+        delivery.last_error = error or "Unknown error"
+        if delivery.attempts >= current_app.config.get("DELIVERY_MAX_ATTEMPTS", 5):
+            delivery.status = DeliveryStatus.DEAD
+            delivery.next_attempt_at = None
+            logger.error(
+                f"Giving up on delivery {delivery.idempotency_key} "
+                f"after {delivery.attempts} attempts: {delivery.last_error}"
+            )
+        else:
+            delivery.status = DeliveryStatus.FAILED
+            delivery.next_attempt_at = now + timedelta(seconds=next_retry_delay(delivery.attempts))
+            logger.warning(
+                f"Delivery {delivery.idempotency_key} failed "
+                f"(attempt {delivery.attempts}), retrying at {delivery.next_attempt_at}"
+            )
+    if delivery.notification is not None:
+        _sync_notification(delivery)
+    db.session.commit()
+    return delivery
+
+
+def _sync_notification(delivery):
+    """Mirror a delivery's latest outcome onto its Notification record."""
+    notification = delivery.notification
+    notification.sent = delivery.status == DeliveryStatus.SENT
+    notification.sent_at = delivery.sent_at
+    notification.error = delivery.last_error
+
+
+def deliver(user, notification_type, channel, payload, week_start=None, timesheet_id=None, occurrence=None):
+    """
+    Send a notification once per idempotency key.
+
+    Commits the session: the delivery is recorded before sending, and its
+    outcome after.
+
+    Args:
+        user: Recipient User
+        notification_type: NotificationType value
+        channel: DeliveryChannel value
+        payload: JSON-serializable description of what to send
+            - email: recipients, subject, template, context
+            - sms: phone, message
+            - teams: card, fallback_text
+        week_start: Week the notification is about
+        timesheet_id: Related timesheet, if any
+        occurrence: See delivery_key()
+
+    Returns:
+        NotificationDelivery: The attempted delivery, or None if this key
+            was already delivered (or is being delivered or retried)
+    """
+    key = delivery_key(notification_type, user.id, week_start, channel, occurrence)
+    delivery = NotificationDelivery(
+        idempotency_key=key,
+        user_id=user.id,
+        timesheet_id=timesheet_id,
+        type=notification_type,
+        channel=channel,
+        week_start=week_start,
+        status=DeliveryStatus.SENDING,
+        attempts=0,
+        next_attempt_at=_lease_until(datetime.utcnow()),
+        payload=payload,
+    )
+    try:
+        with db.session.begin_nested():
+            db.session.add(delivery)
+    except IntegrityError:
+        logger.info(f"Skipping duplicate delivery {key}")
+        return None
+    db.session.commit()
+
+    return _attempt(delivery)
+
+
+def claim_due_deliveries(limit: int):
+    """
+    Lease up to `limit` deliveries that are due for a retry (commits).
+
+    Rows locked by another worker's claim are skipped rather than waited on.
+    """
+    now = datetime.utcnow()
+    due = (
+        NotificationDelivery.query.filter(
+            NotificationDelivery.status.in_([DeliveryStatus.FAILED, DeliveryStatus.SENDING]),
+            NotificationDelivery.next_attempt_at <= now,
+        )
+        .order_by(NotificationDelivery.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    lease = _lease_until(now)
+    for delivery in due:
+        delivery.status = DeliveryStatus.SENDING
+        delivery.next_attempt_at = lease
+    db.session.commit()
+    return due
+
+
+def retry_due_deliveries(limit: int = None) -> dict:
+    """
+    Retry failed deliveries whose backoff has elapsed.
+
+    Args:
+        limit: Max deliveries to retry (default: DELIVERY_RETRY_BATCH)
+
+    Returns:
+        dict: Counts of claimed, sent, failed (will retry), dead and
+            skipped deliveries
+    """
+    if limit is None:
+        limit = current_app.config.get("DELIVERY_RETRY_BATCH", 100)
+
+    result = {"claimed": 0, "sent": 0, "failed": 0, "dead": 0, "skipped": 0}
+    for delivery in claim_due_deliveries(limit):
+        result["claimed"] += 1
+        status = _attempt(delivery).status
+        if status == DeliveryStatus.SENT:
+            result["sent"] += 1
+        elif status == DeliveryStatus.DEAD:
+            result["dead"] += 1
+        elif status == DeliveryStatus.SKIPPED:
+            result["skipped"] += 1
+        else:
+            result["failed"] += 1
+    return result
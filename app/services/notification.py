@@ -5,13 +5,23 @@ Handles sending SMS notifications for timesheet events.
 Creates notification records and sends via Twilio.
 """
 
-from datetime import datetime
+import hashlib
+from datetime import date, datetime
 from flask import current_app
-from ..models import Notification, NotificationType, User
+from ..models import (
+    AdminDigestItem,
+    DeliveryChannel,
+    DeliveryStatus,
+    Notification,
+    NotificationType,
+    User,
+)
 from ..extensions import db
+from .deliveries import deliver
 from ..utils.sms import send_sms, format_phone_number
-from ..utils.email import send_template_email
+from ..utils.email import send_template_email, send_template_email_batch
 from ..utils.teams import (
+    build_admin_digest_card,
     build_admin_submission_card,
     build_timesheet_card,
     send_card_to_user,
@@ -184,8 +194,12 @@ class NotificationService:
             user: The User object to remind
             week_start: The date of week start
 
+        Each channel is delivered once per user and week (see
+        services/deliveries.py), so rerunning the weekly job is safe.
+
         Returns:
-            Notification: The created notification record
+            Notification: The created notification record, or None if no
+                SMS was sent (opted out, or already sent this week)
         """
         # Email notification (REQ-011)
         NotificationService._send_reminder_email(user, week_start)
@@ -204,27 +218,17 @@ class NotificationService:
         week_str = week_start.strftime("%b %d")
         message = f"📋 Reminder: Don't forget to submit your timesheet for week of {week_str}!"
 
-        # Create notification record
-        notification = Notification(
-            user_id=user.id,
-            timesheet_id=None,
-            type=NotificationType.REMINDER,
-            message=message,
+        delivery = deliver(
+            user,
+            NotificationType.REMINDER,
+            DeliveryChannel.SMS,
+            {"phone": phone, "message": message},
+            week_start=week_start,
         )
-        db.session.add(notification)
-
-        # Send SMS
-        result = send_sms(phone, message)
-
-        if result.get("success"):
-            notification.sent = True
-            notification.sent_at = datetime.utcnow()
-        else:
-            notification.sent = False
-            notification.error = result.get("error", "Unknown error")
+        if delivery is None:
+            return None
 
-        db.session.commit()
-        return notification
+        return NotificationService._record_sms(user, NotificationType.REMINDER, message, delivery)
 
     @staticmethod
     def notify_unsubmitted(user, week_start):
@@ -238,6 +242,9 @@ class NotificationService:
             user: The User object to remind
             week_start: The date of the unsubmitted week (previous week's Sunday)
 
+        Each channel is delivered once per user and day (see
+        services/deliveries.py), so rerunning the daily job is safe.
+
         Returns:
             Notification: The created notification record, or None if not sent
         """
@@ -269,31 +276,52 @@ class NotificationService:
             f"Open in Timesheets App: {app_url}"
         )
 
-        # Create notification record
-        notification = Notification(
-            user_id=user.id,
-            timesheet_id=None,
-            type=NotificationType.UNSUBMITTED,
-            message=message,
+        delivery = deliver(
+            user,
+            NotificationType.UNSUBMITTED,
+            DeliveryChannel.SMS,
+            {"phone": phone, "message": message},
+            week_start=week_start,
+            occurrence=date.today().isoformat(),
         )
-        db.session.add(notification)
-
-        # Send SMS
-        result = send_sms(phone, message)
+        if delivery is None:
+            current_app.logger.info(
+                f"SMS skipped for {user.email}: already reminded today"
+            )
+            return None
 
-        if result.get("success"):
-            notification.sent = True
-            notification.sent_at = datetime.utcnow()
+        notification = NotificationService._record_sms(
+            user, NotificationType.UNSUBMITTED, message, delivery
+        )
+        if notification.sent:
             current_app.logger.info(
                 f"Unsubmitted reminder sent to {user.email} ({phone})"
             )
         else:
-            notification.sent = False
-            notification.error = result.get("error", "Unknown error")
             current_app.logger.error(
                 f"Failed to send unsubmitted reminder to {user.email}: {notification.error}"
             )
+        return notification
 
+    @staticmethod
+    def _record_sms(user, notification_type, message, delivery):
+        """
+        Create the SMS notification record for a ledger delivery.
+
+        The record is linked to the delivery, so retries of the delivery
+        update it (see services/deliveries.py).
+        """
+        notification = Notification(
+            user_id=user.id,
+            timesheet_id=delivery.timesheet_id,
+            type=notification_type,
+            message=message,
+            sent=delivery.status == DeliveryStatus.SENT,
+            sent_at=delivery.sent_at,
+            error=delivery.last_error,
+        )
+        db.session.add(notification)
+        delivery.notification = notification
         db.session.commit()
         return notification
 
@@ -301,6 +329,9 @@ class NotificationService:
     def notify_admin_new_submission(timesheet):
         """
         Notify admins when a new timesheet is submitted (REQ-011).
+
+        With ADMIN_DIGEST_ENABLED the submission is queued for each admin's
+        next digest instead of being sent right away.
         """
         from ..models import UserRole
 
@@ -309,6 +340,9 @@ class NotificationService:
             current_app.logger.info("Email admin notification skipped: no admins found")
             return None
 
+        if current_app.config.get("ADMIN_DIGEST_ENABLED", False):
+            return NotificationService._queue_admin_digest(timesheet, admins)
+
         week_str = timesheet.week_start.strftime("%b %d, %Y")
         totals = timesheet.calculate_totals()
         field_hours = sum(
@@ -317,14 +351,15 @@ class NotificationService:
         has_field_hours = field_hours > 0
         has_attachments = timesheet.attachments.count() > 0
 
-        for admin in admins:
-            if not admin.email_opt_in:
-                continue
-            recipients = admin.get_notification_emails()
-            if not recipients:
-                continue
-            send_template_email(
-                recipients,
+        # Every admin gets the same message, so it is rendered once
+        messages = [
+            (admin.get_notification_emails(), {})
+            for admin in admins
+            if admin.email_opt_in and admin.get_notification_emails()
+        ]
+        if messages:
+            send_template_email_batch(
+                messages,
                 subject=f"New Timesheet Submitted ({week_str})",
                 template_name="admin_new_submission",
                 year=datetime.utcnow().year,
@@ -344,6 +379,163 @@ class NotificationService:
 
         return True
 
+    @staticmethod
+    def _queue_admin_digest(timesheet, admins):
+        """
+        Queue a submission for each admin's digest.
+
+        Admins with ADMIN_DIGEST_MAX_ITEMS submissions waiting are flushed
+        now rather than at the next scheduled run.
+        """
+        from sqlalchemy import func
+
+        admin_ids = [admin.id for admin in admins if admin.email_opt_in or admin.teams_opt_in]
+        if not admin_ids:
+            return True
+
+        already_queued = {
+            row.admin_id
+            for row in AdminDigestItem.query.filter(
+                AdminDigestItem.timesheet_id == timesheet.id,
+                AdminDigestItem.admin_id.in_(admin_ids),
+            ).with_entities(AdminDigestItem.admin_id)
+        }
+        for admin_id in admin_ids:
+            if admin_id not in already_queued:
+                db.session.add(AdminDigestItem(admin_id=admin_id, timesheet_id=timesheet.id))
+        db.session.commit()
+
+        max_items = current_app.config.get("ADMIN_DIGEST_MAX_ITEMS", 25)
+        full = [
+            admin_id
+            for admin_id, in db.session.query(AdminDigestItem.admin_id)
+            .filter(AdminDigestItem.admin_id.in_(admin_ids))
+            .group_by(AdminDigestItem.admin_id)
+            .having(func.count(AdminDigestItem.id) >= max_items)
+        ]
+        if full:
+            from ..jobs import enqueue_admin_digest_flush
+            enqueue_admin_digest_flush(full)
+        return True
+
+    @staticmethod
+    def _digest_row(timesheet):
+        totals = timesheet.calculate_totals()
+        field_hours = sum(
+            float(e.hours) for e in timesheet.entries if e.hour_type == "Field"
+        )
+        return {
+            "user_name": timesheet.user.display_name if timesheet.user else "Unknown",
+            "user_email": timesheet.user.email if timesheet.user else "",
+            "week_start": timesheet.week_start.strftime("%b %d, %Y"),
+            "total_hours": float(totals["total"]),
+            "field_hours": float(field_hours),
+            "traveled": timesheet.traveled,
+            "attachment_count": timesheet.attachments.count(),
+        }
+
+    @staticmethod
+    def flush_admin_digests(admin_ids=None):
+        """
+        Send each admin one email and one Teams card listing their queued
+        submissions.
+
+        An admin's items are deleted (and committed) before sending, so a
+        concurrent flush cannot send the same digest twice. The digest is
+        then sent through the delivery ledger, keyed by the admin and the
+        claimed items, so a failed send is retried by
+        retry_due_deliveries() rather than lost with its items.
+
+        Args:
+            admin_ids: Admins to flush (default: every admin with items)
+
+        Returns:
+            dict: Counts of admins, submissions, emails and cards sent
+        """
+        query = AdminDigestItem.query.order_by(AdminDigestItem.created_at)
+        if admin_ids is not None:
+            query = query.filter(AdminDigestItem.admin_id.in_(admin_ids))
+
+        by_admin = {}
+        for item in query.all():
+            by_admin.setdefault(item.admin_id, []).append(item)
+
+        result = {"admins": 0, "submissions": 0, "emails": 0, "cards": 0}
+        if not by_admin:
+            return result
+
+        rows = {}
+        digests = []
+        for admin_id, items in by_admin.items():
+            claimed = AdminDigestItem.query.filter(
+                AdminDigestItem.id.in_([item.id for item in items])
+            ).delete(synchronize_session=False)
+            if claimed != len(items):
+                # Another flush got here first; it sends this digest
+                db.session.rollback()
+                continue
+
+            timesheet_ids = []
+            for item in items:
+                if item.timesheet is None:
+                    continue
+                if item.timesheet_id not in rows:
+                    rows[item.timesheet_id] = NotificationService._digest_row(item.timesheet)
+                timesheet_ids.append(item.timesheet_id)
+            occurrence = hashlib.sha256(
+                ",".join(sorted(item.id for item in items)).encode()
+            ).hexdigest()[:32]
+            admin = item.admin
+            db.session.commit()
+            if timesheet_ids and admin is not None:
+                digests.append((admin, tuple(timesheet_ids), occurrence))
+
+        app_url = current_app.config.get("APP_URL", "http://localhost/app")
+        year = datetime.utcnow().year
+        cards = {}
+        for admin, timesheet_ids, occurrence in digests:
+            result["admins"] += 1
+            result["submissions"] += len(timesheet_ids)
+            submissions = [rows[t] for t in timesheet_ids]
+
+            recipients = admin.get_notification_emails() if admin.email_opt_in else None
+            if recipients:
+                noun = "Timesheet" if len(timesheet_ids) == 1 else "Timesheets"
+                delivery = deliver(
+                    admin,
+                    NotificationType.ADMIN_DIGEST,
+                    DeliveryChannel.EMAIL,
+                    {
+                        "recipients": recipients,
+                        "subject": f"{len(timesheet_ids)} New {noun} Submitted",
+                        "template": "admin_submission_digest",
+                        "context": {"year": year, "app_url": app_url, "submissions": submissions},
+                    },
+                    occurrence=occurrence,
+                )
+                if delivery is not None and delivery.status == DeliveryStatus.SENT:
+                    result["emails"] += 1
+
+            if admin.teams_opt_in:
+                # Admins usually share one digest, so build its card once
+                if timesheet_ids not in cards:
+                    cards[timesheet_ids] = build_admin_digest_card(submissions, app_url)
+                delivery = deliver(
+                    admin,
+                    NotificationType.ADMIN_DIGEST,
+                    DeliveryChannel.TEAMS,
+                    {
+                        "card": cards[timesheet_ids],
+                        "fallback_text": f"{len(timesheet_ids)} new timesheets submitted",
+                    },
+                    occurrence=occurrence,
+                )
+                if delivery is not None and delivery.status == DeliveryStatus.SENT:
+                    result["cards"] += 1
+
+        current_app.logger.info(f"Admin digests flushed: {result}")
+        return result
+
     @staticmethod
     def _send_approval_email(timesheet):
         user = timesheet.user
@@ -404,13 +596,21 @@ class NotificationService:
 
         week_str = week_start.strftime("%b %d, %Y")
 
-        return send_template_email(
-            recipients,
-            subject=f"Timesheet Reminder ({week_str})",
-            template_name="reminder",
-            year=datetime.utcnow().year,
-            app_url=current_app.config.get("APP_URL", "http://localhost/app"),
-            week_start=week_str,
+        return deliver(
+            user,
+            NotificationType.REMINDER,
+            DeliveryChannel.EMAIL,
+            {
+                "recipients": recipients,
+                "subject": f"Timesheet Reminder ({week_str})",
+                "template": "reminder",
+                "context": {
+                    "year": datetime.utcnow().year,
+                    "app_url": current_app.config.get("APP_URL", "http://localhost/app"),
+                    "week_start": week_str,
+                },
+            },
+            week_start=week_start,
         )
 
     @staticmethod
@@ -424,13 +624,22 @@ class NotificationService:
 
         week_str = week_start.strftime("%b %d, %Y")
 
-        return send_template_email(
-            recipients,
-            subject=f"Timesheet Past Due ({week_str})",
-            template_name="unsubmitted",
-            year=datetime.utcnow().year,
-            app_url=current_app.config.get("APP_URL", "http://localhost/app"),
-            week_start=week_str,
+        return deliver(
+            user,
+            NotificationType.UNSUBMITTED,
+            DeliveryChannel.EMAIL,
+            {
+                "recipients": recipients,
+                "subject": f"Timesheet Past Due ({week_str})",
+                "template": "unsubmitted",
+                "context": {
+                    "year": datetime.utcnow().year,
+                    "app_url": current_app.config.get("APP_URL", "http://localhost/app"),
+                    "week_start": week_str,
+                },
+            },
+            week_start=week_start,
+            occurrence=date.today().isoformat(),
         )
 
     @staticmethod
@@ -479,7 +688,13 @@ class NotificationService:
             ["Please submit your timesheet."],
             current_app.config.get("APP_URL", "http://localhost/app"),
         )
-        return send_card_to_user(user, card, f"Timesheet reminder ({week_str})")
+        return deliver(
+            user,
+            NotificationType.REMINDER,
+            DeliveryChannel.TEAMS,
+            {"card": card, "fallback_text": f"Timesheet reminder ({week_str})"},
+            week_start=week_start,
+        )
 
     @staticmethod
     def _send_unsubmitted_teams(user, week_start):
@@ -493,7 +708,14 @@ class NotificationService:
             ["Your timesheet is past due. Please submit as soon as possible."],
             current_app.config.get("APP_URL", "http://localhost/app"),
         )
-        return send_card_to_user(user, card, f"Timesheet past due ({week_str})")
+        return deliver(
+            user,
+            NotificationType.UNSUBMITTED,
+            DeliveryChannel.TEAMS,
+            {"card": card, "fallback_text": f"Timesheet past due ({week_str})"},
+            week_start=week_start,
+            occurrence=date.today().isoformat(),
+        )
 
     @staticmethod
     def _send_admin_submission_teams(timesheet, admins):
@@ -0,0 +1,204 @@
+"""
+Attachment Archives
+
+Builds ZIP archives of timesheet attachments for payroll, organized as
+<employee>/<week start>/<file>.
+
+The archive is produced incrementally: zipfile writes into an unseekable
+sink (so it emits data descriptors instead of seeking back), and each
+attachment is copied from the storage backend chunk by chunk. Neither the
+archive nor any single attachment is held in memory in full, whether the
+archive is streamed to the client or written back to storage by the
+background job.
+
+Members are stored uncompressed: receipts are JPEG/PNG/PDF, which are
+already compressed, so deflating them costs CPU for little gain.
+"""
+
+import io
+import logging
+import zipfile
+from datetime import datetime
+from werkzeug.utils import secure_filename
+
+logger = logging.getLogger(__name__)
+
+MISSING_FILES_NAME = "MISSING_FILES.txt"
+
+
+class _ZipSink(io.RawIOBase):
+    """Unseekable write target whose contents are drained after each write."""
+
+    def __init__(self):
+        super().__init__()
+        self._buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+class IterableReader(io.RawIOBase):
+    """Readable file-like view over an iterator of byte chunks."""
+
+    def __init__(self, chunks):
+        super().__init__()
+        self._chunks = iter(chunks)
+        self._pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            try:
+                self._pending = next(self._chunks)
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def _unique_path(path: str, used: set) -> str:
+    candidate = path
+    stem, dot, ext = path.rpartition(".")
+    if not dot:
+        stem, ext = path, ""
+    counter = 2
+    while candidate in used:
+        candidate = f"{stem} ({counter}).{ext}" if ext else f"{stem} ({counter})"
+        counter += 1
+    used.add(candidate)
+    return candidate
+
+
+def collect_archive_entries(timesheets) -> list:
+    """
+    Map the attachments of the given timesheets to archive paths.
+
+    Attachments are loaded in one query. Entries are plain dicts so they
+    can be passed to a background job.
+
+    Args:
+        timesheets: Timesheets (with users loaded) in archive order
+
+    Returns:
+        list: Dicts with "path", "key", "size" and "uploaded_at"
+    """
+    from ..models import Attachment
+
+    if not timesheets:
+        return []
+
+    by_timesheet = {}
+    attachments = (
+        Attachment.query.filter(Attachment.timesheet_id.in_([ts.id for ts in timesheets]))
+        .order_by(Attachment.uploaded_at)
+        .all()
+    )
+    for attachment in attachments:
+        by_timesheet.setdefault(attachment.timesheet_id, []).append(attachment)
+
+    entries = []
+    used_paths = set()
+    for timesheet in timesheets:
+        employee = ""
+        if timesheet.user:
+            employee = secure_filename(timesheet.user.display_name or timesheet.user.email)
+        folder = f"{employee or timesheet.user_id}/{timesheet.week_start.isoformat()}"
+
+        for attachment in by_timesheet.get(timesheet.id, []):
+            name = secure_filename(attachment.original_filename) or attachment.filename
+            entries.append({
+                "path": _unique_path(f"{folder}/{name}", used_paths),
+                "key": attachment.filename,
+                "size": attachment.file_size,
+                "uploaded_at": attachment.uploaded_at.isoformat(),
+            })
+    return entries
+
+
+def _zip_timestamp(uploaded_at: str):
+    moment = datetime.fromisoformat(uploaded_at)
+    return max(moment, datetime(1980, 1, 1)).timetuple()[:6]
+
+
+def iter_attachment_archive(entries, backend, progress=None):
+    """
+    Generate a ZIP archive of attachments as a stream of byte chunks.
+
+    Attachments missing from storage are skipped and listed in
+    MISSING_FILES.txt at the end of the archive.
+
+    Args:
+        entries: Entries from collect_archive_entries()
+        backend: StorageBackend to read attachments from
+        progress: Optional callable(files_done) invoked after each file
+
+    Yields:
+        bytes: Archive data
+    """
+    sink = _ZipSink()
+    missing = []
+
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        for index, entry in enumerate(entries, start=1):
+            try:
+                chunks = backend.get_stream(entry["key"])
+            except FileNotFoundError:
+                logger.warning(f"Archive skipping missing attachment {entry['key']}")
+                missing.append(entry["path"])
+                continue
+
+            info = zipfile.ZipInfo(entry["path"], date_time=_zip_timestamp(entry["uploaded_at"]))
+            with archive.open(info, mode="w") as member:
+                for chunk in chunks:
+                    member.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+
+            data = sink.drain()
+            if data:
+                yield data
+            if progress:
+                progress(index)
+
+        if missing:
+            archive.writestr(MISSING_FILES_NAME, "\n".join(missing) + "\n")
+
+    yield sink.drain()
+
+
+def write_attachment_archive(entries, key: str, progress=None) -> dict:
+    """
+    Build an archive and store it through the storage backend.
+
+    Args:
+        entries: Entries from collect_archive_entries()
+        key: Storage key for the archive
+        progress: Optional callable(files_done)
+
+    Returns:
+        dict: {"key", "size", "files"}
+    """
+    from .storage import get_storage_backend
+
+    backend = get_storage_backend()
+    stored = backend.save_stream(
+        IterableReader(iter_attachment_archive(entries, backend, progress)),
+        "attachments.zip",
+        "application/zip",
+        key=key,
+    )
+    return {"key": stored["key"], "size": stored["size"], "files": len(entries)}
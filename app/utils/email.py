@@ -1,13 +1,86 @@
 """
 Email utility helpers (REQ-011).
+
+Email templates live in templates/email/ as <name>.html with an optional
+<name>.txt. Each app resolves a template's variants once and keeps the
+compiled templates; without a .txt variant, the plain-text part is
+derived from the HTML.
+
+For many recipients, render_template_email_batch renders the template
+once per distinct per-recipient context.
 """
 
+import html
 import re
 import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 
-from flask import current_app, render_template
+from flask import current_app
+from jinja2 import TemplateNotFound
+
+_HEAD_RE = re.compile(r"<(head|style|script)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def html_to_text(html_content: str) -> str:
+    """Plain-text fallback for an HTML email."""
+    text = _HEAD_RE.sub(" ", html_content)
+    text = html.unescape(_TAG_RE.sub(" ", text))
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+class EmailTemplate:
+    """Compiled HTML and (optional) text variants of an email template."""
+
+    def __init__(self, env, name: str):
+        self.name = name
+        self.html = env.get_template(f"email/{name}.html")
+        try:
+            self.text = env.get_template(f"email/{name}.txt")
+        except TemplateNotFound:
+            self.text = None
+        # Identical renders (e.g. a reminder blast) reuse the last conversion
+        self._last_text = (None, None)
+
+    @property
+    def is_up_to_date(self) -> bool:
+        return self.html.is_up_to_date and (self.text is None or self.text.is_up_to_date)
+
+    def text_for(self, context: dict, html_content: str) -> str:
+        if self.text is not None:
+            return self.text.render(context)
+        last_html, last_text = self._last_text
+        if html_content != last_html:
+            last_text = html_to_text(html_content)
+            self._last_text = (html_content, last_text)
+        return last_text
+
+    def render(self, context: dict):
+        """Render (html, text) for one message."""
+        html_content = self.html.render(context)
+        return html_content, self.text_for(context, html_content)
+
+
+def get_email_template(name: str) -> EmailTemplate:
+    """
+    Get the cached EmailTemplate for this app.
+
+    Raises:
+        TemplateNotFound: If there is no <name>.html template
+    """
+    cache = current_app.extensions.setdefault("email_templates", {})
+    template = cache.get(name)
+    if template is None or (current_app.jinja_env.auto_reload and not template.is_up_to_date):
+        template = cache[name] = EmailTemplate(current_app.jinja_env, name)
+    return template
+
+
+def _template_context(context: dict) -> dict:
+    context = dict(context)
+    current_app.update_template_context(context)
+    return context
 
 
 def _normalize_recipients(to_email):
@@ -62,8 +135,7 @@ def send_email(to_email, subject, html_content, text_content=None):
     use_ssl = current_app.config.get("SMTP_USE_SSL", False)
 
     if not text_content:
-        text_content = re.sub(r"<[^>]+>", " ", html_content)
-        text_content = re.sub(r"\s+", " ", text_content).strip()
+        text_content = html_to_text(html_content)
 
     msg = MIMEMultipart("alternative")
     msg["Subject"] = subject
@@ -102,17 +174,65 @@ def send_email(to_email, subject, html_content, text_content=None):
 
 def send_template_email(to_email, subject, template_name, **template_context):
     try:
-        html_content = render_template(
-            f"email/{template_name}.html", **template_context
-        )
-        try:
-            text_content = render_template(
-                f"email/{template_name}.txt", **template_context
-            )
-        except Exception:
-            text_content = None
-
+        template = get_email_template(template_name)
+        html_content, text_content = template.render(_template_context(template_context))
         return send_email(to_email, subject, html_content, text_content)
     except Exception as exc:
         current_app.logger.error("Email template error: %s", exc)
         return {"success": False, "error": str(exc)}
+
+
+def render_template_email_batch(template_name, contexts, **shared_context) -> list:
+    """
+    Render one email template for many recipients.
+
+    Each recipient gets a full render of the cached template. Recipients
+    with the same per-recipient context share one render, so a message
+    that is identical for everyone (e.g. an admin notice) is rendered once.
+
+    Args:
+        template_name: Template name under templates/email/
+        contexts: Per-recipient dicts
+        **shared_context: Values common to every message
+
+    Returns:
+        list: (html, text) per context, in order
+    """
+    template = get_email_template(template_name)
+    rendered = []
+    last_context, last_render = None, None
+    for context in contexts:
+        if last_render is None or context != last_context:
+            last_context = context
+            last_render = template.render(_template_context({**shared_context, **context}))
+        rendered.append(last_render)
+    return rendered
+
+
+def send_template_email_batch(messages, subject, template_name, **shared_context) -> list:
+    """
+    Send one email template to many recipients (see
+    render_template_email_batch).
+
+    Args:
+        messages: Iterable of (to_email, per-recipient context dict)
+        subject: Subject line for every message
+        template_name: Template name under templates/email/
+        **shared_context: Values common to every message
+
+    Returns:
+        list: send_email() result per message, in order
+    """
+    messages = list(messages)
+    try:
+        rendered = render_template_email_batch(
+            template_name, [context for _, context in messages], **shared_context
+        )
+    except Exception as exc:
+        current_app.logger.error("Email template error: %s", exc)
+        return [{"success": False, "error": str(exc)} for _ in messages]
+
+    return [
+        send_email(to_email, subject, html_content, text_content)
+        for (to_email, _), (html_content, text_content) in zip(messages, rendered)
+    ]
@@ -8,19 +8,79 @@ Features:
 - X-Request-ID generation and propagation
 - Request duration tracking
 - Error rate monitoring
+- Database connection pool checkout metrics
+- Latency histograms per route template with p50/p95/p99
+- Cross-worker aggregation through Redis and Prometheus text output
+- Per-request SQL statement count and database time
+- Non-blocking log output through a queue listener thread
 """
 
+import atexit
+import bisect
+import copy
 import time
+from collections import OrderedDict, deque
 import json
 import logging
+import os
+import queue
+import socket
+import threading
 import uuid
 from functools import wraps
-from flask import request, g, session, current_app
+from logging.handlers import QueueHandler, QueueListener
+from flask import request, g, session, current_app, has_request_context
+from sqlalchemy import event, exc as sa_exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+try:
+    import orjson
+except ImportError:  # Optional speedup; falls back to json
+    orjson = None
 
 
 # ============================================================================
 # JSON Formatter for Structured Logging
 # ============================================================================
+def _dumps(data):
+    """Serialize a log entry, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(data, default=str)
+
+
+def _request_log_context():
+    """
+    Get the request fields added to every log entry.
+    
+    Computed once per request and cached in g (after the request ID has
+    been assigned), so each log call doesn't re-read request/session.
+    Returns an empty dict outside a request.
+    """
+    if not has_request_context():
+        return {}
+    
+    context = g.get("log_context")
+    if context is not None:
+        return context
+    
+    context = {
+        "path": request.path,
+        "method": request.method,
+        "remote_addr": request.remote_addr,
+    }
+    user = session.get("user")
+    if user:
+        context["user_id"] = user.get("id")
+        context["user_email"] = user.get("email")
+    
+    if hasattr(g, "request_id"):
+        context["request_id"] = g.request_id
+        g.log_context = context
+    return context
+
+
 class JSONFormatter(logging.Formatter):
     """
     Custom formatter that outputs logs as JSON objects.
@@ -36,6 +96,9 @@ class JSONFormatter(logging.Formatter):
     - logger: Logger name
     - module: Module where log was generated
     - Additional fields from extra dict
+    
+    Records that went through ContextQueueHandler carry their request
+    context with them, since the listener thread has no request context.
     """
     
     def format(self, record):
@@ -49,21 +112,10 @@ class JSONFormatter(logging.Formatter):
         }
         
         # Add request context if available
-        try:
-            if hasattr(g, 'request_id'):
-                log_data["request_id"] = g.request_id
-            
-            if request:
-                log_data["path"] = request.path
-                log_data["method"] = request.method
-                log_data["remote_addr"] = request.remote_addr
-            
-            if session and "user" in session:
-                log_data["user_id"] = session["user"].get("id")
-                log_data["user_email"] = session["user"].get("email")
-        except RuntimeError:
-            # Outside of request context
-            pass
+        context = getattr(record, 'log_context', None)
+        if context is None:
+            context = _request_log_context()
+        log_data.update(context)
         
         # Add any extra fields
         if hasattr(record, 'extra_fields'):
@@ -73,7 +125,7 @@ class JSONFormatter(logging.Formatter):
         if record.exc_info:
             log_data["exception"] = self.formatException(record.exc_info)
         
-        return json.dumps(log_data)
+        return _dumps(log_data)
 
 
 class ContextFilter(logging.Filter):
@@ -84,18 +136,144 @@ class ContextFilter(logging.Filter):
         if not hasattr(record, 'extra_fields'):
             record.extra_fields = {}
         
-        try:
+        if has_request_context():
             if hasattr(g, 'request_id'):
                 record.extra_fields['request_id'] = g.request_id
             if hasattr(g, 'request_start_time'):
                 elapsed = time.time() - g.request_start_time
                 record.extra_fields['elapsed_ms'] = round(elapsed * 1000, 2)
-        except RuntimeError:
-            pass
         
         return True
 
 
+# ============================================================================
+# Non-blocking Log Handler
+# ============================================================================
+class ContextQueueHandler(QueueHandler):
+    """
+    QueueHandler that snapshots request context before handing off.
+    
+    Only the cheap part (capturing the cached request context) runs on the
+    request's greenlet; JSON encoding and stream writes happen in the
+    QueueListener thread. When the queue is full, records are dropped and
+    counted instead of blocking the request.
+    """
+    
+    dropped = 0
+    
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.log_context = _request_log_context()
+        # Render the message now; args may be request-bound objects
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+    
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            ContextQueueHandler.dropped += 1
+
+
+# One listener thread per process, shared by every app instance
+_log_queue_state = {"pid": None, "handler": None, "listener": None}
+
+
+def _get_queue_log_handler(maxsize):
+    """Get this process's queue handler, starting its listener if needed."""
+    # A listener thread started before a fork doesn't exist in the child
+    if _log_queue_state["pid"] != os.getpid():
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(JSONFormatter())
+        
+        log_queue = queue.Queue(maxsize=maxsize)
+        queue_handler = ContextQueueHandler(log_queue)
+        queue_handler.addFilter(ContextFilter())
+        
+        listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        
+        _log_queue_state.update(
+            {"pid": os.getpid(), "handler": queue_handler, "listener": listener}
+        )
+    return _log_queue_state["handler"]
+
+
+# ============================================================================
+# Latency Histograms
+# ============================================================================
+# Fixed bucket upper bounds in milliseconds. Fixed buckets keep per-route
+# memory constant and let histograms from different workers be added.
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram.
+    
+    counts[i] holds observations <= LATENCY_BUCKETS_MS[i]; the last slot
+    holds everything slower than the largest bound (+Inf).
+    """
+    
+    def __init__(self, counts=None, count=0, sum_ms=0):
+        self.counts = list(counts) if counts else [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = count
+        self.sum_ms = sum_ms
+    
+    def observe(self, duration_ms):
+        """Add one observation."""
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, duration_ms)] += 1
+        self.count += 1
+        self.sum_ms += duration_ms
+    
+    def merge(self, other):
+        """Add another histogram's observations into this one."""
+        for i, bucket_count in enumerate(other.counts):
+            self.counts[i] += bucket_count
+        self.count += other.count
+        self.sum_ms += other.sum_ms
+    
+    def percentile(self, q):
+        """
+        Estimate the q-th percentile (0-100) in milliseconds.
+        
+        Interpolates linearly inside the bucket holding the target rank.
+        Observations in the +Inf bucket report the largest finite bound.
+        """
+        if self.count == 0:
+            return 0
+        
+        rank = self.count * q / 100
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                if i == len(LATENCY_BUCKETS_MS):
+                    break
+                lower = LATENCY_BUCKETS_MS[i - 1] if i > 0 else 0
+                upper = LATENCY_BUCKETS_MS[i]
+                fraction = (rank - cumulative) / bucket_count
+                return round(lower + (upper - lower) * fraction, 2)
+            cumulative += bucket_count
+        return float(LATENCY_BUCKETS_MS[-1])
+    
+    def percentiles(self):
+        """Get p50/p95/p99 estimates."""
+        return {
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+    
+    def to_dict(self):
+        return {"counts": list(self.counts), "count": self.count, "sum_ms": self.sum_ms}
+    
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("counts"), data.get("count", 0), data.get("sum_ms", 0))
+
+
 # ============================================================================
 # Request Metrics
 # ============================================================================
@@ -106,93 +284,379 @@ class RequestMetrics:
     Metrics tracked:
     - Total requests
     - Requests by status code
-    - Request durations
+    - Latency histograms, overall and per route template
     - Error count
+    - Connection pool checkout waits, overflow usage and timeouts
+    - Access token cache hits, misses and proactive refreshes
+    
+    Updates are made under a lock so concurrent greenlets/threads in a
+    worker can share one instance. Counters are per process; snapshot()
+    returns a JSON-serializable copy that merge_snapshots() can combine
+    across gunicorn workers.
+    
+    Memory is bounded: the route table holds at most max_routes entries
+    (least recently used routes are evicted) and slow request samples
+    live in a fixed-size ring buffer.
     """
     
-    def __init__(self):
+    def __init__(self, max_routes=500, max_slow_requests=100):
+        self.max_routes = max_routes
+        self.max_slow_requests = max_slow_requests
+        self._lock = threading.Lock()
+        self._reset()
+    
+    def _reset(self):
         self.total_requests = 0
         self.requests_by_status = {}
-        self.requests_by_route = {}
+        self.requests_by_route = OrderedDict()  # LRU order, oldest first
+        self.evicted_routes = 0
         self.total_errors = 0
         self.total_duration_ms = 0
-        self.slow_requests = []  # Requests > 1 second
-        self._lock = None  # For thread safety if needed
+        self.latency = LatencyHistogram()
+        self.slow_requests = deque(maxlen=self.max_slow_requests)  # Requests > 1 second
+        self.pool_checkouts = 0
+        self.pool_wait_total_ms = 0
+        self.pool_wait_max_ms = 0
+        self.pool_overflow_checkouts = 0
+        self.pool_overflow_peak = 0
+        self.pool_timeouts = 0
+        self.token_cache = {}  # token kind -> {"hit": n, "miss": n, "refresh": n}
     
-    def record_request(self, path, method, status_code, duration_ms):
-        """Record a completed request."""
-        self.total_requests += 1
-        self.total_duration_ms += duration_ms
+    def record_request(
+        self, path, method, status_code, duration_ms, route=None, db_queries=0, db_time_ms=0
+    ):
+        """
+        Record a completed request.
         
-        # Track by status code
+        Args:
+            path: Raw request path (kept for slow request samples)
+            method: HTTP method
+            status_code: Response status code
+            duration_ms: Request duration
+            route: URL rule template (e.g. /api/timesheets/<timesheet_id>);
+                falls back to path when not given
+            db_queries: SQL statements executed by the request
+            db_time_ms: Time spent executing those statements
+        """
+        route_key = f"{method} {route or path}"
         status_key = str(status_code)
-        self.requests_by_status[status_key] = self.requests_by_status.get(status_key, 0) + 1
+        is_error = status_code >= 400
         
-        # Track by route
-        route_key = f"{method} {path}"
-        if route_key not in self.requests_by_route:
-            self.requests_by_route[route_key] = {"count": 0, "total_ms": 0}
-        self.requests_by_route[route_key]["count"] += 1
-        self.requests_by_route[route_key]["total_ms"] += duration_ms
-        
-        # Track errors
-        if status_code >= 400:
-            self.total_errors += 1
+        with self._lock:
+            self.total_requests += 1
+            self.total_duration_ms += duration_ms
+            self.latency.observe(duration_ms)
+            
+            # Track by status code
+            self.requests_by_status[status_key] = self.requests_by_status.get(status_key, 0) + 1
+            
+            # Track by route template
+            route_stats = self.requests_by_route.get(route_key)
+            if route_stats is None:
+                route_stats = {
+                    "count": 0, "total_ms": 0, "errors": 0,
+                    "db_queries": 0, "db_time_ms": 0, "latency": LatencyHistogram(),
+                }
+                self.requests_by_route[route_key] = route_stats
+                while len(self.requests_by_route) > self.max_routes:
+                    self.requests_by_route.popitem(last=False)
+                    self.evicted_routes += 1
+            else:
+                self.requests_by_route.move_to_end(route_key)
+            route_stats["count"] += 1
+            route_stats["total_ms"] += duration_ms
+            route_stats["db_queries"] += db_queries
+            route_stats["db_time_ms"] += db_time_ms
+            route_stats["latency"].observe(duration_ms)
+            
+            # Track errors
+            if is_error:
+                self.total_errors += 1
+                route_stats["errors"] += 1
+            
+            # Track slow requests (> 1 second); the deque drops the oldest
+            if duration_ms > 1000:
+                self.slow_requests.append({
+                    "path": path,
+                    "method": method,
+                    "duration_ms": duration_ms,
+                    "timestamp": time.time()
+                })
+    
+    def record_pool_checkout(self, wait_ms, overflow):
+        """
+        Record a connection checkout from the database pool.
         
-        # Track slow requests (> 1 second)
-        if duration_ms > 1000:
-            self.slow_requests.append({
-                "path": path,
-                "method": method,
-                "duration_ms": duration_ms,
-                "timestamp": time.time()
-            })
-            # Keep only last 100 slow requests
-            if len(self.slow_requests) > 100:
-                self.slow_requests = self.slow_requests[-100:]
+        Args:
+            wait_ms: Time spent waiting for a connection
+            overflow: Connections currently open beyond pool_size
+        """
+        with self._lock:
+            self.pool_checkouts += 1
+            self.pool_wait_total_ms += wait_ms
+            if wait_ms > self.pool_wait_max_ms:
+                self.pool_wait_max_ms = wait_ms
+            if overflow > 0:
+                self.pool_overflow_checkouts += 1
+                if overflow > self.pool_overflow_peak:
+                    self.pool_overflow_peak = overflow
     
-    def get_stats(self):
-        """Get current metrics summary."""
-        avg_duration = (
-            self.total_duration_ms / self.total_requests 
-            if self.total_requests > 0 else 0
-        )
-        error_rate = (
-            (self.total_errors / self.total_requests) * 100 
-            if self.total_requests > 0 else 0
-        )
+    def record_pool_timeout(self, wait_ms):
+        """Record a checkout that gave up after pool_timeout."""
+        with self._lock:
+            self.pool_timeouts += 1
+            if wait_ms > self.pool_wait_max_ms:
+                self.pool_wait_max_ms = wait_ms
+    
+    def record_token_cache(self, kind, outcome):
+        """
+        Record an access token cache lookup.
         
-        return {
-            "total_requests": self.total_requests,
-            "total_errors": self.total_errors,
-            "error_rate_percent": round(error_rate, 2),
-            "avg_duration_ms": round(avg_duration, 2),
-            "requests_by_status": self.requests_by_status,
-            "slow_request_count": len(self.slow_requests),
-            "top_routes": self._get_top_routes(10),
-        }
+        Args:
+            kind: Token kind (e.g. "graph", "bot")
+            outcome: "hit", "miss" or "refresh"
+        """
+        with self._lock:
+            counts = self.token_cache.setdefault(kind, {"hit": 0, "miss": 0, "refresh": 0})
+            counts[outcome] = counts.get(outcome, 0) + 1
     
-    def _get_top_routes(self, limit):
-        """Get top routes by request count."""
-        routes = [
-            {"route": k, "count": v["count"], "avg_ms": round(v["total_ms"] / v["count"], 2)}
-            for k, v in self.requests_by_route.items()
-        ]
-        return sorted(routes, key=lambda x: x["count"], reverse=True)[:limit]
+    def snapshot(self):
+        """Get a JSON-serializable copy of the raw counters."""
+        with self._lock:
+            return {
+                "total_requests": self.total_requests,
+                "total_errors": self.total_errors,
+                "total_duration_ms": self.total_duration_ms,
+                "requests_by_status": dict(self.requests_by_status),
+                "latency": self.latency.to_dict(),
+                "routes": {
+                    key: {
+                        "count": stats["count"],
+                        "total_ms": stats["total_ms"],
+                        "errors": stats["errors"],
+                        "db_queries": stats["db_queries"],
+                        "db_time_ms": stats["db_time_ms"],
+                        "latency": stats["latency"].to_dict(),
+                    }
+                    for key, stats in self.requests_by_route.items()
+                },
+                "evicted_routes": self.evicted_routes,
+                "slow_request_count": len(self.slow_requests),
+                "db_pool": {
+                    "checkouts": self.pool_checkouts,
+                    "wait_total_ms": self.pool_wait_total_ms,
+                    "wait_max_ms": self.pool_wait_max_ms,
+                    "overflow_checkouts": self.pool_overflow_checkouts,
+                    "overflow_peak": self.pool_overflow_peak,
+                    "timeouts": self.pool_timeouts,
+                },
+                "token_cache": {kind: dict(counts) for kind, counts in self.token_cache.items()},
+            }
+    
+    def get_pool_stats(self):
+        """Get connection pool checkout summary."""
+        return _summarize_pool(self.snapshot()["db_pool"])
+    
+    def get_stats(self):
+        """Get current metrics summary for this process."""
+        return summarize_snapshot(self.snapshot())
     
     def reset(self):
         """Reset all metrics."""
-        self.total_requests = 0
-        self.requests_by_status = {}
-        self.requests_by_route = {}
-        self.total_errors = 0
-        self.total_duration_ms = 0
-        self.slow_requests = []
+        with self._lock:
+            self._reset()
+
+
+def merge_snapshots(snapshots):
+    """
+    Combine RequestMetrics snapshots from several workers.
+    
+    Counters and histograms are summed; maxima take the largest value.
+    """
+    merged = {
+        "total_requests": 0,
+        "total_errors": 0,
+        "total_duration_ms": 0,
+        "requests_by_status": {},
+        "latency": LatencyHistogram(),
+        "routes": {},
+        "evicted_routes": 0,
+        "slow_request_count": 0,
+        "db_pool": {
+            "checkouts": 0,
+            "wait_total_ms": 0,
+            "wait_max_ms": 0,
+            "overflow_checkouts": 0,
+            "overflow_peak": 0,
+            "timeouts": 0,
+        },
+        "token_cache": {},
+    }
+    
+    for snapshot in snapshots:
+        for field in (
+            "total_requests", "total_errors", "total_duration_ms",
+            "evicted_routes", "slow_request_count",
+        ):
+            merged[field] += snapshot.get(field, 0)
+        
+        for status, count in snapshot.get("requests_by_status", {}).items():
+            merged["requests_by_status"][status] = merged["requests_by_status"].get(status, 0) + count
+        
+        merged["latency"].merge(LatencyHistogram.from_dict(snapshot.get("latency", {})))
+        
+        for key, stats in snapshot.get("routes", {}).items():
+            route = merged["routes"].setdefault(key, {
+                "count": 0, "total_ms": 0, "errors": 0,
+                "db_queries": 0, "db_time_ms": 0, "latency": LatencyHistogram(),
+            })
+            for field in ("count", "total_ms", "errors", "db_queries", "db_time_ms"):
+                route[field] += stats.get(field, 0)
+            route["latency"].merge(LatencyHistogram.from_dict(stats.get("latency", {})))
+        
+        pool = snapshot.get("db_pool", {})
+        for field in ("checkouts", "wait_total_ms", "overflow_checkouts", "timeouts"):
+            merged["db_pool"][field] += pool.get(field, 0)
+        for field in ("wait_max_ms", "overflow_peak"):
+            merged["db_pool"][field] = max(merged["db_pool"][field], pool.get(field, 0))
+        
+        for kind, counts in snapshot.get("token_cache", {}).items():
+            merged_counts = merged["token_cache"].setdefault(kind, {"hit": 0, "miss": 0, "refresh": 0})
+            for outcome, count in counts.items():
+                merged_counts[outcome] = merged_counts.get(outcome, 0) + count
+    
+    # Return plain data, like RequestMetrics.snapshot()
+    merged["latency"] = merged["latency"].to_dict()
+    for route in merged["routes"].values():
+        route["latency"] = route["latency"].to_dict()
+    return merged
+
+
+def _summarize_pool(pool):
+    checkouts = pool.get("checkouts", 0)
+    avg_wait = pool.get("wait_total_ms", 0) / checkouts if checkouts > 0 else 0
+    return {
+        "checkouts": checkouts,
+        "avg_wait_ms": round(avg_wait, 2),
+        "max_wait_ms": round(pool.get("wait_max_ms", 0), 2),
+        "overflow_checkouts": pool.get("overflow_checkouts", 0),
+        "overflow_peak": pool.get("overflow_peak", 0),
+        "timeouts": pool.get("timeouts", 0),
+    }
+
+
+def summarize_snapshot(snapshot, top_routes=10):
+    """Turn a raw (or merged) snapshot into the /metrics JSON summary."""
+    total_requests = snapshot["total_requests"]
+    avg_duration = (
+        snapshot["total_duration_ms"] / total_requests
+        if total_requests > 0 else 0
+    )
+    error_rate = (
+        (snapshot["total_errors"] / total_requests) * 100
+        if total_requests > 0 else 0
+    )
+    
+    routes = []
+    for key, stats in snapshot["routes"].items():
+        count = stats["count"]
+        percentiles = LatencyHistogram.from_dict(stats["latency"]).percentiles()
+        routes.append({
+            "route": key,
+            "count": count,
+            "errors": stats["errors"],
+            "avg_ms": round(stats["total_ms"] / count, 2) if count else 0,
+            "avg_db_queries": round(stats.get("db_queries", 0) / count, 2) if count else 0,
+            "avg_db_ms": round(stats.get("db_time_ms", 0) / count, 2) if count else 0,
+            "p50_ms": percentiles["p50"],
+            "p95_ms": percentiles["p95"],
+            "p99_ms": percentiles["p99"],
+        })
+    routes.sort(key=lambda x: x["count"], reverse=True)
+    
+    return {
+        "total_requests": total_requests,
+        "total_errors": snapshot["total_errors"],
+        "error_rate_percent": round(error_rate, 2),
+        "avg_duration_ms": round(avg_duration, 2),
+        "latency_ms": LatencyHistogram.from_dict(snapshot["latency"]).percentiles(),
+        "requests_by_status": snapshot["requests_by_status"],
+        "slow_request_count": snapshot["slow_request_count"],
+        "top_routes": routes[:top_routes],
+        "evicted_routes": snapshot.get("evicted_routes", 0),
+        "db_pool": _summarize_pool(snapshot["db_pool"]),
+        "token_cache": snapshot.get("token_cache", {}),
+    }
 
 
 # Global metrics instance
 request_metrics = RequestMetrics()
 
+# Route key for requests that matched no URL rule (404s), so scanners
+# probing random paths can't grow the per-route table
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+# ============================================================================
+# Connection Pool Instrumentation
+# ============================================================================
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that reports checkout wait time, overflow and timeouts.
+    
+    SQLAlchemy pool events fire only after a connection has been handed
+    out, so the wait has to be measured around the pool's own checkout.
+    Selected in create_app via SQLALCHEMY_ENGINE_OPTIONS["poolclass"].
+    """
+    
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except sa_exc.TimeoutError:
+            request_metrics.record_pool_timeout((time.perf_counter() - start) * 1000)
+            raise
+        request_metrics.record_pool_checkout(
+            (time.perf_counter() - start) * 1000, self.overflow()
+        )
+        return conn
+
+
+# ============================================================================
+# SQL Query Instrumentation
+# ============================================================================
+# Engine-wide cursor hooks count statements and time spent in the database
+# for the current request. They make N+1 patterns (e.g. lazy loads inside
+# to_dict()) visible in logs, response headers and per-route metrics.
+# Statements executed outside a request (jobs, CLI) are ignored.
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get("query_start_time")
+    if not start_times:
+        return
+    elapsed_ms = (time.perf_counter() - start_times.pop()) * 1000
+    
+    if not has_request_context() or not hasattr(g, "db_query_count"):
+        return
+    g.db_query_count += 1
+    g.db_time_ms += elapsed_ms
+    
+    statements = getattr(g, "db_statements", None)
+    if statements is not None:
+        key = " ".join(statement.split())[:300]
+        statements[key] = statements.get(key, 0) + 1
+
+
+def register_query_instrumentation():
+    """Attach the cursor hooks to all engines (once per process)."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
 
 # ============================================================================
 # Middleware Registration
@@ -208,14 +672,23 @@ def register_observability(app):
     - Request timing
     - Structured logging
     - Metrics collection
+    - SQL query count/time per request
     """
     
+    request_metrics.max_routes = app.config.get("METRICS_MAX_ROUTES", 500)
+    register_query_instrumentation()
+    query_log_threshold = app.config.get("DB_QUERY_LOG_THRESHOLD", 0)
+    timing_headers = app.debug or app.config.get("DB_TIMING_HEADERS", False)
+    
     # Configure structured logging if in production
     if not app.debug:
-        # Set up JSON formatter for production
-        json_handler = logging.StreamHandler()
-        json_handler.setFormatter(JSONFormatter())
-        json_handler.addFilter(ContextFilter())
+        if app.config.get("LOG_QUEUE_ENABLED", True):
+            # JSON encoding and stream I/O happen off the request greenlet
+            json_handler = _get_queue_log_handler(app.config.get("LOG_QUEUE_SIZE", 10000))
+        else:
+            json_handler = logging.StreamHandler()
+            json_handler.setFormatter(JSONFormatter())
+            json_handler.addFilter(ContextFilter())
         
         # Remove default handlers and add JSON handler
         app.logger.handlers = []
@@ -233,6 +706,12 @@ def register_observability(app):
         
         # Record start time
         g.request_start_time = time.time()
+        
+        # SQL counters filled in by the cursor hooks
+        g.db_query_count = 0
+        g.db_time_ms = 0.0
+        if query_log_threshold:
+            g.db_statements = {}
     
     @app.after_request
     def after_request_observability(response):
@@ -247,14 +726,25 @@ def register_observability(app):
             duration_ms = (time.time() - g.request_start_time) * 1000
             response.headers['X-Response-Time'] = f"{duration_ms:.2f}ms"
         
+        db_queries = getattr(g, 'db_query_count', 0)
+        db_time_ms = getattr(g, 'db_time_ms', 0.0)
+        if timing_headers:
+            response.headers['X-DB-Queries'] = str(db_queries)
+            response.headers['X-DB-Time'] = f"{db_time_ms:.2f}ms"
+        
         # Record metrics (skip static files and health checks)
         if not request.path.startswith('/static') and request.path != '/health':
+            # Key on the URL rule template so IDs don't create new routes
             request_metrics.record_request(
                 path=request.path,
                 method=request.method,
                 status_code=response.status_code,
-                duration_ms=duration_ms
+                duration_ms=duration_ms,
+                route=request.url_rule.rule if request.url_rule else UNMATCHED_ROUTE,
+                db_queries=db_queries,
+                db_time_ms=db_time_ms,
             )
+            publish_metrics()
             
             # Log request (INFO level for success, WARNING for 4xx, ERROR for 5xx)
             log_data = {
@@ -262,9 +752,27 @@ def register_observability(app):
                 "method": request.method,
                 "status_code": response.status_code,
                 "duration_ms": round(duration_ms, 2),
+                "db_queries": db_queries,
+                "db_time_ms": round(db_time_ms, 2),
                 "request_id": getattr(g, 'request_id', None),
             }
             
+            # Log the statements behind query-heavy requests (likely N+1)
+            if query_log_threshold and db_queries > query_log_threshold:
+                statements = sorted(
+                    getattr(g, 'db_statements', {}).items(), key=lambda item: item[1], reverse=True
+                )
+                app.logger.warning(
+                    f"Query-heavy request: {request.method} {request.path} ran {db_queries} queries",
+                    extra={'extra_fields': {
+                        **log_data,
+                        "statements": [
+                            {"statement": statement, "count": count}
+                            for statement, count in statements[:10]
+                        ],
+                    }}
+                )
+            
             if response.status_code >= 500:
                 app.logger.error(f"Request failed: {request.method} {request.path}", extra={'extra_fields': log_data})
             elif response.status_code >= 400:
@@ -275,17 +783,210 @@ def register_observability(app):
         return response
 
 
+# ============================================================================
+# Cross-Worker Aggregation
+# ============================================================================
+# Each gunicorn worker periodically writes its snapshot into one Redis hash
+# (field = host:pid). /metrics merges every live worker's snapshot, so it no
+# longer depends on which worker happens to serve the request. Entries not
+# refreshed within METRICS_WORKER_TTL (dead or restarted workers) are pruned.
+METRICS_REDIS_KEY = "timesheet:metrics:workers"
+
+_publish_state = {"pid": None, "client": None, "last_publish": 0.0}
+
+
+def _worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _get_metrics_redis():
+    """Get this process's Redis client for metrics, or None if not configured."""
+    redis_url = current_app.config.get("REDIS_URL")
+    if not redis_url:
+        return None
+    
+    # Forked workers must not share the parent's connection
+    pid = os.getpid()
+    if _publish_state["pid"] != pid:
+        import redis
+        _publish_state["client"] = redis.from_url(
+            redis_url, socket_timeout=0.5, socket_connect_timeout=0.5
+        )
+        _publish_state["pid"] = pid
+        _publish_state["last_publish"] = 0.0
+    return _publish_state["client"]
+
+
+def publish_metrics(force=False):
+    """
+    Publish this worker's snapshot to Redis.
+    
+    Rate limited to once per METRICS_PUBLISH_INTERVAL seconds unless forced.
+    Failures are logged at debug level and never affect the request.
+    
+    Returns:
+        bool: True if a snapshot was written
+    """
+    try:
+        client = _get_metrics_redis()
+        if client is None:
+            return False
+        
+        now = time.time()
+        interval = current_app.config.get("METRICS_PUBLISH_INTERVAL", 10)
+        if not force and now - _publish_state["last_publish"] < interval:
+            return False
+        _publish_state["last_publish"] = now
+        
+        snapshot = request_metrics.snapshot()
+        snapshot["updated_at"] = now
+        client.hset(METRICS_REDIS_KEY, _worker_id(), json.dumps(snapshot))
+        return True
+    except Exception as e:
+        current_app.logger.debug(f"Metrics publish failed: {e}")
+        return False
+
+
+def collect_worker_snapshots():
+    """
+    Get this worker's live snapshot plus snapshots published by other workers.
+    
+    Falls back to the local snapshot only when Redis is unavailable.
+    """
+    snapshots = [request_metrics.snapshot()]
+    try:
+        client = _get_metrics_redis()
+        if client is None:
+            return snapshots
+        
+        now = time.time()
+        ttl = current_app.config.get("METRICS_WORKER_TTL", 300)
+        own_id = _worker_id()
+        stale = []
+        for worker_id, raw in client.hgetall(METRICS_REDIS_KEY).items():
+            if isinstance(worker_id, bytes):
+                worker_id = worker_id.decode()
+            if worker_id == own_id:
+                continue
+            data = json.loads(raw)
+            if now - data.get("updated_at", 0) > ttl:
+                stale.append(worker_id)
+                continue
+            snapshots.append(data)
+        
+        if stale:
+            client.hdel(METRICS_REDIS_KEY, *stale)
+    except Exception as e:
+        current_app.logger.warning(f"Metrics aggregation failed, showing local worker only: {e}")
+    
+    return snapshots
+
+
+# ============================================================================
+# Prometheus Exposition
+# ============================================================================
+def _prom_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _prom_number(value):
+    return repr(float(value))
+
+
+def render_prometheus(snapshot, workers=1):
+    """
+    Render a (merged) snapshot in Prometheus text exposition format 0.0.4.
+    
+    Latencies are exported in seconds, per Prometheus conventions.
+    """
+    lines = []
+    
+    def header(name, metric_type, help_text):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+    
+    header("timesheet_http_requests_total", "counter", "HTTP requests by status code.")
+    for status, count in sorted(snapshot["requests_by_status"].items()):
+        lines.append(f'timesheet_http_requests_total{{status="{_prom_label(status)}"}} {count}')
+    
+    header("timesheet_http_route_errors_total", "counter", "HTTP 4xx/5xx responses by route.")
+    for key, stats in sorted(snapshot["routes"].items()):
+        method, _, route = key.partition(" ")
+        labels = f'method="{_prom_label(method)}",route="{_prom_label(route)}"'
+        lines.append(f"timesheet_http_route_errors_total{{{labels}}} {stats['errors']}")
+    
+    header("timesheet_http_route_db_queries_total", "counter", "SQL statements executed by route.")
+    for key, stats in sorted(snapshot["routes"].items()):
+        method, _, route = key.partition(" ")
+        labels = f'method="{_prom_label(method)}",route="{_prom_label(route)}"'
+        lines.append(f"timesheet_http_route_db_queries_total{{{labels}}} {stats.get('db_queries', 0)}")
+    
+    header("timesheet_http_route_db_seconds_total", "counter", "Time spent executing SQL by route.")
+    for key, stats in sorted(snapshot["routes"].items()):
+        method, _, route = key.partition(" ")
+        labels = f'method="{_prom_label(method)}",route="{_prom_label(route)}"'
+        seconds = _prom_number(stats.get("db_time_ms", 0) / 1000)
+        lines.append(f"timesheet_http_route_db_seconds_total{{{labels}}} {seconds}")
+    
+    name = "timesheet_http_request_duration_seconds"
+    header(name, "histogram", "HTTP request latency by route template.")
+    for key, stats in sorted(snapshot["routes"].items()):
+        method, _, route = key.partition(" ")
+        labels = f'method="{_prom_label(method)}",route="{_prom_label(route)}"'
+        histogram = stats["latency"]
+        cumulative = 0
+        for bound, bucket_count in zip(LATENCY_BUCKETS_MS, histogram["counts"]):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{{labels},le="{bound / 1000:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram["count"]}')
+        lines.append(f"{name}_sum{{{labels}}} {_prom_number(histogram['sum_ms'] / 1000)}")
+        lines.append(f"{name}_count{{{labels}}} {histogram['count']}")
+    
+    pool = snapshot["db_pool"]
+    header("timesheet_db_pool_checkouts_total", "counter", "Database connection checkouts.")
+    lines.append(f"timesheet_db_pool_checkouts_total {pool['checkouts']}")
+    header("timesheet_db_pool_checkout_wait_seconds_total", "counter", "Time spent waiting for a pooled connection.")
+    lines.append(f"timesheet_db_pool_checkout_wait_seconds_total {_prom_number(pool['wait_total_ms'] / 1000)}")
+    header("timesheet_db_pool_checkout_wait_seconds_max", "gauge", "Longest wait for a pooled connection.")
+    lines.append(f"timesheet_db_pool_checkout_wait_seconds_max {_prom_number(pool['wait_max_ms'] / 1000)}")
+    header("timesheet_db_pool_overflow_checkouts_total", "counter", "Checkouts made while the pool was in overflow.")
+    lines.append(f"timesheet_db_pool_overflow_checkouts_total {pool['overflow_checkouts']}")
+    header("timesheet_db_pool_timeouts_total", "counter", "Checkouts that hit pool_timeout.")
+    lines.append(f"timesheet_db_pool_timeouts_total {pool['timeouts']}")
+    
+    header("timesheet_token_cache_lookups_total", "counter", "Access token cache lookups by token kind and outcome.")
+    for kind, counts in sorted(snapshot.get("token_cache", {}).items()):
+        for outcome, count in sorted(counts.items()):
+            labels = f'token="{_prom_label(kind)}",outcome="{_prom_label(outcome)}"'
+            lines.append(f"timesheet_token_cache_lookups_total{{{labels}}} {count}")
+    
+    header("timesheet_metrics_workers", "gauge", "Worker processes included in these metrics.")
+    lines.append(f"timesheet_metrics_workers {workers}")
+    
+    return "\n".join(lines) + "\n"
+
+
 # ============================================================================
 # Metrics Endpoint
 # ============================================================================
 def get_metrics():
-    """Get current application metrics (for admin use)."""
-    return request_metrics.get_stats()
+    """Get current application metrics across all workers (for admin use)."""
+    snapshots = collect_worker_snapshots()
+    stats = summarize_snapshot(merge_snapshots(snapshots))
+    stats["workers"] = len(snapshots)
+    return stats
+
+
+def get_prometheus_metrics():
+    """Get current application metrics in Prometheus text format."""
+    snapshots = collect_worker_snapshots()
+    return render_prometheus(merge_snapshots(snapshots), workers=len(snapshots))
 
 
 def reset_metrics():
     """Reset all metrics (for testing)."""
     request_metrics.reset()
+    _publish_state.update({"pid": None, "client": None, "last_publish": 0.0})
 
 
 # ============================================================================
@@ -0,0 +1,168 @@
+"""
+Attachment Previews
+
+Small thumbnails of image attachments and first-page previews of PDFs,
+so admins reviewing a queue fetch kilobytes per attachment instead of
+the full upload.
+
+Previews are generated by a background job after upload and stored
+through the storage backend next to the original, under
+"<original key>.preview.<ext>". They are immutable, so the preview
+endpoint serves them with a long-lived Cache-Control.
+
+Rendering:
+- png/jpg/jpeg/gif: Pillow (GIFs use the first frame)
+- pdf: pypdfium2 when installed (optional); otherwise no preview
+
+Configuration:
+    ATTACHMENT_PREVIEWS_ENABLED: Generate previews after upload (default: true)
+    ATTACHMENT_PREVIEW_SIZE: Longest edge in pixels (default: 320)
+    ATTACHMENT_PREVIEW_FORMAT: "webp" or "jpeg" (default: webp; falls back
+        to jpeg if Pillow lacks WebP support)
+"""
+
+import io
+import logging
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
+
+# Preview keys never change content, so clients may cache them indefinitely
+PREVIEW_CACHE_MAX_AGE = 365 * 24 * 3600
+
+
+def _encode(image, fmt: str):
+    """Encode a PIL image as WebP or JPEG, returning (bytes, mime_type)."""
+    from PIL import Image, features
+
+    output = io.BytesIO()
+    if fmt == "webp" and features.check("webp"):
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        image.save(output, "WEBP", quality=80, method=4)
+        return output.getvalue(), "image/webp"
+
+    if image.mode in ("RGBA", "LA", "P"):
+        # JPEG has no alpha; flatten transparency onto white
+        rgba = image.convert("RGBA")
+        image = Image.new("RGB", rgba.size, (255, 255, 255))
+        image.paste(rgba, mask=rgba.getchannel("A"))
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+    image.save(output, "JPEG", quality=80, optimize=True, progressive=True)
+    return output.getvalue(), "image/jpeg"
+
+
+def render_image_preview(data: bytes, max_size: int, fmt: str = "webp"):
+    """
+    Render a thumbnail for an image.
+
+    Returns:
+        tuple: (preview bytes, mime type)
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as image:
+        # JPEG decoders can downscale while decoding, far cheaper than resizing
+        image.draft("RGB", (max_size, max_size))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_size, max_size))
+        return _encode(image, fmt)
+
+
+def render_pdf_preview(data: bytes, max_size: int, fmt: str = "webp"):
+    """
+    Render the first page of a PDF.
+
+    Returns:
+        tuple: (preview bytes, mime type), or None if no PDF renderer is installed
+    """
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        return None
+
+    pdf = pdfium.PdfDocument(data)
+    try:
+        page = pdf[0]
+        width, height = page.get_size()
+        scale = max_size / max(width, height)
+        image = page.render(scale=scale).to_pil()
+    finally:
+        pdf.close()
+    return _encode(image, fmt)
+
+
+def render_preview(data: bytes, extension: str):
+    """
+    Render a preview for attachment content.
+
+    Args:
+        data: Original file content
+        extension: Lowercase file extension
+
+    Returns:
+        tuple: (preview bytes, mime type), or None if the type isn't supported
+    """
+    max_size = current_app.config.get("ATTACHMENT_PREVIEW_SIZE", 320)
+    fmt = current_app.config.get("ATTACHMENT_PREVIEW_FORMAT", "webp").lower()
+
+    if extension in IMAGE_EXTENSIONS:
+        return render_image_preview(data, max_size, fmt)
+    if extension == "pdf":
+        return render_pdf_preview(data, max_size, fmt)
+    return None
+
+
+def create_attachment_preview(attachment) -> dict:
+    """
+    Generate and store the preview for an attachment.
+
+    Attachments with identical content (same content_hash) reuse an
+    existing preview instead of rendering again. The caller commits.
+
+    Returns:
+        dict: Result with "success" and, on success, the preview key
+    """
+    from ..models import Attachment
+    from .storage import get_storage_backend
+
+    if attachment.preview_key:
+        return {"success": True, "preview_key": attachment.preview_key, "reused": True}
+
+    if attachment.content_hash:
+        sibling = Attachment.query.filter(
+            Attachment.content_hash == attachment.content_hash,
+            Attachment.preview_key.isnot(None),
+        ).first()
+        if sibling is not None:
+            attachment.preview_key = sibling.preview_key
+            attachment.preview_mime_type = sibling.preview_mime_type
+            return {"success": True, "preview_key": sibling.preview_key, "reused": True}
+
+    extension = attachment.filename.rsplit(".", 1)[-1].lower() if "." in attachment.filename else ""
+    backend = get_storage_backend()
+    data = b"".join(backend.get_stream(attachment.filename))
+
+    rendered = render_preview(data, extension)
+    if rendered is None:
+        return {"success": False, "reason": "unsupported"}
+
+    preview_data, mime_type = rendered
+    preview_ext = "webp" if mime_type == "image/webp" else "jpg"
+    preview_key = backend.save(
+        preview_data,
+        f"preview.{preview_ext}",
+        mime_type,
+        key=f"{attachment.filename}.preview.{preview_ext}",
+    )
+
+    attachment.preview_key = preview_key
+    attachment.preview_mime_type = mime_type
+    logger.info(
+        f"Stored {len(preview_data)} byte preview for attachment {attachment.id} "
+        f"({attachment.file_size} byte original)"
+    )
+    return {"success": True, "preview_key": preview_key, "size": len(preview_data)}
@@ -0,0 +1,245 @@
+"""
+Request Profiling
+
+Opt-in cProfile capture of individual requests, for diagnosing slow admin
+and export endpoints in production without redeploying.
+
+How it works:
+- An admin mints a short-lived signed token (POST /api/admin/profiles/token)
+- A request carrying the token in the X-Profile-Token header (or the
+  _profile query parameter) runs under cProfile, sampled by PROFILE_SAMPLE_RATE
+- Stats are saved as <request_id>.pstats in PROFILE_DIR, which is kept as
+  a ring of at most PROFILE_MAX_FILES profiles
+- The response carries X-Profile-ID; the stats are served by
+  GET /api/admin/profiles/<request_id>
+
+Configuration:
+    PROFILING_ENABLED: Master switch (default: false)
+    PROFILE_DIR: Directory for .pstats files (shared by workers on a host)
+    PROFILE_MAX_FILES: Number of profiles kept (default: 50)
+    PROFILE_SAMPLE_RATE: Fraction of signed requests profiled (default: 1.0)
+    PROFILE_TOKEN_MAX_AGE: Token lifetime in seconds (default: 3600)
+
+Note: under gevent, cProfile also records other greenlets that run on the
+worker thread while the profiled request waits on I/O.
+"""
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import time
+import uuid
+from flask import request, g, current_app
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile-Token"
+PROFILE_QUERY_PARAM = "_profile"
+
+# Profile IDs become filenames, and request IDs can come from clients
+_PROFILE_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def _serializer():
+    return URLSafeTimedSerializer(
+        current_app.config["SECRET_KEY"], salt="request-profile"
+    )
+
+
+def create_profile_token(user_id):
+    """
+    Create a signed token that enables profiling for requests carrying it.
+
+    Args:
+        user_id: Admin who requested the token (recorded with each profile)
+
+    Returns:
+        str: Signed token
+    """
+    return _serializer().dumps({"uid": user_id})
+
+
+def verify_profile_token(token):
+    """
+    Validate a profiling token.
+
+    Returns:
+        dict: Token payload, or None if invalid or expired
+    """
+    max_age = current_app.config.get("PROFILE_TOKEN_MAX_AGE", 3600)
+    try:
+        return _serializer().loads(token, max_age=max_age)
+    except (BadSignature, SignatureExpired):
+        return None
+
+
+def _profile_dir():
+    directory = current_app.config.get("PROFILE_DIR")
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def get_profile_path(profile_id):
+    """
+    Get the .pstats path for a profile.
+
+    Returns:
+        str: Path to the stats file, or None if it doesn't exist
+    """
+    if not _PROFILE_ID_RE.match(profile_id or ""):
+        return None
+    path = os.path.join(_profile_dir(), f"{profile_id}.pstats")
+    return path if os.path.exists(path) else None
+
+
+def _prune_profiles(directory, max_files):
+    """Delete the oldest profiles beyond max_files."""
+    stats_files = [
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.endswith(".pstats")
+    ]
+    if len(stats_files) <= max_files:
+        return
+
+    stats_files.sort(key=os.path.getmtime)
+    for path in stats_files[: len(stats_files) - max_files]:
+        for stale in (path, path[: -len(".pstats")] + ".json"):
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass  # Another worker pruned it first
+
+
+def list_profiles():
+    """
+    List stored profiles, newest first.
+
+    Returns:
+        list: Profile metadata dicts
+    """
+    directory = _profile_dir()
+    profiles = []
+    for name in os.listdir(directory):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return sorted(profiles, key=lambda p: p.get("created_at", 0), reverse=True)
+
+
+def format_profile(profile_id, sort="cumulative", limit=50):
+    """
+    Render a stored profile as a text report.
+
+    Args:
+        profile_id: Profile (request) ID
+        sort: pstats sort key (cumulative, tottime, calls, ...)
+        limit: Number of functions to include
+
+    Returns:
+        str: Report text, or None if the profile doesn't exist
+    """
+    path = get_profile_path(profile_id)
+    if not path:
+        return None
+
+    stream = io.StringIO()
+    stats = pstats.Stats(path, stream=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+
+def _save_profile(profiler, profile_id, response):
+    directory = _profile_dir()
+    profiler.dump_stats(os.path.join(directory, f"{profile_id}.pstats"))
+
+    duration_ms = None
+    if hasattr(g, "request_start_time"):
+        duration_ms = round((time.time() - g.request_start_time) * 1000, 2)
+
+    meta = {
+        "id": profile_id,
+        "method": request.method,
+        "path": request.path,
+        "status_code": response.status_code,
+        "duration_ms": duration_ms,
+        "requested_by": getattr(g, "profile_requested_by", None),
+        "created_at": time.time(),
+    }
+    with open(os.path.join(directory, f"{profile_id}.json"), "w") as f:
+        json.dump(meta, f)
+
+    _prune_profiles(directory, current_app.config.get("PROFILE_MAX_FILES", 50))
+
+
+def register_profiling(app):
+    """
+    Register the request profiling hooks.
+
+    Must be called after register_observability so g.request_id is set
+    before profiling starts.
+    """
+
+    @app.before_request
+    def start_request_profile():
+        if not app.config.get("PROFILING_ENABLED", False):
+            return
+
+        token = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_QUERY_PARAM)
+        if not token:
+            return
+
+        payload = verify_profile_token(token)
+        if payload is None:
+            logger.warning(f"Rejected profiling token on {request.method} {request.path}")
+            return
+
+        if random.random() >= app.config.get("PROFILE_SAMPLE_RATE", 1.0):
+            return
+
+        profile_id = getattr(g, "request_id", None)
+        if not _PROFILE_ID_RE.match(profile_id or "") or get_profile_path(profile_id):
+            profile_id = uuid.uuid4().hex[:12]
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another greenlet on this thread is already being profiled
+            logger.info(f"Skipped profiling {request.path}: profiler busy")
+            return
+
+        g.profile_id = profile_id
+        g.profile_requested_by = payload.get("uid")
+        g.profiler = profiler
+
+    @app.after_request
+    def finish_request_profile(response):
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return response
+
+        profiler.disable()
+        try:
+            _save_profile(profiler, g.profile_id, response)
+            response.headers["X-Profile-ID"] = g.profile_id
+        except OSError as e:
+            logger.error(f"Failed to save profile {g.profile_id}: {e}")
+        return response
+
+    @app.teardown_request
+    def stop_request_profile(exc=None):
+        # after_request is skipped on unhandled errors; never leave it running
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
@@ -2,27 +2,216 @@
 SharePoint Sync Utilities (REQ-010)
 
 Handles Microsoft Graph authentication and file uploads to SharePoint.
+
+Uploads:
+- Files up to SIMPLE_UPLOAD_MAX_BYTES use a single PUT (no upload session)
+- Larger files use a Graph upload session. Chunks are multiples of 320 KiB
+  and grow or shrink to keep each PUT near TARGET_CHUNK_SECONDS. The
+  session URL and last acknowledged offset are stored on the Attachment,
+  so a retried sync resumes mid-file instead of starting over.
+
+All Graph calls share one keep-alive requests.Session per worker process.
+
+Folders:
+- Drive folders known to exist are cached for SP_FOLDER_CACHE_TTL seconds,
+  in process and (when REDIS_URL is set) in Redis so every worker benefits.
+  A sync into an already-seen week goes straight to the upload.
+
+Throttling:
+- Every Graph call takes a token from a per-tenant TokenBucket
+  (SP_RATE_LIMIT_PER_SECOND, SP_RATE_LIMIT_BURST) shared by all threads
+  in the process. A 429 (or 503 with Retry-After) pauses the whole bucket
+  for the advertised delay before the call is retried.
+
+Batch sync:
+- sync_attachments_batch() uploads many attachments on a thread pool
+  (SP_SYNC_CONCURRENCY). Each destination folder is checked once per
+  batch; database reads and writes stay on the calling thread.
 """
 
+import email.utils
+import logging
 import os
+import threading
 import time
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from flask import current_app
 from werkzeug.utils import secure_filename
 
 
+logger = logging.getLogger(__name__)
+
 GRAPH_SCOPE = ["https://graph.microsoft.com/.default"]
-_TOKEN_CACHE: Dict[str, float] = {
-    "access_token": "",
-    "expires_at": 0,
-}
+DEFAULT_GRAPH_BASE_URL = "https://graph.microsoft.com/v1.0"
+
+# Graph accepts simple uploads up to 4 MB
+SIMPLE_UPLOAD_MAX_BYTES = 4 * 1024 * 1024
+
+# Upload session chunks must be multiples of 320 KiB
+CHUNK_UNIT = 320 * 1024
+MIN_CHUNK_SIZE = CHUNK_UNIT
+INITIAL_CHUNK_SIZE = 4 * CHUNK_UNIT
+MAX_CHUNK_SIZE = 32 * CHUNK_UNIT
+TARGET_CHUNK_SECONDS = 2.0
+
+_HTTP_STATE = {"pid": None, "session": None}
+
+# Longest Retry-After honoured before a call is retried
+MAX_RETRY_AFTER_SECONDS = 120
+
+_RATE_LIMITERS = {"pid": None, "buckets": {}}
+
+FOLDER_CACHE_REDIS_PREFIX = "timesheet:sharepoint:folder:"
+
+# (drive_id, path) -> expiry timestamp, plus this process's Redis client
+_FOLDER_CACHE = {"pid": None, "paths": {}, "redis": None}
 
 
 class SharePointSyncError(RuntimeError):
     pass
 
 
+def _graph_url(path: str) -> str:
+    base = (current_app.config.get("GRAPH_BASE_URL") or DEFAULT_GRAPH_BASE_URL).rstrip("/")
+    return f"{base}/{path.lstrip('/')}"
+
+
+def _get_http_session():
+    """
+    Get the keep-alive session for Graph calls.
+
+    One session (and connection pool) per worker process; a forked child
+    builds its own rather than sharing the parent's sockets.
+    """
+    pid = os.getpid()
+    if _HTTP_STATE["pid"] != pid:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=current_app.config.get("SP_HTTP_POOL_SIZE", 10),
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _HTTP_STATE.update(pid=pid, session=session)
+    return _HTTP_STATE["session"]
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Allows bursts of up to `capacity` calls, refilled at `rate` per second
+    (rate <= 0 disables the limit). defer() blocks every caller until the
+    given delay has passed, e.g. after Graph returns Retry-After.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = float(rate)
+        self.capacity = max(float(capacity), 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Take one token, sleeping until one is available.
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    delay = self.blocked_until - now
+                elif self.rate <= 0:
+                    return waited
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return waited
+                    delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def defer(self, seconds: float) -> None:
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+def _get_rate_limiter() -> TokenBucket:
+    """Get this process's token bucket for the configured tenant."""
+    pid = os.getpid()
+    if _RATE_LIMITERS["pid"] != pid:
+        _RATE_LIMITERS.update(pid=pid, buckets={})
+
+    config = current_app.config
+    rate = float(config.get("SP_RATE_LIMIT_PER_SECOND", 10))
+    burst = float(config.get("SP_RATE_LIMIT_BURST", 20))
+    key = (config.get("AZURE_TENANT_ID") or "common", rate, burst)
+
+    bucket = _RATE_LIMITERS["buckets"].get(key)
+    if bucket is None:
+        bucket = _RATE_LIMITERS["buckets"].setdefault(key, TokenBucket(rate, burst))
+    return bucket
+
+
+def _retry_after_seconds(response, attempt: int) -> float:
+    """Delay requested by a throttled response, or exponential backoff."""
+    value = response.headers.get("Retry-After")
+    delay = None
+    if value:
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                when = email.utils.parsedate_to_datetime(value)
+                delay = when.timestamp() - time.time()
+            except (TypeError, ValueError):
+                delay = None
+    if delay is None:
+        delay = 2 ** attempt
+    return min(max(delay, 0.0), MAX_RETRY_AFTER_SECONDS)
+
+
+def _graph_request(method: str, url: str, **kwargs):
+    """
+    Make a rate-limited Graph request, retrying throttled responses.
+
+    429s, and 503s that carry Retry-After, pause the shared bucket and are
+    retried up to SP_THROTTLE_MAX_RETRIES times; the last response is
+    returned either way.
+    """
+    limiter = _get_rate_limiter()
+    retries = current_app.config.get("SP_THROTTLE_MAX_RETRIES", 3)
+
+    attempt = 0
+    while True:
+        limiter.acquire()
+        response = _get_http_session().request(method, url, **kwargs)
+
+        throttled = response.status_code == 429 or (
+            response.status_code == 503 and "Retry-After" in response.headers
+        )
+        if not throttled or attempt >= retries:
+            return response
+
+        delay = _retry_after_seconds(response, attempt)
+        logger.warning(
+            f"Graph throttled {method} ({response.status_code}); retrying in {delay:.1f}s"
+        )
+        limiter.defer(delay)
+        attempt += 1
+
+
 def _is_placeholder(value: str) -> bool:
     if not value:
         return True
@@ -48,34 +237,22 @@ def _get_graph_token() -> str:
     if not is_sharepoint_configured():
         raise SharePointSyncError("SharePoint sync is not configured")
 
-    now = time.time()
-    if _TOKEN_CACHE["access_token"] and now < (_TOKEN_CACHE["expires_at"] - 60):
-        return _TOKEN_CACHE["access_token"]
-
-    import msal
+    from .token_cache import acquire_client_token, get_access_token
 
     authority = current_app.config.get("AZURE_AUTHORITY")
     client_id = current_app.config.get("AZURE_CLIENT_ID")
     client_secret = current_app.config.get("AZURE_CLIENT_SECRET")
 
-    msal_app = msal.ConfidentialClientApplication(
-        client_id,
-        authority=authority,
-        client_credential=client_secret,
-    )
-    result = msal_app.acquire_token_for_client(scopes=GRAPH_SCOPE)
-
-    access_token = result.get("access_token")
-    if not access_token:
-        raise SharePointSyncError(
-            f"Failed to acquire Graph token: {result.get('error_description', 'unknown error')}"
-        )
-
-    expires_in = int(result.get("expires_in", 3599))
-    _TOKEN_CACHE["access_token"] = access_token
-    _TOKEN_CACHE["expires_at"] = now + expires_in
+    def acquire():
+        result = acquire_client_token(client_id, authority, client_secret, GRAPH_SCOPE)
+        access_token = result.get("access_token")
+        if not access_token:
+            raise SharePointSyncError(
+                f"Failed to acquire Graph token: {result.get('error_description', 'unknown error')}"
+            )
+        return access_token, int(result.get("expires_in", 3599))
 
-    return access_token
+    return get_access_token(f"graph:{authority}:{client_id}", acquire)
 
 
 def _build_sharepoint_folder(timesheet) -> str:
@@ -88,9 +265,7 @@ def _build_sharepoint_folder(timesheet) -> str:
 
 
 def _create_folder(token: str, drive_id: str, parent_path: str, name: str) -> None:
-    import requests
-
-    root = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/root"
+    root = _graph_url(f"drives/{drive_id}/root")
     if parent_path:
         url = f"{root}:/{parent_path}:/children"
     else:
@@ -102,7 +277,8 @@ def _create_folder(token: str, drive_id: str, parent_path: str, name: str) -> No
         "@microsoft.graph.conflictBehavior": "fail",
     }
 
-    response = requests.post(
+    response = _graph_request(
+        "POST",
         url,
         headers={"Authorization": f"Bearer {token}"},
         json=payload,
@@ -128,20 +304,125 @@ def _create_folder(token: str, drive_id: str, parent_path: str, name: str) -> No
     )
 
 
+def _get_folder_cache_redis():
+    """Get this process's Redis client for the folder cache, or None."""
+    redis_url = current_app.config.get("REDIS_URL")
+    if not redis_url:
+        return None
+
+    pid = os.getpid()
+    if _FOLDER_CACHE["pid"] != pid:
+        import redis
+        _FOLDER_CACHE["redis"] = redis.from_url(
+            redis_url, socket_timeout=0.5, socket_connect_timeout=0.5
+        )
+        _FOLDER_CACHE["pid"] = pid
+    return _FOLDER_CACHE["redis"]
+
+
+def _folder_redis_key(drive_id: str, path: str) -> str:
+    return f"{FOLDER_CACHE_REDIS_PREFIX}{drive_id}:{path}"
+
+
+def _cached_folder_depth(drive_id: str, prefixes: list) -> int:
+    """
+    Find how many leading segments of a path are known to exist.
+
+    Args:
+        drive_id: Drive the folders live in
+        prefixes: Cumulative path prefixes, shortest first
+
+    Returns:
+        int: Number of prefixes known to exist (0 if none)
+    """
+    now = time.time()
+    paths = _FOLDER_CACHE["paths"]
+    for depth in range(len(prefixes), 0, -1):
+        if paths.get((drive_id, prefixes[depth - 1]), 0) > now:
+            return depth
+
+    try:
+        client = _get_folder_cache_redis()
+        if client is None:
+            return 0
+        found = client.mget([_folder_redis_key(drive_id, p) for p in prefixes])
+    except Exception as e:
+        logger.debug(f"SharePoint folder cache lookup failed: {e}")
+        return 0
+
+    ttl = current_app.config.get("SP_FOLDER_CACHE_TTL", 3600)
+    for depth in range(len(prefixes), 0, -1):
+        if found[depth - 1]:
+            for prefix in prefixes[:depth]:
+                paths[(drive_id, prefix)] = now + ttl
+            return depth
+    return 0
+
+
+def _remember_folders(drive_id: str, prefixes: list) -> None:
+    ttl = current_app.config.get("SP_FOLDER_CACHE_TTL", 3600)
+    expires_at = time.time() + ttl
+    for prefix in prefixes:
+        _FOLDER_CACHE["paths"][(drive_id, prefix)] = expires_at
+
+    try:
+        client = _get_folder_cache_redis()
+        if client is None:
+            return
+        pipe = client.pipeline(transaction=False)
+        for prefix in prefixes:
+            pipe.set(_folder_redis_key(drive_id, prefix), 1, ex=ttl)
+        pipe.execute()
+    except Exception as e:
+        logger.debug(f"SharePoint folder cache update failed: {e}")
+
+
+def forget_folder_path(drive_id: str, path: str) -> None:
+    """
+    Drop a folder (and its descendants) from the cache.
+
+    Called when Graph reports the folder missing, e.g. it was deleted in
+    SharePoint while still cached.
+    """
+    paths = _FOLDER_CACHE["paths"]
+    for cached_drive, cached_path in list(paths):
+        if cached_drive == drive_id and (cached_path == path or cached_path.startswith(f"{path}/")):
+            paths.pop((cached_drive, cached_path), None)
+
+    try:
+        client = _get_folder_cache_redis()
+        if client is not None:
+            client.delete(_folder_redis_key(drive_id, path))
+    except Exception as e:
+        logger.debug(f"SharePoint folder cache delete failed: {e}")
+
+
+def reset_folder_cache() -> None:
+    """Clear this process's folder cache (Redis entries expire on their own)."""
+    _FOLDER_CACHE["paths"].clear()
+
+
 def _ensure_folder_path(token: str, drive_id: str, path: str) -> None:
     if not path:
         return
 
-    current = ""
-    for segment in path.split("/"):
+    segments = path.split("/")
+    prefixes = ["/".join(segments[:i]) for i in range(1, len(segments) + 1)]
+
+    caching = current_app.config.get("SP_FOLDER_CACHE_TTL", 3600) > 0
+    depth = _cached_folder_depth(drive_id, prefixes) if caching else 0
+
+    current = prefixes[depth - 1] if depth else ""
+    for segment in segments[depth:]:
         _create_folder(token, drive_id, current, segment)
         current = f"{current}/{segment}" if current else segment
 
+    if caching and depth < len(prefixes):
+        _remember_folders(drive_id, prefixes)
 
-def _create_upload_session(token: str, drive_id: str, path: str) -> str:
-    import requests
 
-    url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/root:/{path}:/createUploadSession"
+def _create_upload_session(token: str, drive_id: str, path: str) -> str:
+    url = _graph_url(f"drives/{drive_id}/root:/{path}:/createUploadSession")
     payload = {
         "item": {
             "@microsoft.graph.conflictBehavior": "replace",
@@ -149,13 +430,18 @@ def _create_upload_session(token: str, drive_id: str, path: str) -> str:
         }
     }
 
-    response = requests.post(
+    response = _graph_request(
+        "POST",
         url,
         headers={"Authorization": f"Bearer {token}"},
         json=payload,
         timeout=30,
     )
 
+    if response.status_code == 404:
+        # The folder vanished while cached; the retry recreates it
+        forget_folder_path(drive_id, os.path.dirname(path))
+
     if response.status_code not in (200, 201):
         raise SharePointSyncError(
             f"Failed to create upload session: {response.status_code} {response.text}"
@@ -169,76 +455,356 @@ def _create_upload_session(token: str, drive_id: str, path: str) -> str:
     return upload_url
 
 
-def _upload_file(upload_url: str, filepath: str) -> dict:
-    import requests
+def _next_chunk_size(chunk_size: int, elapsed: float) -> int:
+    """Grow fast chunks and shrink slow ones, staying on 320 KiB multiples."""
+    if elapsed < TARGET_CHUNK_SECONDS / 2:
+        return min(chunk_size * 2, MAX_CHUNK_SIZE)
+    if elapsed > TARGET_CHUNK_SECONDS * 2:
+        return max((chunk_size // 2) // CHUNK_UNIT * CHUNK_UNIT, MIN_CHUNK_SIZE)
+    return chunk_size
+
 
-    file_size = os.path.getsize(filepath)
-    if file_size == 0:
-        raise SharePointSyncError("File is empty")
+def _simple_upload(token: str, drive_id: str, path: str, data: bytes) -> dict:
+    url = _graph_url(f"drives/{drive_id}/root:/{path}:/content")
+    response = _graph_request(
+        "PUT",
+        url,
+        params={"@microsoft.graph.conflictBehavior": "replace"},
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/octet-stream",
+        },
+        data=data,
+        timeout=60,
+    )
 
-    chunk_size = 320 * 1024 * 4
-    offset = 0
+    if response.status_code == 404:
+        forget_folder_path(drive_id, os.path.dirname(path))
 
-    with open(filepath, "rb") as handle:
-        while True:
-            chunk = handle.read(chunk_size)
-            if not chunk:
-                break
+    if response.status_code not in (200, 201):
+        raise SharePointSyncError(f"Upload failed: {response.status_code} {response.text}")
+    return response.json()
 
-            start = offset
-            end = offset + len(chunk) - 1
 
-            headers = {
-                "Content-Length": str(len(chunk)),
-                "Content-Range": f"bytes {start}-{end}/{file_size}",
-                "Content-Type": "application/octet-stream",
-            }
+def _resume_offset(upload_url: str):
+    """
+    Ask Graph where an existing upload session left off.
 
-            response = requests.put(upload_url, headers=headers, data=chunk, timeout=60)
+    Returns:
+        int: Next expected byte offset, or None if the session is gone
+    """
+    try:
+        response = _graph_request("GET", upload_url, timeout=30)
+    except Exception as exc:
+        logger.warning(f"Could not query SharePoint upload session: {exc}")
+        return None
+
+    if response.status_code != 200:
+        return None
+
+    ranges = response.json().get("nextExpectedRanges") or []
+    if not ranges:
+        return None
+    return int(ranges[0].split("-")[0])
+
+
+def _upload_session_chunks(upload_url: str, chunks, offset: int, total_size: int, on_progress) -> dict:
+    """
+    PUT content to an upload session, starting at offset.
+
+    Args:
+        upload_url: Pre-authenticated session URL
+        chunks: Iterator of file content from offset onwards
+        offset: Byte offset of the first chunk
+        total_size: Full file size
+        on_progress: Callable(offset) after each acknowledged chunk
+
+    Returns:
+        dict: The created drive item
+    """
+    chunk_size = INITIAL_CHUNK_SIZE
+    buffer = bytearray()
+    source = iter(chunks)
+    exhausted = False
+
+    while True:
+        while len(buffer) < chunk_size and not exhausted:
+            try:
+                buffer += next(source)
+            except StopIteration:
+                exhausted = True
+
+        if not buffer:
+            raise SharePointSyncError("Upload session completed without final response")
+
+        piece = bytes(buffer[:chunk_size])
+        start = offset
+        end = offset + len(piece) - 1
+        headers = {
+            "Content-Length": str(len(piece)),
+            "Content-Range": f"bytes {start}-{end}/{total_size}",
+            "Content-Type": "application/octet-stream",
+        }
 
-            if response.status_code in (200, 201):
-                return response.json()
-            if response.status_code == 202:
-                offset += len(chunk)
-                continue
+        started = time.monotonic()
+        response = _graph_request("PUT", upload_url, headers=headers, data=piece, timeout=60)
+        elapsed = time.monotonic() - started
 
+        if response.status_code in (200, 201):
+            return response.json()
+        if response.status_code != 202:
             raise SharePointSyncError(
-                f"Upload failed: {response.status_code} {response.text}"
+                f"Upload failed at byte {start}: {response.status_code} {response.text}"
             )
 
-    raise SharePointSyncError("Upload session completed without final response")
+        del buffer[:len(piece)]
+        offset += len(piece)
+        on_progress(offset)
+        chunk_size = _next_chunk_size(chunk_size, elapsed)
+
+
+def _resumable_upload(token: str, drive_id: str, path: str, attachment, backend, checkpoint) -> dict:
+    upload_url = attachment.sharepoint_upload_url
+    offset = _resume_offset(upload_url) if upload_url else None
+
+    if offset is None:
+        upload_url = _create_upload_session(token, drive_id, path)
+        offset = 0
+        attachment.sharepoint_upload_url = upload_url
+        attachment.sharepoint_upload_offset = 0
+        checkpoint()
+    else:
+        logger.info(
+            f"Resuming SharePoint upload of attachment {attachment.id} at byte {offset}"
+        )
+
+    def record_progress(new_offset):
+        attachment.sharepoint_upload_offset = new_offset
+        checkpoint()
+
+    try:
+        chunks = backend.get_stream(attachment.filename, (offset, None))
+    except FileNotFoundError:
+        raise SharePointSyncError(f"Stored file not found: {attachment.filename}")
+
+    item = _upload_session_chunks(
+        upload_url, chunks, offset, attachment.file_size, record_progress
+    )
+
+    attachment.sharepoint_upload_url = None
+    attachment.sharepoint_upload_offset = None
+    return item
+
+
+def _find_synced_duplicate(attachment, drive_id: str, folder_path: str):
+    """
+    Find an already-synced attachment with identical content in the same folder.
+
+    Returns:
+        Attachment: The synced duplicate, or None
+    """
+    if not attachment.content_hash:
+        return None
+
+    from ..models import Attachment
+
+    candidates = Attachment.query.filter(
+        Attachment.content_hash == attachment.content_hash,
+        Attachment.id != attachment.id,
+        Attachment.sharepoint_sync_status == Attachment.SharePointSyncStatus.SYNCED,
+        Attachment.sharepoint_drive_id == drive_id,
+        Attachment.sharepoint_item_id.isnot(None),
+    ).all()
+
+    for candidate in candidates:
+        if candidate.timesheet and _build_sharepoint_folder(candidate.timesheet) == folder_path:
+            return candidate
+    return None
+
+
+class _UploadTarget:
+    """
+    Detached copy of the attachment fields an upload reads and writes.
+
+    Lets worker threads upload without touching the ORM object, whose
+    session belongs to the calling thread.
+    """
+
+    def __init__(self, attachment):
+        self.id = attachment.id
+        self.filename = attachment.filename
+        self.file_size = attachment.file_size
+        self.sharepoint_upload_url = attachment.sharepoint_upload_url
+        self.sharepoint_upload_offset = attachment.sharepoint_upload_offset
+
+    def apply_to(self, attachment) -> None:
+        attachment.sharepoint_upload_url = self.sharepoint_upload_url
+        attachment.sharepoint_upload_offset = self.sharepoint_upload_offset
+
 
+def _plan_upload(attachment) -> dict:
+    """
+    Work out where an attachment goes (database reads only).
 
-def upload_attachment_to_sharepoint(attachment) -> dict:
+    Returns:
+        dict: drive_id, site_id, folder_path, upload_path and duplicate
+            (an already-synced identical Attachment, or None)
+    """
     if not is_sharepoint_configured():
         raise SharePointSyncError("SharePoint sync is disabled or not configured")
 
     if not attachment.timesheet:
         raise SharePointSyncError("Attachment is missing a timesheet reference")
 
-    upload_folder = current_app.config.get("UPLOAD_FOLDER", "uploads")
-    local_path = os.path.join(upload_folder, attachment.filename)
-    if not os.path.exists(local_path):
-        raise SharePointSyncError(f"Local file not found: {attachment.filename}")
-
-    token = _get_graph_token()
     drive_id = current_app.config.get("SP_DRIVE_ID")
-    site_id = current_app.config.get("SP_SITE_ID")
     folder_path = _build_sharepoint_folder(attachment.timesheet)
 
     safe_name = secure_filename(attachment.original_filename)
     if not safe_name:
         safe_name = attachment.filename
     sharepoint_name = f"{attachment.id}_{safe_name}"
-    upload_path = f"{folder_path}/{sharepoint_name}" if folder_path else sharepoint_name
 
-    _ensure_folder_path(token, drive_id, folder_path)
-    upload_url = _create_upload_session(token, drive_id, upload_path)
-    item = _upload_file(upload_url, local_path)
+    return {
+        "drive_id": drive_id,
+        "site_id": current_app.config.get("SP_SITE_ID"),
+        "folder_path": folder_path,
+        "upload_path": f"{folder_path}/{sharepoint_name}" if folder_path else sharepoint_name,
+        # Identical content already uploaded to this week's folder is linked, not re-sent
+        "duplicate": _find_synced_duplicate(attachment, drive_id, folder_path),
+    }
+
+
+def _duplicate_result(duplicate) -> dict:
+    return {
+        "item_id": duplicate.sharepoint_item_id,
+        "web_url": duplicate.sharepoint_web_url,
+        "drive_id": duplicate.sharepoint_drive_id,
+        "site_id": duplicate.sharepoint_site_id,
+        "deduplicated": True,
+    }
+
+
+def _perform_upload(token: str, plan: dict, target, checkpoint, ensure_folders: bool = True) -> dict:
+    from .storage import get_storage_backend
+
+    backend = get_storage_backend()
+    drive_id = plan["drive_id"]
+
+    if ensure_folders:
+        _ensure_folder_path(token, drive_id, plan["folder_path"])
+
+    if target.file_size <= SIMPLE_UPLOAD_MAX_BYTES:
+        try:
+            data = b"".join(backend.get_stream(target.filename))
+        except FileNotFoundError:
+            raise SharePointSyncError(f"Stored file not found: {target.filename}")
+        if not data:
+            raise SharePointSyncError("File is empty")
+        item = _simple_upload(token, drive_id, plan["upload_path"], data)
+    else:
+        item = _resumable_upload(token, drive_id, plan["upload_path"], target, backend, checkpoint)
 
     return {
         "item_id": item.get("id"),
         "web_url": item.get("webUrl"),
         "drive_id": drive_id,
-        "site_id": site_id,
+        "site_id": plan["site_id"],
     }
+
+
+def upload_attachment_to_sharepoint(attachment, checkpoint=None) -> dict:
+    """
+    Upload an attachment to its week folder in SharePoint.
+
+    Args:
+        attachment: Attachment to upload
+        checkpoint: Optional callable used to persist upload-session progress
+            stored on the attachment (e.g. db.session.commit)
+
+    Returns:
+        dict: item_id, web_url, drive_id, site_id (and deduplicated=True
+            when an identical synced file was linked instead)
+    """
+    plan = _plan_upload(attachment)
+    if plan["duplicate"] is not None:
+        return _duplicate_result(plan["duplicate"])
+
+    token = _get_graph_token()
+    return _perform_upload(token, plan, attachment, checkpoint or (lambda: None))
+
+
+def sync_attachments_batch(attachments, concurrency: int = None):
+    """
+    Upload attachments concurrently.
+
+    Attachments are grouped by destination folder: each folder is checked
+    once, then files are uploaded on up to `concurrency` threads sharing the
+    process's HTTP session and rate limiter. Upload-session progress is
+    copied back onto each attachment when its upload finishes, so a failed
+    file resumes on the next sync. The caller records results and commits.
+
+    Args:
+        attachments: Attachments to upload (loaded in the calling thread)
+        concurrency: Worker threads (default: SP_SYNC_CONCURRENCY)
+
+    Yields:
+        tuple: (attachment, result dict or None, exception or None) as each
+            upload completes
+    """
+    concurrency = max(int(concurrency or current_app.config.get("SP_SYNC_CONCURRENCY", 4)), 1)
+
+    groups = {}
+    for attachment in attachments:
+        try:
+            plan = _plan_upload(attachment)
+        except SharePointSyncError as exc:
+            yield attachment, None, exc
+            continue
+        if plan["duplicate"] is not None:
+            yield attachment, _duplicate_result(plan["duplicate"]), None
+            continue
+        groups.setdefault((plan["drive_id"], plan["folder_path"]), []).append((attachment, plan))
+
+    if not groups:
+        return
+
+    try:
+        token = _get_graph_token()
+    except SharePointSyncError as exc:
+        for group in groups.values():
+            for attachment, _ in group:
+                yield attachment, None, exc
+        return
+
+    app = current_app._get_current_object()
+
+    def in_app_context(func, *args):
+        with app.app_context():
+            return func(*args)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="sharepoint-sync") as pool:
+        upload_futures = {}
+        for (drive_id, folder_path), group in groups.items():
+            # Checked here, one folder at a time, so shared parent folders
+            # are created once and cached; earlier groups upload meanwhile
+            try:
+                _ensure_folder_path(token, drive_id, folder_path)
+            except Exception as exc:
+                for attachment, _ in group:
+                    yield attachment, None, exc
+                continue
+
+            for attachment, plan in group:
+                target = _UploadTarget(attachment)
+                future = pool.submit(
+                    in_app_context, _perform_upload, token, plan, target, lambda: None, False
+                )
+                upload_futures[future] = (attachment, target)
+
+        for future in as_completed(upload_futures):
+            attachment, target = upload_futures[future]
+            target.apply_to(attachment)
+            try:
+                yield attachment, future.result(), None
+            except Exception as exc:
+                yield attachment, None, exc
@@ -16,20 +16,113 @@ Configuration:
     R2_ACCESS_KEY_ID: R2 credentials
     R2_SECRET_ACCESS_KEY: R2 credentials
     R2_BUCKET: R2 bucket name
+    AWS_S3_ENDPOINT_URL: Custom S3 endpoint (MinIO, local stand-ins)
+    STORAGE_MULTIPART_CHUNK_SIZE: S3/R2 multipart part size in bytes (min 5 MB)
+    STORAGE_MAX_POOL_CONNECTIONS: HTTP connections per S3/R2 client (default: 25)
 """
 
+import hashlib
 import os
 import uuid
+from urllib.parse import quote
 from datetime import datetime, timedelta
 from abc import ABC, abstractmethod
 from flask import current_app
+from werkzeug.security import safe_join
+
+
+# Read size for streaming saves; the first chunk is also used for sniffing
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# S3 rejects multipart parts smaller than 5 MB (except the last one)
+MIN_MULTIPART_CHUNK_SIZE = 5 * 1024 * 1024
+
+
+class StorageValidationError(ValueError):
+    """Raised when streamed content is rejected before it is stored."""
+
+
+def _iter_file(handle, byte_range=None):
+    """Yield chunks from an open file, optionally limited to a byte range."""
+    with handle:
+        remaining = None
+        if byte_range:
+            start, end = byte_range
+            handle.seek(start)
+            if end is not None:
+                remaining = end - start + 1
+        
+        while remaining is None or remaining > 0:
+            size = STREAM_CHUNK_SIZE if remaining is None else min(STREAM_CHUNK_SIZE, remaining)
+            chunk = handle.read(size)
+            if not chunk:
+                return
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def _generate_key(filename: str, prefix: str = "") -> str:
+    ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    name = f"{uuid.uuid4()}.{ext}" if ext else str(uuid.uuid4())
+    return f"{prefix}{name}"
 
 
 class StorageBackend(ABC):
     """Abstract base class for storage backends."""
     
+    def _validated_chunks(self, stream, validate_header, digest):
+        """
+        Yield chunks from stream, validating the first one and hashing all.
+        
+        Args:
+            stream: Readable binary file-like object
+            validate_header: Optional callable given the first chunk;
+                returning False aborts before anything is stored
+            digest: dict updated in place with "size" and "sha256"
+        """
+        sha256 = hashlib.sha256()
+        size = 0
+        
+        chunk = stream.read(STREAM_CHUNK_SIZE)
+        if validate_header is not None and not validate_header(chunk):
+            raise StorageValidationError("File content does not match extension")
+        
+        while chunk:
+            sha256.update(chunk)
+            size += len(chunk)
+            yield chunk
+            chunk = stream.read(STREAM_CHUNK_SIZE)
+        
+        digest["size"] = size
+        digest["sha256"] = sha256.hexdigest()
+    
     @abstractmethod
-    def save(self, file_data: bytes, filename: str, content_type: str) -> str:
+    def save_stream(self, stream, filename: str, content_type: str, validate_header=None, key: str = None) -> dict:
+        """
+        Save a file-like object in a single streaming pass.
+        
+        The content is never held in memory in full. The first chunk is
+        passed to validate_header (e.g. a magic-byte check) before anything
+        is written, and the SHA-256 and byte count are computed on the way.
+        
+        Args:
+            stream: Readable binary file-like object
+            filename: Original filename (for extension)
+            content_type: MIME type
+            validate_header: Optional callable(first_chunk) -> bool
+            key: Explicit storage key; generated from filename if omitted
+            
+        Returns:
+            dict: {"key": storage key, "size": bytes written, "sha256": hex digest}
+            
+        Raises:
+            StorageValidationError: If validate_header rejects the content
+        """
+        pass
+    
+    @abstractmethod
+    def save(self, file_data: bytes, filename: str, content_type: str, key: str = None) -> str:
         """
         Save a file and return its storage key.
         
@@ -37,6 +130,8 @@ class StorageBackend(ABC):
             file_data: Raw file bytes
             filename: Original filename (for extension)
             content_type: MIME type
+            key: Explicit storage key (e.g. a derived file stored next to
+                its original); generated from filename if omitted
             
         Returns:
             str: Storage key for retrieving the file
@@ -56,6 +151,24 @@ class StorageBackend(ABC):
         """
         pass
     
+    @abstractmethod
+    def get_stream(self, key: str, byte_range: tuple = None):
+        """
+        Retrieve file data as an iterator of chunks.
+        
+        Args:
+            key: Storage key returned from save()
+            byte_range: Optional (start, end) inclusive byte offsets;
+                end may be None to read to the end of the file
+            
+        Returns:
+            Iterator[bytes]: File content in chunks
+            
+        Raises:
+            FileNotFoundError: If the key does not exist
+        """
+        pass
+    
     @abstractmethod
     def delete(self, key: str) -> bool:
         """
@@ -70,13 +183,14 @@ class StorageBackend(ABC):
         pass
     
     @abstractmethod
-    def get_url(self, key: str, expires_in: int = 3600) -> str:
+    def get_url(self, key: str, expires_in: int = 3600, download_name: str = None) -> str:
         """
         Get a URL for accessing the file.
         
         Args:
             key: Storage key
             expires_in: Seconds until URL expires (for signed URLs)
+            download_name: Filename to suggest via Content-Disposition
             
         Returns:
             str: URL for accessing the file
@@ -97,26 +211,68 @@ class LocalStorageBackend(StorageBackend):
         )
         os.makedirs(self.upload_folder, exist_ok=True)
     
-    def save(self, file_data: bytes, filename: str, content_type: str) -> str:
+    def save(self, file_data: bytes, filename: str, content_type: str, key: str = None) -> str:
         """Save file to local filesystem."""
-        ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
-        key = f"{uuid.uuid4()}.{ext}" if ext else str(uuid.uuid4())
+        key = key or _generate_key(filename)
         
-        filepath = os.path.join(self.upload_folder, key)
+        filepath = self._writable_path(key)
         with open(filepath, "wb") as f:
             f.write(file_data)
         
         return key
     
+    def save_stream(self, stream, filename: str, content_type: str, validate_header=None, key: str = None) -> dict:
+        """Stream file to local filesystem via a temp file renamed on success."""
+        key = key or _generate_key(filename)
+        filepath = self._writable_path(key)
+        partial_path = f"{filepath}.part"
+        digest = {}
+        
+        chunks = self._validated_chunks(stream, validate_header, digest)
+        first = next(chunks, b"")  # Validates before the file is created
+        try:
+            with open(partial_path, "wb") as f:
+                f.write(first)
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(partial_path, filepath)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        
+        return {"key": key, **digest}
+    
+    def _writable_path(self, key: str) -> str:
+        """Resolve a key for writing, creating parent folders for nested keys."""
+        filepath = safe_join(self.upload_folder, key)
+        if filepath is None:
+            raise ValueError(f"Invalid storage key: {key}")
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        return filepath
+    
+    def get_path(self, key: str) -> str:
+        """
+        Resolve a storage key to its path on disk.
+        
+        Raises:
+            FileNotFoundError: If the key escapes the upload folder or is missing
+        """
+        filepath = safe_join(self.upload_folder, key)
+        if filepath is None or not os.path.isfile(filepath):
+            raise FileNotFoundError(f"File not found: {key}")
+        return filepath
+    
     def get(self, key: str) -> bytes:
         """Read file from local filesystem."""
-        filepath = os.path.join(self.upload_folder, key)
-        if not os.path.exists(filepath):
-            raise FileNotFoundError(f"File not found: {key}")
-        
-        with open(filepath, "rb") as f:
+        with open(self.get_path(key), "rb") as f:
             return f.read()
     
+    def get_stream(self, key: str, byte_range: tuple = None):
+        """Stream file from local filesystem."""
+        # Opened eagerly so a missing file raises here, not mid-response
+        return _iter_file(open(self.get_path(key), "rb"), byte_range)
+    
     def delete(self, key: str) -> bool:
         """Delete file from local filesystem."""
         filepath = os.path.join(self.upload_folder, key)
@@ -125,7 +281,7 @@ class LocalStorageBackend(StorageBackend):
             return True
         return False
     
-    def get_url(self, key: str, expires_in: int = 3600) -> str:
+    def get_url(self, key: str, expires_in: int = 3600, download_name: str = None) -> str:
         """
         Get local URL for file.
         
@@ -136,38 +292,23 @@ class LocalStorageBackend(StorageBackend):
         return f"/uploads/{key}"
 
 
-class S3StorageBackend(StorageBackend):
+class S3CompatibleStorageBackend(StorageBackend):
     """
-    AWS S3 storage for production.
+    Shared implementation for S3 API storage (AWS S3, Cloudflare R2).
     
-    Supports signed URLs for secure access.
+    Subclasses set self.client and self.bucket.
     """
     
-    def __init__(self):
-        try:
-            import boto3
-            from botocore.config import Config
-        except ImportError:
-            raise ImportError("boto3 is required for S3 storage. Install with: pip install boto3")
-        
-        self.bucket = current_app.config.get("AWS_S3_BUCKET")
-        self.region = current_app.config.get("AWS_S3_REGION", "us-east-1")
-        
-        if not self.bucket:
-            raise ValueError("AWS_S3_BUCKET must be configured")
-        
-        self.client = boto3.client(
-            "s3",
-            region_name=self.region,
-            aws_access_key_id=current_app.config.get("AWS_ACCESS_KEY_ID"),
-            aws_secret_access_key=current_app.config.get("AWS_SECRET_ACCESS_KEY"),
-            config=Config(signature_version="s3v4"),
-        )
+    client = None
+    bucket = None
+    
+    def _multipart_chunk_size(self) -> int:
+        configured = int(current_app.config.get("STORAGE_MULTIPART_CHUNK_SIZE", 8 * 1024 * 1024))
+        return max(configured, MIN_MULTIPART_CHUNK_SIZE)
     
-    def save(self, file_data: bytes, filename: str, content_type: str) -> str:
-        """Upload file to S3."""
-        ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
-        key = f"attachments/{uuid.uuid4()}.{ext}" if ext else f"attachments/{uuid.uuid4()}"
+    def save(self, file_data: bytes, filename: str, content_type: str, key: str = None) -> str:
+        """Upload file to the bucket."""
+        key = key or _generate_key(filename, prefix="attachments/")
         
         self.client.put_object(
             Bucket=self.bucket,
@@ -178,29 +319,138 @@ class S3StorageBackend(StorageBackend):
         
         return key
     
+    def save_stream(self, stream, filename: str, content_type: str, validate_header=None, key: str = None) -> dict:
+        """
+        Stream file to the bucket.
+        
+        Files up to one part are sent with a single PutObject; larger files
+        use multipart upload so at most one part is buffered in memory.
+        """
+        key = key or _generate_key(filename, prefix="attachments/")
+        part_size = self._multipart_chunk_size()
+        digest = {}
+        buffer = bytearray()
+        upload_id = None
+        parts = []
+        
+        def upload_part(data):
+            part_number = len(parts) + 1
+            response = self.client.upload_part(
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=bytes(data),
+            )
+            parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+        
+        try:
+            for chunk in self._validated_chunks(stream, validate_header, digest):
+                buffer += chunk
+                if len(buffer) >= part_size:
+                    if upload_id is None:
+                        upload_id = self.client.create_multipart_upload(
+                            Bucket=self.bucket, Key=key, ContentType=content_type
+                        )["UploadId"]
+                    upload_part(buffer[:part_size])
+                    del buffer[:part_size]
+            
+            if upload_id is None:
+                self.client.put_object(
+                    Bucket=self.bucket,
+                    Key=key,
+                    Body=bytes(buffer),
+                    ContentType=content_type,
+                )
+            else:
+                if buffer:
+                    upload_part(buffer)
+                self.client.complete_multipart_upload(
+                    Bucket=self.bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    MultipartUpload={"Parts": parts},
+                )
+        except BaseException:
+            if upload_id is not None:
+                try:
+                    self.client.abort_multipart_upload(
+                        Bucket=self.bucket, Key=key, UploadId=upload_id
+                    )
+                except Exception:
+                    pass  # Bucket lifecycle rules clean up orphaned uploads
+            raise
+        
+        return {"key": key, **digest}
+    
     def get(self, key: str) -> bytes:
-        """Download file from S3."""
+        """Download file from the bucket."""
         response = self.client.get_object(Bucket=self.bucket, Key=key)
         return response["Body"].read()
     
+    def get_stream(self, key: str, byte_range: tuple = None):
+        """Stream file from the bucket, using a ranged GET if requested."""
+        params = {"Bucket": self.bucket, "Key": key}
+        if byte_range:
+            start, end = byte_range
+            params["Range"] = f"bytes={start}-{'' if end is None else end}"
+        
+        try:
+            response = self.client.get_object(**params)
+        except Exception as e:
+            error_code = getattr(e, "response", {}).get("Error", {}).get("Code")
+            if error_code in ("NoSuchKey", "404"):
+                raise FileNotFoundError(f"File not found: {key}") from e
+            raise
+        
+        return response["Body"].iter_chunks(STREAM_CHUNK_SIZE)
+    
     def delete(self, key: str) -> bool:
-        """Delete file from S3."""
+        """Delete file from the bucket."""
         try:
             self.client.delete_object(Bucket=self.bucket, Key=key)
             return True
         except Exception:
             return False
     
-    def get_url(self, key: str, expires_in: int = 3600) -> str:
-        """Generate presigned URL for S3 object."""
+    def get_url(self, key: str, expires_in: int = 3600, download_name: str = None) -> str:
+        """Generate presigned URL for the object."""
+        params = {"Bucket": self.bucket, "Key": key}
+        if download_name:
+            params["ResponseContentDisposition"] = (
+                f"attachment; filename*=UTF-8''{quote(download_name)}"
+            )
         return self.client.generate_presigned_url(
             "get_object",
-            Params={"Bucket": self.bucket, "Key": key},
+            Params=params,
             ExpiresIn=expires_in,
         )
 
 
-class R2StorageBackend(StorageBackend):
+class S3StorageBackend(S3CompatibleStorageBackend):
+    """
+    AWS S3 storage for production.
+    
+    Supports signed URLs for secure access. AWS_S3_ENDPOINT_URL points it
+    at an S3-compatible server such as MinIO.
+    """
+    
+    def __init__(self):
+        self.bucket = current_app.config.get("AWS_S3_BUCKET")
+        self.region = current_app.config.get("AWS_S3_REGION", "us-east-1")
+        
+        if not self.bucket:
+            raise ValueError("AWS_S3_BUCKET must be configured")
+        
+        self.client = _build_s3_client(
+            region_name=self.region,
+            endpoint_url=current_app.config.get("AWS_S3_ENDPOINT_URL") or None,
+            aws_access_key_id=current_app.config.get("AWS_ACCESS_KEY_ID"),
+            aws_secret_access_key=current_app.config.get("AWS_SECRET_ACCESS_KEY"),
+        )
+
+
+class R2StorageBackend(S3CompatibleStorageBackend):
     """
     Cloudflare R2 storage (S3-compatible).
     
@@ -208,79 +458,77 @@ class R2StorageBackend(StorageBackend):
     """
     
     def __init__(self):
-        try:
-            import boto3
-            from botocore.config import Config
-        except ImportError:
-            raise ImportError("boto3 is required for R2 storage. Install with: pip install boto3")
-        
         self.bucket = current_app.config.get("R2_BUCKET")
         account_id = current_app.config.get("R2_ACCOUNT_ID")
         
         if not self.bucket or not account_id:
             raise ValueError("R2_BUCKET and R2_ACCOUNT_ID must be configured")
         
-        endpoint_url = f"https://{account_id}.r2.cloudflarestorage.com"
-        
-        self.client = boto3.client(
-            "s3",
-            endpoint_url=endpoint_url,
+        self.client = _build_s3_client(
+            endpoint_url=f"https://{account_id}.r2.cloudflarestorage.com",
             aws_access_key_id=current_app.config.get("R2_ACCESS_KEY_ID"),
             aws_secret_access_key=current_app.config.get("R2_SECRET_ACCESS_KEY"),
-            config=Config(signature_version="s3v4"),
-        )
-    
-    def save(self, file_data: bytes, filename: str, content_type: str) -> str:
-        """Upload file to R2."""
-        ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
-        key = f"attachments/{uuid.uuid4()}.{ext}" if ext else f"attachments/{uuid.uuid4()}"
-        
-        self.client.put_object(
-            Bucket=self.bucket,
-            Key=key,
-            Body=file_data,
-            ContentType=content_type,
         )
-        
-        return key
-    
-    def get(self, key: str) -> bytes:
-        """Download file from R2."""
-        response = self.client.get_object(Bucket=self.bucket, Key=key)
-        return response["Body"].read()
+
+
+def _build_s3_client(**client_kwargs):
+    """
+    Create a boto3 S3 client sized for concurrent use.
     
-    def delete(self, key: str) -> bool:
-        """Delete file from R2."""
-        try:
-            self.client.delete_object(Bucket=self.bucket, Key=key)
-            return True
-        except Exception:
-            return False
+    boto3 clients are thread-safe; one client (and its connection pool)
+    is shared by every request in a worker process.
+    """
+    try:
+        import boto3
+        from botocore.config import Config
+    except ImportError:
+        raise ImportError("boto3 is required for S3/R2 storage. Install with: pip install boto3")
     
-    def get_url(self, key: str, expires_in: int = 3600) -> str:
-        """Generate presigned URL for R2 object."""
-        return self.client.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": self.bucket, "Key": key},
-            ExpiresIn=expires_in,
-        )
+    return boto3.client(
+        "s3",
+        config=Config(
+            signature_version="s3v4",
+            max_pool_connections=current_app.config.get("STORAGE_MAX_POOL_CONNECTIONS", 25),
+        ),
+        **client_kwargs,
+    )
+
+
+_BACKEND_CLASSES = {
+    "s3": S3StorageBackend,
+    "r2": R2StorageBackend,
+    "local": LocalStorageBackend,
+}
 
 
 def get_storage_backend() -> StorageBackend:
     """
-    Factory function to get the configured storage backend.
+    Get the configured storage backend.
+    
+    The backend (and its boto3 client) is created once per app and worker
+    process. Entries created before a fork are discarded in the child,
+    since connection pools must not be shared across processes.
     
     Returns:
         StorageBackend: The configured storage backend instance
     """
-    backend_type = current_app.config.get("STORAGE_BACKEND", "local").lower()
+    app = current_app._get_current_object()
+    backend_type = app.config.get("STORAGE_BACKEND", "local").lower()
+    cache_key = (os.getpid(), backend_type)
+    
+    cached = app.extensions.get("storage_backend")
+    if cached is not None and cached[0] == cache_key:
+        return cached[1]
     
-    if backend_type == "s3":
-        return S3StorageBackend()
-    elif backend_type == "r2":
-        return R2StorageBackend()
-    else:
-        return LocalStorageBackend()
+    # A concurrent first call may build a second instance; last one wins
+    backend = _BACKEND_CLASSES.get(backend_type, LocalStorageBackend)()
+    app.extensions["storage_backend"] = (cache_key, backend)
+    return backend
+
+
+def reset_storage_backend():
+    """Drop the cached backend so the next call rebuilds it from config."""
+    current_app.extensions.pop("storage_backend", None)
 
 
 # Convenience functions
@@ -289,6 +537,11 @@ def save_file(file_data: bytes, filename: str, content_type: str) -> str:
     return get_storage_backend().save(file_data, filename, content_type)
 
 
+def save_file_stream(stream, filename: str, content_type: str, validate_header=None, key: str = None) -> dict:
+    """Stream a file into the configured storage backend."""
+    return get_storage_backend().save_stream(stream, filename, content_type, validate_header, key)
+
+
 def get_file(key: str) -> bytes:
     """Get a file using the configured storage backend."""
     return get_storage_backend().get(key)
@@ -299,6 +552,11 @@ def delete_file(key: str) -> bool:
     return get_storage_backend().delete(key)
 
 
+def get_file_stream(key: str, byte_range: tuple = None):
+    """Stream a file using the configured storage backend."""
+    return get_storage_backend().get_stream(key, byte_range)
+
+
 def get_file_url(key: str, expires_in: int = 3600) -> str:
     """Get a URL for a file using the configured storage backend."""
     return get_storage_backend().get_url(key, expires_in)
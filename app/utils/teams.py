@@ -2,19 +2,27 @@
 Teams Notification Utilities (REQ-012)
 
 Sends proactive Teams notifications using Bot Framework.
+
+Messages go out over one keep-alive requests.Session per worker process.
+Sending a card to several users (fan_out_card) resolves every recipient's
+conversation in one query, then posts on up to TEAMS_FANOUT_CONCURRENCY
+threads, so the slowest recipient - not the sum of all of them - bounds
+the total time. Each post is capped at TEAMS_SEND_TIMEOUT seconds.
 """
 
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Iterable, Optional
 
 from flask import current_app
 
 
 BOT_SCOPE = ["https://api.botframework.com/.default"]
-_TOKEN_CACHE = {
-    "access_token": "",
-    "expires_at": 0,
-}
+
+# Adaptive cards are capped at ~28 KB; longer digests link to the admin view
+DIGEST_CARD_MAX_LINES = 40
+_HTTP_STATE = {"pid": None, "session": None}
 
 
 def _is_placeholder(value: str) -> bool:
@@ -40,33 +48,42 @@ def _get_bot_token() -> str:
     if not is_teams_configured():
         raise RuntimeError("Teams notifications are not configured")
 
-    now = time.time()
-    if _TOKEN_CACHE["access_token"] and now < (_TOKEN_CACHE["expires_at"] - 60):
-        return _TOKEN_CACHE["access_token"]
-
-    import msal
+    from .token_cache import acquire_client_token, get_access_token
 
     tenant_id = current_app.config.get("TEAMS_TENANT_ID", "botframework.com")
     authority = f"https://login.microsoftonline.com/{tenant_id}"
+    app_id = current_app.config.get("TEAMS_APP_ID")
 
-    app = msal.ConfidentialClientApplication(
-        current_app.config.get("TEAMS_APP_ID"),
-        authority=authority,
-        client_credential=current_app.config.get("TEAMS_APP_PASSWORD"),
-    )
-
-    result = app.acquire_token_for_client(scopes=BOT_SCOPE)
-    token = result.get("access_token")
-    if not token:
-        raise RuntimeError(
-            f"Failed to acquire bot token: {result.get('error_description', 'unknown error')}"
+    def acquire():
+        result = acquire_client_token(
+            app_id, authority, current_app.config.get("TEAMS_APP_PASSWORD"), BOT_SCOPE
         )
+        token = result.get("access_token")
+        if not token:
+            raise RuntimeError(
+                f"Failed to acquire bot token: {result.get('error_description', 'unknown error')}"
+            )
+        return token, int(result.get("expires_in", 3599))
 
-    expires_in = int(result.get("expires_in", 3599))
-    _TOKEN_CACHE["access_token"] = token
-    _TOKEN_CACHE["expires_at"] = now + expires_in
+    return get_access_token(f"bot:{authority}:{app_id}", acquire)
 
-    return token
+
+def _get_http_session():
+    """Get this process's keep-alive session for Bot Framework calls."""
+    pid = os.getpid()
+    if _HTTP_STATE["pid"] != pid:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=current_app.config.get("TEAMS_FANOUT_CONCURRENCY", 8),
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _HTTP_STATE.update(pid=pid, session=session)
+    return _HTTP_STATE["session"]
 
 
 def _build_message_payload(text: str, card: Optional[dict], bot_id: str, bot_name: str):
@@ -90,12 +107,8 @@ def _build_message_payload(text: str, card: Optional[dict], bot_id: str, bot_nam
     return payload
 
 
-def send_teams_message(conversation, text: str, card: Optional[dict] = None) -> bool:
-    if not is_teams_configured():
-        current_app.logger.info("Teams notification skipped: not configured")
-        return False
-
-    token = _get_bot_token()
+def _build_activity_request(conversation, text: str, card: Optional[dict]):
+    """Build the (url, payload) for a proactive message to a conversation."""
     service_url = conversation.service_url.rstrip("/")
     url = f"{service_url}/v3/conversations/{conversation.conversation_id}/activities"
 
@@ -105,17 +118,19 @@ def send_teams_message(conversation, text: str, card: Optional[dict] = None) ->
         bot_id=conversation.bot_id,
         bot_name=conversation.bot_name,
     )
+    return url, payload
 
-    import requests
 
-    response = requests.post(
+def _post_activity(session, url: str, payload: dict, token: str, timeout: float) -> None:
+    # Plain HTTP only: runs on fan-out threads without an app context
+    response = session.post(
         url,
         headers={
             "Authorization": f"Bearer {token}",
             "Content-Type": "application/json",
         },
         json=payload,
-        timeout=30,
+        timeout=timeout,
     )
 
     if response.status_code not in (200, 201, 202):
@@ -123,6 +138,21 @@ def send_teams_message(conversation, text: str, card: Optional[dict] = None) ->
             f"Teams send failed: {response.status_code} {response.text}"
         )
 
+
+def send_teams_message(conversation, text: str, card: Optional[dict] = None) -> bool:
+    if not is_teams_configured():
+        current_app.logger.info("Teams notification skipped: not configured")
+        return False
+
+    token = _get_bot_token()
+    url, payload = _build_activity_request(conversation, text, card)
+    _post_activity(
+        _get_http_session(),
+        url,
+        payload,
+        token,
+        current_app.config.get("TEAMS_SEND_TIMEOUT", 10),
+    )
     return True
 
 
@@ -147,6 +177,129 @@ def get_conversation_for_user(user):
     return conversation
 
 
+def get_conversations_for_users(users) -> dict:
+    """
+    Resolve conversations for many users in one query.
+
+    Same rules as get_conversation_for_user: a conversation linked to the
+    user wins, otherwise one matching their teams_account is linked to them.
+
+    Returns:
+        dict: user id -> TeamsConversation, for users that have one
+    """
+    from sqlalchemy import or_
+    from app.models import TeamsConversation
+    from app.extensions import db
+
+    eligible = [user for user in users if user and user.teams_opt_in and user.teams_account]
+    if not eligible:
+        return {}
+
+    user_ids = [user.id for user in eligible]
+    accounts = [user.teams_account for user in eligible]
+    candidates = TeamsConversation.query.filter(
+        or_(
+            TeamsConversation.user_id.in_(user_ids),
+            TeamsConversation.teams_user_principal.in_(accounts),
+        )
+    ).all()
+
+    by_user = {c.user_id: c for c in candidates if c.user_id}
+    by_principal = {}
+    for conversation in candidates:
+        if conversation.teams_user_principal:
+            by_principal.setdefault(conversation.teams_user_principal, conversation)
+
+    resolved = {}
+    linked = False
+    for user in eligible:
+        conversation = by_user.get(user.id)
+        if conversation is None:
+            conversation = by_principal.get(user.teams_account)
+            if conversation is None:
+                continue
+            if conversation.user_id != user.id:
+                conversation.user_id = user.id
+                linked = True
+        resolved[user.id] = conversation
+
+    if linked:
+        db.session.commit()
+    return resolved
+
+
+def fan_out_card(users: Iterable, card: dict, fallback_text: str) -> dict:
+    """
+    Send a card to many users concurrently.
+
+    Args:
+        users: Recipients (users not opted in to Teams are skipped)
+        card: Adaptive card content
+        fallback_text: Text shown where the card can't render
+
+    Returns:
+        dict: sent, failed and skipped counts, elapsed seconds, and per-user
+            results ({"user_id", "success", "error", "elapsed"})
+    """
+    users = [user for user in users if user]
+    summary = {"sent": 0, "failed": 0, "skipped": 0, "elapsed": 0.0, "results": []}
+
+    if not is_teams_configured():
+        current_app.logger.info("Teams notification skipped: not configured")
+        summary["skipped"] = len(users)
+        return summary
+
+    conversations = get_conversations_for_users(users)
+    summary["skipped"] = len(users) - len(conversations)
+    if not conversations:
+        return summary
+
+    started = time.monotonic()
+    token = _get_bot_token()
+    session = _get_http_session()
+    timeout = current_app.config.get("TEAMS_SEND_TIMEOUT", 10)
+    concurrency = max(current_app.config.get("TEAMS_FANOUT_CONCURRENCY", 8), 1)
+
+    # Read ORM attributes here; workers only do HTTP
+    emails = {user.id: user.email for user in users}
+    requests_by_user = {
+        user_id: _build_activity_request(conversation, fallback_text, card)
+        for user_id, conversation in conversations.items()
+    }
+
+    def send(user_id):
+        url, payload = requests_by_user[user_id]
+        sent_at = time.monotonic()
+        try:
+            _post_activity(session, url, payload, token, timeout)
+            error = None
+        except Exception as exc:
+            error = str(exc)
+        return {
+            "user_id": user_id,
+            "success": error is None,
+            "error": error,
+            "elapsed": round(time.monotonic() - sent_at, 3),
+        }
+
+    workers = min(concurrency, len(requests_by_user))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="teams-fanout") as pool:
+        results = list(pool.map(send, requests_by_user))
+
+    for result in results:
+        if result["success"]:
+            summary["sent"] += 1
+        else:
+            summary["failed"] += 1
+            current_app.logger.error(
+                "Teams notification failed for %s: %s", emails.get(result["user_id"]), result["error"]
+            )
+
+    summary["results"] = results
+    summary["elapsed"] = round(time.monotonic() - started, 3)
+    return summary
+
+
 def send_card_to_user(user, card: dict, fallback_text: str) -> bool:
     conversation = get_conversation_for_user(user)
     if not conversation:
@@ -157,20 +310,12 @@ def send_card_to_user(user, card: dict, fallback_text: str) -> bool:
 
 
 def send_card_to_users(users: Iterable, card: dict, fallback_text: str) -> int:
-    sent = 0
-    for user in users:
-        if not user.teams_opt_in:
-            continue
-        if not user.teams_account:
-            continue
-        try:
-            if send_card_to_user(user, card, fallback_text):
-                sent += 1
-        except Exception as exc:
-            current_app.logger.error(
-                "Teams notification failed for %s: %s", user.email, exc
-            )
-    return sent
+    """Send a card to many users concurrently; returns the number sent."""
+    try:
+        return fan_out_card(users, card, fallback_text)["sent"]
+    except Exception as exc:
+        current_app.logger.error("Teams fan-out failed: %s", exc)
+        return 0
 
 
 def build_action_open_url(title: str, url: str) -> dict:
@@ -278,3 +423,21 @@ def build_admin_submission_card(timesheet, app_url: str) -> dict:
     )
 
     return card
+
+
+def build_admin_digest_card(submissions: list, app_url: str) -> dict:
+    """Build one card listing digest rows ("user_name", "week_start", "total_hours")."""
+    count = len(submissions)
+    lines = [
+        f"{item['user_name']} - week of {item['week_start']} ({item['total_hours']} h)"
+        for item in submissions[:DIGEST_CARD_MAX_LINES]
+    ]
+    if count > DIGEST_CARD_MAX_LINES:
+        lines.append(f"...and {count - DIGEST_CARD_MAX_LINES} more")
+
+    title = "1 New Timesheet Submitted" if count == 1 else f"{count} New Timesheets Submitted"
+    return build_basic_card(
+        title,
+        lines,
+        actions=[build_action_open_url("Open Admin", f"{app_url}#admin")],
+    )
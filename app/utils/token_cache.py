@@ -0,0 +1,401 @@
+"""
+Access Token Cache
+
+Shared cache for app-only access tokens: Microsoft Graph (SharePoint
+sync) and Bot Framework (Teams notifications).
+
+Stores (TOKEN_CACHE_BACKEND):
+- redis: shared by every gunicorn worker and RQ job process (the "auto"
+  default when REDIS_URL is set)
+- file: one JSON file per token under TOKEN_CACHE_DIR, for single-host
+  deployments without Redis
+- memory: this process only
+
+Each process also keeps the tokens it has seen in memory, so a hit costs
+no round trip. Tokens are refreshed TOKEN_REFRESH_MARGIN seconds before
+they expire. A refresh holds a lock in the store (Redis SET NX, flock, or
+a thread lock) so only one process calls Azure AD: the others keep using
+the still-valid token, or wait for the refresh if they have none. A store
+that is unreachable degrades to the in-process cache.
+
+MSAL ConfidentialClientApplication objects are cached per process as
+well, since building one triggers authority discovery requests. They are
+rebuilt every MSAL_METADATA_REFRESH_SECONDS so authority metadata is
+refreshed; one thread rebuilds while the others keep using the old client.
+MSAL's own token cache stays in the client, in this process only.
+
+Hits, misses and proactive refreshes are counted in request metrics.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "timesheet:token:"
+
+# Tokens closer than this to expiry are never handed out
+MIN_REMAINING_SECONDS = 60
+
+# How long a refresh may hold the lock, and how long others wait for it
+LOCK_TIMEOUT_SECONDS = 30
+LOCK_WAIT_SECONDS = 10
+LOCK_POLL_SECONDS = 0.05
+
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+_STATE = {
+    "pid": None,
+    "store": None,
+    "store_config": None,
+    "local": {},
+    "clients": {},
+    "refreshing": set(),
+}
+_STATE_LOCK = threading.Lock()
+
+
+def _wait_for(try_acquire, blocking: bool) -> bool:
+    deadline = time.monotonic() + LOCK_WAIT_SECONDS
+    while True:
+        if try_acquire():
+            return True
+        if not blocking or time.monotonic() >= deadline:
+            return False
+        time.sleep(LOCK_POLL_SECONDS)
+
+
+class MemoryTokenStore:
+    """Token store for this process only."""
+
+    def __init__(self):
+        self._entries = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry and entry["expires_at"] <= time.time():
+            return None
+        return entry
+
+    def set(self, key, entry, ttl):
+        self._entries[key] = entry
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+    @contextmanager
+    def lock(self, key, blocking=True):
+        with self._guard:
+            lock = self._locks.setdefault(key, threading.Lock())
+        acquired = _wait_for(lambda: lock.acquire(blocking=False), blocking)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                lock.release()
+
+
+class FileTokenStore:
+    """Token store in a directory shared by the processes on one host."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def _path(self, key, suffix):
+        digest = hashlib.sha256(key.encode()).hexdigest()[:32]
+        return os.path.join(self.directory, f"{digest}{suffix}")
+
+    def get(self, key):
+        try:
+            with open(self._path(key, ".json")) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("expires_at", 0) <= time.time():
+            return None
+        return entry
+
+    def set(self, key, entry, ttl):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(key, ".json"))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key, ".json"))
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def lock(self, key, blocking=True):
+        import fcntl
+
+        with open(self._path(key, ".lock"), "a") as handle:
+            def try_acquire():
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return True
+                except BlockingIOError:
+                    return False
+
+            acquired = _wait_for(try_acquire, blocking)
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+class RedisTokenStore:
+    """Token store shared through Redis."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key):
+        raw = self.client.get(f"{REDIS_KEY_PREFIX}{key}")
+        return json.loads(raw) if raw else None
+
+    def set(self, key, entry, ttl):
+        self.client.set(f"{REDIS_KEY_PREFIX}{key}", json.dumps(entry), ex=max(int(ttl), 1))
+
+    def delete(self, key):
+        self.client.delete(f"{REDIS_KEY_PREFIX}{key}")
+
+    @contextmanager
+    def lock(self, key, blocking=True):
+        lock_key = f"{REDIS_KEY_PREFIX}{key}:lock"
+        owner = uuid.uuid4().hex
+        try:
+            acquired = _wait_for(
+                lambda: bool(
+                    self.client.set(lock_key, owner, nx=True, px=LOCK_TIMEOUT_SECONDS * 1000)
+                ),
+                blocking,
+            )
+        except Exception as e:
+            # Redis is down: refresh without coordination rather than fail
+            logger.warning(f"Token cache lock unavailable: {e}")
+            yield True
+            return
+
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                # Only release our own lock, not one taken after ours expired
+                _store_call(self.client.eval, _RELEASE_LOCK_SCRIPT, 1, lock_key, owner)
+
+
+def _build_store(backend, redis_url, directory):
+    if backend == "auto":
+        backend = "redis" if redis_url else "memory"
+
+    if backend == "redis":
+        if not redis_url:
+            logger.warning("TOKEN_CACHE_BACKEND=redis but REDIS_URL is not set; using memory")
+            return MemoryTokenStore()
+        import redis
+        return RedisTokenStore(
+            redis.from_url(redis_url, socket_timeout=1, socket_connect_timeout=1)
+        )
+    if backend == "file":
+        return FileTokenStore(directory or os.path.join(tempfile.gettempdir(), "timesheet-token-cache"))
+    return MemoryTokenStore()
+
+
+def _reset_if_forked():
+    pid = os.getpid()
+    if _STATE["pid"] != pid:
+        # Forked workers must not share the parent's connections or locks
+        _STATE.update(
+            pid=pid, store=None, store_config=None, local={}, clients={}, refreshing=set()
+        )
+
+
+def get_token_store():
+    """Get this process's token store for the configured backend."""
+    config = current_app.config
+    store_config = (
+        (config.get("TOKEN_CACHE_BACKEND") or "auto").lower(),
+        config.get("REDIS_URL") or "",
+        config.get("TOKEN_CACHE_DIR") or "",
+    )
+
+    with _STATE_LOCK:
+        _reset_if_forked()
+        if _STATE["store"] is None or _STATE["store_config"] != store_config:
+            _STATE["store"] = _build_store(*store_config)
+            _STATE["store_config"] = store_config
+        return _STATE["store"]
+
+
+def reset_token_cache():
+    """Forget cached tokens and MSAL clients in this process (for tests)."""
+    with _STATE_LOCK:
+        _STATE.update(
+            pid=None, store=None, store_config=None, local={}, clients={}, refreshing=set()
+        )
+
+
+def _record(name, outcome):
+    try:
+        from .observability import request_metrics
+        request_metrics.record_token_cache(name.split(":", 1)[0], outcome)
+    except Exception:
+        pass
+
+
+def _usable(entry, now, margin=0):
+    return bool(entry) and entry["expires_at"] - max(margin, MIN_REMAINING_SECONDS) > now
+
+
+def _store_call(method, *args):
+    """Call a store method, treating store errors as a cache miss."""
+    try:
+        return method(*args)
+    except Exception as e:
+        logger.warning(f"Token cache store error: {e}")
+        return None
+
+
+def _refresh(name, acquire, store):
+    access_token, expires_in = acquire()
+    entry = {"access_token": access_token, "expires_at": time.time() + int(expires_in)}
+    _STATE["local"][name] = entry
+    _store_call(store.set, name, entry, expires_in)
+    return access_token
+
+
+def get_access_token(name: str, acquire) -> str:
+    """
+    Get a cached access token, acquiring or refreshing it as needed.
+
+    Args:
+        name: Cache key, prefixed by token kind (e.g. "graph:<client id>")
+        acquire: Callable returning (access_token, expires_in_seconds);
+            errors it raises propagate to the caller
+
+    Returns:
+        str: Access token with at least a minute of validity left
+    """
+    store = get_token_store()
+    margin = current_app.config.get("TOKEN_REFRESH_MARGIN", 300)
+    now = time.time()
+
+    entry = _STATE["local"].get(name)
+    if not _usable(entry, now, margin):
+        shared = _store_call(store.get, name)
+        if shared and (not entry or shared["expires_at"] > entry["expires_at"]):
+            entry = shared
+            _STATE["local"][name] = entry
+
+    if _usable(entry, now, margin):
+        _record(name, "hit")
+        return entry["access_token"]
+
+    if _usable(entry, now):
+        # Nearing expiry: one process refreshes, the rest keep using it
+        with store.lock(name, blocking=False) as acquired:
+            if acquired:
+                _record(name, "refresh")
+                return _refresh(name, acquire, store)
+        _record(name, "hit")
+        return entry["access_token"]
+
+    # If the wait times out, acquire anyway rather than fail the caller
+    with store.lock(name, blocking=True):
+        # Another process may have refreshed while we waited
+        shared = _store_call(store.get, name)
+        if _usable(shared, time.time()):
+            _STATE["local"][name] = shared
+            _record(name, "hit")
+            return shared["access_token"]
+
+        _record(name, "miss")
+        return _refresh(name, acquire, store)
+
+
+def get_confidential_client(client_id: str, authority: str, client_credential):
+    """
+    Get this process's MSAL ConfidentialClientApplication for an app.
+
+    Building one fetches authority metadata over HTTP, so it is done once
+    per process and credential rather than per token request, and again
+    every MSAL_METADATA_REFRESH_SECONDS (0 never refreshes).
+    """
+    import msal
+
+    key = (
+        client_id,
+        authority,
+        hashlib.sha256(str(client_credential).encode()).hexdigest(),
+    )
+    max_age = current_app.config.get("MSAL_METADATA_REFRESH_SECONDS", 86400)
+
+    with _STATE_LOCK:
+        _reset_if_forked()
+        cached = _STATE["clients"].get(key)
+        if cached is not None:
+            fresh = max_age <= 0 or time.monotonic() - cached["built_at"] < max_age
+            if fresh or key in _STATE["refreshing"]:
+                return cached["client"]
+        _STATE["refreshing"].add(key)
+
+    try:
+        client = msal.ConfidentialClientApplication(
+            client_id,
+            authority=authority,
+            client_credential=client_credential,
+        )
+    except Exception as e:
+        if cached is None:
+            raise
+        # Keep signing people in with the metadata we already have
+        logger.warning(f"MSAL client refresh failed, retrying later: {e}")
+        client = cached["client"]
+    finally:
+        with _STATE_LOCK:
+            _STATE["refreshing"].discard(key)
+
+    with _STATE_LOCK:
+        _STATE["clients"][key] = {"client": client, "built_at": time.monotonic()}
+    return client
+
+
+def acquire_client_token(client_id: str, authority: str, client_credential, scopes) -> dict:
+    """
+    Request a fresh app-only token through the cached MSAL client.
+
+    MSAL's own in-memory copy is dropped first, so a proactive refresh
+    gets a new token rather than the one being replaced.
+
+    Returns:
+        dict: MSAL result (access_token/expires_in, or error details)
+    """
+    client = get_confidential_client(client_id, authority, client_credential)
+    client.remove_tokens_for_client()
+    return client.acquire_token_for_client(scopes=scopes)
@@ -0,0 +1,49 @@
+"""Add content-addressed attachment blobs
+
+Revision ID: 011_attachment_blobs
+Revises: 010_enhanced_roles
+Create Date: 2026-10-19
+
+Identical uploads share one stored object, tracked by SHA-256 with a
+reference count. Existing attachments keep content_hash NULL and are
+deleted from storage directly, as before.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "011_attachment_blobs"
+down_revision = "010_enhanced_roles"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "attachment_blobs",
+        sa.Column("sha256", sa.String(length=64), primary_key=True),
+        sa.Column("storage_key", sa.String(length=255), nullable=False),
+        sa.Column("file_size", sa.Integer(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+
+    with op.batch_alter_table("attachments", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("content_hash", sa.String(length=64), nullable=True))
+        batch_op.create_index("ix_attachments_content_hash", ["content_hash"], unique=False)
+        batch_op.create_foreign_key(
+            "fk_attachments_content_hash",
+            "attachment_blobs",
+            ["content_hash"],
+            ["sha256"],
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("attachments", schema=None) as batch_op:
+        batch_op.drop_constraint("fk_attachments_content_hash", type_="foreignkey")
+        batch_op.drop_index("ix_attachments_content_hash")
+        batch_op.drop_column("content_hash")
+
+    op.drop_table("attachment_blobs")
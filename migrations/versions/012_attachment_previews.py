@@ -0,0 +1,27 @@
+"""Add attachment preview columns
+
+Revision ID: 012_attachment_previews
+Revises: 011_attachment_blobs
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "012_attachment_previews"
+down_revision = "011_attachment_blobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("attachments", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("preview_key", sa.String(length=300), nullable=True))
+        batch_op.add_column(sa.Column("preview_mime_type", sa.String(length=50), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("attachments", schema=None) as batch_op:
+        batch_op.drop_column("preview_mime_type")
+        batch_op.drop_column("preview_key")
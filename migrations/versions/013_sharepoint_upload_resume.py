@@ -0,0 +1,27 @@
+"""Persist SharePoint upload sessions for resume
+
+Revision ID: 013_sp_upload_resume
+Revises: 012_attachment_previews
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "013_sp_upload_resume"
+down_revision = "012_attachment_previews"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("attachments", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("sharepoint_upload_url", sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column("sharepoint_upload_offset", sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("attachments", schema=None) as batch_op:
+        batch_op.drop_column("sharepoint_upload_offset")
+        batch_op.drop_column("sharepoint_upload_url")
@@ -0,0 +1,37 @@
+"""Queue admin submission notifications for digests
+
+Revision ID: 014_admin_digest_items
+Revises: 013_sp_upload_resume
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "014_admin_digest_items"
+down_revision = "013_sp_upload_resume"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "admin_digest_items",
+        sa.Column("id", sa.String(length=36), primary_key=True),
+        sa.Column("admin_id", sa.String(length=36), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column(
+            "timesheet_id",
+            sa.String(length=36),
+            sa.ForeignKey("timesheets.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.UniqueConstraint("admin_id", "timesheet_id", name="uq_admin_digest_items_admin_timesheet"),
+    )
+    op.create_index("ix_admin_digest_items_admin_id", "admin_digest_items", ["admin_id"])
+
+
+def downgrade():
+    op.drop_index("ix_admin_digest_items_admin_id", table_name="admin_digest_items")
+    op.drop_table("admin_digest_items")
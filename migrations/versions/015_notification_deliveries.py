@@ -0,0 +1,46 @@
+"""Add the notification delivery ledger
+
+Revision ID: 015_notification_deliveries
+Revises: 014_admin_digest_items
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "015_notification_deliveries"
+down_revision = "014_admin_digest_items"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "notification_deliveries",
+        sa.Column("id", sa.String(length=36), primary_key=True),
+        sa.Column("idempotency_key", sa.String(length=255), nullable=False),
+        sa.Column("user_id", sa.String(length=36), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("timesheet_id", sa.String(length=36), sa.ForeignKey("timesheets.id"), nullable=True),
+        sa.Column("type", sa.String(length=20), nullable=False),
+        sa.Column("channel", sa.String(length=10), nullable=False),
+        sa.Column("week_start", sa.Date(), nullable=True),
+        sa.Column("status", sa.String(length=10), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=True),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("sent_at", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.UniqueConstraint("idempotency_key", name="uq_notification_deliveries_idempotency_key"),
+    )
+    op.create_index("ix_notification_deliveries_user_id", "notification_deliveries", ["user_id"])
+    op.create_index(
+        "ix_notification_deliveries_due", "notification_deliveries", ["status", "next_attempt_at"]
+    )
+
+
+def downgrade():
+    op.drop_index("ix_notification_deliveries_due", table_name="notification_deliveries")
+    op.drop_index("ix_notification_deliveries_user_id", table_name="notification_deliveries")
+    op.drop_table("notification_deliveries")
@@ -0,0 +1,32 @@
+"""Record the latest run of each scheduled job
+
+Revision ID: 016_scheduled_jobs
+Revises: 015_notification_deliveries
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "016_scheduled_jobs"
+down_revision = "015_notification_deliveries"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "scheduled_jobs",
+        sa.Column("name", sa.String(length=100), primary_key=True),
+        sa.Column("last_started_at", sa.DateTime(), nullable=True),
+        sa.Column("last_finished_at", sa.DateTime(), nullable=True),
+        sa.Column("last_duration_seconds", sa.Float(), nullable=True),
+        sa.Column("last_status", sa.String(length=20), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("run_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade():
+    op.drop_table("scheduled_jobs")
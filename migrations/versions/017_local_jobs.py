@@ -0,0 +1,39 @@
+"""Durable queue for the local job runner
+
+Revision ID: 017_local_jobs
+Revises: 016_scheduled_jobs
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "017_local_jobs"
+down_revision = "016_scheduled_jobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "local_jobs",
+        sa.Column("id", sa.String(length=36), primary_key=True),
+        sa.Column("func", sa.String(length=255), nullable=False),
+        sa.Column("args", sa.JSON(), nullable=False),
+        sa.Column("kwargs", sa.JSON(), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("max_attempts", sa.Integer(), nullable=False, server_default="1"),
+        sa.Column("timeout", sa.Integer(), nullable=True),
+        sa.Column("run_at", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_local_jobs_due", "local_jobs", ["status", "run_at"])
+
+
+def downgrade():
+    op.drop_index("ix_local_jobs_due", table_name="local_jobs")
+    op.drop_table("local_jobs")
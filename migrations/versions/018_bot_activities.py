@@ -0,0 +1,36 @@
+"""Store inbound bot activities for background processing
+
+Revision ID: 018_bot_activities
+Revises: 017_local_jobs
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "018_bot_activities"
+down_revision = "017_local_jobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "bot_activities",
+        sa.Column("id", sa.String(length=36), primary_key=True),
+        sa.Column("activity_key", sa.String(length=64), nullable=False, unique=True),
+        sa.Column("activity_id", sa.String(length=255), nullable=True),
+        sa.Column("activity_type", sa.String(length=50), nullable=True),
+        sa.Column("activity", sa.JSON(), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("received_at", sa.DateTime(), nullable=False),
+        sa.Column("processed_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_bot_activities_received_at", "bot_activities", ["received_at"])
+
+
+def downgrade():
+    op.drop_index("ix_bot_activities_received_at", table_name="bot_activities")
+    op.drop_table("bot_activities")
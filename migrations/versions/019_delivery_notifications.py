@@ -0,0 +1,34 @@
+"""Link SMS deliveries to their notification records
+
+Revision ID: 019_delivery_notifications
+Revises: 018_bot_activities
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "019_delivery_notifications"
+down_revision = "018_bot_activities"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Add notification_id to notification_deliveries."""
+    with op.batch_alter_table("notification_deliveries", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("notification_id", sa.String(length=36), nullable=True))
+        batch_op.create_foreign_key(
+            "fk_notification_deliveries_notification_id",
+            "notifications",
+            ["notification_id"],
+            ["id"],
+        )
+
+
+def downgrade():
+    """Remove notification_id from notification_deliveries."""
+    with op.batch_alter_table("notification_deliveries", schema=None) as batch_op:
+        batch_op.drop_constraint("fk_notification_deliveries_notification_id", type_="foreignkey")
+        batch_op.drop_column("notification_id")
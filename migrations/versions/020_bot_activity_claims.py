@@ -0,0 +1,27 @@
+"""Record when a bot activity was claimed for processing
+
+Revision ID: 020_bot_activity_claims
+Revises: 019_delivery_notifications
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "020_bot_activity_claims"
+down_revision = "019_delivery_notifications"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Add claimed_at to bot_activities."""
+    with op.batch_alter_table("bot_activities", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("claimed_at", sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    """Remove claimed_at from bot_activities."""
+    with op.batch_alter_table("bot_activities", schema=None) as batch_op:
+        batch_op.drop_column("claimed_at")
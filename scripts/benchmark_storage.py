@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Storage Backend Micro-Benchmark
+
+Compares per-call overhead of building a fresh S3 backend (and boto3
+client) for every operation against the cached backend returned by
+get_storage_backend().
+
+Requires boto3 and an S3-compatible server, for example:
+
+    pip install "moto[server]" && moto_server -p 5001
+    # or: docker run -p 9000:9000 minio/minio server /data
+
+Usage:
+    python scripts/benchmark_storage.py --endpoint-url http://localhost:5001
+    python scripts/benchmark_storage.py --endpoint-url http://localhost:9000 \\
+        --access-key minioadmin --secret-key minioadmin --iterations 500
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from app.utils.storage import (  # noqa: E402
+    S3StorageBackend,
+    get_storage_backend,
+    reset_storage_backend,
+)
+
+
+def _run(label, iterations, get_backend, key):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        get_backend().get(key)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(
+        f"{label:<10} mean={statistics.mean(timings):7.2f}ms "
+        f"p50={statistics.median(timings):7.2f}ms p95={p95:7.2f}ms"
+    )
+    return statistics.mean(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--endpoint-url", required=True)
+    parser.add_argument("--bucket", default="timesheet-benchmark")
+    parser.add_argument("--access-key", default="testing")
+    parser.add_argument("--secret-key", default="testing")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app()
+    app.config.update(
+        STORAGE_BACKEND="s3",
+        AWS_S3_BUCKET=args.bucket,
+        AWS_S3_ENDPOINT_URL=args.endpoint_url,
+        AWS_ACCESS_KEY_ID=args.access_key,
+        AWS_SECRET_ACCESS_KEY=args.secret_key,
+    )
+
+    with app.app_context():
+        reset_storage_backend()
+        backend = get_storage_backend()
+        try:
+            backend.client.create_bucket(Bucket=args.bucket)
+        except backend.client.exceptions.BucketAlreadyOwnedByYou:
+            pass
+        key = backend.save(b"%PDF-1.4 benchmark", "bench.pdf", "application/pdf")
+
+        uncached = _run("uncached", args.iterations, S3StorageBackend, key)
+        cached = _run("cached", args.iterations, get_storage_backend, key)
+        print(f"overhead removed per call: {uncached - cached:.2f}ms")
+
+        backend.delete(key)
+
+
+if __name__ == "__main__":
+    main()
@@ -645,10 +645,16 @@ function showAdminTimesheetDetail(timesheet) {
                             ? `<button class="btn btn-ghost btn-sm" type="button" onclick="retrySharepointSync('${att.id}', '${timesheet.id}')">Retry</button>`
                             : '';
 
+                        const previewImage = att.has_preview
+                            ? `<img class="attachment-preview" loading="lazy" alt=""
+                                   src="/api/admin/timesheets/${timesheet.id}/attachments/${att.id}/preview">`
+                            : '';
+
                         return `
                             <div class="attachment-item attachment-admin">
                                 <a href="/api/admin/timesheets/${timesheet.id}/attachments/${att.id}" 
                                    target="_blank" rel="noopener">
+                                    ${previewImage}
                                     ${escapeHtml(att.filename)}${att.reimbursement_type ? ` (${escapeHtml(att.reimbursement_type)})` : ''}
                                 </a>
                                 <div class="attachment-sync">
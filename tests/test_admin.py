@@ -254,3 +254,109 @@ class TestAdminListUsers:
         emails = [u["email"] for u in data["users"]]
         assert "user@northstar.com" in emails
         assert "admin@northstar.com" in emails
+
+
+class TestSchedulerStatus:
+    """Tests for GET /api/admin/scheduler."""
+
+    def test_requires_admin(self, auth_client):
+        response = auth_client.get("/api/admin/scheduler")
+        assert response.status_code == 403
+
+    def test_lists_scheduled_jobs(self, admin_client):
+        """Without rq-scheduler the schedule is still listed, without next runs."""
+        response = admin_client.get("/api/admin/scheduler")
+        assert response.status_code == 200
+
+        jobs = {job["name"]: job for job in response.get_json()["jobs"]}
+        assert jobs["daily-reminders"]["cron"] == "0 9 * * 1-5"
+        assert jobs["daily-reminders"]["next_run_at"] is None
+        assert jobs["daily-reminders"]["last_status"] is None
+
+
+class TestRequestProfiling:
+    """Tests for signed-token request profiling (/api/admin/profiles)."""
+
+    @pytest.fixture
+    def profiling_app(self, app, tmp_path):
+        app.config["PROFILING_ENABLED"] = True
+        app.config["PROFILE_DIR"] = str(tmp_path)
+        return app
+
+    def _token(self, admin_client):
+        response = admin_client.post("/api/admin/profiles/token")
+        assert response.status_code == 200
+        return response.get_json()["token"]
+
+    def test_token_requires_admin(self, auth_client, profiling_app):
+        """Regular users cannot mint profiling tokens."""
+        response = auth_client.post("/api/admin/profiles/token")
+        assert response.status_code == 403
+
+    def test_token_rejected_when_disabled(self, admin_client):
+        """Profiling must be switched on explicitly."""
+        response = admin_client.post("/api/admin/profiles/token")
+        assert response.status_code == 400
+
+    def test_signed_request_is_profiled(self, admin_client, profiling_app):
+        """A request with a valid token stores a profile under its request ID."""
+        token = self._token(admin_client)
+        response = admin_client.get(
+            "/api/admin/timesheets",
+            headers={"X-Profile-Token": token, "X-Request-ID": "prof-req-1"},
+        )
+        assert response.status_code == 200
+        assert response.headers["X-Profile-ID"] == "prof-req-1"
+
+        listing = admin_client.get("/api/admin/profiles").get_json()
+        assert listing["profiles"][0]["path"] == "/api/admin/timesheets"
+
+        download = admin_client.get("/api/admin/profiles/prof-req-1")
+        assert download.status_code == 200
+        assert download.mimetype == "application/octet-stream"
+
+        report = admin_client.get("/api/admin/profiles/prof-req-1?format=text&sort=tottime")
+        assert report.status_code == 200
+        assert b"function calls" in report.data
+
+    def test_query_flag_triggers_profile(self, admin_client, profiling_app):
+        """The token can also be passed as the _profile query parameter."""
+        token = self._token(admin_client)
+        response = admin_client.get(f"/api/admin/users?_profile={token}")
+        assert "X-Profile-ID" in response.headers
+
+    def test_invalid_token_not_profiled(self, admin_client, profiling_app):
+        """Forged tokens are ignored."""
+        response = admin_client.get(
+            "/api/admin/timesheets", headers={"X-Profile-Token": "forged"}
+        )
+        assert "X-Profile-ID" not in response.headers
+
+    def test_unsafe_request_id_gets_generated_profile_id(self, admin_client, profiling_app):
+        """Client request IDs that aren't filename-safe are replaced."""
+        token = self._token(admin_client)
+        response = admin_client.get(
+            "/api/admin/users",
+            headers={"X-Profile-Token": token, "X-Request-ID": "../../etc/passwd"},
+        )
+        profile_id = response.headers["X-Profile-ID"]
+        assert "/" not in profile_id
+        assert admin_client.get(f"/api/admin/profiles/{profile_id}").status_code == 200
+
+    def test_profile_ring_is_bounded(self, admin_client, profiling_app):
+        """Only PROFILE_MAX_FILES profiles are kept."""
+        profiling_app.config["PROFILE_MAX_FILES"] = 2
+        token = self._token(admin_client)
+        for i in range(4):
+            admin_client.get(
+                "/api/admin/users",
+                headers={"X-Profile-Token": token, "X-Request-ID": f"ring-{i}"},
+            )
+
+        ids = {p["id"] for p in admin_client.get("/api/admin/profiles").get_json()["profiles"]}
+        assert len(ids) == 2
+        assert admin_client.get("/api/admin/profiles/ring-0").status_code == 404
+
+    def test_missing_profile(self, admin_client, profiling_app):
+        """Unknown profile IDs return 404."""
+        assert admin_client.get("/api/admin/profiles/nope").status_code == 404
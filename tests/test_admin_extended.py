@@ -1075,3 +1075,104 @@ class TestRejectTimesheetEdgeCases:
         assert response.status_code == 200
         # No note should be created when no reason provided
 
+
+
+# ============================================================================
+# Attachment Archive Export Tests
+# ============================================================================
+
+class TestExportAttachments:
+    """Tests for the attachment ZIP export."""
+
+    @pytest.fixture
+    def stored_attachment_file(self, app, timesheet_with_attachment):
+        import os
+
+        with app.app_context():
+            path = os.path.join(app.config["UPLOAD_FOLDER"], timesheet_with_attachment["attachment_filename"])
+            with open(path, "wb") as f:
+                f.write(b"%PDF-1.4 field ticket")
+        return timesheet_with_attachment
+
+    def test_streams_zip_organized_by_employee_and_week(self, admin_client, stored_attachment_file, app):
+        """Test that the archive contains attachments under employee/week folders."""
+        import zipfile
+
+        with app.app_context():
+            ts = db.session.get(Timesheet, stored_attachment_file["id"])
+            db.session.add(Attachment(
+                timesheet_id=ts.id,
+                filename="not-on-disk.pdf",
+                original_filename="approval_doc.pdf",
+                mime_type="application/pdf",
+                file_size=10,
+            ))
+            db.session.commit()
+            folder = f"Test_User/{ts.week_start.isoformat()}"
+
+        response = admin_client.get(
+            f"/api/admin/exports/attachments?user_id={stored_attachment_file['user_id']}"
+        )
+
+        assert response.status_code == 200
+        assert response.mimetype == "application/zip"
+        archive = zipfile.ZipFile(BytesIO(response.data))
+        assert archive.read(f"{folder}/approval_doc.pdf") == b"%PDF-1.4 field ticket"
+        assert archive.read("MISSING_FILES.txt").decode() == f"{folder}/approval_doc (2).pdf\n"
+
+    def test_no_matching_attachments(self, admin_client, submitted_timesheet):
+        """Test 404 when no attachments match the filters."""
+        response = admin_client.get(
+            f"/api/admin/exports/attachments?user_id={submitted_timesheet['user_id']}"
+        )
+        assert response.status_code == 404
+
+    def test_large_archive_runs_in_background(self, admin_client, stored_attachment_file, app):
+        """Test that archives over the sync limit are queued."""
+        app.config["ATTACHMENT_ARCHIVE_SYNC_MAX_BYTES"] = 1
+        queue = MagicMock()
+        queue.enqueue.return_value = MagicMock(id="job-123")
+
+        with patch("app.jobs.get_queue", return_value=queue):
+            response = admin_client.get("/api/admin/exports/attachments")
+
+        assert response.status_code == 202
+        data = response.get_json()
+        assert data["job_id"] == "job-123"
+        assert data["status_url"].endswith("/jobs/job-123")
+        entries = queue.enqueue.call_args.args[1]
+        assert entries[0]["key"] == stored_attachment_file["attachment_filename"]
+
+    def test_background_archive_resumable_download(self, admin_client, stored_attachment_file, sample_admin, app):
+        """Test status reporting and Range downloads of a finished archive."""
+        from app.utils.archive import collect_archive_entries, write_attachment_archive
+
+        with app.app_context():
+            timesheets = Timesheet.query.filter_by(id=stored_attachment_file["id"]).all()
+            result = write_attachment_archive(
+                collect_archive_entries(timesheets), "archives/job-456.zip"
+            )
+
+        job = MagicMock()
+        job.meta = {"requested_by": sample_admin["id"], "files_total": 1, "files_done": 1}
+        job.result = result
+        job.get_status.return_value = "finished"
+
+        with patch("app.jobs.fetch_job", return_value=job):
+            status = admin_client.get("/api/admin/exports/attachments/jobs/job-456").get_json()
+            assert status["status"] == "finished"
+            assert status["size"] == result["size"]
+
+            response = admin_client.get(status["download_url"], headers={"Range": "bytes=10-"})
+            assert response.status_code == 206
+            assert len(response.data) == result["size"] - 10
+
+    def test_archive_job_hidden_from_other_users(self, admin_client):
+        """Test that archive jobs are only visible to the requester."""
+        job = MagicMock()
+        job.meta = {"requested_by": "someone-else"}
+
+        with patch("app.jobs.fetch_job", return_value=job):
+            response = admin_client.get("/api/admin/exports/attachments/jobs/job-789")
+
+        assert response.status_code == 404
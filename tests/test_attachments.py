@@ -215,4 +215,239 @@ class TestAttachments:
             f"/api/admin/timesheets/{timesheet_id}/attachments/{attachment_id}"
         )
         assert response.status_code == 200
-        assert response.data == b"%PDF-1.4 test"
\ No newline at end of file
+        assert response.data == b"%PDF-1.4 test"
+
+class TestAttachmentDeduplication:
+    """Tests for content-addressed attachment storage."""
+
+    @pytest.fixture
+    def second_timesheet(self, app, sample_user, sample_week_start):
+        from datetime import timedelta
+        from app.models import Timesheet
+
+        with app.app_context():
+            timesheet = Timesheet(
+                user_id=sample_user['id'],
+                week_start=sample_week_start - timedelta(weeks=2),
+                status=TimesheetStatus.NEW,
+            )
+            db.session.add(timesheet)
+            db.session.commit()
+            return timesheet.id
+
+    def _upload(self, client, timesheet_id, content):
+        response = client.post(
+            f"/api/timesheets/{timesheet_id}/attachments",
+            data={'file': (io.BytesIO(content), 'receipt.pdf')},
+            content_type='multipart/form-data'
+        )
+        assert response.status_code == 201
+        return response.get_json()['id']
+
+    def test_identical_uploads_share_one_blob(self, auth_client, sample_timesheet, second_timesheet, app):
+        """Test that re-uploading the same receipt stores it once."""
+        from app.models import AttachmentBlob
+
+        content = b"%PDF-1.4 " + os.urandom(64)
+        first_id = self._upload(auth_client, sample_timesheet['id'], content)
+        second_id = self._upload(auth_client, second_timesheet, content)
+
+        with app.app_context():
+            first = Attachment.query.get(first_id)
+            second = Attachment.query.get(second_id)
+            assert first.filename == second.filename
+            assert first.content_hash == second.content_hash
+
+            blob = AttachmentBlob.query.get(first.content_hash)
+            assert blob.ref_count == 2
+
+            upload_folder = current_app.config['UPLOAD_FOLDER']
+            matching = []
+            for name in os.listdir(upload_folder):
+                path = os.path.join(upload_folder, name)
+                if os.path.isfile(path):
+                    with open(path, 'rb') as f:
+                        if f.read() == content:
+                            matching.append(name)
+            assert matching == [first.filename]
+
+    def test_blob_removed_with_last_reference(self, auth_client, sample_timesheet, second_timesheet, app):
+        """Test that stored content survives until the last attachment is deleted."""
+        from app.models import AttachmentBlob
+
+        content = b"%PDF-1.4 " + os.urandom(64)
+        first_id = self._upload(auth_client, sample_timesheet['id'], content)
+        self._upload(auth_client, second_timesheet, content)
+
+        with app.app_context():
+            first = Attachment.query.get(first_id)
+            content_hash = first.content_hash
+            filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], first.filename)
+
+        response = auth_client.delete(
+            f"/api/timesheets/{sample_timesheet['id']}/attachments/{first_id}"
+        )
+        assert response.status_code == 200
+        assert os.path.exists(filepath)
+        with app.app_context():
+            assert AttachmentBlob.query.get(content_hash).ref_count == 1
+
+        # Deleting the draft timesheet releases its attachments too
+        response = auth_client.delete(f"/api/timesheets/{second_timesheet}")
+        assert response.status_code == 200
+        assert not os.path.exists(filepath)
+        with app.app_context():
+            assert AttachmentBlob.query.get(content_hash) is None
+
+    def test_sharepoint_sync_links_identical_content(self, auth_client, sample_timesheet, app):
+        """Test that identical content in the same SharePoint folder is not re-uploaded."""
+        from unittest.mock import patch
+        from app.utils.sharepoint import upload_attachment_to_sharepoint
+
+        content = b"%PDF-1.4 " + os.urandom(64)
+        first_id = self._upload(auth_client, sample_timesheet['id'], content)
+        second_id = self._upload(auth_client, sample_timesheet['id'], content)
+
+        app.config.update(
+            SHAREPOINT_SYNC_ENABLED=True,
+            AZURE_CLIENT_ID="client",
+            AZURE_CLIENT_SECRET="secret",
+            SP_SITE_ID="site",
+            SP_DRIVE_ID="drive",
+        )
+        with app.app_context():
+            first = Attachment.query.get(first_id)
+            first.sharepoint_sync_status = Attachment.SharePointSyncStatus.SYNCED
+            first.sharepoint_item_id = "item-1"
+            first.sharepoint_drive_id = "drive"
+            first.sharepoint_web_url = "https://sharepoint.example/item-1"
+            db.session.commit()
+
+            with patch("app.utils.sharepoint._get_graph_token") as get_token:
+                result = upload_attachment_to_sharepoint(Attachment.query.get(second_id))
+
+            get_token.assert_not_called()
+            assert result["item_id"] == "item-1"
+            assert result["deduplicated"] is True
+
+
+class TestAttachmentPreviews:
+    """Tests for thumbnail/preview generation and serving."""
+
+    @staticmethod
+    def _png_bytes(size=(1200, 800)):
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new("RGBA", size, (200, 30, 30, 128)).save(buffer, "PNG")
+        return buffer.getvalue()
+
+    @pytest.fixture
+    def previewed_attachment(self, app, submitted_timesheet):
+        from app.utils.previews import create_attachment_preview
+        from app.utils.storage import get_storage_backend
+
+        with app.app_context():
+            data = self._png_bytes()
+            key = get_storage_backend().save(data, "scan.png", "image/png")
+            attachment = Attachment(
+                timesheet_id=submitted_timesheet['id'],
+                filename=key,
+                original_filename="scan.png",
+                mime_type="image/png",
+                file_size=len(data),
+            )
+            db.session.add(attachment)
+            db.session.flush()
+            result = create_attachment_preview(attachment)
+            db.session.commit()
+            return {
+                "url": f"/api/admin/timesheets/{submitted_timesheet['id']}/attachments/{attachment.id}/preview",
+                "result": result,
+                "original_size": len(data),
+                "preview_key": attachment.preview_key,
+            }
+
+    def test_image_thumbnail_is_small_webp(self, app):
+        """Test that image thumbnails fit the configured size."""
+        from PIL import Image
+        from app.utils.previews import render_image_preview
+
+        preview, mime_type = render_image_preview(self._png_bytes(), 320, "webp")
+
+        assert mime_type == "image/webp"
+        with Image.open(io.BytesIO(preview)) as image:
+            assert max(image.size) == 320
+
+    def test_jpeg_thumbnail_flattens_alpha(self, app):
+        """Test that JPEG thumbnails are produced for transparent images."""
+        from PIL import Image
+        from app.utils.previews import render_image_preview
+
+        preview, mime_type = render_image_preview(self._png_bytes(), 200, "jpeg")
+
+        assert mime_type == "image/jpeg"
+        with Image.open(io.BytesIO(preview)) as image:
+            assert image.mode == "RGB"
+
+    def test_preview_stored_next_to_original(self, app, previewed_attachment):
+        """Test that the preview is stored under the original's key."""
+        assert previewed_attachment["result"]["success"] is True
+        assert previewed_attachment["preview_key"].endswith(".preview.webp")
+        with app.app_context():
+            path = os.path.join(current_app.config['UPLOAD_FOLDER'], previewed_attachment["preview_key"])
+            assert os.path.getsize(path) < previewed_attachment["original_size"] / 10
+
+    def test_identical_content_reuses_preview(self, auth_client, sample_timesheet, app):
+        """Test that duplicates of already-previewed content don't render again."""
+        from unittest.mock import patch
+        from app.utils.previews import create_attachment_preview
+
+        content = self._png_bytes((400, 300))
+        ids = []
+        for _ in range(2):
+            response = auth_client.post(
+                f"/api/timesheets/{sample_timesheet['id']}/attachments",
+                data={'file': (io.BytesIO(content), 'scan.png')},
+                content_type='multipart/form-data'
+            )
+            ids.append(response.get_json()['id'])
+
+        with app.app_context():
+            first = create_attachment_preview(Attachment.query.get(ids[0]))
+            with patch("app.utils.previews.render_preview") as render:
+                second = create_attachment_preview(Attachment.query.get(ids[1]))
+            render.assert_not_called()
+            assert second["reused"] is True
+            assert second["preview_key"] == first["preview_key"]
+
+    def test_preview_endpoint_is_cacheable(self, admin_client, previewed_attachment):
+        """Test long-lived caching and conditional requests on previews."""
+        response = admin_client.get(previewed_attachment["url"])
+        assert response.status_code == 200
+        assert response.mimetype == "image/webp"
+        assert "immutable" in response.headers["Cache-Control"]
+        etag = response.headers["ETag"]
+
+        response = admin_client.get(previewed_attachment["url"], headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.data == b""
+
+    def test_preview_missing_returns_404(self, admin_client, submitted_timesheet, app):
+        """Test that attachments without a preview return 404."""
+        with app.app_context():
+            attachment = Attachment(
+                timesheet_id=submitted_timesheet['id'],
+                filename="no-preview.pdf",
+                original_filename="no-preview.pdf",
+                mime_type="application/pdf",
+                file_size=10,
+            )
+            db.session.add(attachment)
+            db.session.commit()
+            attachment_id = attachment.id
+
+        response = admin_client.get(
+            f"/api/admin/timesheets/{submitted_timesheet['id']}/attachments/{attachment_id}/preview"
+        )
+        assert response.status_code == 404
@@ -476,3 +476,60 @@ class TestOAuthCallbackWithMock:
                 user = User.query.filter_by(azure_id="azure-sub-claim").first()
                 assert user is not None
                 assert user.email == "user@example.com"
+
+
+class TestMsalAppCaching:
+    """Tests for reuse of the sign-in MSAL app."""
+
+    def test_msal_app_built_once_per_process(self, client, app):
+        """Login and callback reuse one MSAL app instead of rediscovering."""
+        from unittest.mock import patch
+        from app.utils.token_cache import reset_token_cache
+
+        app.config["AZURE_CLIENT_ID"] = "real-client-id"
+        app.config["AZURE_CLIENT_SECRET"] = "real-client-secret"
+        reset_token_cache()
+
+        with patch("msal.ConfidentialClientApplication") as mock_msal_class:
+            mock_msal_class.return_value.get_authorization_request_url.return_value = (
+                "https://login.microsoftonline.com/authorize"
+            )
+            mock_msal_class.return_value.acquire_token_by_authorization_code.return_value = {
+                "error": "invalid_grant",
+            }
+
+            client.get("/auth/login")
+            client.get("/auth/login")
+            client.get("/auth/callback?code=test-code")
+
+        assert mock_msal_class.call_count == 1
+        reset_token_cache()
+
+    def test_callback_drops_user_tokens_from_shared_client(self, client, app):
+        """Only the ID token claims are used; the user's tokens aren't kept."""
+        from unittest.mock import patch, MagicMock
+
+        app.config["AZURE_CLIENT_ID"] = "real-client-id"
+        app.config["AZURE_CLIENT_SECRET"] = "real-client-secret"
+
+        signed_in = {"home_account_id": "oid-1.tid-1", "username": "new@company.com"}
+        other = {"home_account_id": "oid-2.tid-1", "username": "other@company.com"}
+        with patch("app.routes.auth._get_msal_app") as mock_msal:
+            mock_app = MagicMock()
+            mock_app.acquire_token_by_authorization_code.return_value = {
+                "access_token": "test-access-token",
+                "id_token_claims": {
+                    "oid": "oid-1",
+                    "tid": "tid-1",
+                    "preferred_username": "New@company.com",
+                    "name": "New User",
+                },
+            }
+            mock_app.get_accounts.return_value = [signed_in, other]
+            mock_msal.return_value = mock_app
+
+            response = client.get("/auth/callback?code=test-code")
+
+        assert response.status_code == 302
+        mock_app.remove_account.assert_called_once_with(signed_in)
+
@@ -0,0 +1,163 @@
+"""
+Teams Bot Webhook Tests
+
+Tests for /api/bot/messages and background processing of bot activities.
+"""
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from app.bot.routes import (
+    activity_key,
+    find_stalled_bot_activities,
+    process_bot_activity,
+    prune_bot_activities,
+)
+from app.extensions import db
+from app.models import BotActivity, BotActivityStatus, Timesheet, TimesheetStatus, User, UserRole
+
+
+def _activity(activity_id="act-1", **fields):
+    return {
+        "type": "message",
+        "id": activity_id,
+        "channelId": "msteams",
+        "serviceUrl": "https://smba.trafficmanager.net/amer/",
+        "conversation": {"id": "conv-1"},
+        "from": {"id": "29:admin", "aadObjectId": "aad-admin", "userPrincipalName": "admin@northstar.com"},
+        "recipient": {"id": "28:bot", "name": "Timesheet Bot"},
+        **fields,
+    }
+
+
+class TestActivityKeys:
+    """Tests for activity idempotency keys."""
+
+    def test_key_uses_conversation_and_id(self):
+        assert activity_key(_activity("a")) == activity_key(_activity("a", text="edited"))
+        assert activity_key(_activity("a")) != activity_key(_activity("b"))
+        assert activity_key(_activity("a")) != activity_key(
+            _activity("a", conversation={"id": "conv-2"})
+        )
+
+    def test_key_without_id_uses_content(self):
+        activity = _activity(None, text="help")
+        assert activity_key(activity) == activity_key(dict(activity))
+        assert activity_key(activity) != activity_key(_activity(None, text="status"))
+
+
+class TestBotWebhook:
+    """Tests for POST /api/bot/messages."""
+
+    def test_acks_without_processing_when_queued(self, app, client):
+        with patch("app.jobs.enqueue_job", return_value="job-1") as enqueue, \
+                patch("app.bot.routes._handle_activity") as handle:
+            response = client.post("/api/bot/messages", json=_activity(text="help"))
+
+        assert response.status_code == 200
+        handle.assert_not_called()
+        record = BotActivity.query.one()
+        assert record.status == BotActivityStatus.RECEIVED
+        assert record.activity["text"] == "help"
+        assert enqueue.call_args.args[1] == record.id
+
+    def test_redelivery_processed_once(self, app, client):
+        with patch("app.bot.routes._handle_activity") as handle:
+            first = client.post("/api/bot/messages", json=_activity(text="help"))
+            second = client.post("/api/bot/messages", json=_activity(text="help"))
+
+        assert first.status_code == 200
+        assert second.status_code == 200
+        handle.assert_called_once()
+        assert BotActivity.query.one().status == BotActivityStatus.DONE
+
+    def test_failure_recorded_and_acked(self, app, client):
+        with patch("app.bot.routes._handle_activity", side_effect=RuntimeError("boom")):
+            response = client.post("/api/bot/messages", json=_activity(text="help"))
+
+        assert response.status_code == 200
+        record = BotActivity.query.one()
+        assert record.status == BotActivityStatus.FAILED
+        assert record.last_error == "boom"
+
+    def test_approval_card_action_runs_once(self, app, client, sample_admin, submitted_timesheet):
+        db.session.get(User, sample_admin["id"]).role = UserRole.ADMIN
+        db.session.commit()
+        activity = _activity(
+            value={"action": "approve_timesheet", "timesheet_id": submitted_timesheet["id"]}
+        )
+
+        with patch("app.bot.routes.NotificationService.notify_approved") as notify:
+            client.post("/api/bot/messages", json=activity)
+            client.post("/api/bot/messages", json=activity)
+
+        timesheet = db.session.get(Timesheet, submitted_timesheet["id"])
+        assert timesheet.status == TimesheetStatus.APPROVED
+        assert timesheet.approved_by == sample_admin["id"]
+        notify.assert_called_once()
+
+
+class TestProcessBotActivity:
+    """Tests for background processing of stored activities."""
+
+    def _record(self, **fields):
+        record = BotActivity(
+            activity_key=activity_key(_activity()),
+            activity=_activity(),
+            status=BotActivityStatus.RECEIVED,
+            **fields,
+        )
+        db.session.add(record)
+        db.session.commit()
+        return record
+
+    def test_rerun_is_skipped(self, app):
+        record = self._record()
+
+        with patch("app.bot.routes._handle_activity") as handle:
+            assert process_bot_activity(record.id) == {"status": BotActivityStatus.DONE}
+            assert process_bot_activity(record.id) == {"skipped": True}
+
+        handle.assert_called_once()
+        assert record.processed_at is not None
+
+    def test_prune_removes_old_activities(self, app):
+        self._record(received_at=datetime.utcnow() - timedelta(days=8))
+
+        assert prune_bot_activities(7) == 1
+        assert BotActivity.query.count() == 0
+
+    def test_lost_and_stalled_activities_found(self, app):
+        now = datetime.utcnow()
+        lost = self._record(received_at=now - timedelta(minutes=10))
+        fresh = BotActivity(
+            activity_key=activity_key(_activity("act-2")),
+            activity=_activity("act-2"),
+            status=BotActivityStatus.RECEIVED,
+        )
+        stalled = BotActivity(
+            activity_key=activity_key(_activity("act-3")),
+            activity=_activity("act-3"),
+            status=BotActivityStatus.PROCESSING,
+            received_at=now - timedelta(minutes=30),
+            claimed_at=now - timedelta(minutes=20),
+        )
+        busy = BotActivity(
+            activity_key=activity_key(_activity("act-4")),
+            activity=_activity("act-4"),
+            status=BotActivityStatus.PROCESSING,
+            received_at=now - timedelta(minutes=10),
+            claimed_at=now - timedelta(minutes=1),
+        )
+        db.session.add_all([fresh, stalled, busy])
+        db.session.commit()
+
+        assert find_stalled_bot_activities() == [lost.id]
+        db.session.expire_all()
+        assert stalled.status == BotActivityStatus.FAILED
+        assert "did not finish" in stalled.last_error
+        assert busy.status == BotActivityStatus.PROCESSING
+
+        # A stalled action is never run a second time
+        with patch("app.bot.routes._handle_activity") as handle:
+            assert process_bot_activity(stalled.id) == {"skipped": True}
+        handle.assert_not_called()
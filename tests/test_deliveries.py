@@ -0,0 +1,243 @@
+"""
+Delivery Ledger Tests
+
+Tests for app/services/deliveries.py and its use by reminders.
+"""
+
+import pytest
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+from app.extensions import db
+from app.models import (
+    DeliveryChannel,
+    DeliveryStatus,
+    Notification,
+    NotificationDelivery,
+    NotificationType,
+    User,
+)
+from app.services.deliveries import (
+    claim_due_deliveries,
+    deliver,
+    delivery_key,
+    next_retry_delay,
+    retry_due_deliveries,
+)
+from app.services.notification import NotificationService
+
+WEEK = date(2024, 1, 8)
+
+
+@pytest.fixture
+def user(app, sample_user):
+    return db.session.get(User, sample_user["id"])
+
+
+@pytest.fixture
+def senders():
+    """Patch every channel's sender, succeeding by default."""
+    with patch("app.services.deliveries.send_template_email") as email, \
+            patch("app.services.deliveries.send_sms") as sms, \
+            patch("app.services.deliveries.is_teams_configured", return_value=True), \
+            patch("app.services.deliveries.get_conversation_for_user") as conversation, \
+            patch("app.services.deliveries.send_teams_message") as teams:
+        email.return_value = {"success": True}
+        sms.return_value = {"success": True}
+        teams.return_value = True
+        yield {"email": email, "sms": sms, "teams": teams, "conversation": conversation}
+
+
+def _sms(user, **kwargs):
+    return deliver(
+        user,
+        NotificationType.REMINDER,
+        DeliveryChannel.SMS,
+        {"phone": "+15551234567", "message": "Reminder"},
+        week_start=WEEK,
+        **kwargs,
+    )
+
+
+class TestDeliveryKeys:
+    """Tests for idempotency keys and backoff."""
+
+    def test_key_includes_type_user_week_and_channel(self):
+        assert delivery_key("REMINDER", "u1", WEEK, "sms") == "REMINDER:u1:2024-01-08:sms"
+        assert delivery_key("UNSUBMITTED", "u1", WEEK, "email", "2024-01-15") == (
+            "UNSUBMITTED:u1:2024-01-08:email:2024-01-15"
+        )
+
+    def test_backoff_doubles_up_to_cap(self, app):
+        app.config["DELIVERY_RETRY_BASE_SECONDS"] = 60
+        app.config["DELIVERY_RETRY_MAX_SECONDS"] = 300
+        assert [next_retry_delay(n) for n in range(1, 6)] == [60, 120, 240, 300, 300]
+
+
+class TestDeliver:
+    """Tests for idempotent delivery."""
+
+    def test_sends_once_per_key(self, app, user, senders):
+        first = _sms(user)
+        second = _sms(user)
+
+        assert first.status == DeliveryStatus.SENT
+        assert first.attempts == 1
+        assert second is None
+        senders["sms"].assert_called_once_with("+15551234567", "Reminder")
+        assert NotificationDelivery.query.count() == 1
+
+    def test_failure_schedules_retry(self, app, user, senders):
+        app.config["DELIVERY_RETRY_BASE_SECONDS"] = 60
+        senders["sms"].return_value = {"success": False, "error": "Twilio down"}
+
+        before = datetime.utcnow()
+        delivery = _sms(user)
+
+        assert delivery.status == DeliveryStatus.FAILED
+        assert delivery.last_error == "Twilio down"
+        assert before + timedelta(seconds=59) <= delivery.next_attempt_at
+        assert delivery.next_attempt_at <= datetime.utcnow() + timedelta(seconds=60)
+
+    def test_sender_exception_is_a_failure(self, app, user, senders):
+        senders["sms"].side_effect = RuntimeError("boom")
+        assert _sms(user).last_error == "boom"
+
+
+    def test_teams_without_conversation_is_skipped(self, app, user, senders):
+        senders["conversation"].return_value = None
+
+        delivery = deliver(
+            user,
+            NotificationType.REMINDER,
+            DeliveryChannel.TEAMS,
+            {"card": {"type": "AdaptiveCard"}, "fallback_text": "Reminder"},
+            week_start=WEEK,
+        )
+
+        assert delivery.status == DeliveryStatus.SKIPPED
+        assert delivery.next_attempt_at is None
+        assert delivery.last_error == "No Teams conversation for user"
+        senders["teams"].assert_not_called()
+        assert retry_due_deliveries()["claimed"] == 0
+
+    def test_teams_not_configured_is_skipped(self, app, user, senders):
+        with patch("app.services.deliveries.is_teams_configured", return_value=False):
+            delivery = deliver(
+                user,
+                NotificationType.REMINDER,
+                DeliveryChannel.TEAMS,
+                {"card": {"type": "AdaptiveCard"}, "fallback_text": "Reminder"},
+                week_start=WEEK,
+            )
+
+        assert delivery.status == DeliveryStatus.SKIPPED
+        senders["teams"].assert_not_called()
+
+
+class TestRetries:
+    """Tests for the retry worker."""
+
+    def _fail_once(self, user, senders):
+        senders["sms"].return_value = {"success": False, "error": "Twilio down"}
+        delivery = _sms(user)
+        senders["sms"].return_value = {"success": True}
+        return delivery
+
+    def test_not_retried_before_due(self, app, user, senders):
+        self._fail_once(user, senders)
+        assert retry_due_deliveries()["claimed"] == 0
+
+    def test_due_delivery_retried(self, app, user, senders):
+        delivery = self._fail_once(user, senders)
+        delivery.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+
+        assert retry_due_deliveries() == {"claimed": 1, "sent": 1, "failed": 0, "dead": 0, "skipped": 0}
+        assert delivery.status == DeliveryStatus.SENT
+        assert delivery.attempts == 2
+        assert senders["sms"].call_count == 2
+
+    def test_gives_up_after_max_attempts(self, app, user, senders):
+        app.config["DELIVERY_MAX_ATTEMPTS"] = 2
+        delivery = self._fail_once(user, senders)
+        senders["sms"].return_value = {"success": False, "error": "Still down"}
+        delivery.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+
+        assert retry_due_deliveries()["dead"] == 1
+        assert delivery.status == DeliveryStatus.DEAD
+        assert delivery.next_attempt_at is None
+
+    def test_claim_leases_rows(self, app, user, senders):
+        delivery = self._fail_once(user, senders)
+        delivery.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+
+        assert claim_due_deliveries(10) == [delivery]
+        assert delivery.status == DeliveryStatus.SENDING
+        # A second worker finds nothing while the lease holds
+        assert claim_due_deliveries(10) == []
+
+    def test_abandoned_send_is_reclaimed(self, app, user, senders):
+        """A sender that died mid-send leaves a SENDING row to retry after the lease."""
+        delivery = NotificationDelivery(
+            idempotency_key=delivery_key("REMINDER", user.id, WEEK, "sms"),
+            user_id=user.id,
+            type=NotificationType.REMINDER,
+            channel=DeliveryChannel.SMS,
+            week_start=WEEK,
+            status=DeliveryStatus.SENDING,
+            attempts=0,
+            next_attempt_at=datetime.utcnow() - timedelta(seconds=1),
+            payload={"phone": "+15551234567", "message": "Reminder"},
+        )
+        db.session.add(delivery)
+        db.session.commit()
+
+        assert retry_due_deliveries()["sent"] == 1
+        assert _sms(user) is None
+
+
+class TestReminderIdempotency:
+    """Rerunning reminder jobs doesn't double-send."""
+
+    def test_weekly_reminder_rerun_sends_once(self, app, user, senders):
+        first = NotificationService.send_weekly_reminder(user, WEEK)
+        second = NotificationService.send_weekly_reminder(user, WEEK)
+
+        assert first.type == NotificationType.REMINDER
+        assert first.sent is True
+        assert second is None
+        assert senders["email"].call_count == 1
+        assert senders["sms"].call_count == 1
+        assert senders["teams"].call_count == 1
+        assert Notification.query.count() == 1
+        assert {d.channel for d in NotificationDelivery.query} == set(DeliveryChannel.ALL)
+
+    def test_retry_updates_sms_notification(self, app, user, senders):
+        senders["sms"].return_value = {"success": False, "error": "Twilio down"}
+        notification = NotificationService.send_weekly_reminder(user, WEEK)
+        assert notification.sent is False
+        assert notification.error == "Twilio down"
+
+        senders["sms"].return_value = {"success": True}
+        delivery = NotificationDelivery.query.filter_by(channel=DeliveryChannel.SMS).one()
+        delivery.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        retry_due_deliveries()
+
+        assert notification.sent is True
+        assert notification.sent_at == delivery.sent_at
+        assert notification.error is None
+
+    def test_unsubmitted_reminder_once_per_day(self, app, user, senders):
+        with patch("app.services.notification.date") as mock_date:
+            mock_date.today.return_value = date(2024, 1, 15)
+            NotificationService.notify_unsubmitted(user, WEEK)
+            NotificationService.notify_unsubmitted(user, WEEK)
+            assert senders["sms"].call_count == 1
+
+            mock_date.today.return_value = date(2024, 1, 16)
+            NotificationService.notify_unsubmitted(user, WEEK)
+            assert senders["sms"].call_count == 2
+            assert senders["email"].call_count == 2
@@ -286,3 +286,138 @@ class TestEmailTemplates:
                 attachment_count=2,
             )
             assert "Test User" in html or "submitted" in html.lower()
+
+
+class TestEmailTemplateCache:
+    """Tests for cached email template lookup."""
+
+    def test_variants_resolved_once(self, app):
+        """Template lookups (including the missing .txt) happen once per app."""
+        with app.app_context():
+            with patch.object(
+                app.jinja_env, "get_template", wraps=app.jinja_env.get_template
+            ) as mock_get:
+                for _ in range(3):
+                    result = send_template_email(
+                        "user@test.com",
+                        "Reminder",
+                        "reminder",
+                        year=2026,
+                        app_url="http://localhost/app",
+                        week_start="Jan 05, 2026",
+                    )
+                    assert result["success"] is True
+
+            names = [call.args[0] for call in mock_get.call_args_list]
+            assert names.count("email/reminder.html") == 1
+            assert names.count("email/reminder.txt") == 1
+
+    def test_text_fallback_skips_styles(self, app):
+        """The derived plain-text part has the message, not the stylesheet."""
+        from app.utils.email import get_email_template
+
+        with app.app_context():
+            html, text = get_email_template("reminder").render({
+                "year": 2026,
+                "app_url": "http://localhost/app",
+                "week_start": "Jan 05, 2026",
+            })
+
+        assert "<" not in text
+        assert "font-family" not in text
+        assert "Week of Jan 05, 2026" in text
+
+
+class TestTemplateEmailBatch:
+    """Tests for rendering one template for many recipients."""
+
+    def test_batch_matches_individual_renders(self, app):
+        """Batch messages are identical to individual renders."""
+        from app.utils.email import get_email_template, render_template_email_batch
+
+        shared = {"year": 2026, "app_url": "http://localhost/app"}
+        contexts = [{"week_start": "Jan 05, 2026"}, {"week_start": "Feb <02> & co"}]
+
+        with app.app_context():
+            batch = render_template_email_batch("reminder", contexts, **shared)
+            template = get_email_template("reminder")
+            expected = [template.render({**shared, **context}) for context in contexts]
+
+        assert batch == expected
+        assert "Feb &lt;02&gt; &amp; co" in batch[1][0]
+
+    def test_identical_contexts_render_once(self, app):
+        """Recipients with the same context share one render."""
+        from app.utils.email import get_email_template, render_template_email_batch
+
+        with app.app_context():
+            template = get_email_template("reminder")
+            with patch.object(template.html, "render", wraps=template.html.render) as mock_render:
+                rendered = render_template_email_batch(
+                    "reminder",
+                    [{} for _ in range(50)],
+                    year=2026,
+                    app_url="http://localhost/app",
+                    week_start="Jan 05, 2026",
+                )
+
+        assert mock_render.call_count == 1
+        assert len(rendered) == 50
+        assert "Week of Jan 05, 2026" in rendered[49][0]
+
+    def test_filtered_field_rendered_per_recipient(self, app):
+        """Filters on per-recipient fields apply to each recipient's value."""
+        from jinja2 import DictLoader, Environment
+        from app.utils.email import EmailTemplate, render_template_email_batch
+
+        env = Environment(
+            loader=DictLoader({"email/greeting.html": "<p>Hi {{ name|title }} / {{ name|upper }}</p>"}),
+            autoescape=True,
+        )
+        with app.app_context():
+            app.extensions.setdefault("email_templates", {})["greeting"] = EmailTemplate(env, "greeting")
+            rendered = render_template_email_batch(
+                "greeting", [{"name": "alice smith"}, {"name": "bob jones"}]
+            )
+
+        assert rendered[0] == ("<p>Hi Alice Smith / ALICE SMITH</p>", "Hi Alice Smith / ALICE SMITH")
+        assert rendered[1][0] == "<p>Hi Bob Jones / BOB JONES</p>"
+
+    def test_field_used_in_condition(self, app):
+        """Fields used in conditions are evaluated per recipient."""
+        from app.utils.email import get_email_template, render_template_email_batch
+
+        shared = {
+            "year": 2026,
+            "app_url": "http://localhost/app",
+            "week_start": "Jan 05, 2026",
+            "total_hours": 40.0,
+        }
+        contexts = [{"approved_by": None}, {"approved_by": "Admin User"}]
+
+        with app.app_context():
+            batch = render_template_email_batch("approved", contexts, **shared)
+            template = get_email_template("approved")
+            expected = [template.render({**shared, **context}) for context in contexts]
+
+        assert batch == expected
+        assert "Approved by" not in batch[0][0]
+        assert "Approved by Admin User" in batch[1][0]
+
+    def test_send_batch_sends_each_message(self, app):
+        """send_template_email_batch sends one message per recipient."""
+        from app.utils.email import send_template_email_batch
+
+        with app.app_context(), patch("app.utils.email.send_email") as mock_send:
+            mock_send.return_value = {"success": True}
+            results = send_template_email_batch(
+                [("a@test.com", {"week_start": "Jan 05"}), ("b@test.com", {"week_start": "Jan 12"})],
+                "Reminder",
+                "reminder",
+                year=2026,
+                app_url="http://localhost/app",
+            )
+
+        assert results == [{"success": True}, {"success": True}]
+        assert [call.args[0] for call in mock_send.call_args_list] == ["a@test.com", "b@test.com"]
+        assert "Jan 12" in mock_send.call_args.args[2]
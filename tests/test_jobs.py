@@ -0,0 +1,578 @@
+"""
+Background Job Tests
+
+Tests for reminder sharding, the scheduler and the local job runner in
+app/jobs.
+"""
+
+import pytest
+import sys
+import types
+from datetime import date, datetime, timedelta
+from unittest.mock import MagicMock, patch
+from app.extensions import db
+from app.jobs import (
+    _RQ_STATE,
+    _dispatch_reminder_shards,
+    _merge_shard_results,
+    _split_into_shards,
+    enqueue_attachment_archive,
+    enqueue_job,
+    fetch_job,
+    reminder_shard,
+)
+from app.jobs import local
+from app.jobs.local import run_next_local_job, wake
+from app.jobs.scheduler import (
+    _ACQUIRE_LEASE_SCRIPT,
+    SchedulerLease,
+    SchedulerService,
+    _run_scheduled_job,
+    describe_schedule,
+    reconcile_schedule,
+    scheduled_jobs,
+)
+from app.models import (
+    LocalJob,
+    LocalJobStatus,
+    ScheduledJob,
+    ScheduledJobStatus,
+    Timesheet,
+    TimesheetStatus,
+    User,
+)
+
+WEEK = date(2024, 1, 8)
+
+
+def _make_users(count):
+    users = [
+        User(
+            azure_id=f"azure-{n}",
+            email=f"user{n}@northstar.com",
+            display_name=f"User {n}",
+            phone="+15551234567",
+        )
+        for n in range(count)
+    ]
+    db.session.add_all(users)
+    db.session.commit()
+    return [user.id for user in users]
+
+
+class TestReminderShards:
+    """Tests for splitting users into shards."""
+
+    def test_shard_is_stable_and_in_range(self):
+        assert reminder_shard("user-1", 8) == reminder_shard("user-1", 8)
+        assert all(0 <= reminder_shard(f"user-{n}", 8) < 8 for n in range(100))
+
+    def test_split_partitions_every_user(self):
+        user_ids = [f"user-{n}" for n in range(200)]
+        shards = _split_into_shards(user_ids, 8)
+
+        assert len(shards) == 8
+        assert sorted(uid for shard in shards for uid in shard) == sorted(user_ids)
+        for shard in shards:
+            assert {reminder_shard(uid, 8) for uid in shard} == {reminder_shard(shard[0], 8)}
+
+    def test_empty_shards_dropped(self):
+        assert _split_into_shards(["only-user"], 8) == [["only-user"]]
+        assert _split_into_shards([], 8) == []
+
+    def test_merge_counts_failed_shards(self):
+        results = [
+            {"users_checked": 3, "reminders_sent": 2, "errors": 1},
+            None,
+            {"users_checked": 4, "reminders_sent": 4, "errors": 0},
+        ]
+        assert _merge_shard_results(results) == {
+            "users_checked": 7,
+            "reminders_sent": 6,
+            "errors": 1,
+            "failed_shards": 1,
+        }
+
+
+class TestReminderDispatch:
+    """Tests for running reminder shards."""
+
+    def test_inline_runs_every_shard(self, app):
+        app.config["REMINDER_SHARDS"] = 4
+        user_ids = _make_users(12)
+
+        with patch("app.services.notification.NotificationService.send_weekly_reminder") as send:
+            result = _dispatch_reminder_shards("weekly", WEEK, user_ids, {"week": str(WEEK)})
+
+        assert send.call_count == 12
+        assert {call.args[0].id for call in send.call_args_list} == set(user_ids)
+        assert result["week"] == str(WEEK)
+        assert result["shards"] == len(_split_into_shards(user_ids, 4))
+        assert result["users_checked"] == 12
+        assert result["reminders_sent"] == 12
+        assert result["failed_shards"] == 0
+
+    def test_daily_skips_submitted_users(self, app):
+        app.config["REMINDER_SHARDS"] = 2
+        user_ids = _make_users(3)
+        db.session.add(Timesheet(user_id=user_ids[0], week_start=WEEK, status=TimesheetStatus.SUBMITTED))
+        db.session.commit()
+
+        with patch("app.services.notification.NotificationService.notify_unsubmitted") as notify:
+            result = _dispatch_reminder_shards("daily", WEEK, user_ids, {})
+
+        assert {call.args[0].id for call in notify.call_args_list} == set(user_ids[1:])
+        assert result["users_checked"] == 3
+        assert result["reminders_sent"] == 2
+
+    def test_send_errors_counted_per_user(self, app):
+        user_ids = _make_users(2)
+
+        with patch(
+            "app.services.notification.NotificationService.send_weekly_reminder",
+            side_effect=[RuntimeError("boom"), None],
+        ):
+            result = _dispatch_reminder_shards("weekly", WEEK, user_ids, {})
+
+        assert result["errors"] == 1
+        assert result["reminders_sent"] == 1
+
+    def test_queue_enqueues_shards_then_collector(self, app):
+        app.config["REMINDER_SHARDS"] = 4
+        user_ids = [f"user-{n}" for n in range(40)]
+        queue = MagicMock()
+        queue.enqueue.side_effect = lambda *args, **kwargs: MagicMock(id=f"job-{queue.enqueue.call_count}")
+
+        fake_rq = types.SimpleNamespace(
+            Retry=MagicMock(),
+            Dependency=lambda jobs, allow_failure: ("dependency", jobs, allow_failure),
+        )
+        with patch("app.jobs.get_queue", return_value=queue), patch.dict(sys.modules, {"rq": fake_rq}):
+            result = _dispatch_reminder_shards("weekly", WEEK, user_ids, {"week": str(WEEK)})
+
+        calls = queue.enqueue.call_args_list
+        assert len(calls) == 5
+        shard_calls, collector_call = calls[:4], calls[4]
+        assert sorted(uid for call in shard_calls for uid in call.args[3]) == sorted(user_ids)
+        assert all(call.kwargs["job_timeout"] == app.config["REMINDER_SHARD_TIMEOUT"] for call in shard_calls)
+
+        assert collector_call.args[1:] == (
+            "weekly", {"week": str(WEEK)}, ["job-1", "job-2", "job-3", "job-4"], None,
+        )
+        _, depends_on, allow_failure = collector_call.kwargs["depends_on"]
+        assert [job.id for job in depends_on] == ["job-1", "job-2", "job-3", "job-4"]
+        assert allow_failure is True
+
+        assert result["shard_job_ids"] == ["job-1", "job-2", "job-3", "job-4"]
+        assert result["collector_job_id"] == "job-5"
+        assert result["users"] == 40
+
+    def test_redis_failure_runs_shards_inline(self, app):
+        user_ids = _make_users(3)
+        queue = MagicMock()
+        queue.enqueue.side_effect = ConnectionError("Redis down")
+        _RQ_STATE["down_until"] = 0.0
+
+        fake_rq = types.SimpleNamespace(Retry=MagicMock())
+        try:
+            with patch("app.jobs.get_queue", return_value=queue) as get_queue, \
+                    patch.dict(sys.modules, {"rq": fake_rq}), \
+                    patch("app.services.notification.NotificationService.send_weekly_reminder") as send:
+                result = _dispatch_reminder_shards("weekly", WEEK, user_ids, {})
+                _dispatch_reminder_shards("weekly", WEEK, user_ids, {})
+        finally:
+            _RQ_STATE["down_until"] = 0.0
+
+        assert result["reminders_sent"] == 3
+        assert "collector_job_id" not in result
+        assert send.call_count == 6
+        # The second dispatch skips RQ while it is backed off
+        assert get_queue.call_count == 1
+
+
+class FakeRedis:
+    """Just enough Redis for the scheduler lease scripts."""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def eval(self, script, numkeys, key, holder, *args):
+        current = self.values.get(key)
+        if script == _ACQUIRE_LEASE_SCRIPT:
+            if current in (None, holder):
+                self.values[key] = holder
+                return 1
+            return 0
+        if current == holder:
+            del self.values[key]
+            return 1
+        return 0
+
+
+class FakeScheduler:
+    """In-memory stand-in for rq_scheduler.Scheduler."""
+
+    def __init__(self):
+        self.jobs = {}
+        self.cron_calls = []
+        self.enqueue_calls = 0
+
+    def get_jobs(self, with_times=False):
+        jobs = list(self.jobs.values())
+        return [(job, datetime(2024, 1, 8, 9, 0)) for job in jobs] if with_times else jobs
+
+    def cancel(self, job):
+        self.jobs.pop(job.id, None)
+
+    def cron(self, cron_string, func, args, id, queue_name, timeout, description, meta):
+        self.cron_calls.append(meta["schedule"])
+        self.jobs[id] = types.SimpleNamespace(id=id, meta=meta, cron=cron_string, args=args)
+
+    def enqueue_jobs(self):
+        self.enqueue_calls += 1
+
+
+class TestScheduleReconcile:
+    """Tests for reconciling rq-scheduler entries with the declared schedule."""
+
+    def test_reconcile_is_idempotent(self, app):
+        scheduler = FakeScheduler()
+        definitions = scheduled_jobs(app.config)
+        names = [job["name"] for job in definitions]
+
+        first = reconcile_schedule(scheduler, definitions, "timesheet")
+        second = reconcile_schedule(scheduler, definitions, "timesheet")
+
+        assert first["created"] == names
+        assert second == {"created": [], "updated": [], "unchanged": names, "removed": []}
+        assert scheduler.cron_calls == names
+        assert sorted(scheduler.jobs) == sorted(f"timesheet:schedule:{name}" for name in names)
+
+    def test_only_changed_entries_touched(self, app):
+        scheduler = FakeScheduler()
+        app.config["ADMIN_DIGEST_ENABLED"] = True
+        reconcile_schedule(scheduler, scheduled_jobs(app.config), "timesheet")
+        scheduler.cron_calls.clear()
+
+        app.config["ADMIN_DIGEST_INTERVAL_MINUTES"] = 30
+        result = reconcile_schedule(scheduler, scheduled_jobs(app.config), "timesheet")
+        assert result["updated"] == ["admin-digest"]
+        assert scheduler.cron_calls == ["admin-digest"]
+        assert scheduler.jobs["timesheet:schedule:admin-digest"].cron == "*/30 * * * *"
+
+        app.config["ADMIN_DIGEST_ENABLED"] = False
+        result = reconcile_schedule(scheduler, scheduled_jobs(app.config), "timesheet")
+        assert result["removed"] == ["timesheet:schedule:admin-digest"]
+        assert "timesheet:schedule:admin-digest" not in scheduler.jobs
+
+    def test_legacy_entries_replaced_and_foreign_kept(self, app):
+        scheduler = FakeScheduler()
+        scheduler.jobs["legacy"] = types.SimpleNamespace(id="legacy", meta={"origin": "timesheet"})
+        scheduler.jobs["other"] = types.SimpleNamespace(id="other", meta={"origin": "elsewhere"})
+
+        result = reconcile_schedule(scheduler, scheduled_jobs(app.config), "timesheet")
+
+        assert result["removed"] == ["legacy"]
+        assert "other" in scheduler.jobs
+
+
+class TestSchedulerLeader:
+    """Tests for leader election between scheduler processes."""
+
+    def _service(self, app, redis, scheduler, holder):
+        service = SchedulerService(app, connection=redis, scheduler=scheduler)
+        service.lease.holder = holder
+        return service
+
+    def test_only_leader_schedules(self, app):
+        redis, scheduler = FakeRedis(), FakeScheduler()
+        first = self._service(app, redis, scheduler, "a")
+        second = self._service(app, redis, scheduler, "b")
+
+        assert first.tick() is True
+        assert second.tick() is False
+        assert first.tick() is True
+        assert scheduler.enqueue_calls == 2
+        # Reconciled once on taking over, not on every tick
+        assert len(scheduler.cron_calls) == len(scheduled_jobs(app.config))
+
+    def test_standby_takes_over_when_lease_lapses(self, app):
+        redis, scheduler = FakeRedis(), FakeScheduler()
+        first = self._service(app, redis, scheduler, "a")
+        second = self._service(app, redis, scheduler, "b")
+        first.tick()
+
+        del redis.values["timesheet:scheduler:leader"]  # lease expired
+        assert second.tick() is True
+        assert redis.get("timesheet:scheduler:leader") == "b"
+        assert first.tick() is False
+
+    def test_run_releases_lease(self, app):
+        redis = FakeRedis()
+        service = self._service(app, redis, FakeScheduler(), "a")
+
+        service.run(max_ticks=1)
+
+        assert redis.get("timesheet:scheduler:leader") is None
+        assert SchedulerLease(redis, 30, holder="b").acquire() is True
+
+
+class TestScheduledRuns:
+    """Tests for recording scheduled job runs."""
+
+    def test_success_recorded(self, app):
+        with patch("app.jobs.send_weekly_reminders_job", return_value={"reminders_sent": 3}):
+            assert _run_scheduled_job("weekly-reminders") == {"reminders_sent": 3}
+
+        record = db.session.get(ScheduledJob, "weekly-reminders")
+        assert record.last_status == ScheduledJobStatus.SUCCEEDED
+        assert record.last_started_at <= record.last_finished_at
+        assert record.last_duration_seconds >= 0
+        assert record.run_count == 1
+
+    def test_failure_recorded(self, app):
+        with patch("app.jobs.send_daily_reminders_job", side_effect=RuntimeError("boom")):
+            with pytest.raises(RuntimeError):
+                _run_scheduled_job("daily-reminders")
+
+        record = db.session.get(ScheduledJob, "daily-reminders")
+        assert record.last_status == ScheduledJobStatus.FAILED
+        assert record.last_error == "boom"
+        assert record.last_finished_at is not None
+
+    def test_sharded_run_finished_by_collector(self, app):
+        from app.jobs import collect_reminder_shards_job
+
+        dispatched = {"shard_job_ids": ["job-1", "job-2"], "collector_job_id": "job-3"}
+        with patch("app.jobs.send_weekly_reminders_job", return_value=dispatched) as job:
+            _run_scheduled_job("weekly-reminders")
+
+        job.assert_called_once_with(schedule="weekly-reminders")
+        record = db.session.get(ScheduledJob, "weekly-reminders")
+        assert record.last_status == ScheduledJobStatus.RUNNING
+        assert record.last_finished_at is None
+        assert record.run_count == 1
+
+        finished = MagicMock(is_finished=True, return_value=lambda: {"users_checked": 2, "reminders_sent": 2})
+        fake_job = types.SimpleNamespace(Job=MagicMock(fetch_many=MagicMock(return_value=[finished, None])))
+        with patch("app.jobs.get_queue", return_value=MagicMock()), \
+                patch.dict(sys.modules, {"rq.job": fake_job}):
+            result = collect_reminder_shards_job.__wrapped__(
+                "weekly", {}, ["job-1", "job-2"], "weekly-reminders"
+            )
+
+        assert result["failed_shards"] == 1
+        db.session.refresh(record)
+        assert record.last_status == ScheduledJobStatus.FAILED
+        assert record.last_error == "1 of 2 shards failed"
+        assert record.last_started_at <= record.last_finished_at
+        assert record.last_duration_seconds >= 0
+
+    def test_undeclared_job_skipped(self, app):
+        assert _run_scheduled_job("admin-digest")["skipped"] is True
+        assert db.session.get(ScheduledJob, "admin-digest") is None
+
+    def test_describe_schedule(self, app):
+        redis, scheduler = FakeRedis(), FakeScheduler()
+        reconcile_schedule(scheduler, scheduled_jobs(app.config), "timesheet")
+        SchedulerLease(redis, 30, holder="host:1").acquire()
+        with patch("app.jobs.send_daily_reminders_job", return_value={}):
+            _run_scheduled_job("daily-reminders")
+
+        jobs = {job["name"]: job for job in describe_schedule(redis, scheduler)["jobs"]}
+
+        assert describe_schedule(redis, scheduler)["leader"] == "host:1"
+        assert jobs["daily-reminders"]["next_run_at"] == "2024-01-08T09:00:00"
+        assert jobs["daily-reminders"]["last_status"] == ScheduledJobStatus.SUCCEEDED
+        assert jobs["weekly-reminders"]["last_started_at"] is None
+
+    def test_jobs_cli_registered(self, app):
+        result = app.test_cli_runner().invoke(args=["jobs", "--help"])
+
+        assert result.exit_code == 0
+        assert "scheduler" in result.output
+        assert "worker" in result.output
+
+
+CALLS = []
+
+
+def record_call(value, suffix=""):
+    """Job function for the local runner tests."""
+    if value == "fail":
+        raise RuntimeError("job failed")
+    CALLS.append(f"{value}{suffix}")
+    return value
+
+
+class TestLocalJobs:
+    """Tests for the database-backed fallback job runner."""
+
+    @pytest.fixture
+    def local_app(self, app):
+        app.config["JOB_FALLBACK"] = "local"
+        CALLS.clear()
+        _RQ_STATE["down_until"] = 0.0
+        with patch("app.jobs.local.wake") as mock_wake:
+            yield mock_wake
+        _RQ_STATE["down_until"] = 0.0
+        local._STATE["timer"] = local._STATE["timer_at"] = None
+
+    @pytest.fixture
+    def pool(self, app, local_app):
+        """Run the pool inline, capture its wake-up timers, and move its clock."""
+        timers = []
+
+        class FakeTimer:
+            def __init__(self, delay, function, args):
+                self.delay, self.function, self.args = delay, function, args
+                self.cancelled = False
+                timers.append(self)
+
+            def start(self):
+                pass
+
+            def cancel(self):
+                self.cancelled = True
+
+        offset = {"seconds": 0}
+
+        class Clock(datetime):
+            @classmethod
+            def utcnow(cls):
+                return datetime.utcnow() + timedelta(seconds=offset["seconds"])
+
+        executor = MagicMock()
+        executor.submit.side_effect = lambda fn, *args: fn(*args)
+        with patch("app.jobs.local._executor", return_value=executor), \
+                patch("app.jobs.local.threading.Timer", FakeTimer), \
+                patch("app.jobs.local.datetime", Clock):
+            # Enqueue first, then let timers wake the real pool
+            yield types.SimpleNamespace(timers=timers, offset=offset, local_wake=local_app)
+
+    def test_enqueue_stores_job(self, app, local_app):
+        job_id = enqueue_job(record_call, "a", suffix="!", retry=3, job_timeout=60)
+
+        job = db.session.get(LocalJob, job_id)
+        assert job.func == "tests.test_jobs:record_call"
+        assert job.args == ["a"]
+        assert job.kwargs == {"suffix": "!"}
+        assert job.max_attempts == 4
+        assert job.timeout == 60
+        assert job.status == LocalJobStatus.QUEUED
+        local_app.assert_called_once()
+        assert CALLS == []
+
+    def test_sync_fallback_enqueues_nothing(self, app):
+        assert enqueue_job(record_call, "a") is None
+        assert LocalJob.query.count() == 0
+
+    def test_job_runs_and_is_removed(self, app, local_app):
+        enqueue_job(record_call, "a", suffix="!")
+
+        assert run_next_local_job() is True
+        assert CALLS == ["a!"]
+        assert LocalJob.query.count() == 0
+        assert run_next_local_job() is False
+
+    def test_failed_job_retried_then_given_up(self, app, pool):
+        job_id = enqueue_job(record_call, "fail", retry=1)
+        pool.local_wake.side_effect = wake
+
+        wake(app)
+        job = db.session.get(LocalJob, job_id)
+        assert job.status == LocalJobStatus.QUEUED
+        assert job.last_error == "job failed"
+        assert job.run_at > datetime.utcnow()
+
+        # The pool set a timer for the retry; it runs once the backoff is over
+        timer = pool.timers[-1]
+        assert local.RETRY_BASE_SECONDS <= timer.delay <= local.RETRY_BASE_SECONDS + 2
+        pool.offset["seconds"] = timer.delay
+        timer.function(*timer.args)
+
+        db.session.refresh(job)
+        assert job.status == LocalJobStatus.FAILED
+        assert job.attempts == 2
+        assert job.run_at is None
+        assert len(pool.timers) == 1
+
+    def test_abandoned_job_rerun_after_lease(self, app, pool):
+        """A job whose process died mid-run is picked up once its lease lapses."""
+        job_id = enqueue_job(record_call, "a", job_timeout=60)
+        pool.local_wake.side_effect = wake
+        job = db.session.get(LocalJob, job_id)
+        job.status = LocalJobStatus.RUNNING
+        job.run_at = datetime.utcnow() + timedelta(seconds=60)
+        db.session.commit()
+
+        wake(app)
+        assert CALLS == []
+
+        timer = pool.timers[-1]
+        assert 59 <= timer.delay <= 62
+        pool.offset["seconds"] = timer.delay
+        timer.function(*timer.args)
+        assert CALLS == ["a"]
+        assert LocalJob.query.count() == 0
+
+    def test_earlier_job_replaces_wake_timer(self, app, pool):
+        enqueue_job(record_call, "fail", retry=3, job_timeout=600)
+        with patch("app.jobs.local.RETRY_BASE_SECONDS", 300):
+            wake(app)
+        later = pool.timers[-1]
+
+        enqueue_job(record_call, "fail", retry=3)
+        wake(app)
+
+        assert later.cancelled is True
+        assert pool.timers[-1].delay < later.delay
+
+    def test_redis_failure_falls_back_and_backs_off(self, app, local_app):
+        queue = MagicMock()
+        queue.enqueue.side_effect = ConnectionError("Redis down")
+
+        with patch("app.jobs.get_queue", return_value=queue) as get_queue:
+            first = enqueue_job(record_call, "a")
+            second = enqueue_job(record_call, "b")
+
+        assert get_queue.call_count == 1
+        assert {job.id for job in LocalJob.query} == {first, second}
+
+    def test_redis_failure_during_archive_and_fetch(self, app, local_app):
+        queue = MagicMock()
+        queue.enqueue.side_effect = ConnectionError("Redis down")
+
+        with patch("app.jobs.get_queue", return_value=queue) as get_queue:
+            assert enqueue_attachment_archive([{"size": 1}], "admin-1") is None
+            assert fetch_job("job-1") is None
+
+        # fetch_job skipped RQ while it was backed off
+        assert get_queue.call_count == 1
+        assert LocalJob.query.count() == 0
+
+        _RQ_STATE["down_until"] = 0.0
+        fake_modules = {
+            "rq.exceptions": types.SimpleNamespace(NoSuchJobError=LookupError),
+            "rq.job": types.SimpleNamespace(
+                Job=MagicMock(fetch=MagicMock(side_effect=ConnectionError("Redis down")))
+            ),
+        }
+        with patch("app.jobs.get_queue", return_value=queue), patch.dict(sys.modules, fake_modules):
+            assert fetch_job("job-1") is None
+        assert _RQ_STATE["down_until"] > 0
+
+    def test_wake_drains_queue(self, app, local_app):
+        enqueue_job(record_call, "a")
+        enqueue_job(record_call, "b")
+
+        executor = MagicMock()
+        executor.submit.side_effect = lambda fn, *args: fn(*args)
+        with patch("app.jobs.local._executor", return_value=executor):
+            assert wake(app) is True
+
+        assert sorted(CALLS) == ["a", "b"]
+        assert LocalJob.query.count() == 0
@@ -409,3 +409,175 @@ class TestNotificationEdgeCases:
                 
                 # Should return None
                 assert result is None
+
+
+class TestAdminDigest:
+    """Tests for batched admin submission notifications."""
+
+    @pytest.fixture
+    def digest_setup(self, app):
+        from app.extensions import db
+        from app.models import UserRole
+
+        app.config["ADMIN_DIGEST_ENABLED"] = True
+        app.config["ADMIN_DIGEST_MAX_ITEMS"] = 25
+        with app.app_context():
+            admins = [
+                User(
+                    azure_id=f"digest-admin-{i}",
+                    email=f"digest-admin-{i}@northstar.com",
+                    display_name=f"Digest Admin {i}",
+                    role=UserRole.ADMIN,
+                )
+                for i in range(2)
+            ]
+            employees = [
+                User(
+                    azure_id=f"digest-user-{i}",
+                    email=f"digest-user-{i}@northstar.com",
+                    display_name=f"Digest User {i}",
+                )
+                for i in range(3)
+            ]
+            db.session.add_all(admins + employees)
+            db.session.flush()
+            timesheets = [
+                Timesheet(
+                    user_id=employee.id,
+                    week_start=date(2024, 1, 7),
+                    status=TimesheetStatus.SUBMITTED,
+                )
+                for employee in employees
+            ]
+            db.session.add_all(timesheets)
+            db.session.commit()
+            yield {"admins": admins, "timesheets": timesheets}
+
+    @patch("app.services.notification.send_card_to_users")
+    @patch("app.services.notification.send_template_email_batch")
+    def test_submissions_queued_not_sent(self, mock_email, mock_cards, app, digest_setup):
+        """Digest mode queues one item per admin instead of sending."""
+        from app.models import AdminDigestItem
+
+        for timesheet in digest_setup["timesheets"]:
+            NotificationService.notify_admin_new_submission(timesheet)
+
+        mock_email.assert_not_called()
+        mock_cards.assert_not_called()
+        assert AdminDigestItem.query.count() == 6
+
+    @patch("app.services.notification.send_card_to_users")
+    @patch("app.services.notification.send_template_email_batch")
+    def test_resubmission_listed_once(self, mock_email, mock_cards, app, digest_setup):
+        """Submitting the same timesheet twice before a flush queues it once."""
+        from app.models import AdminDigestItem
+
+        timesheet = digest_setup["timesheets"][0]
+        NotificationService.notify_admin_new_submission(timesheet)
+        NotificationService.notify_admin_new_submission(timesheet)
+
+        assert AdminDigestItem.query.count() == 2
+
+    @pytest.fixture
+    def teams_sender(self):
+        with patch("app.services.deliveries.is_teams_configured", return_value=True), \
+                patch("app.services.deliveries.get_conversation_for_user"), \
+                patch("app.services.deliveries.send_teams_message", return_value=True) as send:
+            yield send
+
+    @patch("app.utils.email.send_email", return_value={"success": True})
+    def test_flush_sends_one_digest_per_admin(self, mock_send, app, digest_setup, teams_sender):
+        """A flush sends each admin one email and one card listing everything."""
+        from app.models import AdminDigestItem, NotificationDelivery
+
+        for timesheet in digest_setup["timesheets"]:
+            NotificationService.notify_admin_new_submission(timesheet)
+
+        result = NotificationService.flush_admin_digests()
+
+        assert result == {"admins": 2, "submissions": 6, "emails": 2, "cards": 2}
+        assert mock_send.call_count == 2
+        assert {call.args[0][0] for call in mock_send.call_args_list} == {
+            "digest-admin-0@northstar.com", "digest-admin-1@northstar.com",
+        }
+        html = mock_send.call_args.args[2]
+        assert "3 new timesheets" in html
+        for name in ("Digest User 0", "Digest User 1", "Digest User 2"):
+            assert name in html
+        assert teams_sender.call_count == 2
+        assert NotificationDelivery.query.filter_by(
+            type=NotificationType.ADMIN_DIGEST
+        ).count() == 4
+        assert AdminDigestItem.query.count() == 0
+
+        assert NotificationService.flush_admin_digests()["admins"] == 0
+
+    def test_failed_digest_is_retried(self, app, digest_setup, teams_sender):
+        """A digest whose send fails stays in the ledger and goes out on retry."""
+        from datetime import timedelta
+        from app.extensions import db
+        from app.models import DeliveryChannel, DeliveryStatus, NotificationDelivery
+        from app.services.deliveries import retry_due_deliveries
+
+        NotificationService.notify_admin_new_submission(digest_setup["timesheets"][0])
+
+        with patch("app.services.deliveries.send_template_email",
+                   return_value={"success": False, "error": "SMTP down"}):
+            result = NotificationService.flush_admin_digests()
+        assert result["emails"] == 0
+
+        failed = NotificationDelivery.query.filter_by(channel=DeliveryChannel.EMAIL).all()
+        assert {d.status for d in failed} == {DeliveryStatus.FAILED}
+        for delivery in failed:
+            delivery.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+
+        with patch("app.services.deliveries.send_template_email",
+                   return_value={"success": True}) as mock_email:
+            assert retry_due_deliveries()["sent"] == 2
+        assert "Digest User 0" in str(mock_email.call_args)
+
+    @patch("app.services.deliveries.send_template_email", return_value={"success": True})
+    def test_full_queue_flushes_early(self, mock_email, app, digest_setup, teams_sender):
+        """Reaching ADMIN_DIGEST_MAX_ITEMS flushes without waiting for the schedule."""
+        from app.models import AdminDigestItem
+
+        app.config["ADMIN_DIGEST_MAX_ITEMS"] = 2
+        first, second, third = digest_setup["timesheets"]
+
+        NotificationService.notify_admin_new_submission(first)
+        mock_email.assert_not_called()
+
+        NotificationService.notify_admin_new_submission(second)
+        assert mock_email.call_count == 2
+        assert AdminDigestItem.query.count() == 0
+
+        NotificationService.notify_admin_new_submission(third)
+        assert mock_email.call_count == 2
+        assert AdminDigestItem.query.count() == 2
+
+    def test_digest_email_renders(self, app):
+        """The digest template lists every submission."""
+        from flask import render_template
+
+        submissions = [
+            {
+                "user_name": f"Employee {i}",
+                "user_email": f"e{i}@northstar.com",
+                "week_start": "Jan 07, 2024",
+                "total_hours": 40.0,
+                "field_hours": 8.0,
+                "traveled": False,
+                "attachment_count": 0,
+            }
+            for i in range(3)
+        ]
+        with app.test_request_context():
+            html = render_template(
+                "email/admin_submission_digest.html",
+                year=2024,
+                app_url="http://localhost/app",
+                submissions=submissions,
+            )
+        assert "3 new timesheets ready for review" in html
+        assert html.count("Employee ") == 3
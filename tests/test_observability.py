@@ -0,0 +1,470 @@
+"""
+Observability Tests
+
+Tests for request metrics, connection pool instrumentation and logging.
+"""
+
+import io
+import json
+import logging
+import queue
+import time
+import pytest
+from logging.handlers import QueueListener
+from unittest.mock import patch
+from sqlalchemy import create_engine, exc as sa_exc
+
+from app.config import _build_engine_options
+from app.utils import observability
+from app.utils.observability import (
+    METRICS_REDIS_KEY,
+    ContextFilter,
+    ContextQueueHandler,
+    JSONFormatter,
+    InstrumentedQueuePool,
+    LatencyHistogram,
+    RequestMetrics,
+    collect_worker_snapshots,
+    get_metrics,
+    merge_snapshots,
+    publish_metrics,
+    render_prometheus,
+    request_metrics,
+    reset_metrics,
+)
+
+
+class FakeRedis:
+    """Minimal in-memory stand-in for the Redis hash commands used by metrics."""
+
+    def __init__(self):
+        self.hashes = {}
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field.encode()] = value.encode()
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(field.encode(), None)
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    """Reset global metrics around each test."""
+    reset_metrics()
+    yield
+    reset_metrics()
+
+
+class TestEngineOptions:
+    """Tests for SQLALCHEMY_ENGINE_OPTIONS defaults."""
+
+    def test_sqlite_has_no_pool_overrides(self):
+        """SQLite manages its own pool, so no QueuePool options are set."""
+        assert _build_engine_options("sqlite:///timesheet.db") == {}
+
+    def test_postgres_gets_pool_defaults(self):
+        """PostgreSQL gets pre-ping, recycle and a bounded pool."""
+        options = _build_engine_options("postgresql://u:p@db:5432/timesheet")
+        assert options["pool_size"] == 10
+        assert options["max_overflow"] == 10
+        assert options["pool_timeout"] == 10
+        assert options["pool_recycle"] == 1800
+        assert options["pool_pre_ping"] is True
+
+    def test_pool_options_from_environment(self, monkeypatch):
+        """Pool sizing can be tuned per deployment."""
+        monkeypatch.setenv("DB_POOL_SIZE", "3")
+        monkeypatch.setenv("DB_MAX_OVERFLOW", "7")
+        monkeypatch.setenv("DB_POOL_PRE_PING", "false")
+        options = _build_engine_options("postgresql://u:p@db:5432/timesheet")
+        assert options["pool_size"] == 3
+        assert options["max_overflow"] == 7
+        assert options["pool_pre_ping"] is False
+
+
+class TestPoolMetrics:
+    """Tests for connection pool checkout instrumentation."""
+
+    def test_record_pool_checkout(self):
+        """Checkouts accumulate wait time and overflow usage."""
+        metrics = RequestMetrics()
+        metrics.record_pool_checkout(2.0, overflow=-4)
+        metrics.record_pool_checkout(6.0, overflow=2)
+
+        stats = metrics.get_pool_stats()
+        assert stats["checkouts"] == 2
+        assert stats["avg_wait_ms"] == 4.0
+        assert stats["max_wait_ms"] == 6.0
+        assert stats["overflow_checkouts"] == 1
+        assert stats["overflow_peak"] == 2
+        assert stats["timeouts"] == 0
+
+    def test_pool_stats_in_summary_and_reset(self):
+        """Pool stats appear in get_stats and are cleared by reset."""
+        metrics = RequestMetrics()
+        metrics.record_pool_timeout(100.0)
+        assert metrics.get_stats()["db_pool"]["timeouts"] == 1
+
+        metrics.reset()
+        assert metrics.get_stats()["db_pool"]["timeouts"] == 0
+
+    def test_instrumented_pool_records_checkouts(self):
+        """Connections checked out through the pool are counted."""
+        engine = create_engine(
+            "sqlite://", poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=1
+        )
+        first = engine.connect()
+        second = engine.connect()  # Uses the overflow slot
+        second.close()
+        first.close()
+        engine.dispose()
+
+        stats = request_metrics.get_pool_stats()
+        assert stats["checkouts"] == 2
+        assert stats["overflow_checkouts"] == 1
+        assert stats["overflow_peak"] == 1
+
+    def test_instrumented_pool_records_timeouts(self):
+        """An exhausted pool records a timeout before raising."""
+        engine = create_engine(
+            "sqlite://",
+            poolclass=InstrumentedQueuePool,
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=0.05,
+        )
+        held = engine.connect()
+        with pytest.raises(sa_exc.TimeoutError):
+            engine.connect()
+        held.close()
+        engine.dispose()
+
+        stats = request_metrics.get_pool_stats()
+        assert stats["timeouts"] == 1
+        assert stats["max_wait_ms"] >= 40
+
+
+class TestLatencyHistogram:
+    """Tests for fixed-bucket latency histograms."""
+
+    def test_observe_and_percentiles(self):
+        """Percentiles are interpolated inside the matching bucket."""
+        histogram = LatencyHistogram()
+        for _ in range(90):
+            histogram.observe(3)  # <= 5ms bucket
+        for _ in range(10):
+            histogram.observe(400)  # <= 500ms bucket
+
+        assert histogram.count == 100
+        assert histogram.percentile(50) < 5
+        assert 250 < histogram.percentile(95) <= 500
+        assert histogram.percentile(99) <= 500
+
+    def test_empty_histogram(self):
+        """An empty histogram reports zero."""
+        assert LatencyHistogram().percentiles() == {"p50": 0, "p95": 0, "p99": 0}
+
+    def test_overflow_bucket_reports_largest_bound(self):
+        """Observations beyond the last bucket report the largest bound."""
+        histogram = LatencyHistogram()
+        histogram.observe(60000)
+        assert histogram.percentile(99) == 10000.0
+
+    def test_round_trip_and_merge(self):
+        """Histograms survive serialization and can be merged."""
+        first = LatencyHistogram()
+        first.observe(20)
+        second = LatencyHistogram.from_dict(first.to_dict())
+        second.observe(700)
+        first.merge(second)
+        assert first.count == 3
+        assert first.sum_ms == 740
+
+
+class TestRequestMetrics:
+    """Tests for request recording and snapshot merging."""
+
+    def test_routes_keyed_by_template(self):
+        """Requests to different IDs share one route entry."""
+        metrics = RequestMetrics()
+        metrics.record_request("/api/timesheets/a", "GET", 200, 10, route="/api/timesheets/<timesheet_id>")
+        metrics.record_request("/api/timesheets/b", "GET", 404, 30, route="/api/timesheets/<timesheet_id>")
+
+        stats = metrics.get_stats()
+        assert len(stats["top_routes"]) == 1
+        route = stats["top_routes"][0]
+        assert route["route"] == "GET /api/timesheets/<timesheet_id>"
+        assert route["count"] == 2
+        assert route["errors"] == 1
+        assert "p95_ms" in route
+
+    def test_route_table_is_capped_with_lru_eviction(self):
+        """Routes beyond max_routes evict the least recently used entry."""
+        metrics = RequestMetrics(max_routes=2)
+        metrics.record_request("/a", "GET", 200, 1, route="/a")
+        metrics.record_request("/b", "GET", 200, 1, route="/b")
+        metrics.record_request("/a", "GET", 200, 1, route="/a")  # /a is now most recent
+        metrics.record_request("/c", "GET", 200, 1, route="/c")
+
+        snapshot = metrics.snapshot()
+        assert set(snapshot["routes"]) == {"GET /a", "GET /c"}
+        assert snapshot["evicted_routes"] == 1
+        assert metrics.get_stats()["total_requests"] == 4
+
+    def test_slow_requests_ring_buffer(self):
+        """Only the most recent slow requests are kept."""
+        metrics = RequestMetrics(max_slow_requests=3)
+        for i in range(5):
+            metrics.record_request(f"/slow/{i}", "GET", 200, 1500, route="/slow/<id>")
+
+        assert len(metrics.slow_requests) == 3
+        assert [r["path"] for r in metrics.slow_requests] == ["/slow/2", "/slow/3", "/slow/4"]
+        assert metrics.get_stats()["slow_request_count"] == 3
+
+    def test_merge_snapshots_sums_workers(self):
+        """Snapshots from several workers add up."""
+        first = RequestMetrics()
+        second = RequestMetrics()
+        first.record_request("/x", "GET", 200, 10, route="/x")
+        second.record_request("/x", "GET", 500, 2000, route="/x")
+        second.record_pool_checkout(8.0, overflow=1)
+
+        merged = merge_snapshots([first.snapshot(), second.snapshot()])
+        assert merged["total_requests"] == 2
+        assert merged["total_errors"] == 1
+        assert merged["requests_by_status"] == {"200": 1, "500": 1}
+        assert merged["routes"]["GET /x"]["latency"]["count"] == 2
+        assert merged["slow_request_count"] == 1
+        assert merged["db_pool"]["overflow_peak"] == 1
+
+    def test_after_request_uses_url_rule(self, client):
+        """The middleware records the rule template, not the raw path."""
+        client.get("/api/timesheets/some-id")
+        client.get("/api/timesheets/other-id")
+        client.get("/no/such/page")
+
+        routes = request_metrics.snapshot()["routes"]
+        assert "GET /api/timesheets/<timesheet_id>" in routes
+        assert routes["GET /api/timesheets/<timesheet_id>"]["count"] == 2
+        assert "GET <unmatched>" in routes
+        assert not any("some-id" in key for key in routes)
+
+
+class TestQueryInstrumentation:
+    """Tests for per-request SQL statement counting."""
+
+    def test_headers_report_queries(self, auth_client, sample_timesheet_with_entries):
+        """Responses carry X-DB-Queries / X-DB-Time outside production."""
+        response = auth_client.get(f"/api/timesheets/{sample_timesheet_with_entries['id']}")
+        assert response.status_code == 200
+        assert int(response.headers["X-DB-Queries"]) > 0
+        assert response.headers["X-DB-Time"].endswith("ms")
+
+    def test_route_metrics_include_queries(self, auth_client, sample_timesheet):
+        """Per-route metrics accumulate statement counts."""
+        auth_client.get(f"/api/timesheets/{sample_timesheet['id']}")
+        route = request_metrics.snapshot()["routes"]["GET /api/timesheets/<timesheet_id>"]
+        assert route["db_queries"] > 0
+        assert route["db_time_ms"] >= 0
+        assert get_metrics()["top_routes"][0]["avg_db_queries"] > 0
+
+    def test_headers_disabled(self, app, client):
+        """Headers are omitted when DB_TIMING_HEADERS is off."""
+        from app import create_app
+        from app.config import TestingConfig
+
+        class NoHeadersConfig(TestingConfig):
+            DB_TIMING_HEADERS = False
+
+        response = create_app(NoHeadersConfig).test_client().get("/login")
+        assert "X-DB-Queries" not in response.headers
+
+    def test_threshold_logs_statements(self, app, sample_user):
+        """Requests over DB_QUERY_LOG_THRESHOLD log their repeated statements."""
+        from app import create_app
+        from app.config import TestingConfig
+        from app.extensions import db
+
+        class ThresholdConfig(TestingConfig):
+            DB_QUERY_LOG_THRESHOLD = 1
+
+        threshold_app = create_app(ThresholdConfig)
+        with threshold_app.app_context():
+            db.create_all()
+            client = threshold_app.test_client()
+            with client.session_transaction() as sess:
+                sess["user"] = sample_user
+            with patch.object(threshold_app.logger, "warning") as mock_warning:
+                client.get("/api/timesheets")
+            db.drop_all()
+
+        messages = [call.args[0] for call in mock_warning.call_args_list]
+        assert any("Query-heavy request" in message for message in messages)
+        extra = mock_warning.call_args_list[-1].kwargs["extra"]["extra_fields"]
+        assert extra["db_queries"] > 1
+        assert extra["statements"][0]["count"] >= 1
+
+
+class TestWorkerAggregation:
+    """Tests for cross-worker aggregation through Redis."""
+
+    def test_local_only_without_redis(self, app):
+        """Without REDIS_URL only this worker is reported."""
+        app.config["REDIS_URL"] = ""
+        request_metrics.record_request("/x", "GET", 200, 5, route="/x")
+        assert publish_metrics(force=True) is False
+        assert get_metrics()["workers"] == 1
+
+    def test_publish_and_collect(self, app):
+        """Published snapshots from other workers are merged into /metrics."""
+        fake = FakeRedis()
+        other = RequestMetrics()
+        other.record_request("/x", "GET", 200, 50, route="/x")
+        other_snapshot = other.snapshot()
+        other_snapshot["updated_at"] = time.time()
+        fake.hset(METRICS_REDIS_KEY, "other-host:1", json.dumps(other_snapshot))
+
+        app.config["REDIS_URL"] = "redis://fake:6379/0"
+        with patch("redis.from_url", return_value=fake):
+            request_metrics.record_request("/x", "GET", 200, 5, route="/x")
+            assert publish_metrics(force=True) is True
+            stats = get_metrics()
+
+        assert stats["workers"] == 2
+        assert stats["total_requests"] == 2
+        assert len(fake.hgetall(METRICS_REDIS_KEY)) == 2
+
+    def test_stale_workers_are_pruned(self, app):
+        """Snapshots older than METRICS_WORKER_TTL are dropped."""
+        fake = FakeRedis()
+        stale = RequestMetrics().snapshot()
+        stale["updated_at"] = time.time() - 3600
+        fake.hset(METRICS_REDIS_KEY, "dead-host:1", json.dumps(stale))
+
+        app.config["REDIS_URL"] = "redis://fake:6379/0"
+        with patch("redis.from_url", return_value=fake):
+            snapshots = collect_worker_snapshots()
+
+        assert len(snapshots) == 1
+        assert fake.hgetall(METRICS_REDIS_KEY) == {}
+
+    def test_redis_failure_falls_back_to_local(self, app):
+        """A Redis outage never breaks the metrics endpoint."""
+        app.config["REDIS_URL"] = "redis://fake:6379/0"
+        with patch("redis.from_url", side_effect=Exception("connection refused")):
+            assert publish_metrics(force=True) is False
+            assert len(collect_worker_snapshots()) == 1
+
+
+class TestPrometheusExport:
+    """Tests for Prometheus text exposition."""
+
+    def test_render_histogram(self):
+        """Route histograms are exported with cumulative buckets in seconds."""
+        metrics = RequestMetrics()
+        metrics.record_request("/a/1", "GET", 200, 3, route="/a/<id>")
+        metrics.record_request("/a/2", "GET", 200, 300, route="/a/<id>")
+
+        text = render_prometheus(metrics.snapshot())
+        labels = 'method="GET",route="/a/<id>"'
+        assert "# TYPE timesheet_http_request_duration_seconds histogram" in text
+        assert f'timesheet_http_request_duration_seconds_bucket{{{labels},le="0.005"}} 1' in text
+        assert f'timesheet_http_request_duration_seconds_bucket{{{labels},le="0.5"}} 2' in text
+        assert f'timesheet_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+        assert f"timesheet_http_request_duration_seconds_count{{{labels}}} 2" in text
+        assert 'timesheet_http_requests_total{status="200"} 2' in text
+
+    def test_endpoint_requires_admin(self, auth_client):
+        """Regular users cannot scrape metrics."""
+        assert auth_client.get("/metrics/prometheus").status_code == 403
+
+    def test_endpoint_for_admin(self, admin_client):
+        """Admins get text/plain exposition format."""
+        response = admin_client.get("/metrics/prometheus")
+        assert response.status_code == 200
+        assert response.mimetype == "text/plain"
+        assert b"timesheet_metrics_workers 1" in response.data
+
+    def test_endpoint_bearer_token(self, app, client):
+        """Scrapers can authenticate with METRICS_TOKEN."""
+        app.config["METRICS_TOKEN"] = "scrape-secret"
+        ok = client.get("/metrics/prometheus", headers={"Authorization": "Bearer scrape-secret"})
+        bad = client.get("/metrics/prometheus", headers={"Authorization": "Bearer wrong"})
+        assert ok.status_code == 200
+        assert bad.status_code == 401
+
+
+class TestStructuredLogging:
+    """Tests for the JSON formatter and queued log handler."""
+
+    def _record(self, message="hello %s", args=("world",)):
+        return logging.LogRecord("test", logging.INFO, __file__, 1, message, args, None)
+
+    def test_formatter_outside_request(self):
+        """Outside a request only the base fields are logged."""
+        data = json.loads(JSONFormatter().format(self._record()))
+        assert data["message"] == "hello world"
+        assert "path" not in data
+
+    def test_request_context_cached_once(self, app):
+        """Request fields are computed once per request and reused."""
+        from flask import g
+
+        with app.test_request_context("/api/timesheets", method="POST"):
+            g.request_id = "abc123"
+            first = json.loads(JSONFormatter().format(self._record()))
+            assert g.log_context["request_id"] == "abc123"
+
+            g.log_context["path"] = "/cached"
+            second = json.loads(JSONFormatter().format(self._record()))
+
+        assert first["path"] == "/api/timesheets"
+        assert first["method"] == "POST"
+        assert second["path"] == "/cached"
+
+    def test_stdlib_json_fallback(self, monkeypatch):
+        """Logs are still produced without orjson installed."""
+        monkeypatch.setattr(observability, "orjson", None)
+        data = json.loads(JSONFormatter().format(self._record()))
+        assert data["message"] == "hello world"
+
+    def test_queue_handler_carries_request_context(self, app):
+        """Context captured on the request side is written by the listener."""
+        from flask import g
+
+        stream = io.StringIO()
+        stream_handler = logging.StreamHandler(stream)
+        stream_handler.setFormatter(JSONFormatter())
+        log_queue = queue.Queue()
+        handler = ContextQueueHandler(log_queue)
+        handler.addFilter(ContextFilter())
+        listener = QueueListener(log_queue, stream_handler)
+        listener.start()
+
+        logger = logging.getLogger("test.queue")
+        logger.addHandler(handler)
+        logger.propagate = False
+        try:
+            with app.test_request_context("/api/admin/users"):
+                g.request_id = "req-42"
+                logger.warning("queued %d", 7)
+        finally:
+            listener.stop()
+            logger.removeHandler(handler)
+
+        data = json.loads(stream.getvalue().strip())
+        assert data["message"] == "queued 7"
+        assert data["request_id"] == "req-42"
+        assert data["path"] == "/api/admin/users"
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """A full queue drops records and counts them."""
+        handler = ContextQueueHandler(queue.Queue(maxsize=1))
+        before = ContextQueueHandler.dropped
+        handler.handle(self._record())
+        handler.handle(self._record())
+        assert ContextQueueHandler.dropped == before + 1
@@ -0,0 +1,501 @@
+"""
+SharePoint Sync Tests
+
+Tests for Graph uploads against a local HTTP stand-in for the Graph API.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from app.extensions import db
+from app.models import Attachment
+from app.utils import sharepoint
+from app.utils.sharepoint import (
+    CHUNK_UNIT,
+    INITIAL_CHUNK_SIZE,
+    MAX_CHUNK_SIZE,
+    MIN_CHUNK_SIZE,
+    SIMPLE_UPLOAD_MAX_BYTES,
+    SharePointSyncError,
+    _next_chunk_size,
+    upload_attachment_to_sharepoint,
+)
+
+
+class GraphStandIn:
+    """
+    Minimal Graph drive API served over HTTP on localhost.
+
+    Records every request as (method, path) and supports folder creation,
+    simple uploads and upload sessions. Set fail_chunk_at to make the
+    chunk PUT starting at that byte offset fail once with a 503, throttle
+    to answer the next N requests with 429 + Retry-After, and
+    upload_delay to slow simple uploads (max_in_flight records overlap).
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.chunk_starts = []
+        self.sessions = {}
+        self.files = {}
+        self.folders = set()
+        self.fail_chunk_at = None
+        self.throttle = 0
+        self.retry_after = "1"
+        self.upload_delay = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def count(self, method, pattern=""):
+        return sum(1 for m, p in self.requests if m == method and pattern in p)
+
+    def _handler(self):
+        graph = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, payload=None):
+                body = json.dumps(payload or {}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _body(self):
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def _item(self, path):
+                return {"id": f"item-{len(graph.files)}", "webUrl": f"https://sp.example/{path}"}
+
+            def do_POST(self):
+                body = json.loads(self._body() or b"{}")
+                with graph.lock:
+                    graph.requests.append(("POST", self.path))
+
+                match = re.search(r"/root:/(.+):/createUploadSession$", self.path)
+                if match:
+                    session_id = f"s{len(graph.sessions)}"
+                    graph.sessions[session_id] = {"path": match.group(1), "data": bytearray()}
+                    return self._reply(200, {"uploadUrl": f"{graph.base_url}/upload/{session_id}"})
+
+                match = re.search(r"/root(?::/(.+):)?/children$", self.path)
+                if match:
+                    folder = "/".join(p for p in (match.group(1), body["name"]) if p)
+                    with graph.lock:
+                        if folder in graph.folders:
+                            return self._reply(409, {"error": {"code": "nameAlreadyExists"}})
+                        graph.folders.add(folder)
+                    return self._reply(201, {"name": body["name"]})
+
+                return self._reply(404)
+
+            def do_GET(self):
+                graph.requests.append(("GET", self.path))
+                match = re.match(r"/upload/(\w+)$", self.path)
+                if match and match.group(1) in graph.sessions:
+                    received = len(graph.sessions[match.group(1)]["data"])
+                    return self._reply(200, {"nextExpectedRanges": [f"{received}-"]})
+                return self._reply(404)
+
+            def do_PUT(self):
+                data = self._body()
+                with graph.lock:
+                    graph.requests.append(("PUT", self.path))
+                    throttled = graph.throttle > 0
+                    graph.throttle -= throttled
+
+                if throttled:
+                    body = b"{}"
+                    self.send_response(429)
+                    self.send_header("Retry-After", graph.retry_after)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+
+                match = re.match(r"/upload/(\w+)$", self.path)
+                if match:
+                    session = graph.sessions[match.group(1)]
+                    start, end, total = map(
+                        int, re.match(r"bytes (\d+)-(\d+)/(\d+)", self.headers["Content-Range"]).groups()
+                    )
+                    graph.chunk_starts.append(start)
+                    if graph.fail_chunk_at == start:
+                        graph.fail_chunk_at = None
+                        return self._reply(503)
+                    if start != len(session["data"]) or end - start + 1 != len(data):
+                        return self._reply(416)
+                    session["data"] += data
+                    if len(session["data"]) < total:
+                        return self._reply(202, {"nextExpectedRanges": [f"{end + 1}-"]})
+                    graph.files[session["path"]] = bytes(session["data"])
+                    return self._reply(201, self._item(session["path"]))
+
+                match = re.search(r"/root:/(.+):/content", self.path)
+                if match:
+                    with graph.lock:
+                        graph.in_flight += 1
+                        graph.max_in_flight = max(graph.max_in_flight, graph.in_flight)
+                    time.sleep(graph.upload_delay)
+                    with graph.lock:
+                        graph.in_flight -= 1
+                        graph.files[match.group(1)] = data
+                    return self._reply(201, self._item(match.group(1)))
+
+                return self._reply(404)
+
+        return Handler
+
+
+@pytest.fixture
+def graph(app):
+    stand_in = GraphStandIn()
+    stand_in.thread.start()
+    app.config.update(
+        SHAREPOINT_SYNC_ENABLED=True,
+        AZURE_CLIENT_ID="client",
+        AZURE_CLIENT_SECRET="secret",
+        SP_SITE_ID="site",
+        SP_DRIVE_ID="drive",
+        GRAPH_BASE_URL=stand_in.base_url,
+        SP_RATE_LIMIT_PER_SECOND=0,
+    )
+    sharepoint.reset_folder_cache()
+    with patch("app.utils.sharepoint._get_graph_token", return_value="token"):
+        yield stand_in
+    stand_in.server.shutdown()
+    stand_in.server.server_close()
+
+
+@pytest.fixture
+def make_attachment(app, submitted_timesheet):
+    def _make(data, name="receipt.pdf", timesheet_id=None):
+        key = f"sp-{os.urandom(4).hex()}.pdf"
+        with open(os.path.join(app.config["UPLOAD_FOLDER"], key), "wb") as f:
+            f.write(data)
+        attachment = Attachment(
+            timesheet_id=timesheet_id or submitted_timesheet["id"],
+            filename=key,
+            original_filename=name,
+            mime_type="application/pdf",
+            file_size=len(data),
+        )
+        db.session.add(attachment)
+        db.session.commit()
+        return attachment
+
+    return _make
+
+
+class TestChunkSizing:
+    """Tests for adaptive upload-session chunk sizes."""
+
+    def test_fast_chunks_grow_to_cap(self):
+        size = INITIAL_CHUNK_SIZE
+        for _ in range(10):
+            size = _next_chunk_size(size, 0.1)
+        assert size == MAX_CHUNK_SIZE
+
+    def test_slow_chunks_shrink_to_floor(self):
+        size = INITIAL_CHUNK_SIZE
+        for _ in range(10):
+            size = _next_chunk_size(size, 30)
+            assert size % CHUNK_UNIT == 0
+        assert size == MIN_CHUNK_SIZE
+
+
+class TestSharePointUpload:
+    """Tests for upload_attachment_to_sharepoint against the Graph stand-in."""
+
+    def test_small_file_uses_single_put(self, app, graph, make_attachment):
+        data = b"%PDF-1.4 " + os.urandom(1000)
+        with app.app_context():
+            attachment = make_attachment(data)
+            result = upload_attachment_to_sharepoint(attachment)
+
+        assert result["item_id"]
+        assert list(graph.files.values()) == [data]
+        assert graph.count("POST", "createUploadSession") == 0
+        assert graph.count("PUT") == 1
+
+    def test_large_file_uploads_in_chunks(self, app, graph, make_attachment):
+        data = os.urandom(SIMPLE_UPLOAD_MAX_BYTES + 3 * CHUNK_UNIT + 17)
+        with app.app_context():
+            attachment = make_attachment(data)
+            upload_attachment_to_sharepoint(attachment)
+
+            assert attachment.sharepoint_upload_url is None
+            assert attachment.sharepoint_upload_offset is None
+
+        (path, uploaded), = graph.files.items()
+        assert uploaded == data
+        assert path.endswith(f"{attachment.id}_receipt.pdf")
+        assert graph.count("POST", "createUploadSession") == 1
+        assert graph.count("PUT", "/upload/") >= 2
+
+    def test_failed_upload_resumes_from_last_chunk(self, app, graph, make_attachment):
+        data = os.urandom(SIMPLE_UPLOAD_MAX_BYTES + 5 * CHUNK_UNIT)
+        graph.fail_chunk_at = INITIAL_CHUNK_SIZE
+
+        with app.app_context():
+            attachment = make_attachment(data)
+            with pytest.raises(SharePointSyncError):
+                upload_attachment_to_sharepoint(attachment, checkpoint=db.session.commit)
+
+            db.session.expire_all()
+            assert attachment.sharepoint_upload_url
+            assert attachment.sharepoint_upload_offset == INITIAL_CHUNK_SIZE
+
+            upload_attachment_to_sharepoint(attachment, checkpoint=db.session.commit)
+
+        assert list(graph.files.values()) == [data]
+        assert graph.count("POST", "createUploadSession") == 1
+        assert graph.count("GET", "/upload/") == 1
+        # Only the failed chunk is sent twice
+        assert graph.chunk_starts.count(0) == 1
+        assert graph.chunk_starts.count(INITIAL_CHUNK_SIZE) == 2
+
+    def test_expired_session_starts_over(self, app, graph, make_attachment):
+        data = os.urandom(SIMPLE_UPLOAD_MAX_BYTES + CHUNK_UNIT)
+        with app.app_context():
+            attachment = make_attachment(data)
+            attachment.sharepoint_upload_url = f"{graph.base_url}/upload/gone"
+            attachment.sharepoint_upload_offset = CHUNK_UNIT
+            upload_attachment_to_sharepoint(attachment)
+
+        assert list(graph.files.values()) == [data]
+        assert graph.count("POST", "createUploadSession") == 1
+
+    def test_missing_stored_file(self, app, graph, make_attachment):
+        with app.app_context():
+            attachment = make_attachment(b"%PDF-1.4 x")
+            os.remove(os.path.join(app.config["UPLOAD_FOLDER"], attachment.filename))
+            with pytest.raises(SharePointSyncError, match="Stored file not found"):
+                upload_attachment_to_sharepoint(attachment)
+
+    def test_session_reused_across_calls(self, app):
+        with app.app_context():
+            assert sharepoint._get_http_session() is sharepoint._get_http_session()
+            parent = sharepoint._get_http_session()
+            with patch("app.utils.sharepoint.os.getpid", return_value=-1):
+                assert sharepoint._get_http_session() is not parent
+
+
+class FakeRedis:
+    """Just enough of redis-py for the shared folder cache."""
+
+    def __init__(self):
+        self.values = {}
+
+    def mget(self, keys):
+        return [self.values.get(k) for k in keys]
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def execute(self):
+        pass
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+class TestFolderCache:
+    """Tests for skipping folder creation for known drive folders."""
+
+    def test_second_sync_skips_folder_creation(self, app, graph, make_attachment):
+        with app.app_context():
+            upload_attachment_to_sharepoint(make_attachment(b"%PDF-1.4 a"))
+            assert graph.count("POST", "/children") == 3  # base, year, week
+
+            upload_attachment_to_sharepoint(make_attachment(b"%PDF-1.4 b"))
+            assert graph.count("POST", "/children") == 3
+            assert graph.count("PUT") == 2
+
+    def test_new_week_only_creates_missing_segment(self, app, graph, make_attachment, sample_user):
+        from datetime import date
+        from app.models import Timesheet
+
+        with app.app_context():
+            upload_attachment_to_sharepoint(make_attachment(b"%PDF-1.4 a"))
+
+            other = Timesheet(user_id=sample_user["id"], week_start=date(2024, 1, 8))
+            db.session.add(other)
+            db.session.commit()
+            upload_attachment_to_sharepoint(make_attachment(b"%PDF-1.4 b", timesheet_id=other.id))
+
+        # The base folder is cached; only the new year and week are created
+        posts = [p for m, p in graph.requests if m == "POST" and "/children" in p]
+        assert len(posts) == 5
+        assert posts[-2].endswith("/Timesheets:/children")
+        assert posts[-1].endswith("/Timesheets/2024:/children")
+
+    def test_expired_entries_are_rechecked(self, app, graph, make_attachment):
+        with app.app_context():
+            upload_attachment_to_sharepoint(make_attachment(b"%PDF-1.4 a"))
+            for key in sharepoint._FOLDER_CACHE["paths"]:
+                sharepoint._FOLDER_CACHE["paths"][key] = 0
+            upload_attachment_to_sharepoint(make_attachment(b"%PDF-1.4 b"))
+
+        assert graph.count("POST", "/children") == 6
+
+    def test_disabled_cache_always_checks(self, app, graph, make_attachment):
+        app.config["SP_FOLDER_CACHE_TTL"] = 0
+        with app.app_context():
+            upload_attachment_to_sharepoint(make_attachment(b"%PDF-1.4 a"))
+            upload_attachment_to_sharepoint(make_attachment(b"%PDF-1.4 b"))
+
+        assert graph.count("POST", "/children") == 6
+
+    def test_cache_shared_through_redis(self, app, graph, make_attachment):
+        fake = FakeRedis()
+        with app.app_context(), patch(
+            "app.utils.sharepoint._get_folder_cache_redis", return_value=fake
+        ):
+            upload_attachment_to_sharepoint(make_attachment(b"%PDF-1.4 a"))
+            # Another worker has an empty process cache but sees Redis
+            sharepoint.reset_folder_cache()
+            upload_attachment_to_sharepoint(make_attachment(b"%PDF-1.4 b"))
+
+        assert graph.count("POST", "/children") == 3
+        assert len(fake.values) == 3
+
+    def test_missing_folder_is_forgotten(self, app, graph, make_attachment):
+        with app.app_context():
+            attachment = make_attachment(b"%PDF-1.4 a")
+            upload_attachment_to_sharepoint(attachment)
+            week_folder = sharepoint._build_sharepoint_folder(attachment.timesheet)
+
+            sharepoint.forget_folder_path("drive", week_folder)
+            assert ("drive", week_folder) not in sharepoint._FOLDER_CACHE["paths"]
+
+            upload_attachment_to_sharepoint(make_attachment(b"%PDF-1.4 b"))
+
+        # Only the week segment is re-checked
+        assert graph.count("POST", "/children") == 4
+
+
+class TestThrottling:
+    """Tests for the shared token bucket and Retry-After handling."""
+
+    def test_bucket_allows_burst_then_paces(self):
+        bucket = sharepoint.TokenBucket(rate=50, capacity=2)
+        started = time.monotonic()
+        waits = [bucket.acquire() for _ in range(6)]
+
+        assert waits[:2] == [0.0, 0.0]
+        assert time.monotonic() - started >= 4 / 50 * 0.9
+
+    def test_defer_blocks_all_callers(self):
+        bucket = sharepoint.TokenBucket(rate=0, capacity=1)
+        bucket.defer(0.2)
+        assert bucket.acquire() >= 0.15
+
+    def test_retry_after_header_is_honoured(self, app, graph, make_attachment):
+        graph.throttle = 1
+        with app.app_context():
+            started = time.monotonic()
+            upload_attachment_to_sharepoint(make_attachment(b"%PDF-1.4 a"))
+            elapsed = time.monotonic() - started
+
+        assert graph.count("PUT") == 2
+        assert elapsed >= 0.9
+        assert len(graph.files) == 1
+
+    def test_gives_up_after_max_retries(self, app, graph, make_attachment):
+        app.config["SP_THROTTLE_MAX_RETRIES"] = 1
+        graph.throttle = 5
+        graph.retry_after = "0"
+        with app.app_context():
+            with pytest.raises(SharePointSyncError, match="429"):
+                upload_attachment_to_sharepoint(make_attachment(b"%PDF-1.4 a"))
+
+        assert graph.count("PUT") == 2
+
+    def test_retry_after_http_date(self):
+        from email.utils import formatdate
+
+        class Response:
+            headers = {"Retry-After": formatdate(time.time() + 30, usegmt=True)}
+
+        assert 25 <= sharepoint._retry_after_seconds(Response(), 0) <= 31
+
+
+class TestBatchSync:
+    """Tests for concurrent batch sync."""
+
+    @pytest.fixture
+    def batch(self, app, make_attachment, sample_user):
+        from datetime import timedelta
+        from app.models import Timesheet
+
+        with app.app_context():
+            first = make_attachment(b"%PDF-1.4 0")
+            other = Timesheet(
+                user_id=sample_user["id"],
+                week_start=first.timesheet.week_start - timedelta(weeks=1),
+            )
+            db.session.add(other)
+            db.session.commit()
+            attachments = [first] + [
+                make_attachment(f"%PDF-1.4 {i}".encode(), timesheet_id=(other.id if i % 2 else None))
+                for i in range(1, 6)
+            ]
+            return [a.id for a in attachments]
+
+    def test_uploads_concurrently_and_reports_throughput(self, app, graph, batch):
+        from app.jobs import sync_sharepoint_batch
+
+        graph.upload_delay = 0.2
+        with app.app_context():
+            attachments = Attachment.query.filter(Attachment.id.in_(batch)).all()
+            result = sync_sharepoint_batch(attachments, concurrency=3)
+
+            statuses = {a.sharepoint_sync_status for a in Attachment.query.filter(Attachment.id.in_(batch))}
+            assert statuses == {Attachment.SharePointSyncStatus.SYNCED}
+
+        assert result["synced"] == 6
+        assert result["failed"] == 0
+        assert result["bytes_uploaded"] == sum(len(f"%PDF-1.4 {i}") for i in range(6))
+        assert result["files_per_second"] > 0
+        assert result["bytes_per_second"] > 0
+        assert len(graph.files) == 6
+        assert graph.max_in_flight > 1
+        # Two week folders: shared parents created once, not once per file
+        assert graph.count("POST", "/children") == 4
+
+    def test_failures_are_recorded_per_attachment(self, app, graph, batch):
+        from app.jobs import sync_sharepoint_batch
+
+        with app.app_context():
+            attachments = Attachment.query.filter(Attachment.id.in_(batch)).all()
+            broken = attachments[0]
+            os.remove(os.path.join(app.config["UPLOAD_FOLDER"], broken.filename))
+
+            result = sync_sharepoint_batch(attachments, concurrency=2)
+
+            db.session.expire_all()
+            broken = Attachment.query.get(broken.id)
+            assert broken.sharepoint_sync_status == Attachment.SharePointSyncStatus.FAILED
+            assert "Stored file not found" in broken.sharepoint_last_error
+            assert broken.sharepoint_retry_count == 1
+
+        assert result["synced"] == 5
+        assert result["failed"] == 1
@@ -0,0 +1,308 @@
+"""
+Storage Tests
+
+Tests for the attachment storage backends and streaming uploads.
+"""
+
+import hashlib
+import io
+import os
+import sys
+import pytest
+from unittest.mock import MagicMock, patch
+from app.extensions import db
+from app.models import Attachment
+from app.utils.storage import (
+    LocalStorageBackend,
+    S3CompatibleStorageBackend,
+    S3StorageBackend,
+    StorageValidationError,
+    MIN_MULTIPART_CHUNK_SIZE,
+    get_storage_backend,
+)
+
+
+def _is_pdf(header):
+    return header.startswith(b"%PDF")
+
+
+class ChunkCountingStream(io.BytesIO):
+    """BytesIO that records how many reads were made."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+@pytest.fixture
+def s3_backend(app):
+    """S3-compatible backend with a mocked client."""
+    with app.app_context():
+        backend = S3CompatibleStorageBackend()
+        backend.bucket = "attachments-test"
+        backend.client = MagicMock()
+        backend.client.create_multipart_upload.return_value = {"UploadId": "upload-1"}
+        backend.client.upload_part.side_effect = lambda **kw: {"ETag": f"etag-{kw['PartNumber']}"}
+        yield backend
+
+
+class TestLocalStreamingSave:
+    """Tests for LocalStorageBackend.save_stream."""
+
+    def test_save_stream_writes_file_and_digest(self, app, tmp_path):
+        data = b"%PDF-1.4 " + os.urandom(200 * 1024)
+        with app.app_context():
+            backend = LocalStorageBackend(str(tmp_path))
+            result = backend.save_stream(io.BytesIO(data), "report.pdf", "application/pdf", _is_pdf)
+
+        assert result["key"].endswith(".pdf")
+        assert result["size"] == len(data)
+        assert result["sha256"] == hashlib.sha256(data).hexdigest()
+        assert (tmp_path / result["key"]).read_bytes() == data
+        assert not any(name.endswith(".part") for name in os.listdir(tmp_path))
+
+    def test_rejected_content_writes_nothing(self, app, tmp_path):
+        stream = ChunkCountingStream(b"MZ" + b"\0" * (512 * 1024))
+        with app.app_context():
+            backend = LocalStorageBackend(str(tmp_path))
+            with pytest.raises(StorageValidationError):
+                backend.save_stream(stream, "fake.pdf", "application/pdf", _is_pdf)
+
+        assert os.listdir(tmp_path) == []
+        assert stream.reads == 1  # Aborted after the first chunk
+
+    def test_empty_stream_is_rejected(self, app, tmp_path):
+        with app.app_context():
+            backend = LocalStorageBackend(str(tmp_path))
+            with pytest.raises(StorageValidationError):
+                backend.save_stream(io.BytesIO(b""), "empty.pdf", "application/pdf", _is_pdf)
+
+
+class TestS3StreamingSave:
+    """Tests for S3/R2 streaming uploads."""
+
+    def test_small_file_uses_single_put(self, s3_backend):
+        data = b"%PDF-1.4 small"
+        result = s3_backend.save_stream(io.BytesIO(data), "a.pdf", "application/pdf", _is_pdf)
+
+        s3_backend.client.put_object.assert_called_once()
+        kwargs = s3_backend.client.put_object.call_args.kwargs
+        assert kwargs["Body"] == data
+        assert kwargs["Key"] == result["key"]
+        assert result["key"].startswith("attachments/")
+        s3_backend.client.create_multipart_upload.assert_not_called()
+
+    def test_large_file_uses_multipart(self, s3_backend, app):
+        app.config["STORAGE_MULTIPART_CHUNK_SIZE"] = MIN_MULTIPART_CHUNK_SIZE
+        data = b"%PDF-1.4 " + os.urandom(2 * MIN_MULTIPART_CHUNK_SIZE + 1000)
+
+        with app.app_context():
+            result = s3_backend.save_stream(io.BytesIO(data), "big.pdf", "application/pdf", _is_pdf)
+
+        client = s3_backend.client
+        client.put_object.assert_not_called()
+        parts = [c.kwargs for c in client.upload_part.call_args_list]
+        assert [p["PartNumber"] for p in parts] == [1, 2, 3]
+        assert b"".join(p["Body"] for p in parts) == data
+        assert len(parts[0]["Body"]) == MIN_MULTIPART_CHUNK_SIZE
+
+        complete = client.complete_multipart_upload.call_args.kwargs
+        assert complete["MultipartUpload"]["Parts"][-1] == {"ETag": "etag-3", "PartNumber": 3}
+        assert result["size"] == len(data)
+        assert result["sha256"] == hashlib.sha256(data).hexdigest()
+
+    def test_failed_part_aborts_upload(self, s3_backend, app):
+        app.config["STORAGE_MULTIPART_CHUNK_SIZE"] = MIN_MULTIPART_CHUNK_SIZE
+        s3_backend.client.upload_part.side_effect = RuntimeError("network")
+        data = b"%PDF" + b"\0" * (MIN_MULTIPART_CHUNK_SIZE + 10)
+
+        with app.app_context(), pytest.raises(RuntimeError):
+            s3_backend.save_stream(io.BytesIO(data), "big.pdf", "application/pdf", _is_pdf)
+
+        s3_backend.client.abort_multipart_upload.assert_called_once()
+        s3_backend.client.complete_multipart_upload.assert_not_called()
+
+    def test_rejected_content_makes_no_requests(self, s3_backend):
+        with pytest.raises(StorageValidationError):
+            s3_backend.save_stream(io.BytesIO(b"nope"), "a.pdf", "application/pdf", _is_pdf)
+
+        assert s3_backend.client.method_calls == []
+
+
+class TestUploadRoute:
+    """Tests for the upload route's use of the storage backend."""
+
+    def test_upload_records_streamed_size(self, auth_client, sample_timesheet, app):
+        data = b"%PDF-1.4 " + b"x" * 100_000
+        response = auth_client.post(
+            f"/api/timesheets/{sample_timesheet['id']}/attachments",
+            data={"file": (io.BytesIO(data), "scan.pdf")},
+            content_type="multipart/form-data",
+        )
+        assert response.status_code == 201
+        assert response.get_json()["file_size"] == len(data)
+
+    def test_rejected_upload_leaves_no_file(self, auth_client, sample_timesheet, app):
+        upload_folder = app.config["UPLOAD_FOLDER"]
+        before = set(os.listdir(upload_folder)) if os.path.isdir(upload_folder) else set()
+
+        response = auth_client.post(
+            f"/api/timesheets/{sample_timesheet['id']}/attachments",
+            data={"file": (io.BytesIO(b"GIF89a not a png"), "photo.png")},
+            content_type="multipart/form-data",
+        )
+
+        assert response.status_code == 400
+        assert set(os.listdir(upload_folder)) == before
+
+
+class TestBackendCache:
+    """Tests for per-app, per-process backend caching."""
+
+    @pytest.fixture
+    def fake_boto3(self):
+        boto3 = MagicMock()
+        botocore_config = MagicMock()
+        modules = {"boto3": boto3, "botocore": MagicMock(), "botocore.config": botocore_config}
+        with patch.dict(sys.modules, modules):
+            yield boto3, botocore_config
+
+    def test_backend_is_reused(self, app):
+        with app.app_context():
+            assert get_storage_backend() is get_storage_backend()
+
+    def test_backend_rebuilt_after_fork(self, app):
+        with app.app_context():
+            parent = get_storage_backend()
+            with patch("app.utils.storage.os.getpid", return_value=-1):
+                child = get_storage_backend()
+        assert child is not parent
+
+    def test_backend_rebuilt_when_type_changes(self, app, fake_boto3):
+        app.config.update(STORAGE_BACKEND="s3", AWS_S3_BUCKET="bucket")
+        with app.app_context():
+            assert isinstance(get_storage_backend(), S3StorageBackend)
+            app.config["STORAGE_BACKEND"] = "local"
+            assert isinstance(get_storage_backend(), LocalStorageBackend)
+
+    def test_s3_client_built_once_with_pool_size(self, app, fake_boto3):
+        boto3, botocore_config = fake_boto3
+        app.config.update(
+            STORAGE_BACKEND="s3",
+            AWS_S3_BUCKET="bucket",
+            STORAGE_MAX_POOL_CONNECTIONS=64,
+        )
+        with app.app_context():
+            for _ in range(5):
+                get_storage_backend().delete("attachments/x.pdf")
+
+        assert boto3.client.call_count == 1
+        botocore_config.Config.assert_called_once_with(
+            signature_version="s3v4", max_pool_connections=64
+        )
+
+
+class TestStreamingReads:
+    """Tests for StorageBackend.get_stream."""
+
+    def test_local_stream_full_and_range(self, app, tmp_path):
+        data = os.urandom(150 * 1024)
+        (tmp_path / "a.pdf").write_bytes(data)
+        with app.app_context():
+            backend = LocalStorageBackend(str(tmp_path))
+            assert b"".join(backend.get_stream("a.pdf")) == data
+            assert b"".join(backend.get_stream("a.pdf", (100, 70_000))) == data[100:70_001]
+            assert b"".join(backend.get_stream("a.pdf", (140_000, None))) == data[140_000:]
+
+    def test_local_stream_missing_or_escaping_key(self, app, tmp_path):
+        with app.app_context():
+            backend = LocalStorageBackend(str(tmp_path))
+            with pytest.raises(FileNotFoundError):
+                backend.get_stream("missing.pdf")
+            with pytest.raises(FileNotFoundError):
+                backend.get_stream("../etc/passwd")
+
+    def test_s3_stream_uses_ranged_get(self, s3_backend):
+        body = MagicMock()
+        body.iter_chunks.return_value = iter([b"abc"])
+        s3_backend.client.get_object.return_value = {"Body": body}
+
+        assert list(s3_backend.get_stream("k", (10, 19))) == [b"abc"]
+        s3_backend.client.get_object.assert_called_once_with(
+            Bucket="attachments-test", Key="k", Range="bytes=10-19"
+        )
+
+    def test_s3_stream_missing_key(self, s3_backend):
+        error = Exception("missing")
+        error.response = {"Error": {"Code": "NoSuchKey"}}
+        s3_backend.client.get_object.side_effect = error
+
+        with pytest.raises(FileNotFoundError):
+            s3_backend.get_stream("k")
+
+    def test_presigned_url_sets_download_name(self, s3_backend):
+        s3_backend.get_url("k", expires_in=60, download_name="my receipt.pdf")
+        params = s3_backend.client.generate_presigned_url.call_args.kwargs["Params"]
+        assert params["ResponseContentDisposition"] == (
+            "attachment; filename*=UTF-8''my%20receipt.pdf"
+        )
+
+
+class TestAdminDownload:
+    """Tests for offloaded and ranged admin attachment downloads."""
+
+    @pytest.fixture
+    def stored_attachment(self, app, submitted_timesheet):
+        data = b"%PDF-1.4 " + bytes(range(256)) * 40
+        with app.app_context():
+            key = "download-test.pdf"
+            with open(os.path.join(app.config["UPLOAD_FOLDER"], key), "wb") as f:
+                f.write(data)
+            attachment = Attachment(
+                timesheet_id=submitted_timesheet["id"],
+                filename=key,
+                original_filename="receipt.pdf",
+                mime_type="application/pdf",
+                file_size=len(data),
+            )
+            db.session.add(attachment)
+            db.session.commit()
+            url = f"/api/admin/timesheets/{submitted_timesheet['id']}/attachments/{attachment.id}"
+        return url, key, data
+
+    def test_range_request_returns_partial_content(self, admin_client, stored_attachment):
+        url, _, data = stored_attachment
+        response = admin_client.get(url, headers={"Range": "bytes=0-99"})
+
+        assert response.status_code == 206
+        assert response.data == data[:100]
+        assert response.headers["Content-Range"] == f"bytes 0-99/{len(data)}"
+
+    def test_accel_redirect_offloads_to_nginx(self, app, admin_client, stored_attachment):
+        url, key, _ = stored_attachment
+        app.config["STORAGE_ACCEL_REDIRECT_PREFIX"] = "/protected-uploads/"
+
+        response = admin_client.get(url)
+
+        assert response.status_code == 200
+        assert response.headers["X-Accel-Redirect"] == f"/protected-uploads/{key}"
+        assert "receipt.pdf" in response.headers["Content-Disposition"]
+        assert response.data == b""
+
+    def test_object_storage_redirects_to_presigned_url(self, app, admin_client, stored_attachment):
+        url, key, _ = stored_attachment
+        backend = MagicMock()
+        backend.get_url.return_value = "https://bucket.example/signed"
+
+        with patch("app.utils.storage.get_storage_backend", return_value=backend):
+            response = admin_client.get(url)
+
+        assert response.status_code == 302
+        assert response.headers["Location"] == "https://bucket.example/signed"
+        backend.get_url.assert_called_once_with(
+            key, expires_in=300, download_name="receipt.pdf"
+        )
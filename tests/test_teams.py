@@ -316,7 +316,8 @@ class TestGetBotToken:
     @patch("msal.ConfidentialClientApplication")
     def test_acquires_token_from_msal(self, mock_msal_class, mock_configured, app):
         """Test that _get_bot_token acquires token from MSAL."""
-        from app.utils.teams import _get_bot_token, _TOKEN_CACHE
+        from app.utils.teams import _get_bot_token
+        from app.utils.token_cache import reset_token_cache
 
         mock_configured.return_value = True
         
@@ -333,8 +334,7 @@ class TestGetBotToken:
         app.config["TEAMS_TENANT_ID"] = "test-tenant"
 
         # Clear cache
-        _TOKEN_CACHE["access_token"] = ""
-        _TOKEN_CACHE["expires_at"] = 0
+        reset_token_cache()
 
         with app.app_context():
             token = _get_bot_token()
@@ -345,34 +345,39 @@ class TestGetBotToken:
     @patch("msal.ConfidentialClientApplication")
     def test_uses_cached_token(self, mock_msal_class, mock_configured, app):
         """Test that _get_bot_token uses cached token if not expired."""
-        from app.utils.teams import _get_bot_token, _TOKEN_CACHE
-        import time
+        from app.utils.teams import _get_bot_token
+        from app.utils.token_cache import reset_token_cache
 
         mock_configured.return_value = True
-
-        # Set a cached token that hasn't expired
-        _TOKEN_CACHE["access_token"] = "cached-token"
-        _TOKEN_CACHE["expires_at"] = time.time() + 3600
+        mock_app = MagicMock()
+        mock_app.acquire_token_for_client.return_value = {
+            "access_token": "cached-token",
+            "expires_in": 3600,
+        }
+        mock_msal_class.return_value = mock_app
+        reset_token_cache()
 
         app.config["TEAMS_NOTIFICATIONS_ENABLED"] = True
         app.config["TEAMS_APP_ID"] = "real-app-id"
         app.config["TEAMS_APP_PASSWORD"] = "real-password"
 
         with app.app_context():
+            assert _get_bot_token() == "cached-token"
             token = _get_bot_token()
             assert token == "cached-token"
-            # MSAL should not be called since we have a cached token
-            mock_msal_class.assert_not_called()
+            # MSAL should only be asked once; the second call is a cache hit
+            mock_app.acquire_token_for_client.assert_called_once()
+            mock_msal_class.assert_called_once()
 
         # Clean up cache for other tests
-        _TOKEN_CACHE["access_token"] = ""
-        _TOKEN_CACHE["expires_at"] = 0
+        reset_token_cache()
 
     @patch("app.utils.teams.is_teams_configured")
     @patch("msal.ConfidentialClientApplication")
     def test_raises_on_token_error(self, mock_msal_class, mock_configured, app):
         """Test that _get_bot_token raises on MSAL error."""
-        from app.utils.teams import _get_bot_token, _TOKEN_CACHE
+        from app.utils.teams import _get_bot_token
+        from app.utils.token_cache import reset_token_cache
 
         mock_configured.return_value = True
 
@@ -383,8 +388,7 @@ class TestGetBotToken:
         }
         mock_msal_class.return_value = mock_app
 
-        _TOKEN_CACHE["access_token"] = ""
-        _TOKEN_CACHE["expires_at"] = 0
+        reset_token_cache()
 
         app.config["TEAMS_NOTIFICATIONS_ENABLED"] = True
         app.config["TEAMS_APP_ID"] = "real-app-id"
@@ -404,7 +408,7 @@ class TestSendTeamsMessageWithMock:
 
     @patch("app.utils.teams._get_bot_token")
     @patch("app.utils.teams.is_teams_configured")
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_sends_message_successfully(self, mock_post, mock_configured, mock_token, app):
         """Test successful message send to Teams."""
         from app.utils.teams import send_teams_message
@@ -431,7 +435,7 @@ class TestSendTeamsMessageWithMock:
 
     @patch("app.utils.teams._get_bot_token")
     @patch("app.utils.teams.is_teams_configured")
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_sends_message_with_card(self, mock_post, mock_configured, mock_token, app):
         """Test sending message with adaptive card."""
         from app.utils.teams import send_teams_message
@@ -459,7 +463,7 @@ class TestSendTeamsMessageWithMock:
 
     @patch("app.utils.teams._get_bot_token")
     @patch("app.utils.teams.is_teams_configured")
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_raises_on_http_error(self, mock_post, mock_configured, mock_token, app):
         """Test that HTTP errors raise RuntimeError."""
         from app.utils.teams import send_teams_message
@@ -593,62 +597,208 @@ class TestBuildAdminSubmissionCard:
 # Send Card to Users (Success Path)
 # ============================================================================
 
+def _link_conversation(user, account, service_url="https://smba.trafficmanager.net/amer/"):
+    from app.models import TeamsConversation
+    from app.extensions import db
+
+    user.teams_opt_in = True
+    user.teams_account = account
+    db.session.add(TeamsConversation(
+        user_id=user.id,
+        conversation_id=f"conv-{account}",
+        service_url=service_url,
+        bot_id="bot-id",
+        bot_name="Bot",
+    ))
+    db.session.commit()
+
+
+@patch("app.utils.teams._get_bot_token", return_value="test-bot-token")
+@patch("app.utils.teams.is_teams_configured", return_value=True)
 class TestSendCardToUsersWithMock:
     """Tests for send_card_to_users with successful sends."""
 
-    @patch("app.utils.teams.send_card_to_user")
-    def test_counts_successful_sends(self, mock_send, app, sample_user):
+    @patch("requests.Session.post")
+    def test_counts_successful_sends(self, mock_post, mock_configured, mock_token, app, sample_user):
         """Test that successful sends are counted."""
         from app.utils.teams import send_card_to_users
         from app.models import User
 
-        mock_send.return_value = True
+        mock_post.return_value = MagicMock(status_code=200)
 
         with app.app_context():
             user = User.query.get(sample_user["id"])
-            user.teams_opt_in = True
-            user.teams_account = "user@company.com"
+            _link_conversation(user, "user@company.com")
 
             result = send_card_to_users([user], {"type": "AdaptiveCard"}, "Test")
             assert result == 1
-            mock_send.assert_called_once()
+            mock_post.assert_called_once()
 
-    @patch("app.utils.teams.send_card_to_user")
-    def test_handles_send_exceptions(self, mock_send, app, sample_user):
+    @patch("requests.Session.post")
+    def test_handles_send_exceptions(self, mock_post, mock_configured, mock_token, app, sample_user):
         """Test that exceptions during send are caught and logged."""
         from app.utils.teams import send_card_to_users
         from app.models import User
 
-        mock_send.side_effect = Exception("Network error")
+        mock_post.side_effect = Exception("Network error")
 
         with app.app_context():
             user = User.query.get(sample_user["id"])
-            user.teams_opt_in = True
-            user.teams_account = "user@company.com"
+            _link_conversation(user, "user@company.com")
 
             # Should not raise, should return 0
             result = send_card_to_users([user], {"type": "AdaptiveCard"}, "Test")
             assert result == 0
 
-    @patch("app.utils.teams.send_card_to_user")
-    def test_sends_to_multiple_users(self, mock_send, app, sample_user, sample_admin):
+    @patch("requests.Session.post")
+    def test_sends_to_multiple_users(self, mock_post, mock_configured, mock_token, app, sample_user, sample_admin):
         """Test sending to multiple users."""
         from app.utils.teams import send_card_to_users
         from app.models import User
-        from app.extensions import db
 
-        mock_send.return_value = True
+        mock_post.return_value = MagicMock(status_code=201)
 
         with app.app_context():
             user1 = User.query.get(sample_user["id"])
-            user1.teams_opt_in = True
-            user1.teams_account = "user1@company.com"
-
+            _link_conversation(user1, "user1@company.com")
             user2 = User.query.get(sample_admin["id"])
-            user2.teams_opt_in = True
-            user2.teams_account = "user2@company.com"
-            db.session.commit()
+            _link_conversation(user2, "user2@company.com")
 
             result = send_card_to_users([user1, user2], {"type": "AdaptiveCard"}, "Test")
             assert result == 2
-            assert mock_send.call_count == 2
+            assert mock_post.call_count == 2
+
+
+class BotFrameworkStandIn:
+    """Local HTTP server accepting activities; some conversations are slow or fail."""
+
+    def __init__(self, delays=None, failures=()):
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.delays = delays or {}
+        self.failures = set(failures)
+        self.received = []
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                import time
+
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                conversation = self.path.split("/")[3]
+                stand_in.received.append(conversation)
+                time.sleep(stand_in.delays.get(conversation, 0))
+                status = 500 if conversation in stand_in.failures else 201
+                self.send_response(status)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@patch("app.utils.teams._get_bot_token", return_value="test-bot-token")
+@patch("app.utils.teams.is_teams_configured", return_value=True)
+class TestFanOutCard:
+    """Tests for concurrent fan-out to many recipients."""
+
+    @staticmethod
+    def _recipients(count):
+        from app.models import User
+        from app.extensions import db
+
+        users = [
+            User(azure_id=f"azure-fan-{i}", email=f"fan{i}@northstar.com", display_name=f"Fan {i}")
+            for i in range(count)
+        ]
+        db.session.add_all(users)
+        db.session.commit()
+        return users
+
+    def test_slowest_recipient_bounds_latency(self, mock_configured, mock_token, app):
+        import time
+        from app.utils.teams import fan_out_card
+
+        stand_in = BotFrameworkStandIn(delays={f"conv-fan{i}@company.com": 0.3 for i in range(5)})
+        try:
+            with app.app_context():
+                users = self._recipients(5)
+                for user in users:
+                    _link_conversation(user, user.email.replace("northstar", "company"), stand_in.url)
+
+                started = time.monotonic()
+                result = fan_out_card(users, {"type": "AdaptiveCard"}, "Test")
+                elapsed = time.monotonic() - started
+        finally:
+            stand_in.close()
+
+        assert result["sent"] == 5
+        assert len(stand_in.received) == 5
+        assert elapsed < 1.0  # Sequential sends would take 1.5s
+
+    def test_results_aggregated_per_recipient(self, mock_configured, mock_token, app):
+        from app.utils.teams import fan_out_card
+
+        stand_in = BotFrameworkStandIn(failures={"conv-fan1@company.com"})
+        try:
+            with app.app_context():
+                users = self._recipients(3)
+                _link_conversation(users[0], "fan0@company.com", stand_in.url)
+                _link_conversation(users[1], "fan1@company.com", stand_in.url)
+                users[2].teams_opt_in = True
+                users[2].teams_account = "fan2@company.com"  # No conversation yet
+
+                result = fan_out_card(users, {"type": "AdaptiveCard"}, "Test")
+                by_user = {r["user_id"]: r for r in result["results"]}
+
+                assert (result["sent"], result["failed"], result["skipped"]) == (1, 1, 1)
+                assert by_user[users[0].id]["success"] is True
+                assert "500" in by_user[users[1].id]["error"]
+        finally:
+            stand_in.close()
+
+    def test_conversations_resolved_in_one_query(self, mock_configured, mock_token, app):
+        from sqlalchemy import event
+        from app.extensions import db
+        from app.models import TeamsConversation
+        from app.utils.teams import get_conversations_for_users
+
+        with app.app_context():
+            users = self._recipients(4)
+            _link_conversation(users[0], "fan0@company.com")
+            _link_conversation(users[1], "fan1@company.com")
+            # Known only by principal: linked to the user on lookup
+            users[2].teams_opt_in = True
+            users[2].teams_account = "fan2@company.com"
+            db.session.add(TeamsConversation(
+                teams_user_principal="fan2@company.com",
+                conversation_id="conv-principal",
+                service_url="https://smba.trafficmanager.net/amer/",
+                bot_id="bot-id",
+            ))
+            db.session.commit()
+
+            statements = []
+            listener = lambda conn, cursor, statement, *args: statements.append(statement)
+            event.listen(db.engine, "before_cursor_execute", listener)
+            try:
+                resolved = get_conversations_for_users(users)
+            finally:
+                event.remove(db.engine, "before_cursor_execute", listener)
+
+            lookups = [s for s in statements if "FROM teams_conversations" in s]
+            assert len(lookups) == 1
+            assert set(resolved) == {users[0].id, users[1].id, users[2].id}
+            assert resolved[users[2].id].user_id == users[2].id
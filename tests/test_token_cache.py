@@ -0,0 +1,245 @@
+"""
+Token Cache Tests
+
+Tests for the shared Graph / Bot Framework access token cache.
+"""
+
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+from app.utils import token_cache
+from app.utils.observability import request_metrics
+from app.utils.token_cache import (
+    FileTokenStore,
+    MemoryTokenStore,
+    RedisTokenStore,
+    get_access_token,
+    get_confidential_client,
+    reset_token_cache,
+)
+
+
+class FakeRedis:
+    """Just enough of redis-py for RedisTokenStore."""
+
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None, nx=False, px=None):
+        with self.lock:
+            if nx and key in self.values:
+                return None
+            self.values[key] = value
+            return True
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+    def eval(self, script, numkeys, key, owner):
+        with self.lock:
+            if self.values.get(key) == owner:
+                del self.values[key]
+                return 1
+            return 0
+
+
+class Acquirer:
+    """Counts token acquisitions, optionally slowly."""
+
+    def __init__(self, expires_in=3600, delay=0):
+        self.calls = 0
+        self.expires_in = expires_in
+        self.delay = delay
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+            number = self.calls
+        time.sleep(self.delay)
+        return f"token-{number}", self.expires_in
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    reset_token_cache()
+    request_metrics.reset()
+    yield
+    reset_token_cache()
+
+
+def _forget_local():
+    """Simulate another process: same store, empty in-process cache."""
+    token_cache._STATE["local"].clear()
+
+
+class TestGetAccessToken:
+    """Tests for hits, misses and proactive refresh."""
+
+    def test_miss_then_hit(self, app):
+        acquire = Acquirer()
+        with app.app_context():
+            assert get_access_token("graph:t", acquire) == "token-1"
+            assert get_access_token("graph:t", acquire) == "token-1"
+
+        assert acquire.calls == 1
+        assert request_metrics.snapshot()["token_cache"]["graph"] == {"hit": 1, "miss": 1, "refresh": 0}
+
+    def test_refreshes_within_margin(self, app):
+        app.config["TOKEN_REFRESH_MARGIN"] = 300
+        acquire = Acquirer(expires_in=200)  # Inside the margin, still valid
+        with app.app_context():
+            assert get_access_token("bot:t", acquire) == "token-1"
+            assert get_access_token("bot:t", acquire) == "token-2"
+
+        assert request_metrics.snapshot()["token_cache"]["bot"]["refresh"] == 1
+
+    def test_expired_token_is_never_returned(self, app):
+        acquire = Acquirer(expires_in=30)  # Below the one-minute floor
+        with app.app_context():
+            get_access_token("graph:t", acquire)
+            get_access_token("graph:t", acquire)
+
+        assert acquire.calls == 2
+        assert request_metrics.snapshot()["token_cache"]["graph"]["miss"] == 2
+
+    def test_concurrent_misses_acquire_once(self, app):
+        acquire = Acquirer(delay=0.2)
+        tokens = []
+
+        def worker():
+            with app.app_context():
+                tokens.append(get_access_token("graph:t", acquire))
+
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert acquire.calls == 1
+        assert tokens == ["token-1"] * 5
+
+    def test_refresh_in_progress_serves_current_token(self, app):
+        store = MemoryTokenStore()
+        store.set("graph:t", {"access_token": "old", "expires_at": time.time() + 200}, 200)
+        acquire = Acquirer()
+
+        with app.app_context(), patch("app.utils.token_cache.get_token_store", return_value=store):
+            with store.lock("graph:t"):
+                # Another caller holds the refresh lock
+                assert get_access_token("graph:t", acquire) == "old"
+
+        assert acquire.calls == 0
+
+    def test_acquire_errors_propagate(self, app):
+        def failing():
+            raise RuntimeError("Failed to acquire")
+
+        with app.app_context(), pytest.raises(RuntimeError):
+            get_access_token("graph:t", failing)
+
+
+class TestStores:
+    """Tests for sharing tokens between processes."""
+
+    def test_file_store_shared_between_processes(self, app, tmp_path):
+        app.config.update(TOKEN_CACHE_BACKEND="file", TOKEN_CACHE_DIR=str(tmp_path))
+        acquire = Acquirer()
+        with app.app_context():
+            get_access_token("graph:t", acquire)
+            _forget_local()
+            assert get_access_token("graph:t", acquire) == "token-1"
+
+        assert acquire.calls == 1
+        assert isinstance(token_cache._STATE["store"], FileTokenStore)
+
+    def test_redis_store_shared_between_processes(self, app):
+        fake = FakeRedis()
+        store = RedisTokenStore(fake)
+        acquire = Acquirer()
+        with app.app_context(), patch("app.utils.token_cache.get_token_store", return_value=store):
+            get_access_token("bot:t", acquire)
+            _forget_local()
+            assert get_access_token("bot:t", acquire) == "token-1"
+
+        assert acquire.calls == 1
+        assert not any(key.endswith(":lock") for key in fake.values)
+
+    def test_unreachable_redis_falls_back_to_process_cache(self, app):
+        broken = MagicMock()
+        broken.get.side_effect = ConnectionError("down")
+        broken.set.side_effect = ConnectionError("down")
+        acquire = Acquirer()
+        with app.app_context(), patch(
+            "app.utils.token_cache.get_token_store", return_value=RedisTokenStore(broken)
+        ):
+            assert get_access_token("graph:t", acquire) == "token-1"
+            assert get_access_token("graph:t", acquire) == "token-1"
+
+        assert acquire.calls == 1
+
+    def test_store_rebuilt_after_fork(self, app):
+        with app.app_context():
+            parent = token_cache.get_token_store()
+            with patch("app.utils.token_cache.os.getpid", return_value=-1):
+                assert token_cache.get_token_store() is not parent
+
+
+class TestConfidentialClient:
+    """Tests for per-process MSAL client reuse."""
+
+    @patch("msal.ConfidentialClientApplication")
+    def test_client_built_once_per_credential(self, mock_msal_class, app):
+        first = get_confidential_client("id", "https://login/tenant", "secret")
+        again = get_confidential_client("id", "https://login/tenant", "secret")
+        rotated = get_confidential_client("id", "https://login/tenant", "new-secret")
+
+        assert first is again
+        assert mock_msal_class.call_count == 2
+        assert rotated is mock_msal_class.return_value
+
+    @patch("msal.ConfidentialClientApplication")
+    def test_client_rebuilt_after_metadata_refresh_interval(self, mock_msal_class, app):
+        app.config["MSAL_METADATA_REFRESH_SECONDS"] = 600
+        with patch("app.utils.token_cache.time.monotonic", return_value=1000.0):
+            get_confidential_client("id", "https://login/tenant", "secret")
+        with patch("app.utils.token_cache.time.monotonic", return_value=1500.0):
+            get_confidential_client("id", "https://login/tenant", "secret")
+        assert mock_msal_class.call_count == 1
+
+        with patch("app.utils.token_cache.time.monotonic", return_value=1700.0):
+            get_confidential_client("id", "https://login/tenant", "secret")
+        assert mock_msal_class.call_count == 2
+
+    @patch("msal.ConfidentialClientApplication")
+    def test_failed_refresh_keeps_previous_client(self, mock_msal_class, app):
+        app.config["MSAL_METADATA_REFRESH_SECONDS"] = 600
+        with patch("app.utils.token_cache.time.monotonic", return_value=1000.0):
+            first = get_confidential_client("id", "https://login/tenant", "secret")
+
+        mock_msal_class.side_effect = ValueError("discovery failed")
+        with patch("app.utils.token_cache.time.monotonic", return_value=2000.0):
+            assert get_confidential_client("id", "https://login/tenant", "secret") is first
+
+    @patch("app.utils.sharepoint.is_sharepoint_configured", return_value=True)
+    @patch("msal.ConfidentialClientApplication")
+    def test_graph_token_uses_shared_cache(self, mock_msal_class, mock_configured, app):
+        from app.utils.sharepoint import _get_graph_token
+
+        mock_msal_class.return_value.acquire_token_for_client.return_value = {
+            "access_token": "graph-token",
+            "expires_in": 3600,
+        }
+        with app.app_context():
+            assert _get_graph_token() == "graph-token"
+            assert _get_graph_token() == "graph-token"
+
+        mock_msal_class.assert_called_once()
+        mock_msal_class.return_value.acquire_token_for_client.assert_called_once()
+        assert request_metrics.snapshot()["token_cache"]["graph"]["hit"] == 1